@@ -225,9 +225,15 @@ export const useJob = (jobId: string | null) => {
     if (jobId) {
       fetchJob();
       
-      // Auto-refresh every 3 seconds for active jobs
-      const interval = setInterval(() => fetchJob(true), 3000);
-      return () => clearInterval(interval);
+      // Live updates pushed by the server; poll every 3 seconds only if the stream is unavailable
+      let interval: ReturnType<typeof setInterval> | null = null;
+      const source = apiService.subscribeToJob(jobId, setJob, () => {
+        if (!interval) interval = setInterval(() => fetchJob(true), 3000);
+      });
+      return () => {
+        source?.close();
+        if (interval) clearInterval(interval);
+      };
     }
   }, [jobId, fetchJob]);
 
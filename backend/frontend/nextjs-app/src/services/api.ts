@@ -679,6 +679,32 @@ class ApiService {
     return client.get<Job>(`${API_CONFIG.importUrl}/jobs/${jobId}`);
   }
 
+  // Server-sent job progress. Calls onUnavailable if streaming isn't possible
+  // (no EventSource, no token, or the stream fails) so callers can poll instead.
+  subscribeToJob(jobId: string, onUpdate: (job: Job) => void, onUnavailable: () => void): EventSource | null {
+    const token = localStorage.getItem('captely_jwt') || sessionStorage.getItem('captely_jwt');
+    if (typeof EventSource === 'undefined' || !token) {
+      onUnavailable();
+      return null;
+    }
+
+    const source = new EventSource(
+      `${API_CONFIG.importUrl}/jobs/${jobId}/events?token=${encodeURIComponent(token)}`
+    );
+    source.addEventListener('progress', (event) => {
+      onUpdate(JSON.parse((event as MessageEvent).data));
+    });
+    source.addEventListener('done', (event) => {
+      onUpdate(JSON.parse((event as MessageEvent).data));
+      source.close();
+    });
+    source.onerror = () => {
+      source.close();
+      onUnavailable();
+    };
+    return source;
+  }
+
   async getJobContacts(jobId: string, page: number = 1, limit: number = 50): Promise<{
     contacts: Contact[];
     total: number;
@@ -1231,6 +1257,7 @@ class ApiService {
     email_reliability?: string;
     lead_score_min?: number;
     lead_score_max?: number;
+    cursor?: string;
   } = {}): Promise<{
     contacts: (Contact & {
       lead_score: number;
@@ -1242,6 +1269,7 @@ class ApiService {
     page: number;
     limit: number;
     total_pages: number;
+    next_cursor: string | null;
     filters_applied: any;
   }> {
     return client.get(`${API_CONFIG.importUrl}/crm/contacts`, params);
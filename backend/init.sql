@@ -6,6 +6,9 @@
 -- Create UUID extension
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 
+-- Trigram matching for contact search
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
 -- Test comment to see if file is created
 
 -- =============================================
@@ -177,6 +180,7 @@ CREATE TABLE IF NOT EXISTS import_jobs (
 CREATE TABLE IF NOT EXISTS contacts (
     id SERIAL PRIMARY KEY,
     job_id VARCHAR(255) REFERENCES import_jobs(id),
+    user_id VARCHAR(255), -- Denormalized from import_jobs (set by trigger)
     first_name VARCHAR(255),
     last_name VARCHAR(255),
     position VARCHAR(255),
@@ -212,6 +216,55 @@ CREATE TABLE IF NOT EXISTS contacts (
     updated_at TIMESTAMP NOT NULL DEFAULT NOW()
 );
 
+-- =============================================
+-- JOB STATS TABLE (per-job contact aggregates, kept current by triggers)
+-- =============================================
+CREATE TABLE IF NOT EXISTS job_stats (
+    job_id VARCHAR(255) PRIMARY KEY REFERENCES import_jobs(id) ON DELETE CASCADE,
+    total_processed INTEGER NOT NULL DEFAULT 0,
+    enriched_count INTEGER NOT NULL DEFAULT 0,
+    emails_found INTEGER NOT NULL DEFAULT 0,
+    phones_found INTEGER NOT NULL DEFAULT 0,
+    credits_used BIGINT NOT NULL DEFAULT 0,
+    score_sum DOUBLE PRECISION NOT NULL DEFAULT 0,   -- AVG(enrichment_score) = score_sum / score_count
+    score_count INTEGER NOT NULL DEFAULT 0,
+    version BIGINT NOT NULL DEFAULT 0,               -- bumped by every change; orders progress deltas
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- =============================================
+-- ANALYTICS ROLLUP TABLES (per user/provider, kept current by triggers)
+-- =============================================
+CREATE TABLE IF NOT EXISTS contact_rollups_hourly (
+    user_id VARCHAR(255) NOT NULL,
+    provider VARCHAR(50) NOT NULL DEFAULT '',        -- '' for contacts without enrichment_provider
+    bucket TIMESTAMP NOT NULL,                       -- date_trunc('hour', contacts.created_at)
+    contacts INTEGER NOT NULL DEFAULT 0,
+    enriched INTEGER NOT NULL DEFAULT 0,
+    emails_found INTEGER NOT NULL DEFAULT 0,
+    phones_found INTEGER NOT NULL DEFAULT 0,
+    credits_used BIGINT NOT NULL DEFAULT 0,
+    score_sum NUMERIC NOT NULL DEFAULT 0,            -- exact; float drifts as deltas accumulate
+    score_count INTEGER NOT NULL DEFAULT 0,
+    last_contact_at TIMESTAMP,
+    PRIMARY KEY (user_id, bucket, provider)
+);
+
+CREATE TABLE IF NOT EXISTS contact_rollups_daily (
+    user_id VARCHAR(255) NOT NULL,
+    provider VARCHAR(50) NOT NULL DEFAULT '',
+    bucket DATE NOT NULL,
+    contacts INTEGER NOT NULL DEFAULT 0,
+    enriched INTEGER NOT NULL DEFAULT 0,
+    emails_found INTEGER NOT NULL DEFAULT 0,
+    phones_found INTEGER NOT NULL DEFAULT 0,
+    credits_used BIGINT NOT NULL DEFAULT 0,
+    score_sum NUMERIC NOT NULL DEFAULT 0,
+    score_count INTEGER NOT NULL DEFAULT 0,
+    last_contact_at TIMESTAMP,
+    PRIMARY KEY (user_id, bucket, provider)
+);
+
 -- =============================================
 -- ENRICHMENT RESULTS TABLE
 -- =============================================
@@ -288,6 +341,33 @@ EXCEPTION
     WHEN duplicate_object THEN NULL;
 END $$;
 
+-- =============================================
+-- EXPORT JOBS TABLE (asynchronous exports, cached artifacts)
+-- =============================================
+CREATE TABLE IF NOT EXISTS export_jobs (
+    id VARCHAR(36) PRIMARY KEY,
+    user_id VARCHAR(255) NOT NULL,
+    job_id VARCHAR(255) NOT NULL REFERENCES import_jobs(id) ON DELETE CASCADE,
+    format VARCHAR(20) NOT NULL,
+    columns JSONB,
+    filters JSONB,
+    cache_key VARCHAR(64) NOT NULL,           -- sha256 of job + format + columns + filters + last-modified
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',   -- queued, running, completed, failed
+    total_rows INTEGER,
+    rows_written INTEGER NOT NULL DEFAULT 0,
+    storage VARCHAR(10),                      -- 'local' or 's3'
+    artifact_key TEXT,
+    size_bytes BIGINT,
+    error TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    started_at TIMESTAMP,
+    completed_at TIMESTAMP,
+    expires_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_export_jobs_user_cache ON export_jobs(user_id, cache_key, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_export_jobs_expires_at ON export_jobs(expires_at) WHERE artifact_key IS NOT NULL;
+
 -- =============================================
 -- COMPREHENSIVE BILLING SYSTEM
 -- =============================================
@@ -622,6 +702,40 @@ CREATE TABLE IF NOT EXISTS salesforce_contact_mappings (
     UNIQUE(captely_contact_id, salesforce_contact_id)
 );
 
+-- Incremental CRM import state: paging cursor + last-modified watermark
+CREATE TABLE IF NOT EXISTS crm_sync_state (
+    user_id VARCHAR(255) NOT NULL,
+    provider VARCHAR(50) NOT NULL,            -- 'hubspot', 'salesforce'
+    cursor TEXT,                              -- next page of an unfinished import
+    watermark TIMESTAMP WITH TIME ZONE,       -- records modified after this are re-imported
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (user_id, provider)
+);
+
+CREATE INDEX IF NOT EXISTS idx_salesforce_contact_mappings_user_sf
+ON salesforce_contact_mappings(user_id, salesforce_contact_id);
+
+-- Salesforce Bulk API 2.0 jobs run by the export worker
+CREATE TABLE IF NOT EXISTS salesforce_bulk_jobs (
+    id VARCHAR(36) PRIMARY KEY,
+    user_id VARCHAR(255) NOT NULL,
+    operation VARCHAR(20) NOT NULL,           -- 'upsert' (export) or 'query' (import)
+    job_id VARCHAR(255) REFERENCES import_jobs(id) ON DELETE CASCADE,  -- batch exported / imported into
+    soql TEXT,                                -- query: SOQL to run
+    salesforce_job_id VARCHAR(18),
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',   -- queued, submitted, completed, failed
+    salesforce_state VARCHAR(30),             -- Salesforce job state (UploadComplete, InProgress, JobComplete, ...)
+    total_records INTEGER,
+    processed_records INTEGER NOT NULL DEFAULT 0,
+    failed_records INTEGER NOT NULL DEFAULT 0,
+    errors JSONB,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    completed_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_salesforce_bulk_jobs_user ON salesforce_bulk_jobs(user_id, created_at DESC);
+
 -- =============================================
 -- LEMLIST INTEGRATION TABLES
 -- =============================================
@@ -720,6 +834,32 @@ CREATE TABLE IF NOT EXISTS zapier_contact_mappings (
     UNIQUE(captely_contact_id, zapier_record_id)
 );
 
+-- Outbound webhook outbox, delivered by the webhook dispatcher
+CREATE TABLE IF NOT EXISTS webhook_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    user_id VARCHAR(255) NOT NULL,
+    destination TEXT NOT NULL,                -- webhook URL
+    event VARCHAR(100) NOT NULL,
+    batch_mode BOOLEAN NOT NULL DEFAULT TRUE, -- false: delivered as a JSON array, one Zap run per item
+    envelope JSONB NOT NULL DEFAULT '{}',     -- top-level fields sent with the item
+    envelope_hash CHAR(32) NOT NULL,          -- md5 of the envelope; only equal envelopes share a batch
+    payload JSONB NOT NULL,                   -- the item (one contact)
+    gzip BOOLEAN NOT NULL DEFAULT FALSE,      -- destination accepts Content-Encoding: gzip
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',  -- pending, sending, delivered, dead
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    locked_at TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    delivered_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_webhook_outbox_pending
+ON webhook_outbox(user_id, destination, event, batch_mode, envelope_hash, id) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_webhook_outbox_sending ON webhook_outbox(locked_at) WHERE status = 'sending';
+CREATE INDEX IF NOT EXISTS idx_webhook_outbox_delivered ON webhook_outbox(delivered_at) WHERE status = 'delivered';
+CREATE INDEX IF NOT EXISTS idx_webhook_outbox_user_status ON webhook_outbox(user_id, status);
+
 -- =============================================
 -- CREATE ALL PERFORMANCE INDEXES
 -- =============================================
@@ -744,12 +884,21 @@ CREATE INDEX IF NOT EXISTS idx_contacts_job_id ON contacts(job_id);
 CREATE INDEX IF NOT EXISTS idx_contacts_email ON contacts(email);
 CREATE INDEX IF NOT EXISTS idx_contacts_enriched ON contacts(enriched);
 CREATE INDEX IF NOT EXISTS idx_contacts_created_at ON contacts(created_at DESC);
+-- Keyset pagination of contact listings (cursor on created_at, id)
+CREATE INDEX IF NOT EXISTS idx_contacts_created_at_id ON contacts(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_contacts_job_created_at_id ON contacts(job_id, created_at DESC, id DESC);
+-- Per-user reads on the denormalized user_id
+CREATE INDEX IF NOT EXISTS idx_contacts_user_created_at_id ON contacts(user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_contacts_user_enriched ON contacts(user_id, enriched);
 CREATE INDEX IF NOT EXISTS idx_contacts_notes ON contacts(notes) WHERE notes IS NOT NULL;
 CREATE INDEX IF NOT EXISTS idx_contacts_email_verification_score ON contacts(email_verification_score) WHERE email_verification_score IS NOT NULL;
 CREATE INDEX IF NOT EXISTS idx_contacts_phone_verification_score ON contacts(phone_verification_score) WHERE phone_verification_score IS NOT NULL;
 CREATE INDEX IF NOT EXISTS idx_contacts_lead_score ON contacts(lead_score);
 CREATE INDEX IF NOT EXISTS idx_contacts_email_reliability ON contacts(email_reliability);
 
+-- Enrichment results indexes (latest result per contact, for exports)
+CREATE INDEX IF NOT EXISTS idx_enrichment_results_contact_latest ON enrichment_results(contact_id, created_at DESC, id DESC);
+
 -- Import jobs indexes
 CREATE INDEX IF NOT EXISTS idx_import_jobs_user_id ON import_jobs(user_id);
 CREATE INDEX IF NOT EXISTS idx_import_jobs_status ON import_jobs(status);
@@ -1053,6 +1202,147 @@ INSERT INTO crm_campaigns (id, name, type, status, from_email, from_name, total_
     ('00000000-0000-0000-0006-000000000004', 'New Feature Announcement', 'email', 'draft', 'product@captely.com', 'Captely Product', 0, 0, 0, 0, 0)
 ON CONFLICT (id) DO NOTHING;
 
+-- =============================================
+-- LEAD SCORING FUNCTIONS (mirror enrichment-worker app/scoring.py)
+-- =============================================
+-- Python's str.strip() on the whitespace we actually see in imported data
+CREATE OR REPLACE FUNCTION scoring_has_text(p_value TEXT)
+RETURNS BOOLEAN AS $$
+    SELECT p_value IS NOT NULL AND btrim(p_value, E' \t\n\r\f\v') <> '';
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+-- Lead score (0-100) based on contact data quality
+CREATE OR REPLACE FUNCTION calculate_lead_score(
+    p_email TEXT,
+    p_phone TEXT,
+    p_email_verified BOOLEAN,
+    p_phone_verified BOOLEAN,
+    p_email_verification_score DOUBLE PRECISION,
+    p_phone_verification_score DOUBLE PRECISION,
+    p_company TEXT,
+    p_position TEXT,
+    p_profile_url TEXT,
+    p_enrichment_score DOUBLE PRECISION
+)
+RETURNS INTEGER AS $$
+    SELECT LEAST(
+        20  -- Base score
+
+        -- Email scoring (max 55 points)
+        + CASE
+            WHEN NOT scoring_has_text(p_email) THEN 0
+            WHEN COALESCE(p_email_verified, FALSE) THEN 20 + CASE
+                WHEN COALESCE(p_email_verification_score, 0) >= 0.9 THEN 35
+                WHEN COALESCE(p_email_verification_score, 0) >= 0.7 THEN 30
+                WHEN COALESCE(p_email_verification_score, 0) >= 0.5 THEN 25
+                ELSE 20
+            END
+            WHEN COALESCE(p_email_verification_score, 0) > 0
+                THEN 20 + trunc(p_email_verification_score * 15)::INTEGER
+            ELSE 20
+        END
+
+        -- Phone scoring (max 35 points)
+        + CASE
+            WHEN NOT scoring_has_text(p_phone) THEN 0
+            WHEN COALESCE(p_phone_verified, FALSE) THEN 15 + CASE
+                WHEN COALESCE(p_phone_verification_score, 0) >= 0.9 THEN 30
+                WHEN COALESCE(p_phone_verification_score, 0) >= 0.7 THEN 25
+                ELSE 20
+            END
+            WHEN COALESCE(p_phone_verification_score, 0) > 0
+                THEN 15 + trunc(p_phone_verification_score * 10)::INTEGER
+            ELSE 15
+        END
+
+        -- Additional data quality factors (max 30 points)
+        + CASE WHEN scoring_has_text(p_company) AND lower(p_company) <> 'unknown' THEN 10 ELSE 0 END
+        + CASE WHEN scoring_has_text(p_position) AND lower(p_position) <> 'unknown' THEN 10 ELSE 0 END
+        + CASE WHEN scoring_has_text(p_profile_url) THEN 10 ELSE 0 END
+
+        -- Enrichment quality bonus (max 10 points)
+        + CASE
+            WHEN COALESCE(p_enrichment_score, 0) >= 0.8 THEN 10
+            WHEN COALESCE(p_enrichment_score, 0) >= 0.6 THEN 5
+            ELSE 0
+        END,
+        100
+    );
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+-- Email reliability category
+CREATE OR REPLACE FUNCTION calculate_email_reliability(
+    p_email TEXT,
+    p_email_verified BOOLEAN,
+    p_email_verification_score DOUBLE PRECISION,
+    p_is_disposable BOOLEAN,
+    p_is_role_based BOOLEAN,
+    p_is_catchall BOOLEAN
+)
+RETURNS TEXT AS $$
+    SELECT CASE
+        WHEN NOT scoring_has_text(p_email) THEN 'no_email'
+        WHEN COALESCE(p_is_disposable, FALSE) THEN 'poor'
+        WHEN NOT COALESCE(p_email_verified, FALSE) THEN 'unknown'
+        WHEN COALESCE(p_email_verification_score, 0.5) >= 0.9
+             AND NOT COALESCE(p_is_role_based, FALSE)
+             AND NOT COALESCE(p_is_catchall, FALSE) THEN 'excellent'
+        WHEN COALESCE(p_email_verification_score, 0.5) >= 0.7 THEN
+            CASE WHEN COALESCE(p_is_role_based, FALSE) THEN 'fair' ELSE 'good' END
+        WHEN COALESCE(p_email_verification_score, 0.5) >= 0.5 THEN 'fair'
+        ELSE 'poor'
+    END;
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+-- Row-level wrappers used for set-based recalculation.
+-- Score columns are REAL; going through text gives the same value the
+-- worker reads back via psycopg2 (0.7, not 0.699999988...).
+CREATE OR REPLACE FUNCTION contact_lead_score(c contacts)
+RETURNS INTEGER AS $$
+    SELECT calculate_lead_score(
+        c.email, c.phone, c.email_verified, c.phone_verified,
+        c.email_verification_score::TEXT::DOUBLE PRECISION,
+        c.phone_verification_score::TEXT::DOUBLE PRECISION,
+        c.company, c.position, c.profile_url,
+        c.enrichment_score::TEXT::DOUBLE PRECISION
+    );
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+CREATE OR REPLACE FUNCTION contact_email_reliability(c contacts)
+RETURNS TEXT AS $$
+    SELECT calculate_email_reliability(
+        c.email, c.email_verified,
+        c.email_verification_score::TEXT::DOUBLE PRECISION,
+        c.is_disposable, c.is_role_based, c.is_catchall
+    );
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+-- =============================================
+-- CONTACT SEARCH (pg_trgm, see migrations/add_contact_search_index.sql)
+-- =============================================
+
+-- Lower-cased searchable text of a contact ('||' keeps it IMMUTABLE, concat_ws is not)
+CREATE OR REPLACE FUNCTION contact_search_text(
+    p_first_name TEXT,
+    p_last_name TEXT,
+    p_email TEXT,
+    p_company TEXT,
+    p_position TEXT
+)
+RETURNS TEXT AS $$
+    SELECT lower(
+        coalesce(p_first_name, '') || ' ' ||
+        coalesce(p_last_name, '') || ' ' ||
+        coalesce(p_email, '') || ' ' ||
+        coalesce(p_company, '') || ' ' ||
+        coalesce(p_position, '')
+    );
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+-- Maintained on every write; serves LIKE '%term%' and word similarity (<%)
+CREATE INDEX IF NOT EXISTS idx_contacts_search_trgm ON contacts
+USING GIN (contact_search_text(first_name, last_name, email, company, position) gin_trgm_ops);
+
 -- =============================================
 -- CREATE TRIGGERS FOR AUTOMATIC TIMESTAMPS
 -- =============================================
@@ -1066,6 +1356,338 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Copy import_jobs.user_id onto contacts (see migrations/add_contacts_user_id.sql)
+CREATE OR REPLACE FUNCTION set_contact_user_id()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.user_id IS NULL OR (TG_OP = 'UPDATE' AND NEW.job_id IS DISTINCT FROM OLD.job_id) THEN
+        SELECT user_id INTO NEW.user_id FROM import_jobs WHERE id = NEW.job_id;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS set_contact_user_id_trigger ON contacts;
+CREATE TRIGGER set_contact_user_id_trigger
+    BEFORE INSERT OR UPDATE OF job_id ON contacts
+    FOR EACH ROW
+    EXECUTE FUNCTION set_contact_user_id();
+
+-- Maintain job_stats from contacts writes (see migrations/add_job_stats.sql)
+-- Apply the net effect of a contacts statement. Rows from new_rows count +1,
+-- rows from old_rows -1, so an UPDATE moves counts between states (or jobs).
+CREATE OR REPLACE FUNCTION apply_job_stats_delta()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- One static statement per operation rather than EXECUTE: plpgsql
+    -- caches their plans, where dynamic SQL was re-planned for every
+    -- contacts statement (~1 ms per single-row UPDATE)
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO job_stats AS js (job_id, total_processed, enriched_count, emails_found, phones_found,
+                                     credits_used, score_sum, score_count, version, updated_at)
+        SELECT * FROM (
+            SELECT d.job_id,
+                   SUM(d.sign) AS total_processed,
+                   SUM(CASE WHEN d.enriched = true THEN d.sign ELSE 0 END) AS enriched_count,
+                   SUM(CASE WHEN d.email IS NOT NULL AND d.email != '' THEN d.sign ELSE 0 END) AS emails_found,
+                   SUM(CASE WHEN d.phone IS NOT NULL AND d.phone != '' THEN d.sign ELSE 0 END) AS phones_found,
+                   SUM(COALESCE(d.credits_consumed, 0) * d.sign) AS credits_used,
+                   SUM(COALESCE(d.enrichment_score, 0) * d.sign) AS score_sum,
+                   SUM(CASE WHEN d.enrichment_score IS NOT NULL THEN d.sign ELSE 0 END) AS score_count,
+                   1 AS version,
+                   NOW() AS updated_at
+            FROM (SELECT n.*, 1 AS sign FROM new_rows n) d
+            JOIN import_jobs ij ON ij.id = d.job_id  -- skip jobs deleted in this statement
+            GROUP BY d.job_id
+        ) delta
+        ON CONFLICT (job_id) DO UPDATE SET
+            total_processed = js.total_processed + EXCLUDED.total_processed,
+            enriched_count = js.enriched_count + EXCLUDED.enriched_count,
+            emails_found = js.emails_found + EXCLUDED.emails_found,
+            phones_found = js.phones_found + EXCLUDED.phones_found,
+            credits_used = js.credits_used + EXCLUDED.credits_used,
+            score_sum = js.score_sum + EXCLUDED.score_sum,
+            score_count = js.score_count + EXCLUDED.score_count,
+            version = js.version + 1,
+            updated_at = EXCLUDED.updated_at;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO job_stats AS js (job_id, total_processed, enriched_count, emails_found, phones_found,
+                                     credits_used, score_sum, score_count, version, updated_at)
+        SELECT * FROM (
+            SELECT d.job_id,
+                   SUM(d.sign) AS total_processed,
+                   SUM(CASE WHEN d.enriched = true THEN d.sign ELSE 0 END) AS enriched_count,
+                   SUM(CASE WHEN d.email IS NOT NULL AND d.email != '' THEN d.sign ELSE 0 END) AS emails_found,
+                   SUM(CASE WHEN d.phone IS NOT NULL AND d.phone != '' THEN d.sign ELSE 0 END) AS phones_found,
+                   SUM(COALESCE(d.credits_consumed, 0) * d.sign) AS credits_used,
+                   SUM(COALESCE(d.enrichment_score, 0) * d.sign) AS score_sum,
+                   SUM(CASE WHEN d.enrichment_score IS NOT NULL THEN d.sign ELSE 0 END) AS score_count,
+                   1 AS version,
+                   NOW() AS updated_at
+            FROM (SELECT o.*, -1 AS sign FROM old_rows o) d
+            JOIN import_jobs ij ON ij.id = d.job_id  -- skip jobs deleted in this statement
+            GROUP BY d.job_id
+        ) delta
+        ON CONFLICT (job_id) DO UPDATE SET
+            total_processed = js.total_processed + EXCLUDED.total_processed,
+            enriched_count = js.enriched_count + EXCLUDED.enriched_count,
+            emails_found = js.emails_found + EXCLUDED.emails_found,
+            phones_found = js.phones_found + EXCLUDED.phones_found,
+            credits_used = js.credits_used + EXCLUDED.credits_used,
+            score_sum = js.score_sum + EXCLUDED.score_sum,
+            score_count = js.score_count + EXCLUDED.score_count,
+            version = js.version + 1,
+            updated_at = EXCLUDED.updated_at;
+    ELSE
+        INSERT INTO job_stats AS js (job_id, total_processed, enriched_count, emails_found, phones_found,
+                                     credits_used, score_sum, score_count, version, updated_at)
+        SELECT * FROM (
+            SELECT d.job_id,
+                   SUM(d.sign) AS total_processed,
+                   SUM(CASE WHEN d.enriched = true THEN d.sign ELSE 0 END) AS enriched_count,
+                   SUM(CASE WHEN d.email IS NOT NULL AND d.email != '' THEN d.sign ELSE 0 END) AS emails_found,
+                   SUM(CASE WHEN d.phone IS NOT NULL AND d.phone != '' THEN d.sign ELSE 0 END) AS phones_found,
+                   SUM(COALESCE(d.credits_consumed, 0) * d.sign) AS credits_used,
+                   SUM(COALESCE(d.enrichment_score, 0) * d.sign) AS score_sum,
+                   SUM(CASE WHEN d.enrichment_score IS NOT NULL THEN d.sign ELSE 0 END) AS score_count,
+                   1 AS version,
+                   NOW() AS updated_at
+            FROM (SELECT n.*, 1 AS sign FROM new_rows n
+                  UNION ALL
+                  SELECT o.*, -1 AS sign FROM old_rows o) d
+            JOIN import_jobs ij ON ij.id = d.job_id  -- skip jobs deleted in this statement
+            GROUP BY d.job_id
+        ) delta
+        -- Updates that touch no counted column (most enrichment writes) are a no-op
+        WHERE (total_processed, enriched_count, emails_found, phones_found, credits_used, score_sum, score_count)
+              != (0, 0, 0, 0, 0, 0, 0)
+        ON CONFLICT (job_id) DO UPDATE SET
+            total_processed = js.total_processed + EXCLUDED.total_processed,
+            enriched_count = js.enriched_count + EXCLUDED.enriched_count,
+            emails_found = js.emails_found + EXCLUDED.emails_found,
+            phones_found = js.phones_found + EXCLUDED.phones_found,
+            credits_used = js.credits_used + EXCLUDED.credits_used,
+            score_sum = js.score_sum + EXCLUDED.score_sum,
+            score_count = js.score_count + EXCLUDED.score_count,
+            version = js.version + 1,
+            updated_at = EXCLUDED.updated_at;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Transition tables allow a single event per trigger
+DROP TRIGGER IF EXISTS job_stats_insert_trigger ON contacts;
+CREATE TRIGGER job_stats_insert_trigger
+    AFTER INSERT ON contacts
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION apply_job_stats_delta();
+
+DROP TRIGGER IF EXISTS job_stats_update_trigger ON contacts;
+CREATE TRIGGER job_stats_update_trigger
+    AFTER UPDATE ON contacts
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION apply_job_stats_delta();
+
+DROP TRIGGER IF EXISTS job_stats_delete_trigger ON contacts;
+CREATE TRIGGER job_stats_delete_trigger
+    AFTER DELETE ON contacts
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION apply_job_stats_delta();
+
+-- Recompute stats from contacts (all jobs, or one). Repairs drift, e.g.
+-- after a TRUNCATE, which statement triggers above don't see.
+CREATE OR REPLACE FUNCTION refresh_job_stats(p_job_id VARCHAR DEFAULT NULL)
+RETURNS VOID AS $$
+BEGIN
+    INSERT INTO job_stats AS js (job_id, total_processed, enriched_count, emails_found, phones_found,
+                                 credits_used, score_sum, score_count, version, updated_at)
+    SELECT ij.id,
+           COUNT(c.id),
+           COUNT(CASE WHEN c.enriched = true THEN 1 END),
+           COUNT(CASE WHEN c.email IS NOT NULL AND c.email != '' THEN 1 END),
+           COUNT(CASE WHEN c.phone IS NOT NULL AND c.phone != '' THEN 1 END),
+           COALESCE(SUM(c.credits_consumed), 0),
+           COALESCE(SUM(c.enrichment_score), 0),
+           COUNT(c.enrichment_score),
+           1,
+           NOW()
+    FROM import_jobs ij
+    LEFT JOIN contacts c ON c.job_id = ij.id
+    WHERE p_job_id IS NULL OR ij.id = p_job_id
+    GROUP BY ij.id
+    ON CONFLICT (job_id) DO UPDATE SET
+        total_processed = EXCLUDED.total_processed,
+        enriched_count = EXCLUDED.enriched_count,
+        emails_found = EXCLUDED.emails_found,
+        phones_found = EXCLUDED.phones_found,
+        credits_used = EXCLUDED.credits_used,
+        score_sum = EXCLUDED.score_sum,
+        score_count = EXCLUDED.score_count,
+        version = js.version + 1,
+        updated_at = EXCLUDED.updated_at;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Maintain analytics rollups from contacts writes (see migrations/add_analytics_rollups.sql)
+CREATE OR REPLACE FUNCTION apply_contact_rollup_delta()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO contact_rollups_hourly AS r (user_id, provider, bucket, contacts, enriched, emails_found,
+                                                 phones_found, credits_used, score_sum, score_count, last_contact_at)
+        SELECT * FROM (
+            SELECT d.user_id,
+                   COALESCE(d.enrichment_provider, '') AS provider,
+                   date_trunc('hour', d.created_at) AS bucket,
+                   SUM(d.sign) AS contacts,
+                   SUM(CASE WHEN d.enriched = true THEN d.sign ELSE 0 END) AS enriched,
+                   SUM(CASE WHEN d.email IS NOT NULL AND d.email != '' AND d.email != 'null' THEN d.sign ELSE 0 END) AS emails_found,
+                   SUM(CASE WHEN d.phone IS NOT NULL AND d.phone != '' AND d.phone != 'null' THEN d.sign ELSE 0 END) AS phones_found,
+                   SUM(COALESCE(d.credits_consumed, 0) * d.sign) AS credits_used,
+                   SUM(COALESCE(d.enrichment_score, 0)::numeric * d.sign) AS score_sum,
+                   SUM(CASE WHEN d.enrichment_score IS NOT NULL THEN d.sign ELSE 0 END) AS score_count,
+                   MAX(d.created_at) FILTER (WHERE d.sign > 0) AS last_contact_at
+            FROM (SELECT n.*, 1 AS sign FROM new_rows n) d
+            WHERE d.user_id IS NOT NULL
+            GROUP BY 1, 2, 3
+        ) delta
+        ON CONFLICT (user_id, bucket, provider) DO UPDATE SET
+            contacts = r.contacts + EXCLUDED.contacts,
+            enriched = r.enriched + EXCLUDED.enriched,
+            emails_found = r.emails_found + EXCLUDED.emails_found,
+            phones_found = r.phones_found + EXCLUDED.phones_found,
+            credits_used = r.credits_used + EXCLUDED.credits_used,
+            score_sum = r.score_sum + EXCLUDED.score_sum,
+            score_count = r.score_count + EXCLUDED.score_count,
+            last_contact_at = GREATEST(r.last_contact_at, EXCLUDED.last_contact_at);
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO contact_rollups_hourly AS r (user_id, provider, bucket, contacts, enriched, emails_found,
+                                                 phones_found, credits_used, score_sum, score_count, last_contact_at)
+        SELECT * FROM (
+            SELECT d.user_id,
+                   COALESCE(d.enrichment_provider, '') AS provider,
+                   date_trunc('hour', d.created_at) AS bucket,
+                   SUM(d.sign) AS contacts,
+                   SUM(CASE WHEN d.enriched = true THEN d.sign ELSE 0 END) AS enriched,
+                   SUM(CASE WHEN d.email IS NOT NULL AND d.email != '' AND d.email != 'null' THEN d.sign ELSE 0 END) AS emails_found,
+                   SUM(CASE WHEN d.phone IS NOT NULL AND d.phone != '' AND d.phone != 'null' THEN d.sign ELSE 0 END) AS phones_found,
+                   SUM(COALESCE(d.credits_consumed, 0) * d.sign) AS credits_used,
+                   SUM(COALESCE(d.enrichment_score, 0)::numeric * d.sign) AS score_sum,
+                   SUM(CASE WHEN d.enrichment_score IS NOT NULL THEN d.sign ELSE 0 END) AS score_count,
+                   MAX(d.created_at) FILTER (WHERE d.sign > 0) AS last_contact_at
+            FROM (SELECT o.*, -1 AS sign FROM old_rows o) d
+            WHERE d.user_id IS NOT NULL
+            GROUP BY 1, 2, 3
+        ) delta
+        ON CONFLICT (user_id, bucket, provider) DO UPDATE SET
+            contacts = r.contacts + EXCLUDED.contacts,
+            enriched = r.enriched + EXCLUDED.enriched,
+            emails_found = r.emails_found + EXCLUDED.emails_found,
+            phones_found = r.phones_found + EXCLUDED.phones_found,
+            credits_used = r.credits_used + EXCLUDED.credits_used,
+            score_sum = r.score_sum + EXCLUDED.score_sum,
+            score_count = r.score_count + EXCLUDED.score_count,
+            last_contact_at = GREATEST(r.last_contact_at, EXCLUDED.last_contact_at);
+    ELSE
+        INSERT INTO contact_rollups_hourly AS r (user_id, provider, bucket, contacts, enriched, emails_found,
+                                                 phones_found, credits_used, score_sum, score_count, last_contact_at)
+        SELECT * FROM (
+            SELECT d.user_id,
+                   COALESCE(d.enrichment_provider, '') AS provider,
+                   date_trunc('hour', d.created_at) AS bucket,
+                   SUM(d.sign) AS contacts,
+                   SUM(CASE WHEN d.enriched = true THEN d.sign ELSE 0 END) AS enriched,
+                   SUM(CASE WHEN d.email IS NOT NULL AND d.email != '' AND d.email != 'null' THEN d.sign ELSE 0 END) AS emails_found,
+                   SUM(CASE WHEN d.phone IS NOT NULL AND d.phone != '' AND d.phone != 'null' THEN d.sign ELSE 0 END) AS phones_found,
+                   SUM(COALESCE(d.credits_consumed, 0) * d.sign) AS credits_used,
+                   SUM(COALESCE(d.enrichment_score, 0)::numeric * d.sign) AS score_sum,
+                   SUM(CASE WHEN d.enrichment_score IS NOT NULL THEN d.sign ELSE 0 END) AS score_count,
+                   MAX(d.created_at) FILTER (WHERE d.sign > 0) AS last_contact_at
+            FROM (SELECT n.*, 1 AS sign FROM new_rows n
+                  UNION ALL
+                  SELECT o.*, -1 AS sign FROM old_rows o) d
+            WHERE d.user_id IS NOT NULL
+            GROUP BY 1, 2, 3
+        ) delta
+        -- Updates that touch no counted column (most enrichment writes) are a no-op
+        WHERE (contacts, enriched, emails_found, phones_found, credits_used, score_sum, score_count)
+              != (0, 0, 0, 0, 0, 0, 0)
+        ON CONFLICT (user_id, bucket, provider) DO UPDATE SET
+            contacts = r.contacts + EXCLUDED.contacts,
+            enriched = r.enriched + EXCLUDED.enriched,
+            emails_found = r.emails_found + EXCLUDED.emails_found,
+            phones_found = r.phones_found + EXCLUDED.phones_found,
+            credits_used = r.credits_used + EXCLUDED.credits_used,
+            score_sum = r.score_sum + EXCLUDED.score_sum,
+            score_count = r.score_count + EXCLUDED.score_count,
+            last_contact_at = GREATEST(r.last_contact_at, EXCLUDED.last_contact_at);
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS contact_rollups_insert_trigger ON contacts;
+CREATE TRIGGER contact_rollups_insert_trigger
+    AFTER INSERT ON contacts
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION apply_contact_rollup_delta();
+
+DROP TRIGGER IF EXISTS contact_rollups_update_trigger ON contacts;
+CREATE TRIGGER contact_rollups_update_trigger
+    AFTER UPDATE ON contacts
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION apply_contact_rollup_delta();
+
+DROP TRIGGER IF EXISTS contact_rollups_delete_trigger ON contacts;
+CREATE TRIGGER contact_rollups_delete_trigger
+    AFTER DELETE ON contacts
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION apply_contact_rollup_delta();
+
+-- Move hourly rows older than p_keep_hours into the daily table.
+-- A late update to an old contact recreates a small hourly row for its
+-- bucket, which the next run folds in as well.
+CREATE OR REPLACE FUNCTION compact_contact_rollups(p_keep_hours INTEGER DEFAULT 192)
+RETURNS INTEGER AS $$
+DECLARE
+    v_moved INTEGER;
+BEGIN
+    WITH moved AS (
+        DELETE FROM contact_rollups_hourly
+        WHERE bucket < date_trunc('day', NOW() - make_interval(hours => p_keep_hours))
+        RETURNING *
+    ), folded AS (
+        INSERT INTO contact_rollups_daily AS r (user_id, provider, bucket, contacts, enriched, emails_found,
+                                                phones_found, credits_used, score_sum, score_count, last_contact_at)
+        SELECT user_id, provider, bucket::date,
+               SUM(contacts), SUM(enriched), SUM(emails_found), SUM(phones_found),
+               SUM(credits_used), SUM(score_sum), SUM(score_count), MAX(last_contact_at)
+        FROM moved
+        GROUP BY user_id, provider, bucket::date
+        ON CONFLICT (user_id, bucket, provider) DO UPDATE SET
+            contacts = r.contacts + EXCLUDED.contacts,
+            enriched = r.enriched + EXCLUDED.enriched,
+            emails_found = r.emails_found + EXCLUDED.emails_found,
+            phones_found = r.phones_found + EXCLUDED.phones_found,
+            credits_used = r.credits_used + EXCLUDED.credits_used,
+            score_sum = r.score_sum + EXCLUDED.score_sum,
+            score_count = r.score_count + EXCLUDED.score_count,
+            last_contact_at = GREATEST(r.last_contact_at, EXCLUDED.last_contact_at)
+    )
+    SELECT COUNT(*) INTO v_moved FROM moved;
+    RETURN v_moved;
+END;
+$$ LANGUAGE plpgsql;
+
 -- Apply triggers to tables that need them
 DO $$
 BEGIN
@@ -0,0 +1,235 @@
+-- =============================================
+-- Per-user, per-provider analytics rollups
+-- The dashboard sums these rows instead of aggregating every contact of
+-- the user on each load.
+--
+-- contact_rollups_hourly is maintained by statement-level triggers on
+-- contacts (net change of each INSERT/UPDATE/DELETE, bucketed by the
+-- contact's created_at hour). compact_contact_rollups() runs periodically
+-- (Celery beat) and folds hourly rows older than the retention window into
+-- contact_rollups_daily. The two tables never overlap, so all-time totals
+-- are daily + hourly and recent windows read hourly alone.
+-- Safe to run multiple times.
+-- =============================================
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS contact_rollups_hourly (
+    user_id VARCHAR(255) NOT NULL,
+    provider VARCHAR(50) NOT NULL DEFAULT '',        -- '' for contacts without enrichment_provider
+    bucket TIMESTAMP NOT NULL,                       -- date_trunc('hour', contacts.created_at)
+    contacts INTEGER NOT NULL DEFAULT 0,
+    enriched INTEGER NOT NULL DEFAULT 0,
+    emails_found INTEGER NOT NULL DEFAULT 0,
+    phones_found INTEGER NOT NULL DEFAULT 0,
+    credits_used BIGINT NOT NULL DEFAULT 0,
+    score_sum NUMERIC NOT NULL DEFAULT 0,            -- exact; float drifts as deltas accumulate
+    score_count INTEGER NOT NULL DEFAULT 0,
+    last_contact_at TIMESTAMP,
+    PRIMARY KEY (user_id, bucket, provider)
+);
+
+CREATE TABLE IF NOT EXISTS contact_rollups_daily (
+    user_id VARCHAR(255) NOT NULL,
+    provider VARCHAR(50) NOT NULL DEFAULT '',
+    bucket DATE NOT NULL,
+    contacts INTEGER NOT NULL DEFAULT 0,
+    enriched INTEGER NOT NULL DEFAULT 0,
+    emails_found INTEGER NOT NULL DEFAULT 0,
+    phones_found INTEGER NOT NULL DEFAULT 0,
+    credits_used BIGINT NOT NULL DEFAULT 0,
+    score_sum NUMERIC NOT NULL DEFAULT 0,
+    score_count INTEGER NOT NULL DEFAULT 0,
+    last_contact_at TIMESTAMP,
+    PRIMARY KEY (user_id, bucket, provider)
+);
+
+-- Tables created before score_sum was exact
+ALTER TABLE contact_rollups_hourly ALTER COLUMN score_sum TYPE NUMERIC;
+ALTER TABLE contact_rollups_daily ALTER COLUMN score_sum TYPE NUMERIC;
+
+-- Same shape as apply_job_stats_delta (migrations/add_job_stats.sql)
+CREATE OR REPLACE FUNCTION apply_contact_rollup_delta()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO contact_rollups_hourly AS r (user_id, provider, bucket, contacts, enriched, emails_found,
+                                                 phones_found, credits_used, score_sum, score_count, last_contact_at)
+        SELECT * FROM (
+            SELECT d.user_id,
+                   COALESCE(d.enrichment_provider, '') AS provider,
+                   date_trunc('hour', d.created_at) AS bucket,
+                   SUM(d.sign) AS contacts,
+                   SUM(CASE WHEN d.enriched = true THEN d.sign ELSE 0 END) AS enriched,
+                   SUM(CASE WHEN d.email IS NOT NULL AND d.email != '' AND d.email != 'null' THEN d.sign ELSE 0 END) AS emails_found,
+                   SUM(CASE WHEN d.phone IS NOT NULL AND d.phone != '' AND d.phone != 'null' THEN d.sign ELSE 0 END) AS phones_found,
+                   SUM(COALESCE(d.credits_consumed, 0) * d.sign) AS credits_used,
+                   SUM(COALESCE(d.enrichment_score, 0)::numeric * d.sign) AS score_sum,
+                   SUM(CASE WHEN d.enrichment_score IS NOT NULL THEN d.sign ELSE 0 END) AS score_count,
+                   MAX(d.created_at) FILTER (WHERE d.sign > 0) AS last_contact_at
+            FROM (SELECT n.*, 1 AS sign FROM new_rows n) d
+            WHERE d.user_id IS NOT NULL
+            GROUP BY 1, 2, 3
+        ) delta
+        ON CONFLICT (user_id, bucket, provider) DO UPDATE SET
+            contacts = r.contacts + EXCLUDED.contacts,
+            enriched = r.enriched + EXCLUDED.enriched,
+            emails_found = r.emails_found + EXCLUDED.emails_found,
+            phones_found = r.phones_found + EXCLUDED.phones_found,
+            credits_used = r.credits_used + EXCLUDED.credits_used,
+            score_sum = r.score_sum + EXCLUDED.score_sum,
+            score_count = r.score_count + EXCLUDED.score_count,
+            last_contact_at = GREATEST(r.last_contact_at, EXCLUDED.last_contact_at);
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO contact_rollups_hourly AS r (user_id, provider, bucket, contacts, enriched, emails_found,
+                                                 phones_found, credits_used, score_sum, score_count, last_contact_at)
+        SELECT * FROM (
+            SELECT d.user_id,
+                   COALESCE(d.enrichment_provider, '') AS provider,
+                   date_trunc('hour', d.created_at) AS bucket,
+                   SUM(d.sign) AS contacts,
+                   SUM(CASE WHEN d.enriched = true THEN d.sign ELSE 0 END) AS enriched,
+                   SUM(CASE WHEN d.email IS NOT NULL AND d.email != '' AND d.email != 'null' THEN d.sign ELSE 0 END) AS emails_found,
+                   SUM(CASE WHEN d.phone IS NOT NULL AND d.phone != '' AND d.phone != 'null' THEN d.sign ELSE 0 END) AS phones_found,
+                   SUM(COALESCE(d.credits_consumed, 0) * d.sign) AS credits_used,
+                   SUM(COALESCE(d.enrichment_score, 0)::numeric * d.sign) AS score_sum,
+                   SUM(CASE WHEN d.enrichment_score IS NOT NULL THEN d.sign ELSE 0 END) AS score_count,
+                   MAX(d.created_at) FILTER (WHERE d.sign > 0) AS last_contact_at
+            FROM (SELECT o.*, -1 AS sign FROM old_rows o) d
+            WHERE d.user_id IS NOT NULL
+            GROUP BY 1, 2, 3
+        ) delta
+        ON CONFLICT (user_id, bucket, provider) DO UPDATE SET
+            contacts = r.contacts + EXCLUDED.contacts,
+            enriched = r.enriched + EXCLUDED.enriched,
+            emails_found = r.emails_found + EXCLUDED.emails_found,
+            phones_found = r.phones_found + EXCLUDED.phones_found,
+            credits_used = r.credits_used + EXCLUDED.credits_used,
+            score_sum = r.score_sum + EXCLUDED.score_sum,
+            score_count = r.score_count + EXCLUDED.score_count,
+            last_contact_at = GREATEST(r.last_contact_at, EXCLUDED.last_contact_at);
+    ELSE
+        INSERT INTO contact_rollups_hourly AS r (user_id, provider, bucket, contacts, enriched, emails_found,
+                                                 phones_found, credits_used, score_sum, score_count, last_contact_at)
+        SELECT * FROM (
+            SELECT d.user_id,
+                   COALESCE(d.enrichment_provider, '') AS provider,
+                   date_trunc('hour', d.created_at) AS bucket,
+                   SUM(d.sign) AS contacts,
+                   SUM(CASE WHEN d.enriched = true THEN d.sign ELSE 0 END) AS enriched,
+                   SUM(CASE WHEN d.email IS NOT NULL AND d.email != '' AND d.email != 'null' THEN d.sign ELSE 0 END) AS emails_found,
+                   SUM(CASE WHEN d.phone IS NOT NULL AND d.phone != '' AND d.phone != 'null' THEN d.sign ELSE 0 END) AS phones_found,
+                   SUM(COALESCE(d.credits_consumed, 0) * d.sign) AS credits_used,
+                   SUM(COALESCE(d.enrichment_score, 0)::numeric * d.sign) AS score_sum,
+                   SUM(CASE WHEN d.enrichment_score IS NOT NULL THEN d.sign ELSE 0 END) AS score_count,
+                   MAX(d.created_at) FILTER (WHERE d.sign > 0) AS last_contact_at
+            FROM (SELECT n.*, 1 AS sign FROM new_rows n
+                  UNION ALL
+                  SELECT o.*, -1 AS sign FROM old_rows o) d
+            WHERE d.user_id IS NOT NULL
+            GROUP BY 1, 2, 3
+        ) delta
+        -- Updates that touch no counted column (most enrichment writes) are a no-op
+        WHERE (contacts, enriched, emails_found, phones_found, credits_used, score_sum, score_count)
+              != (0, 0, 0, 0, 0, 0, 0)
+        ON CONFLICT (user_id, bucket, provider) DO UPDATE SET
+            contacts = r.contacts + EXCLUDED.contacts,
+            enriched = r.enriched + EXCLUDED.enriched,
+            emails_found = r.emails_found + EXCLUDED.emails_found,
+            phones_found = r.phones_found + EXCLUDED.phones_found,
+            credits_used = r.credits_used + EXCLUDED.credits_used,
+            score_sum = r.score_sum + EXCLUDED.score_sum,
+            score_count = r.score_count + EXCLUDED.score_count,
+            last_contact_at = GREATEST(r.last_contact_at, EXCLUDED.last_contact_at);
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS contact_rollups_insert_trigger ON contacts;
+CREATE TRIGGER contact_rollups_insert_trigger
+    AFTER INSERT ON contacts
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION apply_contact_rollup_delta();
+
+DROP TRIGGER IF EXISTS contact_rollups_update_trigger ON contacts;
+CREATE TRIGGER contact_rollups_update_trigger
+    AFTER UPDATE ON contacts
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION apply_contact_rollup_delta();
+
+DROP TRIGGER IF EXISTS contact_rollups_delete_trigger ON contacts;
+CREATE TRIGGER contact_rollups_delete_trigger
+    AFTER DELETE ON contacts
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION apply_contact_rollup_delta();
+
+-- Move hourly rows older than p_keep_hours into the daily table.
+-- A late update to an old contact recreates a small hourly row for its
+-- bucket, which the next run folds in as well.
+CREATE OR REPLACE FUNCTION compact_contact_rollups(p_keep_hours INTEGER DEFAULT 192)
+RETURNS INTEGER AS $$
+DECLARE
+    v_moved INTEGER;
+BEGIN
+    WITH moved AS (
+        DELETE FROM contact_rollups_hourly
+        WHERE bucket < date_trunc('day', NOW() - make_interval(hours => p_keep_hours))
+        RETURNING *
+    ), folded AS (
+        INSERT INTO contact_rollups_daily AS r (user_id, provider, bucket, contacts, enriched, emails_found,
+                                                phones_found, credits_used, score_sum, score_count, last_contact_at)
+        SELECT user_id, provider, bucket::date,
+               SUM(contacts), SUM(enriched), SUM(emails_found), SUM(phones_found),
+               SUM(credits_used), SUM(score_sum), SUM(score_count), MAX(last_contact_at)
+        FROM moved
+        GROUP BY user_id, provider, bucket::date
+        ON CONFLICT (user_id, bucket, provider) DO UPDATE SET
+            contacts = r.contacts + EXCLUDED.contacts,
+            enriched = r.enriched + EXCLUDED.enriched,
+            emails_found = r.emails_found + EXCLUDED.emails_found,
+            phones_found = r.phones_found + EXCLUDED.phones_found,
+            credits_used = r.credits_used + EXCLUDED.credits_used,
+            score_sum = r.score_sum + EXCLUDED.score_sum,
+            score_count = r.score_count + EXCLUDED.score_count,
+            last_contact_at = GREATEST(r.last_contact_at, EXCLUDED.last_contact_at)
+    )
+    SELECT COUNT(*) INTO v_moved FROM moved;
+    RETURN v_moved;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Backfill while writers wait, so no contact is counted twice or missed
+LOCK TABLE contacts IN SHARE MODE;
+
+TRUNCATE contact_rollups_hourly, contact_rollups_daily;
+
+INSERT INTO contact_rollups_hourly (user_id, provider, bucket, contacts, enriched, emails_found,
+                                    phones_found, credits_used, score_sum, score_count, last_contact_at)
+SELECT c.user_id,
+       COALESCE(c.enrichment_provider, ''),
+       date_trunc('hour', c.created_at),
+       COUNT(*),
+       COUNT(CASE WHEN c.enriched = true THEN 1 END),
+       COUNT(CASE WHEN c.email IS NOT NULL AND c.email != '' AND c.email != 'null' THEN 1 END),
+       COUNT(CASE WHEN c.phone IS NOT NULL AND c.phone != '' AND c.phone != 'null' THEN 1 END),
+       COALESCE(SUM(c.credits_consumed), 0),
+       COALESCE(SUM(c.enrichment_score::numeric), 0),
+       COUNT(c.enrichment_score),
+       MAX(c.created_at)
+FROM contacts c
+WHERE c.user_id IS NOT NULL
+GROUP BY 1, 2, 3;
+
+SELECT compact_contact_rollups();
+
+COMMIT;
+
+ANALYZE contact_rollups_hourly;
+ANALYZE contact_rollups_daily;
+
+SELECT 'Analytics rollup tables created!' as message;
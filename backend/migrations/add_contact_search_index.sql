@@ -0,0 +1,35 @@
+-- =============================================
+-- CONTACT SEARCH (pg_trgm)
+-- Substring, prefix and typo-tolerant search over contact names, email,
+-- company and position, backed by a trigram GIN index on one expression.
+-- Queries must use contact_search_text(...) verbatim to hit the index
+-- (see services/common/search.py). Safe to run multiple times.
+-- =============================================
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Lower-cased searchable text of a contact ('||' keeps it IMMUTABLE, concat_ws is not)
+CREATE OR REPLACE FUNCTION contact_search_text(
+    p_first_name TEXT,
+    p_last_name TEXT,
+    p_email TEXT,
+    p_company TEXT,
+    p_position TEXT
+)
+RETURNS TEXT AS $$
+    SELECT lower(
+        coalesce(p_first_name, '') || ' ' ||
+        coalesce(p_last_name, '') || ' ' ||
+        coalesce(p_email, '') || ' ' ||
+        coalesce(p_company, '') || ' ' ||
+        coalesce(p_position, '')
+    );
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+-- Maintained on every write; serves LIKE '%term%' and word similarity (<%)
+CREATE INDEX IF NOT EXISTS idx_contacts_search_trgm ON contacts
+USING GIN (contact_search_text(first_name, last_name, email, company, position) gin_trgm_ops);
+
+ANALYZE contacts;
+
+SELECT 'Contact search index created!' as message;
@@ -0,0 +1,16 @@
+-- =============================================
+-- Keyset pagination indexes for contact listings
+-- Contact lists page on (created_at DESC, id DESC) with a cursor instead of
+-- OFFSET (import-service /api/crm/contacts, crm-service /api/contacts).
+-- Safe to run multiple times.
+-- =============================================
+
+-- Listing across all of a user's batches walks this index in order
+CREATE INDEX IF NOT EXISTS idx_contacts_created_at_id ON contacts(created_at DESC, id DESC);
+
+-- Listing a single batch (batch_filter / job_id)
+CREATE INDEX IF NOT EXISTS idx_contacts_job_created_at_id ON contacts(job_id, created_at DESC, id DESC);
+
+ANALYZE contacts;
+
+SELECT 'Contact keyset pagination indexes created!' as message;
@@ -0,0 +1,65 @@
+-- =============================================
+-- Denormalize import_jobs.user_id onto contacts
+-- Per-user reads filter on contacts.user_id instead of joining import_jobs.
+-- A trigger fills user_id on insert (and when job_id changes), so writers
+-- don't need to pass it.
+--
+-- Run with psql outside an explicit transaction (no -1/--single-transaction):
+-- the backfill commits after every batch and the indexes are built
+-- CONCURRENTLY so the table stays writable. Safe to run multiple times.
+-- =============================================
+
+ALTER TABLE contacts ADD COLUMN IF NOT EXISTS user_id VARCHAR(255);
+
+-- 1. Keep new rows populated before backfilling old ones
+CREATE OR REPLACE FUNCTION set_contact_user_id()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.user_id IS NULL OR (TG_OP = 'UPDATE' AND NEW.job_id IS DISTINCT FROM OLD.job_id) THEN
+        SELECT user_id INTO NEW.user_id FROM import_jobs WHERE id = NEW.job_id;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS set_contact_user_id_trigger ON contacts;
+CREATE TRIGGER set_contact_user_id_trigger
+    BEFORE INSERT OR UPDATE OF job_id ON contacts
+    FOR EACH ROW
+    EXECUTE FUNCTION set_contact_user_id();
+
+-- 2. Backfill existing rows in id ranges, one commit per batch
+CREATE OR REPLACE PROCEDURE backfill_contacts_user_id(p_batch_size INTEGER DEFAULT 10000)
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_max_id INTEGER;
+    v_from INTEGER := 0;
+    v_updated BIGINT := 0;
+    v_rows INTEGER;
+BEGIN
+    SELECT COALESCE(MAX(id), 0) INTO v_max_id FROM contacts;
+    WHILE v_from <= v_max_id LOOP
+        UPDATE contacts c
+        SET user_id = ij.user_id
+        FROM import_jobs ij
+        WHERE c.job_id = ij.id
+          AND c.id > v_from AND c.id <= v_from + p_batch_size
+          AND c.user_id IS DISTINCT FROM ij.user_id;
+        GET DIAGNOSTICS v_rows = ROW_COUNT;
+        v_updated := v_updated + v_rows;
+        v_from := v_from + p_batch_size;
+        COMMIT;
+    END LOOP;
+    RAISE NOTICE 'contacts.user_id backfilled on % rows', v_updated;
+END;
+$$;
+
+CALL backfill_contacts_user_id();
+
+-- 3. Per-user indexes (listing keyset order, enrichment filters)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_contacts_user_created_at_id ON contacts(user_id, created_at DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_contacts_user_enriched ON contacts(user_id, enriched);
+
+ANALYZE contacts;
+
+SELECT 'contacts.user_id denormalized!' as message;
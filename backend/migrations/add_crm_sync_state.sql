@@ -0,0 +1,23 @@
+-- =============================================
+-- Incremental CRM imports
+-- One row per user and CRM holds the paging cursor of an interrupted full
+-- import and the last-modified watermark of the last completed one, so the
+-- next import resumes where it stopped and then pulls only changed
+-- records (import-service app/crm_sync.py).
+-- Safe to run multiple times.
+-- =============================================
+
+CREATE TABLE IF NOT EXISTS crm_sync_state (
+    user_id VARCHAR(255) NOT NULL,
+    provider VARCHAR(50) NOT NULL,            -- 'hubspot', 'salesforce'
+    cursor TEXT,                              -- next page of an unfinished import
+    watermark TIMESTAMP WITH TIME ZONE,       -- records modified after this are re-imported
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (user_id, provider)
+);
+
+-- Lookup of already-imported Salesforce contacts on re-sync
+CREATE INDEX IF NOT EXISTS idx_salesforce_contact_mappings_user_sf
+ON salesforce_contact_mappings(user_id, salesforce_contact_id);
+
+SELECT 'crm_sync_state table created!' as message;
@@ -0,0 +1,14 @@
+-- =============================================
+-- Export query indexes
+-- Job exports join each contact's latest enrichment result through a
+-- LATERAL ... ORDER BY created_at DESC LIMIT 1 (export-service
+-- app/export_query.py), which this index answers with one probe.
+-- Safe to run multiple times.
+-- =============================================
+
+CREATE INDEX IF NOT EXISTS idx_enrichment_results_contact_latest
+    ON enrichment_results(contact_id, created_at DESC, id DESC);
+
+ANALYZE enrichment_results;
+
+SELECT 'Export query indexes created!' as message;
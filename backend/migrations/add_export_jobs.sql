@@ -0,0 +1,34 @@
+-- =============================================
+-- Asynchronous export jobs
+-- POST /api/export/jobs records an export here and the export worker
+-- (export-service app/export_jobs.py) writes its file to local disk or S3,
+-- updating rows_written as it goes. A request whose cache_key matches an
+-- unexpired export is answered with that export instead of a new one.
+-- Safe to run multiple times.
+-- =============================================
+
+CREATE TABLE IF NOT EXISTS export_jobs (
+    id VARCHAR(36) PRIMARY KEY,
+    user_id VARCHAR(255) NOT NULL,
+    job_id VARCHAR(255) NOT NULL REFERENCES import_jobs(id) ON DELETE CASCADE,
+    format VARCHAR(20) NOT NULL,
+    columns JSONB,
+    filters JSONB,
+    cache_key VARCHAR(64) NOT NULL,           -- sha256 of job + format + columns + filters + last-modified
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',   -- queued, running, completed, failed
+    total_rows INTEGER,
+    rows_written INTEGER NOT NULL DEFAULT 0,
+    storage VARCHAR(10),                      -- 'local' or 's3'
+    artifact_key TEXT,
+    size_bytes BIGINT,
+    error TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    started_at TIMESTAMP,
+    completed_at TIMESTAMP,
+    expires_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_export_jobs_user_cache ON export_jobs(user_id, cache_key, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_export_jobs_expires_at ON export_jobs(expires_at) WHERE artifact_key IS NOT NULL;
+
+SELECT 'export_jobs table created!' as message;
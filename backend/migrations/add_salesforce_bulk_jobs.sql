@@ -0,0 +1,29 @@
+-- =============================================
+-- Salesforce Bulk API 2.0 jobs
+-- Large Salesforce exports (ingest upsert) and imports (query) are handed
+-- to the export worker (export-service app/salesforce_bulk.py), which
+-- submits the Bulk API job, polls it and records the outcome here.
+-- Safe to run multiple times.
+-- =============================================
+
+CREATE TABLE IF NOT EXISTS salesforce_bulk_jobs (
+    id VARCHAR(36) PRIMARY KEY,
+    user_id VARCHAR(255) NOT NULL,
+    operation VARCHAR(20) NOT NULL,           -- 'upsert' (export) or 'query' (import)
+    job_id VARCHAR(255) REFERENCES import_jobs(id) ON DELETE CASCADE,  -- batch exported / imported into
+    soql TEXT,                                -- query: SOQL to run
+    salesforce_job_id VARCHAR(18),
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',   -- queued, submitted, completed, failed
+    salesforce_state VARCHAR(30),             -- Salesforce job state (UploadComplete, InProgress, JobComplete, ...)
+    total_records INTEGER,
+    processed_records INTEGER NOT NULL DEFAULT 0,
+    failed_records INTEGER NOT NULL DEFAULT 0,
+    errors JSONB,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    completed_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_salesforce_bulk_jobs_user ON salesforce_bulk_jobs(user_id, created_at DESC);
+
+SELECT 'salesforce_bulk_jobs table created!' as message;
@@ -0,0 +1,37 @@
+-- =============================================
+-- Outbound webhook outbox
+-- Exports to webhooks (Zapier) queue one row per contact here instead of
+-- POSTing inline; the webhook dispatcher (export-service
+-- app/webhook_dispatcher.py) batches, delivers and retries them. Rows that
+-- exhaust their retries stay behind as 'dead' with the last error.
+-- Safe to run multiple times.
+-- =============================================
+
+CREATE TABLE IF NOT EXISTS webhook_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    user_id VARCHAR(255) NOT NULL,
+    destination TEXT NOT NULL,                -- webhook URL
+    event VARCHAR(100) NOT NULL,
+    batch_mode BOOLEAN NOT NULL DEFAULT TRUE, -- false: delivered as a JSON array, one Zap run per item
+    envelope JSONB NOT NULL DEFAULT '{}',     -- top-level fields sent with the item
+    envelope_hash CHAR(32) NOT NULL,          -- md5 of the envelope; only equal envelopes share a batch
+    payload JSONB NOT NULL,                   -- the item (one contact)
+    gzip BOOLEAN NOT NULL DEFAULT FALSE,      -- destination accepts Content-Encoding: gzip
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',  -- pending, sending, delivered, dead
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    locked_at TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    delivered_at TIMESTAMP
+);
+
+ALTER TABLE webhook_outbox ADD COLUMN IF NOT EXISTS gzip BOOLEAN NOT NULL DEFAULT FALSE;
+
+CREATE INDEX IF NOT EXISTS idx_webhook_outbox_pending
+ON webhook_outbox(user_id, destination, event, batch_mode, envelope_hash, id) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_webhook_outbox_sending ON webhook_outbox(locked_at) WHERE status = 'sending';
+CREATE INDEX IF NOT EXISTS idx_webhook_outbox_delivered ON webhook_outbox(delivered_at) WHERE status = 'delivered';
+CREATE INDEX IF NOT EXISTS idx_webhook_outbox_user_status ON webhook_outbox(user_id, status);
+
+SELECT 'webhook_outbox table created!' as message;
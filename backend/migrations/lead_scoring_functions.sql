@@ -0,0 +1,128 @@
+-- =============================================
+-- LEAD SCORING SQL FUNCTIONS
+-- SQL twin of calculate_lead_score / calculate_email_reliability in
+-- services/enrichment-worker/app/scoring.py. Keep both in lockstep:
+-- services/enrichment-worker/test_scoring_parity.py compares them.
+-- Safe to run multiple times.
+-- =============================================
+
+-- Python's str.strip() on the whitespace we actually see in imported data
+CREATE OR REPLACE FUNCTION scoring_has_text(p_value TEXT)
+RETURNS BOOLEAN AS $$
+    SELECT p_value IS NOT NULL AND btrim(p_value, E' \t\n\r\f\v') <> '';
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+-- Lead score (0-100) based on contact data quality
+CREATE OR REPLACE FUNCTION calculate_lead_score(
+    p_email TEXT,
+    p_phone TEXT,
+    p_email_verified BOOLEAN,
+    p_phone_verified BOOLEAN,
+    p_email_verification_score DOUBLE PRECISION,
+    p_phone_verification_score DOUBLE PRECISION,
+    p_company TEXT,
+    p_position TEXT,
+    p_profile_url TEXT,
+    p_enrichment_score DOUBLE PRECISION
+)
+RETURNS INTEGER AS $$
+    SELECT LEAST(
+        20  -- Base score
+
+        -- Email scoring (max 55 points)
+        + CASE
+            WHEN NOT scoring_has_text(p_email) THEN 0
+            WHEN COALESCE(p_email_verified, FALSE) THEN 20 + CASE
+                WHEN COALESCE(p_email_verification_score, 0) >= 0.9 THEN 35
+                WHEN COALESCE(p_email_verification_score, 0) >= 0.7 THEN 30
+                WHEN COALESCE(p_email_verification_score, 0) >= 0.5 THEN 25
+                ELSE 20
+            END
+            WHEN COALESCE(p_email_verification_score, 0) > 0
+                THEN 20 + trunc(p_email_verification_score * 15)::INTEGER
+            ELSE 20
+        END
+
+        -- Phone scoring (max 35 points)
+        + CASE
+            WHEN NOT scoring_has_text(p_phone) THEN 0
+            WHEN COALESCE(p_phone_verified, FALSE) THEN 15 + CASE
+                WHEN COALESCE(p_phone_verification_score, 0) >= 0.9 THEN 30
+                WHEN COALESCE(p_phone_verification_score, 0) >= 0.7 THEN 25
+                ELSE 20
+            END
+            WHEN COALESCE(p_phone_verification_score, 0) > 0
+                THEN 15 + trunc(p_phone_verification_score * 10)::INTEGER
+            ELSE 15
+        END
+
+        -- Additional data quality factors (max 30 points)
+        + CASE WHEN scoring_has_text(p_company) AND lower(p_company) <> 'unknown' THEN 10 ELSE 0 END
+        + CASE WHEN scoring_has_text(p_position) AND lower(p_position) <> 'unknown' THEN 10 ELSE 0 END
+        + CASE WHEN scoring_has_text(p_profile_url) THEN 10 ELSE 0 END
+
+        -- Enrichment quality bonus (max 10 points)
+        + CASE
+            WHEN COALESCE(p_enrichment_score, 0) >= 0.8 THEN 10
+            WHEN COALESCE(p_enrichment_score, 0) >= 0.6 THEN 5
+            ELSE 0
+        END,
+        100
+    );
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+-- Email reliability category
+CREATE OR REPLACE FUNCTION calculate_email_reliability(
+    p_email TEXT,
+    p_email_verified BOOLEAN,
+    p_email_verification_score DOUBLE PRECISION,
+    p_is_disposable BOOLEAN,
+    p_is_role_based BOOLEAN,
+    p_is_catchall BOOLEAN
+)
+RETURNS TEXT AS $$
+    SELECT CASE
+        WHEN NOT scoring_has_text(p_email) THEN 'no_email'
+        WHEN COALESCE(p_is_disposable, FALSE) THEN 'poor'
+        WHEN NOT COALESCE(p_email_verified, FALSE) THEN 'unknown'
+        WHEN COALESCE(p_email_verification_score, 0.5) >= 0.9
+             AND NOT COALESCE(p_is_role_based, FALSE)
+             AND NOT COALESCE(p_is_catchall, FALSE) THEN 'excellent'
+        WHEN COALESCE(p_email_verification_score, 0.5) >= 0.7 THEN
+            CASE WHEN COALESCE(p_is_role_based, FALSE) THEN 'fair' ELSE 'good' END
+        WHEN COALESCE(p_email_verification_score, 0.5) >= 0.5 THEN 'fair'
+        ELSE 'poor'
+    END;
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+-- Row-level wrappers used for set-based recalculation.
+-- Score columns are REAL; going through text gives the same value the
+-- worker reads back via psycopg2 (0.7, not 0.699999988...).
+CREATE OR REPLACE FUNCTION contact_lead_score(c contacts)
+RETURNS INTEGER AS $$
+    SELECT calculate_lead_score(
+        c.email, c.phone, c.email_verified, c.phone_verified,
+        c.email_verification_score::TEXT::DOUBLE PRECISION,
+        c.phone_verification_score::TEXT::DOUBLE PRECISION,
+        c.company, c.position, c.profile_url,
+        c.enrichment_score::TEXT::DOUBLE PRECISION
+    );
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+CREATE OR REPLACE FUNCTION contact_email_reliability(c contacts)
+RETURNS TEXT AS $$
+    SELECT calculate_email_reliability(
+        c.email, c.email_verified,
+        c.email_verification_score::TEXT::DOUBLE PRECISION,
+        c.is_disposable, c.is_role_based, c.is_catchall
+    );
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+-- Example: rescore every contact in one statement
+--   UPDATE contacts c
+--   SET lead_score = contact_lead_score(c),
+--       email_reliability = contact_email_reliability(c)
+--   WHERE lead_score IS DISTINCT FROM contact_lead_score(c)
+--      OR email_reliability IS DISTINCT FROM contact_email_reliability(c);
+
+SELECT 'Lead scoring functions installed!' as message;
@@ -13,8 +13,10 @@ from sqlalchemy import text, select, func
 from sqlalchemy.orm import selectinload
 from datetime import datetime, timedelta, date
 from common.config import get_settings
-from common.db import get_async_session, async_engine, get_session
+from common.db import get_async_session, async_engine, get_session, pool_metrics
 from common.auth import verify_api_token
+from common.events import publish_user_data_changed_async
+from common.response_cache import ResponseCache, cached_response
 from app.models import Base
 import httpx
 import base64
@@ -29,6 +31,9 @@ app = FastAPI(
 
 settings = get_settings()
 
+# Per-user response cache, invalidated when the user's contacts or credits change
+response_cache = ResponseCache(settings.redis_url)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -115,9 +120,7 @@ async def get_user_dashboard(
             AVG(email_verification_score) as avg_email_score,
             SUM(credits_consumed) as total_credits_used
         FROM contacts 
-        WHERE job_id IN (
-            SELECT id FROM import_jobs WHERE user_id = :user_id
-        )
+        WHERE user_id = :user_id
     """
     
     result = await session.execute(text(stats_query), {"user_id": user_id})
@@ -132,9 +135,7 @@ async def get_user_dashboard(
             AVG(enrichment_score) as avg_confidence,
             SUM(credits_consumed) as credits_used
         FROM contacts 
-        WHERE job_id IN (
-            SELECT id FROM import_jobs WHERE user_id = :user_id
-        )
+        WHERE user_id = :user_id
         AND enrichment_provider IS NOT NULL
         GROUP BY enrichment_provider
     """
@@ -160,14 +161,13 @@ async def get_user_dashboard(
             ij.total,
             ij.completed,
             ij.status,
-            COUNT(c.id) as processed_contacts,
-            COUNT(CASE WHEN c.email IS NOT NULL AND c.email != '' THEN 1 END) as emails_found,
-            AVG(c.enrichment_score) as avg_confidence,
-            SUM(c.credits_consumed) as credits_used
+            js.total_processed as processed_contacts,
+            js.emails_found,
+            js.score_sum / NULLIF(js.score_count, 0) as avg_confidence,
+            js.credits_used
         FROM import_jobs ij
-        LEFT JOIN contacts c ON ij.id = c.job_id
+        LEFT JOIN job_stats js ON js.job_id = ij.id
         WHERE ij.user_id = :user_id
-        GROUP BY ij.id, ij.created_at, ij.total, ij.completed, ij.status
         ORDER BY ij.created_at DESC
         LIMIT 10
     """
@@ -198,9 +198,7 @@ async def get_user_dashboard(
             COUNT(CASE WHEN c.email IS NOT NULL AND c.email != '' THEN 1 END) as emails_found,
             SUM(c.credits_consumed) as credits_used
         FROM contacts c
-        WHERE c.job_id IN (
-            SELECT id FROM import_jobs WHERE user_id = :user_id
-        )
+        WHERE c.user_id = :user_id
         AND c.created_at >= :start_date
         GROUP BY DATE(c.created_at)
         ORDER BY date DESC
@@ -252,6 +250,7 @@ async def get_user_dashboard(
     }
 
 @app.get("/api/analytics/enrichment-stats/{user_id}")
+@cached_response(response_cache, "analytics:enrichment-stats")
 async def get_enrichment_statistics(
     user_id: str,
     date_range: Optional[DateRange] = None,
@@ -283,9 +282,7 @@ async def get_enrichment_statistics(
             COUNT(CASE WHEN phone IS NOT NULL AND phone != '' THEN 1 END) as phones_found,
             COUNT(CASE WHEN phone_verified = true THEN 1 END) as phones_verified
         FROM contacts c
-        WHERE c.job_id IN (
-            SELECT id FROM import_jobs WHERE user_id = :user_id
-        )
+        WHERE c.user_id = :user_id
         {date_filter}
     """
     
@@ -304,9 +301,7 @@ async def get_enrichment_statistics(
             END as quality_tier,
             COUNT(*) as count
         FROM contacts c
-        WHERE c.job_id IN (
-            SELECT id FROM import_jobs WHERE user_id = :user_id
-        )
+        WHERE c.user_id = :user_id
         AND email IS NOT NULL
         {date_filter}
         GROUP BY quality_tier
@@ -321,9 +316,7 @@ async def get_enrichment_statistics(
             phone_type,
             COUNT(*) as count
         FROM contacts c
-        WHERE c.job_id IN (
-            SELECT id FROM import_jobs WHERE user_id = :user_id
-        )
+        WHERE c.user_id = :user_id
         AND phone IS NOT NULL
         {date_filter}
         GROUP BY phone_type
@@ -340,9 +333,7 @@ async def get_enrichment_statistics(
             COUNT(CASE WHEN email IS NOT NULL AND email != '' THEN 1 END) as emails_found,
             AVG(enrichment_score) as avg_confidence
         FROM contacts c
-        WHERE c.job_id IN (
-            SELECT id FROM import_jobs WHERE user_id = :user_id
-        )
+        WHERE c.user_id = :user_id
         AND industry IS NOT NULL AND industry != ''
         {date_filter}
         GROUP BY industry
@@ -468,35 +459,40 @@ async def get_job_analytics(job_id: str, session: AsyncSession = Depends(get_asy
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/analytics/dashboard")
+@cached_response(response_cache, "analytics:dashboard")
 async def get_dashboard_analytics(
     user_id: str = Depends(verify_api_token),
     session: AsyncSession = Depends(get_async_session)
 ):
     """Get real-time dashboard analytics from the database for the authenticated user"""
     try:
-        # Get total contacts and enrichment stats for this user
-        # FIXED: Made email/phone counting consistent with other queries
+        # Get total contacts and enrichment stats for this user from the
+        # rollups (migrations/add_analytics_rollups.sql): compacted daily rows
+        # plus the hourly rows written since the last compaction
         stats_query = text("""
             SELECT 
-                COUNT(*) as total_contacts,
-                COUNT(CASE WHEN c.enriched = true THEN 1 END) as enriched_count,
-                COUNT(CASE WHEN c.email IS NOT NULL AND c.email != '' AND c.email != 'null' THEN 1 END) as emails_found,
-                COUNT(CASE WHEN c.phone IS NOT NULL AND c.phone != '' AND c.phone != 'null' THEN 1 END) as phones_found,
-                AVG(c.enrichment_score) as avg_confidence,
-                SUM(c.credits_consumed) as credits_used_total,
-                COUNT(DISTINCT c.job_id) as total_jobs
-            FROM contacts c
-            JOIN import_jobs ij ON c.job_id = ij.id
-            WHERE ij.user_id = :user_id
+                SUM(r.contacts) as total_contacts,
+                SUM(r.enriched) as enriched_count,
+                SUM(r.emails_found) as emails_found,
+                SUM(r.phones_found) as phones_found,
+                SUM(r.score_sum) / NULLIF(SUM(r.score_count), 0) as avg_confidence,
+                SUM(r.credits_used) as credits_used_total
+            FROM (
+                SELECT contacts, enriched, emails_found, phones_found, score_sum, score_count, credits_used
+                FROM contact_rollups_daily WHERE user_id = :user_id
+                UNION ALL
+                SELECT contacts, enriched, emails_found, phones_found, score_sum, score_count, credits_used
+                FROM contact_rollups_hourly WHERE user_id = :user_id
+            ) r
         """)
         
         result = await session.execute(stats_query, {"user_id": user_id})
         stats = result.first()
         
-        total_contacts = stats.total_contacts if stats else 0
-        enriched_count = stats.enriched_count if stats else 0
-        emails_found = stats.emails_found if stats else 0
-        phones_found = stats.phones_found if stats else 0
+        total_contacts = int(stats.total_contacts or 0) if stats else 0
+        enriched_count = int(stats.enriched_count or 0) if stats else 0
+        emails_found = int(stats.emails_found or 0) if stats else 0
+        phones_found = int(stats.phones_found or 0) if stats else 0
         avg_confidence = float(stats.avg_confidence) if stats and stats.avg_confidence else 0
         credits_used_total = float(stats.credits_used_total) if stats and stats.credits_used_total else 0
         
@@ -515,26 +511,6 @@ async def get_dashboard_analytics(
         print(f"   - Email hit rate: {email_hit_rate:.1f}%")
         print(f"   - Phone hit rate: {phone_hit_rate:.1f}%")
         
-        # Additional debug query to check for data inconsistencies
-        debug_query = text("""
-            SELECT 
-                ij.id as job_id,
-                ij.status,
-                COUNT(c.id) as contacts_in_job,
-                COUNT(CASE WHEN c.email IS NOT NULL AND c.email != '' THEN 1 END) as emails_in_job,
-                SUM(c.credits_consumed) as credits_in_job
-            FROM import_jobs ij
-            LEFT JOIN contacts c ON ij.id = c.job_id
-            WHERE ij.user_id = :user_id
-            GROUP BY ij.id, ij.status
-            ORDER BY ij.created_at DESC
-            LIMIT 3
-        """)
-        
-        debug_result = await session.execute(debug_query, {"user_id": user_id})
-        print(f"   📋 Recent jobs breakdown:")
-        for job in debug_result.fetchall():
-            print(f"      Job {job[0]}: {job[2]} contacts, {job[3]} emails, {job[4]} credits")
         print(f"   =" * 50)
         
         # Get recent jobs (both active and completed)
@@ -542,14 +518,13 @@ async def get_dashboard_analytics(
             SELECT 
                 ij.id, ij.status, ij.total, ij.completed, ij.file_name,
                 ij.created_at, ij.updated_at,
-                COUNT(c.id) as actual_completed,
-                COUNT(CASE WHEN c.email IS NOT NULL AND c.email != '' THEN 1 END) as emails_found,
-                COUNT(CASE WHEN c.phone IS NOT NULL AND c.phone != '' THEN 1 END) as phones_found,
-                SUM(c.credits_consumed) as credits_used
+                js.total_processed as actual_completed,
+                js.emails_found,
+                js.phones_found,
+                js.credits_used
             FROM import_jobs ij
-            LEFT JOIN contacts c ON ij.id = c.job_id
+            LEFT JOIN job_stats js ON js.job_id = ij.id
             WHERE ij.user_id = :user_id
-            GROUP BY ij.id, ij.status, ij.total, ij.completed, ij.file_name, ij.created_at, ij.updated_at
             ORDER BY ij.created_at DESC
             LIMIT 10
         """)
@@ -594,22 +569,22 @@ async def get_dashboard_analytics(
         if recent_jobs:
             current_batch = recent_jobs[0]  # Most recent job
         
-        # Get provider performance (real data from database)
+        # Get provider performance (hourly rollups cover the last 7 days)
         provider_query = text("""
             SELECT 
-                c.enrichment_provider,
-                COUNT(*) as total_requests,
-                COUNT(CASE WHEN c.email IS NOT NULL AND c.email != '' THEN 1 END) as emails_found,
-                COUNT(CASE WHEN c.phone IS NOT NULL AND c.phone != '' THEN 1 END) as phones_found,
-                AVG(c.enrichment_score) as avg_confidence,
-                AVG(c.credits_consumed) as avg_cost,
-                MAX(c.created_at) as last_used
-            FROM contacts c
-            JOIN import_jobs ij ON c.job_id = ij.id
-            WHERE ij.user_id = :user_id 
-            AND c.enrichment_provider IS NOT NULL
-            AND c.created_at >= NOW() - INTERVAL '7 days'  -- Last 7 days
-            GROUP BY c.enrichment_provider
+                r.provider,
+                SUM(r.contacts) as total_requests,
+                SUM(r.emails_found) as emails_found,
+                SUM(r.phones_found) as phones_found,
+                SUM(r.score_sum) / NULLIF(SUM(r.score_count), 0) as avg_confidence,
+                SUM(r.credits_used)::float / NULLIF(SUM(r.contacts), 0) as avg_cost,
+                MAX(r.last_contact_at) as last_used
+            FROM contact_rollups_hourly r
+            WHERE r.user_id = :user_id 
+            AND r.provider != ''
+            AND r.bucket >= date_trunc('hour', NOW() - INTERVAL '7 days')  -- Last 7 days
+            GROUP BY r.provider
+            HAVING SUM(r.contacts) > 0
             ORDER BY total_requests DESC
         """)
         
@@ -618,9 +593,9 @@ async def get_dashboard_analytics(
         provider_performance = []
         for row in provider_result.fetchall():
             provider_name = row[0]
-            total_requests = row[1] or 0
-            emails_found = row[2] or 0
-            phones_found = row[3] or 0
+            total_requests = int(row[1] or 0)
+            emails_found = int(row[2] or 0)
+            phones_found = int(row[3] or 0)
             avg_confidence = float(row[4] or 0)
             avg_cost = float(row[5] or 0)
             last_used = row[6]
@@ -667,11 +642,10 @@ async def get_dashboard_analytics(
         
         # Calculate credits used today
         today_credits_query = text("""
-            SELECT SUM(c.credits_consumed) as credits_today
-            FROM contacts c
-            JOIN import_jobs ij ON c.job_id = ij.id
-            WHERE ij.user_id = :user_id 
-            AND DATE(c.created_at) = CURRENT_DATE
+            SELECT SUM(r.credits_used) as credits_today
+            FROM contact_rollups_hourly r
+            WHERE r.user_id = :user_id 
+            AND r.bucket >= CURRENT_DATE
         """)
         
         today_result = await session.execute(today_credits_query, {"user_id": user_id})
@@ -843,6 +817,7 @@ async def get_worker_status():
         return {"workers": []}
 
 @app.get("/api/analytics/credits/{user_id}")
+@cached_response(response_cache, "analytics:credits")
 async def get_credit_analytics(
     user_id: str,
     period: str = Query("30d", regex="^(7d|30d|90d|1y)$"),
@@ -924,6 +899,11 @@ async def get_credit_analytics(
         }
     }
 
+@app.get("/health/db-pool")
+async def db_pool_health():
+    """Connection pool checkout wait times and usage"""
+    return pool_metrics()
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -992,7 +972,7 @@ async def direct_lead_score_recalculation(session: AsyncSession, user_id: str):
         params = {}
         
         if user_id and user_id != "all":
-            where_conditions.append("ij.user_id = :user_id")
+            where_conditions.append("c.user_id = :user_id")
             params["user_id"] = user_id
         
         where_clause = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
@@ -1003,9 +983,9 @@ async def direct_lead_score_recalculation(session: AsyncSession, user_id: str):
                 c.id, c.email, c.phone, c.company, c.position, c.profile_url,
                 c.email_verified, c.phone_verified, 
                 c.email_verification_score, c.phone_verification_score,
-                c.enrichment_score, c.is_disposable, c.is_role_based, c.is_catchall
+                c.enrichment_score, c.is_disposable, c.is_role_based, c.is_catchall,
+                c.user_id
             FROM contacts c
-            JOIN import_jobs ij ON c.job_id = ij.id
             {where_clause}
             ORDER BY c.id
             LIMIT 1000
@@ -1015,6 +995,7 @@ async def direct_lead_score_recalculation(session: AsyncSession, user_id: str):
         contacts = result.fetchall()
         
         updated_count = 0
+        updated_users = set()
         
         for contact in contacts:
             contact_id = contact[0]
@@ -1062,8 +1043,11 @@ async def direct_lead_score_recalculation(session: AsyncSession, user_id: str):
             })
             
             updated_count += 1
+            updated_users.add(str(contact[14]))
         
         await session.commit()
+        for updated_user in updated_users:
+            await publish_user_data_changed_async(settings.redis_url, updated_user)
         
         return {
             "success": True,
@@ -1165,8 +1149,7 @@ async def get_lead_scores_status(
                 MIN(lead_score) as min_score,
                 MAX(lead_score) as max_score
             FROM contacts c
-            JOIN import_jobs ij ON c.job_id = ij.id
-            WHERE ij.user_id = :user_id
+            WHERE c.user_id = :user_id
         """)
         
         result = await session.execute(stats_query, {"user_id": user_id})
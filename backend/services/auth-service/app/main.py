@@ -8,6 +8,7 @@ from datetime import datetime, timedelta, timezone
 from typing import List, Optional
 
 import jwt
+import redis.asyncio as aioredis
 from jwt import ExpiredSignatureError, PyJWTError
 from fastapi import (
     FastAPI,
@@ -35,7 +36,8 @@ import uvicorn
 import resend
 
 from app.models import User, ApiKey, EmailVerification, Base  # Your SQLAlchemy Base/metadata
-from common.db import async_engine, AsyncSessionLocal
+from common.db import pool_metrics
+from common.auth import api_key_fingerprint, API_KEY_REDIS_PREFIX, API_KEY_REVOKED_CHANNEL
 
 # 1. SETTINGS
 class Settings(BaseSettings):
@@ -43,6 +45,7 @@ class Settings(BaseSettings):
     jwt_secret: str = "devsecret"
     jwt_algorithm: str = "HS256"
     jwt_exp_minutes: int = 60
+    redis_url: str = "redis://redis:6379/0"
     # OAuth settings - these will read from VITE_GOOGLE_CLIENT_ID and GOOGLE_CLIENT_SECRET env vars
     VITE_GOOGLE_CLIENT_ID: str = "placeholder-google-client-id"
     GOOGLE_CLIENT_SECRET: str = "placeholder-google-client-secret"
@@ -706,6 +709,19 @@ async def list_apikeys(
             detail=f"Error fetching API keys: {str(e)}"
         )
 
+async def publish_api_key_revoked(key: str):
+    """Drop a revoked key from the shared cache and tell every service to evict it."""
+    fingerprint = api_key_fingerprint(key)
+    client = aioredis.from_url(settings.redis_url, socket_timeout=1.0)
+    try:
+        await client.delete(API_KEY_REDIS_PREFIX + fingerprint)
+        await client.publish(API_KEY_REVOKED_CHANNEL, fingerprint)
+    except Exception as e:
+        # Caches still expire within API_KEY_CACHE_TTL
+        print(f"Could not publish API key revocation: {e}")
+    finally:
+        await client.aclose()
+
 @app.delete("/auth/apikeys/{key_id}")
 async def revoke_apikey(
     key_id: str,
@@ -718,7 +734,7 @@ async def revoke_apikey(
         UPDATE api_keys 
         SET revoked = TRUE
         WHERE id = :key_id AND user_id = :user_id
-        RETURNING id
+        RETURNING id, key
         """)
         
         result = await db.execute(
@@ -735,7 +751,10 @@ async def revoke_apikey(
         if not row:
             raise HTTPException(status_code=404, detail="API key not found")
         
+        await publish_api_key_revoked(row[1])
         return {"status": "success"}
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error revoking API key: {e}")
         raise HTTPException(
@@ -764,6 +783,11 @@ async def api_tokens_page(
         }
     )
 
+@app.get("/health/db-pool")
+async def db_pool_health():
+    """Connection pool checkout wait times and usage"""
+    return pool_metrics()
+
 @app.get("/health", summary="Health check")
 async def health():
     return {"status": "ok"}
@@ -1,47 +1,241 @@
+"""
+Request authentication shared by the services.
+
+JWTs are verified locally with the shared secret. API keys are resolved
+through a short-TTL in-process cache backed by Redis, and only fall back to
+auth-service on a miss. auth-service publishes revoked keys on
+API_KEY_REVOKED_CHANNEL so every service evicts them right away.
+"""
+import time
+import asyncio
+import hashlib
+import logging
+from typing import Dict, Optional, Tuple
+
 import httpx
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from typing import Optional
 from common.config import get_settings
 
+try:
+    import jwt  # PyJWT (auth-service)
+    JWTError = jwt.PyJWTError
+except ImportError:
+    try:
+        from jose import jwt, JWTError  # python-jose (other services)
+    except ImportError:  # No JWT library: every token goes to auth-service
+        jwt = None
+        JWTError = Exception
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # Redis tier is optional
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
 settings = get_settings()
 security = HTTPBearer()
 
+AUTH_SERVICE_URL = "http://auth-service:8000/auth/validate-token"
+
+API_KEY_CACHE_TTL = 60           # In-process positive entries (seconds)
+API_KEY_NEGATIVE_TTL = 5         # In-process unknown-key entries
+API_KEY_REDIS_TTL = 300          # Shared positive entries
+API_KEY_CACHE_SIZE = 10000
+API_KEY_REDIS_PREFIX = "auth:apikey:v1:"
+API_KEY_REVOKED_CHANNEL = "auth:apikey:revoked"
+REDIS_RETRY_AFTER = 30           # Seconds to skip Redis after a connection error
+
+
+def api_key_fingerprint(token: str) -> str:
+    """Hash used for cache keys and revocation messages (raw keys never hit Redis)."""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _decode_jwt(token: str) -> Optional[str]:
+    """Return the ``sub`` claim of a valid JWT, or None."""
+    if jwt is None or token.count(".") != 2:
+        return None
+    try:
+        payload = jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
+    except JWTError:
+        return None
+    user_id = payload.get("sub")
+    return str(user_id) if user_id else None
+
+
+class ApiKeyCache:
+    """In-process TTL cache of API key -> user_id with a Redis tier and revocation listener."""
+
+    def __init__(self, redis_url: Optional[str]):
+        self.redis_url = redis_url
+        self._local: Dict[str, Tuple[Optional[str], float]] = {}
+        self._redis = None
+        self._redis_down_until = 0.0
+        self._listener: Optional[asyncio.Task] = None
+
+    # ----- In-process tier ----- #
+
+    def get_local(self, fingerprint: str) -> Tuple[bool, Optional[str]]:
+        """Returns (found, user_id); user_id is None for a cached unknown key."""
+        entry = self._local.get(fingerprint)
+        if entry is None:
+            return False, None
+        if entry[1] <= time.monotonic():
+            self._local.pop(fingerprint, None)
+            return False, None
+        return True, entry[0]
+
+    def put_local(self, fingerprint: str, user_id: Optional[str]):
+        if len(self._local) >= API_KEY_CACHE_SIZE:
+            now = time.monotonic()
+            for key in [k for k, (_, exp) in self._local.items() if exp <= now]:
+                del self._local[key]
+            if len(self._local) >= API_KEY_CACHE_SIZE:
+                self._local.clear()
+        ttl = API_KEY_CACHE_TTL if user_id else API_KEY_NEGATIVE_TTL
+        self._local[fingerprint] = (user_id, time.monotonic() + ttl)
+
+    def evict(self, fingerprint: str):
+        self._local.pop(fingerprint, None)
+
+    # ----- Redis tier ----- #
+
+    def _client(self):
+        if aioredis is None or not self.redis_url or time.time() < self._redis_down_until:
+            return None
+        if self._redis is None:
+            self._redis = aioredis.from_url(self.redis_url, socket_timeout=0.5, decode_responses=True)
+        self._ensure_listener()
+        return self._redis
+
+    def _redis_failed(self, e: Exception):
+        logger.warning(f"API key cache: Redis unavailable for {REDIS_RETRY_AFTER}s: {e}")
+        self._redis_down_until = time.time() + REDIS_RETRY_AFTER
+
+    async def get_shared(self, fingerprint: str) -> Optional[str]:
+        client = self._client()
+        if client is None:
+            return None
+        try:
+            return await client.get(API_KEY_REDIS_PREFIX + fingerprint)
+        except Exception as e:
+            self._redis_failed(e)
+            return None
+
+    async def put_shared(self, fingerprint: str, user_id: str):
+        client = self._client()
+        if client is None:
+            return
+        try:
+            await client.set(API_KEY_REDIS_PREFIX + fingerprint, user_id, ex=API_KEY_REDIS_TTL)
+        except Exception as e:
+            self._redis_failed(e)
+
+    # ----- Revocation ----- #
+
+    def _ensure_listener(self):
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+
+    async def _listen(self):
+        """Evict revoked keys published by auth-service. Reconnects on errors."""
+        while True:
+            pubsub = None
+            try:
+                pubsub = self._redis.pubsub()
+                await pubsub.subscribe(API_KEY_REVOKED_CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self.evict(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"API key revocation listener error: {e}")
+                # Entries may have missed a revocation while disconnected
+                self._local.clear()
+                await asyncio.sleep(REDIS_RETRY_AFTER)
+            finally:
+                if pubsub is not None:
+                    try:
+                        await pubsub.aclose()
+                    except Exception:
+                        pass
+
+
+api_key_cache = ApiKeyCache(settings.redis_url)
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    """Keep-alive client reused for every auth-service call."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=5.0,
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+        )
+    return _http_client
+
+
+async def _validate_remote(token: str) -> Optional[str]:
+    """Ask auth-service about a token. None if it is not valid."""
+    try:
+        response = await _get_http_client().post(AUTH_SERVICE_URL, json={"token": token})
+    except httpx.RequestError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Could not connect to authentication service",
+        )
+    if response.status_code != 200:
+        return None
+    return response.json()["user_id"]
+
+
+async def resolve_token(token: str) -> Optional[str]:
+    """Return the user_id for a JWT or API key, or None if it is not valid."""
+    user_id = _decode_jwt(token)
+    if user_id:
+        return user_id
+
+    fingerprint = api_key_fingerprint(token)
+    found, user_id = api_key_cache.get_local(fingerprint)
+    if found:
+        return user_id
+
+    user_id = await api_key_cache.get_shared(fingerprint)
+    if user_id:
+        api_key_cache.put_local(fingerprint, user_id)
+        return user_id
+
+    user_id = await _validate_remote(token)
+    api_key_cache.put_local(fingerprint, user_id)
+    if user_id:
+        await api_key_cache.put_shared(fingerprint, str(user_id))
+    return user_id
+
+
 async def verify_api_token(
     credentials: HTTPAuthorizationCredentials = Depends(security),
 ) -> str:
     """
-    Validates an API token with the auth service and returns the associated user_id
+    Validates an API token (JWT or API key) and returns the associated user_id
     if the token is valid, otherwise raises an HTTPException.
     """
     token = credentials.credentials
-    
+
     if not token:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Missing API token",
         )
-    
-    try:
-        # Call auth service to validate token
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"http://auth-service:8000/auth/validate-token",
-                json={"token": token},
-                timeout=5.0,
-            )
-            
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Invalid API token",
-                )
-                
-            data = response.json()
-            return data["user_id"]
-                
-    except httpx.RequestError:
+
+    user_id = await resolve_token(token)
+    if not user_id:
         raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Could not connect to authentication service",
-        ) 
\ No newline at end of file
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid API token",
+        )
+    return user_id
@@ -16,6 +16,7 @@ class Settings:
         
         # JWT configuration
         self.jwt_secret = os.environ.get('JWT_SECRET', 'devsecret')
+        self.jwt_algorithm = os.environ.get('JWT_ALGORITHM', 'HS256')
         
         # API Keys for enrichment services
         self.hunter_api = os.environ.get('HUNTER_API_KEY', '195519b1b540f1d005011ecd654a889390616b2b')
@@ -39,6 +40,13 @@ class Settings:
         self.minimum_confidence = 0.50  # Lower threshold to accept more results
         self.high_confidence = 0.85     # High confidence threshold to stop cascading
         
+        # Object storage (S3 is used only when credentials are set)
+        self.aws_access_key_id = os.environ.get('AWS_ACCESS_KEY_ID', '')
+        self.aws_secret_access_key = os.environ.get('AWS_SECRET_ACCESS_KEY', '')
+        self.aws_default_region = os.environ.get('AWS_DEFAULT_REGION', 'us-east-1')
+        self.s3_bucket_raw = os.environ.get('S3_BUCKET_RAW', '')
+        self.s3_bucket_exports = os.environ.get('S3_BUCKET_EXPORTS', '')
+        
         # Task configuration
         self.retry_limit = 3
         self.retry_delay = 5
@@ -0,0 +1,162 @@
+"""
+Incremental contact imports from CRMs (HubSpot, Salesforce), used by the
+import service and by the export worker's Salesforce Bulk API imports.
+
+crm_sync_state keeps, per user and CRM, the paging cursor of an import in
+progress and the last-modified watermark of the last completed one. An
+interrupted import resumes from its cursor; once an import completes, the
+next one asks the CRM only for records modified since the watermark.
+
+Each page is written with a handful of set-based statements (new contacts
+and their mappings inserted from unnest() arrays, already-imported ones
+updated in place) while the next page is being fetched.
+"""
+import asyncio
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from common.config import get_settings
+from common.events import publish_user_data_changed_async
+
+settings = get_settings()
+
+# Contact columns a CRM import fills
+CRM_CONTACT_FIELDS = (
+    "first_name", "last_name", "email", "phone", "company",
+    "position", "location", "industry", "profile_url",
+)
+
+# provider -> (mapping table, CRM id column)
+_MAPPINGS = {
+    "hubspot": ("hubspot_contact_mappings", "hubspot_contact_id"),
+    "salesforce": ("salesforce_contact_mappings", "salesforce_contact_id"),
+}
+
+_FIELD_ARRAYS = ", ".join(f"CAST(:{name} AS text[])" for name in CRM_CONTACT_FIELDS)
+_FIELD_COLUMNS = ", ".join(CRM_CONTACT_FIELDS)
+
+
+# ----- Sync state ----- #
+
+async def get_sync_state(session: AsyncSession, user_id: str, provider: str) -> Tuple[Optional[str], Optional[datetime]]:
+    """(cursor, watermark) for the user's last import from ``provider``."""
+    row = (await session.execute(
+        text("SELECT cursor, watermark FROM crm_sync_state WHERE user_id = :user_id AND provider = :provider"),
+        {"user_id": user_id, "provider": provider},
+    )).fetchone()
+    return (row[0], row[1]) if row else (None, None)
+
+
+async def save_sync_state(
+    session: AsyncSession,
+    user_id: str,
+    provider: str,
+    cursor: Optional[str],
+    watermark: Optional[datetime],
+):
+    await session.execute(text("""
+        INSERT INTO crm_sync_state (user_id, provider, cursor, watermark, updated_at)
+        VALUES (:user_id, :provider, :cursor, :watermark, NOW())
+        ON CONFLICT (user_id, provider) DO UPDATE SET
+            cursor = EXCLUDED.cursor,
+            watermark = EXCLUDED.watermark,
+            updated_at = NOW()
+    """), {"user_id": user_id, "provider": provider, "cursor": cursor, "watermark": watermark})
+
+
+# ----- Page writes ----- #
+
+async def write_contacts(
+    session: AsyncSession,
+    user_id: str,
+    job_id: str,
+    provider: str,
+    records: List[Tuple[str, Dict[str, Any]]],
+) -> Tuple[int, int]:
+    """
+    Write one page of (CRM id, Captely contact) pairs; returns (inserted, updated).
+
+    Contacts already mapped for this user are updated in place; the rest are
+    inserted into ``job_id`` along with their mappings. Nothing is committed
+    (see commit_page).
+    """
+    table, crm_column = _MAPPINGS[provider]
+    latest = dict(records)              # A record repeated within the page: keep the last copy
+    if not latest:
+        return 0, 0
+
+    existing = dict((await session.execute(
+        text(f"SELECT {crm_column}, captely_contact_id FROM {table} WHERE user_id = :user_id AND {crm_column} = ANY(:crm_ids)"),
+        {"user_id": user_id, "crm_ids": list(latest)},
+    )).fetchall())
+
+    updates = [(existing[crm_id], contact) for crm_id, contact in latest.items() if crm_id in existing]
+    inserts = [(crm_id, contact) for crm_id, contact in latest.items() if crm_id not in existing]
+
+    if updates:
+        await session.execute(text(f"""
+            UPDATE contacts c SET
+                {", ".join(f"{name} = COALESCE(NULLIF(u.{name}, ''), c.{name})" for name in CRM_CONTACT_FIELDS)},
+                updated_at = NOW()
+            FROM unnest(CAST(:ids AS integer[]), {_FIELD_ARRAYS}) AS u(id, {_FIELD_COLUMNS})
+            WHERE c.id = u.id
+        """), {
+            "ids": [contact_id for contact_id, _ in updates],
+            **{name: [contact.get(name) for _, contact in updates] for name in CRM_CONTACT_FIELDS},
+        })
+
+    if inserts:
+        # Reserve ids up front so contacts and mappings line up without a round trip per row
+        ids = (await session.execute(
+            text("SELECT nextval(pg_get_serial_sequence('contacts', 'id')) FROM generate_series(1, :n)"),
+            {"n": len(inserts)},
+        )).scalars().all()
+        await session.execute(text(f"""
+            INSERT INTO contacts (id, job_id, {_FIELD_COLUMNS}, enriched, enrichment_status, created_at)
+            SELECT u.id, :job_id, {", ".join(f"u.{name}" for name in CRM_CONTACT_FIELDS)}, false, 'pending', NOW()
+            FROM unnest(CAST(:ids AS integer[]), {_FIELD_ARRAYS}) AS u(id, {_FIELD_COLUMNS})
+        """), {
+            "job_id": job_id,
+            "ids": ids,
+            **{name: [contact.get(name) for _, contact in inserts] for name in CRM_CONTACT_FIELDS},
+        })
+        await session.execute(text(f"""
+            INSERT INTO {table} (user_id, captely_contact_id, {crm_column})
+            SELECT CAST(:user_id AS uuid), m.captely_contact_id, m.crm_id
+            FROM unnest(CAST(:ids AS integer[]), CAST(:crm_ids AS varchar[])) AS m(captely_contact_id, crm_id)
+        """), {"user_id": user_id, "ids": ids, "crm_ids": [crm_id for crm_id, _ in inserts]})
+
+    return len(inserts), len(updates)
+
+
+async def commit_page(session: AsyncSession, user_id: str):
+    """Commit a written page and invalidate the user's cached contact stats."""
+    await session.commit()
+    await publish_user_data_changed_async(settings.redis_url, user_id)
+
+
+# ----- Paging ----- #
+
+async def prefetch_pages(
+    fetch: Callable[[Optional[str]], Awaitable[Tuple[List[Any], Optional[str]]]],
+    cursor: Optional[str],
+) -> AsyncIterator[Tuple[List[Any], Optional[str]]]:
+    """
+    Yield (records, next cursor) pages, fetching the next page while the
+    caller processes the current one.
+
+    ``fetch(cursor)`` returns one page and the cursor of the following page
+    (None on the last one). It must not use the caller's database session.
+    """
+    pending = asyncio.create_task(fetch(cursor))
+    try:
+        while pending is not None:
+            records, next_cursor = await pending
+            pending = asyncio.create_task(fetch(next_cursor)) if next_cursor else None
+            yield records, next_cursor
+    finally:
+        if pending is not None:
+            pending.cancel()
@@ -1,27 +1,243 @@
-from sqlalchemy import create_engine
+"""
+Shared SQLAlchemy engines and sessions.
+
+Every engine should come from create_db_engine(), which applies the pool
+settings of the process role (api / worker / script), optional PgBouncer
+transaction-pooling compatibility, asyncpg statement caching and checkout
+wait-time metrics. Engines are cached per (url, driver, role), so modules
+asking for the same database share one pool instead of each building their
+own at import time.
+
+Environment overrides: DB_POOL_ROLE, DB_POOL_SIZE, DB_MAX_OVERFLOW,
+DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_STATEMENT_CACHE_SIZE, DB_PGBOUNCER.
+"""
+import os
+import time
+import uuid
+import logging
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import create_engine, exc as sa_exc
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
 from contextlib import asynccontextmanager
 
 from common.config import get_settings
 
+logger = logging.getLogger(__name__)
+
 settings = get_settings()
 
-# Get base URL
-base_url = settings.database_url.replace("postgresql+asyncpg://", "postgresql://").replace("postgresql+pg8000://", "postgresql://")
+# Pool settings per process role
+POOL_PROFILES: Dict[str, Dict[str, Any]] = {
+    # FastAPI services: many short requests
+    "api": {"pool_size": 10, "max_overflow": 10, "pool_timeout": 10, "pool_recycle": 1800},
+    # Celery workers: many processes, so fewer connections each
+    "worker": {"pool_size": 5, "max_overflow": 5, "pool_timeout": 30, "pool_recycle": 1800},
+    # One-off scripts and migrations: no pooling
+    "script": {},
+}
+
+DEFAULT_ROLE = os.environ.get("DB_POOL_ROLE", "api")
+STATEMENT_CACHE_SIZE = int(os.environ.get("DB_STATEMENT_CACHE_SIZE", "256"))
+PGBOUNCER_MODE = os.environ.get("DB_PGBOUNCER", "false").lower() in ("1", "true", "yes")
+SLOW_CHECKOUT_SECONDS = 0.1
+
+_ENV_OVERRIDES = {
+    "pool_size": "DB_POOL_SIZE",
+    "max_overflow": "DB_MAX_OVERFLOW",
+    "pool_timeout": "DB_POOL_TIMEOUT",
+    "pool_recycle": "DB_POOL_RECYCLE",
+}
+
+
+def sync_database_url(url: str) -> str:
+    """URL for the psycopg2 driver."""
+    return url.replace("postgresql+asyncpg://", "postgresql://").replace("postgresql+pg8000://", "postgresql://")
+
+
+def async_database_url(url: str) -> str:
+    """URL for the asyncpg driver."""
+    url = sync_database_url(url).replace("postgresql+psycopg2://", "postgresql://")
+    return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+
+
+# ----- Pool metrics ----- #
+
+class PoolStats:
+    """Checkout wait-time counters for one engine's pool."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.slow_checkouts = 0
+        self.timeouts = 0
+
+    def observe(self, waited: float):
+        with self.lock:
+            self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            if waited >= SLOW_CHECKOUT_SECONDS:
+                self.slow_checkouts += 1
+
+    def timed_out(self):
+        with self.lock:
+            self.timeouts += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "checkouts": self.checkouts,
+                "avg_wait_ms": round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "max_wait_ms": round(self.wait_max * 1000, 3),
+                "slow_checkouts": self.slow_checkouts,
+                "timeouts": self.timeouts,
+            }
+
+
+_pool_stats: Dict[str, PoolStats] = {}
+
+
+def _instrumented_pool(base, name: str):
+    """Pool subclass that times how long each checkout waits for a connection."""
+    stats = _pool_stats.setdefault(name, PoolStats())
+
+    class InstrumentedPool(base):
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                connection = super()._do_get()
+            except sa_exc.TimeoutError:
+                stats.timed_out()
+                logger.warning(f"DB pool {name}: checkout timed out ({self.status()})")
+                raise
+            stats.observe(time.perf_counter() - started)
+            return connection
+
+    InstrumentedPool.__name__ = f"Instrumented{base.__name__}"
+    return InstrumentedPool
+
+
+# ----- Engine factory ----- #
+
+_engines: Dict[Tuple[str, bool, str], Any] = {}
+_engines_lock = threading.Lock()
+
+
+def _pool_kwargs(role: str) -> Dict[str, Any]:
+    if role not in POOL_PROFILES:
+        raise ValueError(f"Unknown DB pool role: {role!r}")
+    kwargs = dict(POOL_PROFILES[role])
+    if not kwargs:
+        return {}
+    for key, env in _ENV_OVERRIDES.items():
+        if os.environ.get(env):
+            kwargs[key] = int(os.environ[env])
+    return kwargs
+
+
+def create_db_engine(url: Optional[str] = None, *, is_async: bool = True, role: Optional[str] = None, **kwargs):
+    """
+    Return the shared engine for ``url`` (defaults to DATABASE_URL).
+
+    ``role`` picks the pool profile (api / worker / script). Extra keyword
+    arguments are passed to create_engine / create_async_engine and only
+    apply the first time an engine is built.
+    """
+    role = role or DEFAULT_ROLE
+    url = url or settings.database_url
+    url = async_database_url(url) if is_async else sync_database_url(url)
+    key = (url, is_async, role)
+
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is not None:
+            return engine
+
+        parsed = make_url(url)
+        name = f"{role}:{'async' if is_async else 'sync'}:{parsed.host}/{parsed.database}"
+        options: Dict[str, Any] = {"pool_pre_ping": True}
+        pool_kwargs = _pool_kwargs(role)
+        if pool_kwargs:
+            options.update(pool_kwargs)
+            options["poolclass"] = _instrumented_pool(AsyncAdaptedQueuePool if is_async else QueuePool, name)
+        else:
+            options["poolclass"] = NullPool
+
+        connect_args: Dict[str, Any] = {}
+        if is_async:
+            if PGBOUNCER_MODE:
+                # Transaction pooling hands each transaction a different server
+                # connection, so prepared statements can't be reused or named twice.
+                connect_args.update({
+                    "statement_cache_size": 0,
+                    "prepared_statement_cache_size": 0,
+                    "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+                })
+            else:
+                connect_args["prepared_statement_cache_size"] = STATEMENT_CACHE_SIZE
+        options["connect_args"] = connect_args
+        options.update(kwargs)
+
+        engine = (create_async_engine if is_async else create_engine)(url, **options)
+        _engines[key] = engine
+        logger.info(f"DB engine {name}: {pool_kwargs or 'NullPool'}{' (PgBouncer mode)' if PGBOUNCER_MODE else ''}")
+        return engine
+
+
+def pool_metrics() -> Dict[str, Any]:
+    """
+    Checkout wait times and live pool usage of every shared engine, keyed by
+    role and driver. The /health/db-pool endpoints serve this unauthenticated,
+    so database host and name are left out.
+    """
+    with _engines_lock:
+        engines = list(_engines.items())
+    metrics = {}
+    for (url, is_async, role), engine in engines:
+        pool = engine.pool
+        parsed = make_url(url)
+        name = f"{role}:{'async' if is_async else 'sync'}:{parsed.host}/{parsed.database}"
+        entry = _pool_stats.get(name, PoolStats()).as_dict()
+        label = base = f"{role}:{'async' if is_async else 'sync'}"
+        n = 1
+        while label in metrics:
+            n += 1
+            label = f"{base}:{n}"
+        if isinstance(pool, QueuePool):
+            entry.update({
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+            })
+        metrics[label] = entry
+    return metrics
+
+
+def _dispose_after_fork():
+    """Forked children (Celery prefork) must not reuse the parent's sockets."""
+    for engine in list(_engines.values()):
+        getattr(engine, "sync_engine", engine).dispose(close=False)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_dispose_after_fork)
+
+
+# ----- Default engines and sessions ----- #
 
 # Non-async engine (for services that need it)
-engine = create_engine(base_url)
+engine = create_db_engine(is_async=False)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-# Async engine (for services that require async)
-# Ensure we use asyncpg for async operations
-if "postgresql://" in settings.database_url and "+asyncpg" not in settings.database_url:
-    async_url = settings.database_url.replace("postgresql://", "postgresql+asyncpg://")
-else:
-    async_url = settings.database_url
-
-async_engine = create_async_engine(async_url)
+# Async engine (asyncpg)
+async_engine = create_db_engine()
 AsyncSessionLocal = sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
 
 Base = declarative_base()
@@ -0,0 +1,54 @@
+"""
+Data change events published by writers (enrichment worker, billing-service).
+
+Kept free of web-framework imports so Celery workers can use it. Readers
+that cache per-user data (common.response_cache) key their entries on the
+user's generation counter, which publish_user_data_changed() bumps.
+"""
+import json
+import asyncio
+import logging
+
+try:
+    import redis
+except ImportError:  # Events are best effort
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+USER_GENERATION_PREFIX = "respcache:gen:"
+USER_DATA_CHANGED_CHANNEL = "user_data_changed"
+
+
+def user_generation_key(user_id: str) -> str:
+    return f"{USER_GENERATION_PREFIX}{user_id}"
+
+
+_publisher = None
+_warned_no_redis = False
+
+
+def publish_user_data_changed(redis_url: str, user_id: str, reason: str = "contacts"):
+    """Announce that ``user_id``'s contacts or credits changed. Never raises."""
+    global _publisher, _warned_no_redis
+    if not user_id:
+        return
+    if redis is None:
+        if not _warned_no_redis:
+            _warned_no_redis = True
+            logger.warning("redis is not installed: user data change events are not published, cached responses go stale")
+        return
+    try:
+        if _publisher is None:
+            _publisher = redis.Redis.from_url(redis_url, socket_timeout=0.5)
+        pipe = _publisher.pipeline(transaction=False)
+        pipe.incr(user_generation_key(user_id))
+        pipe.publish(USER_DATA_CHANGED_CHANNEL, json.dumps({"user_id": str(user_id), "reason": reason}))
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"User data change event failed for user {user_id}: {e}")
+
+
+async def publish_user_data_changed_async(redis_url: str, user_id: str, reason: str = "contacts"):
+    """publish_user_data_changed for code on an event loop: the blocking Redis call runs in a thread."""
+    await asyncio.to_thread(publish_user_data_changed, redis_url, user_id, reason)
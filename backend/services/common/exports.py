@@ -0,0 +1,490 @@
+"""
+Streaming exports.
+
+Rows are read through a server-side cursor in batches and each batch is
+encoded and yielded as soon as it arrives, so an export holds one batch in
+memory whatever its size and the first bytes leave after the first fetch.
+
+An encoder turns batches of row tuples into bytes: header(), then encode()
+per batch, then footer(). open_stream() / open_stream_sync() run the query
+and read the first batch up front so endpoints can still answer 404 for an
+empty export before any response has started.
+
+NDJSON rows are serialized with orjson when it's installed.
+
+Parquet and Arrow IPC are built with pyarrow from a typed schema: ``kinds``
+gives each column's type ("string", "int", "float", "bool", "timestamp");
+without it the types are inferred from the first batch. Encoders marked
+``cpu_bound`` are run on a worker thread by encode_stream().
+
+XLSX can't be produced incrementally (the zip directory comes last), so it
+is written with xlsxwriter's constant_memory mode into a temp file, which is
+then streamed back and deleted.
+"""
+import io
+import os
+import csv
+import uuid
+import asyncio
+import decimal
+import datetime
+import tempfile
+from typing import AsyncIterator, Iterator, List, Optional, Sequence
+
+try:
+    import xlsxwriter
+except ImportError:  # Only needed by services that export XLSX
+    xlsxwriter = None
+
+try:
+    import orjson
+except ImportError:  # NDJSON falls back to the stdlib encoder
+    orjson = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Only needed by services that export Parquet / Arrow
+    pa = None
+    pq = None
+
+from common.db import AsyncSessionLocal, SessionLocal
+
+EXPORT_BATCH_SIZE = 2000     # Rows per cursor fetch and per encoded chunk
+EXPORT_SPOOL_DIR = os.environ.get("EXPORT_SPOOL_DIR") or tempfile.gettempdir()
+FILE_CHUNK_SIZE = 64 * 1024
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+XLSX_MAX_ROWS = 1048576      # Per sheet, header included
+PARQUET_ROW_GROUP_SIZE = 64 * 1024
+
+
+# ----- Encoders ----- #
+
+class CsvEncoder:
+    media_type = "text/csv"
+    extension = "csv"
+    cpu_bound = False
+
+    def __init__(self, columns: Sequence[str], kinds: Optional[Sequence[str]] = None):
+        self.columns = list(columns)
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+
+    def _drain(self) -> bytes:
+        data = self._buffer.getvalue().encode()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+    def header(self) -> bytes:
+        self._writer.writerow(self.columns)
+        return self._drain()
+
+    def encode(self, rows: Sequence[Sequence]) -> bytes:
+        self._writer.writerows(rows)
+        return self._drain()
+
+    def footer(self) -> bytes:
+        return b""
+
+
+def _json_default(value):
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return str(value)
+
+
+def _dumps(value) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value, default=_json_default)
+    import json
+    return json.dumps(value, default=_json_default, separators=(",", ":")).encode()
+
+
+class NdjsonEncoder:
+    """One JSON object per line, keyed by column name."""
+
+    media_type = NDJSON_MEDIA_TYPE
+    extension = "ndjson"
+    cpu_bound = False
+
+    def __init__(self, columns: Sequence[str], kinds: Optional[Sequence[str]] = None):
+        self.columns = list(columns)
+
+    def header(self) -> bytes:
+        return b""
+
+    def encode(self, rows: Sequence[Sequence]) -> bytes:
+        columns = self.columns
+        return b"".join(_dumps(dict(zip(columns, row))) + b"\n" for row in rows)
+
+    def footer(self) -> bytes:
+        return b""
+
+
+def prefers_ndjson(accept: Optional[str]) -> bool:
+    """True when an Accept header asks for NDJSON."""
+    return bool(accept) and NDJSON_MEDIA_TYPE in accept.lower()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only stream that hands back what was written since the last drain."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class _ArrowEncoder:
+    """Shared batch -> pyarrow RecordBatch conversion."""
+
+    cpu_bound = True
+
+    def __init__(self, columns: Sequence[str], kinds: Optional[Sequence[str]] = None):
+        if pa is None:
+            raise RuntimeError("pyarrow is not installed")
+        self.columns = list(columns)
+        self.schema = pa.schema([
+            (name, self._arrow_type(kind)) for name, kind in zip(self.columns, kinds)
+        ]) if kinds else None
+        self._sink = _ChunkSink()
+
+    @staticmethod
+    def _arrow_type(kind: str):
+        return {
+            "string": pa.string(),
+            "int": pa.int64(),
+            "float": pa.float64(),
+            "bool": pa.bool_(),
+            "timestamp": pa.timestamp("us"),
+        }[kind]
+
+    def _record_batch(self, rows: Sequence[Sequence]):
+        values = list(zip(*rows)) if rows else [()] * len(self.columns)
+        if self.schema is None:
+            arrays = [pa.array(column) for column in values]
+            # All-null columns in the first batch would fix the type to null
+            arrays = [a.cast(pa.string()) if pa.types.is_null(a.type) else a for a in arrays]
+            self.schema = pa.schema([(name, a.type) for name, a in zip(self.columns, arrays)])
+            return pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+        return pa.RecordBatch.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(values, self.schema)],
+            schema=self.schema,
+        )
+
+
+class ArrowStreamEncoder(_ArrowEncoder):
+    """Arrow IPC streaming format, one record batch per cursor batch."""
+
+    media_type = "application/vnd.apache.arrow.stream"
+    extension = "arrows"
+
+    def __init__(self, columns: Sequence[str], kinds: Optional[Sequence[str]] = None):
+        super().__init__(columns, kinds)
+        self._writer = None
+
+    def _open(self):
+        if self._writer is None:
+            self._writer = pa.ipc.new_stream(self._sink, self.schema)
+
+    def header(self) -> bytes:
+        if self.schema is not None:
+            self._open()
+        return self._sink.drain()
+
+    def encode(self, rows: Sequence[Sequence]) -> bytes:
+        batch = self._record_batch(rows)
+        self._open()
+        self._writer.write_batch(batch)
+        return self._sink.drain()
+
+    def footer(self) -> bytes:
+        if self.schema is None:
+            self._record_batch([])
+        self._open()
+        self._writer.close()
+        return self._sink.drain()
+
+
+class ParquetEncoder(_ArrowEncoder):
+    """Parquet, flushed one row group at a time; the footer is written last."""
+
+    media_type = "application/vnd.apache.parquet"
+    extension = "parquet"
+
+    def __init__(self, columns: Sequence[str], kinds: Optional[Sequence[str]] = None):
+        super().__init__(columns, kinds)
+        self._writer = None
+        self._pending = []
+        self._pending_rows = 0
+
+    def _flush(self):
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self._sink, self.schema, compression="zstd")
+        if self._pending:
+            self._writer.write_table(pa.Table.from_batches(self._pending, schema=self.schema))
+            self._pending = []
+            self._pending_rows = 0
+
+    def header(self) -> bytes:
+        return b""
+
+    def encode(self, rows: Sequence[Sequence]) -> bytes:
+        self._pending.append(self._record_batch(rows))
+        self._pending_rows += len(rows)
+        if self._pending_rows >= PARQUET_ROW_GROUP_SIZE:
+            self._flush()
+        return self._sink.drain()
+
+    def footer(self) -> bytes:
+        if self.schema is None:
+            self._record_batch([])
+        self._flush()
+        self._writer.close()
+        return self._sink.drain()
+
+
+class XlsxSpooler:
+    """Write rows to an XLSX temp file, flushing each row as it's written."""
+
+    media_type = XLSX_MEDIA_TYPE
+    extension = "xlsx"
+
+    _NATIVE = (str, int, float, bool, decimal.Decimal, datetime.datetime, datetime.date)
+
+    def __init__(self, columns: Sequence[str], sheet_name: str = "Contacts"):
+        if xlsxwriter is None:
+            raise RuntimeError("xlsxwriter is not installed")
+        self.columns = list(columns)
+        self.sheet_name = sheet_name
+        self.path = os.path.join(EXPORT_SPOOL_DIR, f"export_{uuid.uuid4().hex}.xlsx")
+        self._workbook = xlsxwriter.Workbook(self.path, {
+            "constant_memory": True,
+            "tmpdir": EXPORT_SPOOL_DIR,
+            "remove_timezone": True,
+            "default_date_format": "yyyy-mm-dd hh:mm:ss",
+            # Cell text is data: never turn it into formulas or hyperlinks
+            "strings_to_formulas": False,
+            "strings_to_urls": False,
+        })
+        self._sheets = 0
+        self._new_sheet()
+
+    def _new_sheet(self):
+        self._sheets += 1
+        name = self.sheet_name if self._sheets == 1 else f"{self.sheet_name} ({self._sheets})"
+        self._sheet = self._workbook.add_worksheet(name[:31])
+        self._sheet.write_row(0, 0, self.columns)
+        self._row = 1
+
+    def _cell(self, value):
+        if value is None or isinstance(value, self._NATIVE):
+            return value
+        return str(value)
+
+    def write(self, rows: Sequence[Sequence]):
+        for row in rows:
+            if self._row >= XLSX_MAX_ROWS:
+                self._new_sheet()
+            self._sheet.write_row(self._row, 0, [self._cell(value) for value in row])
+            self._row += 1
+
+    def close(self) -> str:
+        self._workbook.close()
+        return self.path
+
+    def discard(self):
+        try:
+            self._workbook.close()
+        except Exception:
+            pass
+        remove_file(self.path)
+
+
+def remove_file(path: str):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def iter_file(path: str, delete: bool = True) -> Iterator[bytes]:
+    """Stream a file in chunks, removing it afterwards."""
+    try:
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(FILE_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        if delete:
+            remove_file(path)
+
+
+# Formats written by an encoder, by export format name
+STREAM_ENCODERS = {
+    "csv": CsvEncoder,
+    "ndjson": NdjsonEncoder,
+    "parquet": ParquetEncoder,
+    "arrow": ArrowStreamEncoder,
+}
+
+
+# ----- Row sources ----- #
+
+async def stream_query(query, params: dict, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[List]:
+    """Yield result rows in batches from an asyncpg server-side cursor."""
+    async with AsyncSessionLocal() as session:
+        result = await session.stream(query.execution_options(yield_per=batch_size), params)
+        async for batch in result.partitions(batch_size):
+            yield batch
+
+
+def stream_query_sync(query, params: dict, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[List]:
+    """Yield result rows in batches from a psycopg2 named cursor."""
+    session = SessionLocal()
+    try:
+        result = session.execute(query.execution_options(stream_results=True, yield_per=batch_size), params)
+        for batch in result.partitions(batch_size):
+            yield batch
+    finally:
+        session.close()
+
+
+async def _prepend(first: List, batches: AsyncIterator[List]) -> AsyncIterator[List]:
+    try:
+        yield first
+        async for batch in batches:
+            yield batch
+    finally:
+        await batches.aclose()
+
+
+def _prepend_sync(first: List, batches: Iterator[List]) -> Iterator[List]:
+    try:
+        yield first
+        yield from batches
+    finally:
+        batches.close()
+
+
+async def open_stream(query, params: dict, batch_size: int = EXPORT_BATCH_SIZE) -> Optional[AsyncIterator[List]]:
+    """Batches of the query's rows, or None (cursor closed) if it returned nothing."""
+    batches = stream_query(query, params, batch_size)
+    first = await anext(batches, None)
+    if first is None:
+        await batches.aclose()
+        return None
+    return _prepend(first, batches)
+
+
+def open_stream_sync(query, params: dict, batch_size: int = EXPORT_BATCH_SIZE) -> Optional[Iterator[List]]:
+    batches = stream_query_sync(query, params, batch_size)
+    first = next(batches, None)
+    if first is None:
+        batches.close()
+        return None
+    return _prepend_sync(first, batches)
+
+
+# ----- Encoding ----- #
+
+async def encode_stream(encoder, batches: AsyncIterator[List]) -> AsyncIterator[bytes]:
+    try:
+        yield encoder.header()
+        async for batch in batches:
+            if encoder.cpu_bound:
+                # pyarrow encoding is CPU bound; keep the event loop free between fetches
+                chunk = await asyncio.to_thread(encoder.encode, batch)
+            else:
+                chunk = encoder.encode(batch)
+            if chunk:
+                yield chunk
+        footer = await asyncio.to_thread(encoder.footer) if encoder.cpu_bound else encoder.footer()
+        if footer:
+            yield footer
+    finally:
+        await batches.aclose()
+
+
+def encode_stream_sync(encoder, batches: Iterator[List]) -> Iterator[bytes]:
+    try:
+        yield encoder.header()
+        for batch in batches:
+            chunk = encoder.encode(batch)
+            if chunk:
+                yield chunk
+        footer = encoder.footer()
+        if footer:
+            yield footer
+    finally:
+        batches.close()
+
+
+async def spool_xlsx(columns: Sequence[str], batches: AsyncIterator[List], sheet_name: str = "Contacts") -> str:
+    """Write all batches to an XLSX temp file and return its path."""
+    spooler = XlsxSpooler(columns, sheet_name)
+    try:
+        async for batch in batches:
+            # xlsxwriter is CPU bound; keep the event loop free between fetches
+            await asyncio.to_thread(spooler.write, batch)
+        return await asyncio.to_thread(spooler.close)
+    except BaseException:
+        spooler.discard()
+        raise
+    finally:
+        await batches.aclose()
+
+
+def spool_xlsx_sync(columns: Sequence[str], batches: Iterator[List], sheet_name: str = "Contacts") -> str:
+    spooler = XlsxSpooler(columns, sheet_name)
+    try:
+        for batch in batches:
+            spooler.write(batch)
+        return spooler.close()
+    except BaseException:
+        spooler.discard()
+        raise
+    finally:
+        batches.close()
+
+
+def write_export_file(
+    format: str, columns: Sequence[str], batches: Iterator[List], kinds: Optional[Sequence[str]] = None
+) -> str:
+    """Write an export in ``format`` ("excel" or a STREAM_ENCODERS key) to a temp file."""
+    if format == "excel":
+        return spool_xlsx_sync(columns, batches)
+    encoder = STREAM_ENCODERS[format](columns, kinds)
+    path = os.path.join(EXPORT_SPOOL_DIR, f"export_{uuid.uuid4().hex}.{encoder.extension}")
+    try:
+        with open(path, "wb") as f:
+            for chunk in encode_stream_sync(encoder, batches):
+                f.write(chunk)
+    except BaseException:
+        remove_file(path)
+        raise
+    return path
@@ -0,0 +1,236 @@
+"""
+Bulk contact upserts against the HubSpot CRM v3 batch endpoints.
+
+HubSpotBulkSync.upsert() matches contacts on email with batch/read
+(idProperty=email, 100 per call), then sends batch/update for the ones that
+exist and batch/create for the rest. Batches run concurrently under a
+request rate limit; rate-limited and server errors are retried with
+backoff, and a batch rejected for bad input is split in halves until the
+offending records are isolated, so only failed items are retried.
+
+Syncing 10k contacts costs about 100 reads + 100 writes instead of a search
+and a PATCH per contact.
+"""
+import time
+import random
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+HUBSPOT_API_URL = "https://api.hubapi.com"
+HUBSPOT_BATCH_SIZE = 100                 # Max inputs per batch call
+HUBSPOT_REQUESTS_PER_SECOND = 9          # OAuth apps get 110 requests / 10 s per account
+HUBSPOT_CONCURRENCY = 4
+HUBSPOT_MAX_RETRIES = 4
+
+_RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+@dataclass
+class BulkSyncResult:
+    created: int = 0
+    updated: int = 0
+    failed: int = 0
+    api_calls: int = 0
+    ids: Dict[str, str] = field(default_factory=dict)     # lowercased email -> HubSpot contact id
+    errors: List[str] = field(default_factory=list)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "created": self.created,
+            "updated": self.updated,
+            "failed": self.failed,
+            "api_calls": self.api_calls,
+            "errors": self.errors[:50],
+        }
+
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart across coroutines."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class HubSpotBulkSync:
+    def __init__(
+        self,
+        access_token: str,
+        base_url: str = HUBSPOT_API_URL,
+        requests_per_second: float = HUBSPOT_REQUESTS_PER_SECOND,
+        concurrency: int = HUBSPOT_CONCURRENCY,
+        max_retries: int = HUBSPOT_MAX_RETRIES,
+    ):
+        self.base_url = base_url
+        self.headers = {"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"}
+        self.limiter = RateLimiter(requests_per_second)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.max_retries = max_retries
+        self.result = BulkSyncResult()
+
+    # ----- HTTP ----- #
+
+    async def _post(self, client: httpx.AsyncClient, path: str, payload: Dict) -> httpx.Response:
+        """POST with rate limiting; retries 429 / 5xx / network errors with backoff."""
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.wait()
+            self.result.api_calls += 1
+            try:
+                async with self.semaphore:
+                    response = await client.post(f"{self.base_url}{path}", headers=self.headers, json=payload)
+            except httpx.TransportError as e:
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"HubSpot {path}: {e}, retrying")
+                await asyncio.sleep(2 ** attempt + random.random())
+                continue
+            if response.status_code not in _RETRY_STATUSES or attempt == self.max_retries:
+                return response
+            retry_after = response.headers.get("Retry-After")
+            delay = float(retry_after) if retry_after and retry_after.isdigit() else 2 ** attempt + random.random()
+            logger.warning(f"HubSpot {path}: {response.status_code}, retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+        raise RuntimeError("unreachable")
+
+    # ----- Steps ----- #
+
+    async def _read_existing(self, client: httpx.AsyncClient, emails: List[str]) -> Dict[str, str]:
+        """email -> HubSpot id for the emails that already exist."""
+        response = await self._post(client, "/crm/v3/objects/contacts/batch/read", {
+            "idProperty": "email",
+            "properties": ["email"],
+            "inputs": [{"id": email} for email in emails],
+        })
+        if response.status_code not in (200, 207):
+            raise RuntimeError(f"batch/read failed: {response.status_code} - {response.text[:300]}")
+        found = {}
+        for record in response.json().get("results", []):
+            email = (record.get("properties", {}).get("email") or "").lower()
+            if email:
+                found[email] = record["id"]
+        return found
+
+    async def _write(self, client: httpx.AsyncClient, action: str, inputs: List[Dict]):
+        """batch/create or batch/update; isolates bad records by splitting the batch."""
+        response = await self._post(client, f"/crm/v3/objects/contacts/batch/{action}", {"inputs": inputs})
+        status = response.status_code
+
+        if status in (200, 201, 207):
+            data = response.json()
+            results = data.get("results", [])
+            for record in results:
+                email = (record.get("properties", {}).get("email") or "").lower()
+                if email:
+                    self.result.ids[email] = record["id"]
+            if action == "create":
+                self.result.created += len(results)
+            else:
+                self.result.updated += len(results)
+            missing = len(inputs) - len(results)
+            if missing > 0:
+                self.result.failed += missing
+                for error in data.get("errors", [])[:5]:
+                    self.result.errors.append(f"{action}: {error.get('message', error)}")
+            return
+
+        if action == "create" and status == 409:
+            # Created concurrently since our read: update those instead
+            emails = [i["properties"].get("email", "").lower() for i in inputs if i["properties"].get("email")]
+            existing = await self._read_existing(client, emails) if emails else {}
+            updates = [
+                {"id": existing[i["properties"]["email"].lower()], "properties": i["properties"]}
+                for i in inputs if i["properties"].get("email", "").lower() in existing
+            ]
+            creates = [i for i in inputs if i["properties"].get("email", "").lower() not in existing]
+            if updates:
+                await self._write(client, "update", updates)
+            if creates and len(creates) < len(inputs):
+                await self._write(client, "create", creates)
+            elif creates:
+                self._fail(action, creates, response)
+            return
+
+        if status in (400, 409) and len(inputs) > 1:
+            middle = len(inputs) // 2
+            await asyncio.gather(
+                self._write(client, action, inputs[:middle]),
+                self._write(client, action, inputs[middle:]),
+            )
+            return
+
+        self._fail(action, inputs, response)
+
+    def _fail(self, action: str, inputs: List[Dict], response: httpx.Response):
+        self.result.failed += len(inputs)
+        label = inputs[0]["properties"].get("email", "") if len(inputs) == 1 else f"{len(inputs)} contacts"
+        self.result.errors.append(f"{action} {label}: {response.status_code} - {response.text[:300]}")
+
+    # ----- Entry point ----- #
+
+    async def upsert(self, contacts: List[Dict[str, Any]]) -> BulkSyncResult:
+        """
+        Create or update contacts given as HubSpot property dicts.
+
+        Contacts are matched on ``email`` (case-insensitive; later duplicates
+        win). Contacts without an email are always created.
+        """
+        by_email: Dict[str, Dict[str, Any]] = {}
+        no_email: List[Dict[str, Any]] = []
+        for properties in contacts:
+            email = (properties.get("email") or "").strip().lower()
+            if email:
+                by_email[email] = properties
+            else:
+                no_email.append(properties)
+
+        emails = list(by_email)
+        async with httpx.AsyncClient(timeout=60.0, limits=httpx.Limits(max_connections=HUBSPOT_CONCURRENCY * 2)) as client:
+            reads = await asyncio.gather(*[
+                self._read_existing(client, emails[i:i + HUBSPOT_BATCH_SIZE])
+                for i in range(0, len(emails), HUBSPOT_BATCH_SIZE)
+            ], return_exceptions=True)
+
+            existing: Dict[str, str] = {}
+            unresolved = 0
+            for i, read in enumerate(reads):
+                if isinstance(read, Exception):
+                    # Unknown state: leave these out rather than risk duplicates
+                    chunk = emails[i * HUBSPOT_BATCH_SIZE:(i + 1) * HUBSPOT_BATCH_SIZE]
+                    unresolved += len(chunk)
+                    for email in chunk:
+                        by_email.pop(email, None)
+                    self.result.errors.append(f"read: {read}")
+                else:
+                    existing.update(read)
+            self.result.failed += unresolved
+            self.result.ids.update(existing)
+
+            updates = [{"id": existing[email], "properties": props} for email, props in by_email.items() if email in existing]
+            creates = [{"properties": props} for email, props in by_email.items() if email not in existing]
+            creates += [{"properties": props} for props in no_email]
+
+            await asyncio.gather(
+                *[self._write(client, "update", updates[i:i + HUBSPOT_BATCH_SIZE]) for i in range(0, len(updates), HUBSPOT_BATCH_SIZE)],
+                *[self._write(client, "create", creates[i:i + HUBSPOT_BATCH_SIZE]) for i in range(0, len(creates), HUBSPOT_BATCH_SIZE)],
+            )
+
+        logger.info(
+            f"HubSpot bulk upsert: {self.result.created} created, {self.result.updated} updated, "
+            f"{self.result.failed} failed in {self.result.api_calls} API calls"
+        )
+        return self.result
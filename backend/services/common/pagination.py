@@ -0,0 +1,86 @@
+"""
+Keyset pagination helpers shared by the contact listing endpoints.
+
+Listings are ordered by (created_at DESC, id DESC). A cursor encodes the
+last row of a page so the next page is a range scan on the composite
+index instead of an OFFSET that reads and discards every previous row.
+Total counts are cached briefly per user and filter set so paging does
+not repeat the COUNT(*) on every request.
+"""
+import time
+import json
+import base64
+import threading
+from datetime import datetime
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+COUNT_CACHE_TTL = 60        # Seconds a total count is reused
+COUNT_CACHE_SIZE = 5000
+
+# Keyset predicate for "rows after the cursor" in (created_at DESC, id DESC) order
+KEYSET_CONDITION = "(c.created_at, c.id) < (:cursor_created_at, :cursor_id)"
+KEYSET_ORDER = "c.created_at DESC, c.id DESC"
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Opaque cursor for the row a page ended on."""
+    raw = json.dumps([created_at.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor. Raises ValueError on a malformed cursor."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def next_cursor(rows: List[Any], limit: int, created_at_key: str = "created_at", id_key: str = "id") -> Optional[str]:
+    """
+    Cursor for the following page, given ``limit + 1`` fetched rows.
+
+    Trims the extra row from ``rows`` in place; returns None on the last page.
+    """
+    if len(rows) <= limit:
+        return None
+    del rows[limit:]
+    last = rows[-1]._mapping
+    return encode_cursor(last[created_at_key], last[id_key])
+
+
+class CountCache:
+    """Small in-process TTL cache for COUNT(*) results."""
+
+    def __init__(self, ttl: int = COUNT_CACHE_TTL, max_entries: int = COUNT_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: Dict[Hashable, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(scope: str, params: Dict[str, Any]) -> Hashable:
+        """Cache key for a listing scope and its filter parameters."""
+        return scope, tuple(sorted((k, str(v)) for k, v in params.items()))
+
+    def get(self, key: Hashable) -> Optional[int]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                return None
+            return entry[0]
+
+    def set(self, key: Hashable, value: int):
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                now = time.monotonic()
+                self._entries = {k: v for k, v in self._entries.items() if v[1] > now}
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+
+
+# Global instance
+count_cache = CountCache()
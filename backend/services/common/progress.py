@@ -0,0 +1,169 @@
+"""
+Push channel for import job progress.
+
+Workers publish a small delta on ``job_progress:<job_id>`` after each
+contact is saved. import-service keeps one Redis subscription per process
+and fans the deltas out to every client streaming that job, so watching a
+running job costs no database reads beyond the initial snapshot.
+
+Each delta carries the job_stats.version its write produced (the triggers
+bump it on every change, under the row lock, so versions follow commit
+order). A client applies only deltas newer than the version of its
+snapshot: a delta published after the snapshot was read but for a write
+the snapshot already includes is dropped instead of counted twice.
+"""
+import json
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+try:
+    import redis
+    import redis.asyncio as aioredis
+except ImportError:  # Progress push is optional; clients fall back to polling
+    redis = None
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_CHANNEL_PREFIX = "job_progress:"
+SUBSCRIBER_QUEUE_SIZE = 256      # Deltas buffered per client before it must resync
+RECONNECT_DELAY = 2              # Seconds between Redis reconnect attempts
+
+# Sent to a client whose deltas were dropped; it should reload the snapshot
+RESYNC = {"resync": True}
+
+
+def progress_channel(job_id: str) -> str:
+    return f"{PROGRESS_CHANNEL_PREFIX}{job_id}"
+
+
+def contact_progress_delta(contact: Dict[str, Any], version: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Delta for one newly saved contact (same counters as job_stats);
+    ``version`` is the job_stats.version read back in the saving transaction.
+    """
+    score = contact.get("enrichment_score")
+    return {
+        "version": version,
+        "processed": 1,
+        "enriched": 1 if contact.get("enriched") else 0,
+        "emails": 1 if contact.get("email") else 0,
+        "phones": 1 if contact.get("phone") else 0,
+        "credits": contact.get("credits_consumed") or 0,
+        "score": float(score) if score is not None else None,
+    }
+
+
+# ----- Publishing (sync, for Celery workers) ----- #
+
+_publisher = None
+
+
+def publish_job_progress(redis_url: str, job_id: str, delta: Dict[str, Any]):
+    """Publish a progress delta. Never raises: progress push is best effort."""
+    global _publisher
+    if redis is None:
+        return
+    try:
+        if _publisher is None:
+            _publisher = redis.Redis.from_url(redis_url, socket_timeout=0.5)
+        _publisher.publish(progress_channel(job_id), json.dumps(delta))
+    except Exception as e:
+        logger.warning(f"Job progress publish failed for {job_id}: {e}")
+
+
+# ----- Fan-out (async, for import-service) ----- #
+
+class JobProgressHub:
+    """One Redis pub/sub connection per process, shared by all job streams."""
+
+    def __init__(self, redis_url: Optional[str]):
+        self.redis_url = redis_url
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._client = None
+        self._pubsub = None
+        self._reader: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def available(self) -> bool:
+        return aioredis is not None and bool(self.redis_url)
+
+    async def _connect(self):
+        if self._client is None:
+            self._client = aioredis.from_url(self.redis_url, decode_responses=True)
+        self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        if self._subscribers:
+            await self._pubsub.subscribe(*self._subscribers)
+
+    @asynccontextmanager
+    async def subscribe(self, job_id: str) -> AsyncIterator[asyncio.Queue]:
+        """Queue receiving every delta published for ``job_id`` while open."""
+        channel = progress_channel(job_id)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        async with self._lock:
+            if self._pubsub is None:
+                await self._connect()
+            if channel not in self._subscribers:
+                await self._pubsub.subscribe(channel)
+            self._subscribers.setdefault(channel, set()).add(queue)
+            if self._reader is None or self._reader.done():
+                self._reader = asyncio.get_running_loop().create_task(self._read())
+        try:
+            yield queue
+        finally:
+            async with self._lock:
+                queues = self._subscribers.get(channel, set())
+                queues.discard(queue)
+                if not queues:
+                    self._subscribers.pop(channel, None)
+                    try:
+                        await self._pubsub.unsubscribe(channel)
+                    except Exception:
+                        pass
+
+    def _dispatch(self, channel: str, delta: Dict[str, Any]):
+        for queue in list(self._subscribers.get(channel, ())):
+            try:
+                queue.put_nowait(delta)
+            except asyncio.QueueFull:
+                # Slow client: drop its backlog and have it reload the snapshot
+                self._resync(queue)
+
+    async def _read(self):
+        """Route messages to subscriber queues. Reconnects on errors."""
+        while True:
+            try:
+                if not self._subscribers:
+                    await asyncio.sleep(0.5)
+                    continue
+                message = await self._pubsub.get_message(timeout=1.0)
+                if message and message.get("type") == "message":
+                    self._dispatch(message["channel"], json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Job progress listener error: {e}")
+                await asyncio.sleep(RECONNECT_DELAY)
+                async with self._lock:
+                    try:
+                        await self._pubsub.aclose()
+                    except Exception:
+                        pass
+                    try:
+                        await self._connect()
+                    except Exception as e:
+                        logger.warning(f"Job progress reconnect failed: {e}")
+                        continue
+                # Deltas may have been missed while disconnected
+                for queues in list(self._subscribers.values()):
+                    for queue in list(queues):
+                        self._resync(queue)
+
+    @staticmethod
+    def _resync(queue: asyncio.Queue):
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(RESYNC)
@@ -0,0 +1,191 @@
+"""
+Per-user response cache for read-heavy endpoints.
+
+Responses are stored in Redis under the endpoint scope and its parameters,
+tagged with the user's data generation. Writers that change a user's
+contacts or credits call common.events.publish_user_data_changed(), which
+bumps that generation, so every cached response for the user is stale at
+once without scanning keys.
+
+Each response carries an ETag; a request whose If-None-Match still matches
+gets an empty 304.
+"""
+import time
+import json
+import asyncio
+import hashlib
+import inspect
+import logging
+import functools
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.params import Depends as DependsParam
+
+try:
+    import redis
+    import redis.asyncio as aioredis
+except ImportError:  # Caching is optional; endpoints run uncached
+    redis = None
+    aioredis = None
+
+from common.events import user_generation_key
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_TTL = 300                 # Seconds; bounds staleness if an event is lost
+RESPONSE_CACHE_PREFIX = "respcache:v1:"
+REDIS_RETRY_AFTER = 30                   # Seconds to skip Redis after a connection error
+
+
+# ----- Cache ----- #
+
+class ResponseCache:
+    """Redis-backed response cache with sync and async access."""
+
+    def __init__(self, redis_url: Optional[str], ttl: int = RESPONSE_CACHE_TTL):
+        self.redis_url = redis_url
+        self.ttl = ttl
+        self._sync = None
+        self._async = None
+        self._down_until = 0.0
+
+    def _usable(self) -> bool:
+        return redis is not None and bool(self.redis_url) and time.time() >= self._down_until
+
+    def _failed(self, e: Exception):
+        logger.warning(f"Response cache: Redis unavailable for {REDIS_RETRY_AFTER}s: {e}")
+        self._down_until = time.time() + REDIS_RETRY_AFTER
+
+    def _sync_client(self):
+        if self._sync is None:
+            self._sync = redis.Redis.from_url(self.redis_url, socket_timeout=0.5, decode_responses=True)
+        return self._sync
+
+    def _async_client(self):
+        if self._async is None:
+            self._async = aioredis.from_url(self.redis_url, socket_timeout=0.5, decode_responses=True)
+        return self._async
+
+    @staticmethod
+    def key(user_id: str, scope: str, params: Dict[str, Any]) -> str:
+        digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+        return f"{RESPONSE_CACHE_PREFIX}{user_id}:{scope}:{digest}"
+
+    @staticmethod
+    def _decode(values) -> Tuple[str, Optional[Dict[str, str]]]:
+        """(current generation, cached entry if it belongs to that generation)"""
+        generation, raw = values
+        generation = generation or "0"
+        if raw is None:
+            return generation, None
+        entry = json.loads(raw)
+        return generation, entry if entry.get("gen") == generation else None
+
+    def _encode(self, generation: str, body: str) -> Tuple[str, str]:
+        etag = f'"{hashlib.sha1(body.encode()).hexdigest()}"'
+        return etag, json.dumps({"gen": generation, "etag": etag, "body": body})
+
+    def lookup_sync(self, user_id: str, key: str) -> Tuple[Optional[str], Optional[Dict[str, str]]]:
+        if not self._usable():
+            return None, None
+        try:
+            return self._decode(self._sync_client().mget(user_generation_key(user_id), key))
+        except Exception as e:
+            self._failed(e)
+            return None, None
+
+    def store_sync(self, key: str, generation: Optional[str], body: str) -> str:
+        etag, value = self._encode(generation or "0", body)
+        if generation is not None and self._usable():
+            try:
+                self._sync_client().set(key, value, ex=self.ttl)
+            except Exception as e:
+                self._failed(e)
+        return etag
+
+    async def lookup(self, user_id: str, key: str) -> Tuple[Optional[str], Optional[Dict[str, str]]]:
+        if not self._usable():
+            return None, None
+        try:
+            return self._decode(await self._async_client().mget(user_generation_key(user_id), key))
+        except Exception as e:
+            self._failed(e)
+            return None, None
+
+    async def store(self, key: str, generation: Optional[str], body: str) -> str:
+        etag, value = self._encode(generation or "0", body)
+        if generation is not None and self._usable():
+            try:
+                await self._async_client().set(key, value, ex=self.ttl)
+            except Exception as e:
+                self._failed(e)
+        return etag
+
+
+def _respond(request: Request, etag: str, body: str) -> Response:
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def cached_response(cache: ResponseCache, scope: str):
+    """
+    Cache a GET endpoint's JSON response per user.
+
+    The endpoint must take a ``user_id`` argument (path parameter or the
+    verify_api_token dependency). Non-dependency arguments form the cache
+    key. Works for both ``def`` and ``async def`` endpoints; responses that
+    aren't plain data (e.g. a Response object) are passed through uncached.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        key_params = [
+            name for name, param in signature.parameters.items()
+            if name != "user_id" and not isinstance(param.default, DependsParam)
+        ]
+        has_request = "request" in signature.parameters
+        if not has_request:
+            signature = signature.replace(parameters=[
+                *signature.parameters.values(),
+                inspect.Parameter("request", inspect.Parameter.KEYWORD_ONLY, annotation=Request),
+            ])
+
+        def prepare(kwargs):
+            request = kwargs["request"] if has_request else kwargs.pop("request")
+            user_id = str(kwargs["user_id"])
+            params = jsonable_encoder({name: kwargs.get(name) for name in key_params if name != "request"})
+            return request, user_id, cache.key(user_id, scope, params)
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                request, user_id, key = prepare(kwargs)
+                generation, entry = await cache.lookup(user_id, key)
+                if entry:
+                    return _respond(request, entry["etag"], entry["body"])
+                result = await func(*args, **kwargs)
+                if isinstance(result, Response):
+                    return result
+                body = json.dumps(jsonable_encoder(result))
+                etag = await cache.store(key, generation, body)
+                return _respond(request, etag, body)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                request, user_id, key = prepare(kwargs)
+                generation, entry = cache.lookup_sync(user_id, key)
+                if entry:
+                    return _respond(request, entry["etag"], entry["body"])
+                result = func(*args, **kwargs)
+                if isinstance(result, Response):
+                    return result
+                body = json.dumps(jsonable_encoder(result))
+                etag = cache.store_sync(key, generation, body)
+                return _respond(request, etag, body)
+
+        wrapper.__signature__ = signature
+        return wrapper
+    return decorator
@@ -0,0 +1,45 @@
+"""
+Contact search backed by the pg_trgm index from
+migrations/add_contact_search_index.sql.
+
+Matches substrings (the old ILIKE '%term%' behaviour, now index-assisted)
+and, for short typos, whole words by trigram word similarity. Results are
+ranked by how well the term matches the contact.
+"""
+from typing import Any, Dict, Tuple
+
+# Must stay identical to the indexed expression
+SEARCH_TEXT_SQL = "contact_search_text({a}.first_name, {a}.last_name, {a}.email, {a}.company, {a}.position)"
+
+# Shortest term for fuzzy matching; shorter terms only match as substrings
+FUZZY_MIN_LENGTH = 4
+
+
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def contact_search(search: str, alias: str = "c") -> Tuple[str, str, Dict[str, Any]]:
+    """
+    SQL for searching contacts.
+
+    Returns ``(condition, rank, params)``: a WHERE condition, an expression to
+    ORDER BY ... DESC for relevance, and their bind parameters.
+    """
+    term = " ".join(search.lower().split())
+    search_text = SEARCH_TEXT_SQL.format(a=alias)
+    params = {
+        "search_term": term,
+        "search_pattern": f"%{_escape_like(term)}%",
+    }
+
+    condition = f"{search_text} LIKE :search_pattern"
+    if len(term) >= FUZZY_MIN_LENGTH:
+        condition = f"({condition} OR :search_term <% {search_text})"
+
+    # Substring hits first, then closest word match
+    rank = (
+        f"(CASE WHEN {search_text} LIKE :search_pattern THEN 1 ELSE 0 END"
+        f" + word_similarity(:search_term, {search_text}))"
+    )
+    return condition, rank, params
@@ -0,0 +1,105 @@
+"""
+Object storage for uploaded and generated files.
+
+get_s3_client() builds the boto3 client from the AWS_* settings, or returns
+None when S3 isn't configured. ArtifactStore keeps files under a key in S3
+when it has a client and bucket, and in a local directory otherwise.
+"""
+import os
+import shutil
+import logging
+from typing import Optional, Tuple
+
+try:
+    import boto3
+except ImportError:  # S3 is optional; files stay on local disk
+    boto3 = None
+
+from common.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+
+def get_s3_client():
+    """S3 client from AWS_* settings, or None if unavailable."""
+    if boto3 is None or not settings.aws_access_key_id:
+        return None
+    try:
+        return boto3.client(
+            "s3",
+            aws_access_key_id=settings.aws_access_key_id,
+            aws_secret_access_key=settings.aws_secret_access_key,
+            region_name=settings.aws_default_region,
+        )
+    except Exception as e:
+        logger.warning(f"S3 client initialization failed: {e}")
+        return None
+
+
+class ArtifactStore:
+    """Generated files by key, in S3 or under ``local_dir``."""
+
+    def __init__(self, local_dir: str, bucket: Optional[str] = None, s3=None):
+        self.local_dir = local_dir
+        self.bucket = bucket
+        self.s3 = s3 if bucket else None
+
+    @property
+    def backend(self) -> str:
+        return "s3" if self.s3 else "local"
+
+    def local_path(self, key: str) -> str:
+        path = os.path.realpath(os.path.join(self.local_dir, key))
+        if not path.startswith(os.path.realpath(self.local_dir) + os.sep):
+            raise ValueError(f"Artifact key escapes storage dir: {key!r}")
+        return path
+
+    def save(self, path: str, key: str) -> Tuple[str, int]:
+        """Move the file at ``path`` into storage; returns (backend, size)."""
+        size = os.path.getsize(path)
+        if self.s3:
+            try:
+                self.s3.upload_file(path, self.bucket, key)
+            finally:
+                os.unlink(path)
+            return "s3", size
+        target = self.local_path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.move(path, target)
+        return "local", size
+
+    def exists(self, backend: str, key: str) -> bool:
+        if backend == "s3":
+            if not self.s3:
+                return False
+            try:
+                self.s3.head_object(Bucket=self.bucket, Key=key)
+                return True
+            except Exception:
+                return False
+        return os.path.exists(self.local_path(key))
+
+    def presigned_url(self, key: str, filename: str, expires_in: int = 3600) -> str:
+        return self.s3.generate_presigned_url(
+            "get_object",
+            Params={
+                "Bucket": self.bucket,
+                "Key": key,
+                "ResponseContentDisposition": f"attachment; filename={filename}",
+            },
+            ExpiresIn=expires_in,
+        )
+
+    def delete(self, backend: str, key: str):
+        try:
+            if backend == "s3":
+                if self.s3:
+                    self.s3.delete_object(Bucket=self.bucket, Key=key)
+            else:
+                os.unlink(self.local_path(key))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Could not delete artifact {key}: {e}")
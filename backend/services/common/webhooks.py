@@ -0,0 +1,91 @@
+"""
+Outbound webhook outbox.
+
+Services don't POST to webhooks (Zapier Catch Hooks, ...) inline: they
+enqueue one webhook_outbox row per item in the same transaction as the rest
+of their writes and return. The webhook dispatcher (export-service
+app/webhook_dispatcher.py) delivers the rows.
+
+Rows for the same user, destination, event, mode and envelope (compared by
+envelope_hash) are delivered together: a group is sent once it holds
+WEBHOOK_BATCH_SIZE items or its oldest item has waited WEBHOOK_BATCH_WAIT
+seconds. A batch-mode group is sent as one
+``{...envelope, "total_contacts": n, "contacts": [...]}`` object; otherwise
+as a JSON array of ``{...envelope, ...item}`` objects, which Zapier Catch
+Hooks split into one Zap run per element, so per-contact delivery still
+costs a single request.
+
+The envelope is stored without a send time (a per-call timestamp would give
+every call its own envelope_hash, so nothing would batch); webhook_body()
+adds ``timestamp`` when the group is sent.
+
+Bodies are gzip-encoded only for destinations queued with ``gzip=True``:
+Zapier Catch Hooks and most receivers aren't documented to accept
+Content-Encoding, so it is off by default.
+"""
+import os
+import gzip
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+WEBHOOK_BATCH_SIZE = int(os.environ.get("WEBHOOK_BATCH_SIZE", "500"))
+WEBHOOK_BATCH_WAIT = float(os.environ.get("WEBHOOK_BATCH_WAIT_SECONDS", "2"))
+WEBHOOK_GZIP_MIN_BYTES = 1024           # Smaller bodies aren't worth compressing
+
+
+async def enqueue_webhooks(
+    session: AsyncSession,
+    user_id: str,
+    destination: str,
+    event: str,
+    items: List[Dict[str, Any]],
+    envelope: Optional[Dict[str, Any]] = None,
+    batch_mode: bool = True,
+    gzip: bool = False,
+) -> List[int]:
+    """
+    Queue ``items`` for delivery to ``destination``; returns the outbox ids
+    in item order. Pass ``gzip=True`` only for destinations known to accept
+    gzip-encoded bodies. Nothing is committed.
+    """
+    if not items:
+        return []
+    result = await session.execute(text("""
+        INSERT INTO webhook_outbox (user_id, destination, event, batch_mode, envelope, envelope_hash, payload, gzip)
+        SELECT :user_id, :destination, :event, :batch_mode, e.envelope, md5(e.envelope::text), i.item, :gzip
+        FROM CAST(:envelope AS jsonb) AS e(envelope),
+             jsonb_array_elements(CAST(:items AS jsonb)) WITH ORDINALITY AS i(item, n)
+        ORDER BY i.n
+        RETURNING id
+    """), {
+        "user_id": str(user_id),
+        "destination": destination,
+        "event": event,
+        "batch_mode": batch_mode,
+        "gzip": gzip,
+        "envelope": json.dumps(envelope or {}, default=str),
+        "items": json.dumps(items, default=str),
+    })
+    return sorted(result.scalars().all())
+
+
+def webhook_body(envelope: Dict[str, Any], items: List[Dict[str, Any]], batch_mode: bool) -> Any:
+    """The JSON document delivered for one group of outbox items, stamped with the send time."""
+    envelope = {**envelope, "timestamp": datetime.utcnow().isoformat()}
+    if batch_mode:
+        return {**envelope, "total_contacts": len(items), "contacts": items}
+    return [{**envelope, **item} for item in items]
+
+
+def encode_body(body: Any, compress: bool = False) -> Tuple[bytes, Dict[str, str]]:
+    """Serialized request body and headers, gzip-encoded if ``compress`` and large enough."""
+    data = json.dumps(body, default=str, separators=(",", ":")).encode()
+    headers = {"Content-Type": "application/json"}
+    if compress and len(data) >= WEBHOOK_GZIP_MIN_BYTES:
+        data = gzip.compress(data, compresslevel=6)
+        headers["Content-Encoding"] = "gzip"
+    return data, headers
@@ -11,7 +11,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from jose import jwt, JWTError
 
 from common.config import get_settings
-from common.db import get_async_session, SessionLocal
+from common.db import get_async_session, SessionLocal, pool_metrics
 from common.celery_app import celery_app
 from common.auth import verify_api_token
 
@@ -214,9 +214,7 @@ async def get_credit_info(
                     COALESCE(AVG(CASE WHEN email IS NOT NULL AND email != '' THEN 1.0 ELSE 0.0 END) * 100, 0) as email_hit_rate,
                     COALESCE(AVG(CASE WHEN phone IS NOT NULL AND phone != '' THEN 1.0 ELSE 0.0 END) * 100, 0) as phone_hit_rate
                 FROM contacts 
-                WHERE job_id IN (
-                    SELECT id FROM import_jobs WHERE user_id = :user_id
-                )
+                WHERE user_id = :user_id
             """)
             stats_result = await session.execute(stats_query, {"user_id": user_id})
             stats_row = stats_result.fetchone()
@@ -445,6 +443,11 @@ async def check_and_decrement(data: dict, session: AsyncSession = Depends(get_as
 
 app.include_router(router)
 
+@app.get("/health/db-pool")
+async def db_pool_health():
+    """Connection pool checkout wait times and usage"""
+    return pool_metrics()
+
 @app.get("/health")
 async def health():
     return {"status": "healthy", "service": "credit-service"}
@@ -16,7 +16,12 @@ from sqlalchemy import Column, String, DateTime, Text, Enum, Boolean, Integer, F
 from sqlalchemy.dialects.postgresql import UUID
 from pydantic import BaseModel
 from common.config import get_settings
-from common.db import async_engine, AsyncSessionLocal, get_async_session
+from common.db import async_engine, AsyncSessionLocal, get_async_session, pool_metrics
+from common.events import publish_user_data_changed_async
+from common.pagination import (
+    KEYSET_CONDITION, KEYSET_ORDER, count_cache, decode_cursor, next_cursor
+)
+from common.search import contact_search
 
 # Get settings
 settings = get_settings()
@@ -274,7 +279,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Health check endpoint
+# Health check endpoints
+@app.get("/health/db-pool")
+async def db_pool_health():
+    """Connection pool checkout wait times and usage"""
+    return pool_metrics()
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "service": "crm-service"}
@@ -287,25 +297,24 @@ async def get_contacts(
     search: Optional[str] = Query(None),
     enriched_only: bool = Query(False),
     job_id: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page (overrides page)"),
     user_id: str = Depends(get_current_user_id),
     session: AsyncSession = Depends(get_async_session)
 ):
     """Get paginated list of enriched contacts for the authenticated user"""
     try:
-        offset = (page - 1) * limit
         
         # Build base query with user filtering
-        where_conditions = ["j.user_id = :user_id"]  # Always filter by user (from import_jobs table)
+        where_conditions = ["c.user_id = :user_id"]  # Always filter by user (denormalized from import_jobs)
         params = {"user_id": user_id}
         
-        if search:
-            where_conditions.append("""
-                (LOWER(c.first_name) LIKE LOWER(:search) OR 
-                 LOWER(c.last_name) LIKE LOWER(:search) OR 
-                 LOWER(c.company) LIKE LOWER(:search) OR
-                 LOWER(c.email) LIKE LOWER(:search))
-            """)
-            params["search"] = f"%{search}%"
+        # Trigram-indexed search, ranked by relevance
+        order_by = KEYSET_ORDER
+        if search and search.strip():
+            search_condition, search_rank, search_params = contact_search(search)
+            where_conditions.append(search_condition)
+            params.update(search_params)
+            order_by = f"{search_rank} DESC, {KEYSET_ORDER}"
         
         if enriched_only:
             where_conditions.append("c.enriched = true")
@@ -316,15 +325,31 @@ async def get_contacts(
         
         where_clause = "WHERE " + " AND ".join(where_conditions)
         
-        # Get total count
-        count_query = f"""
-            SELECT COUNT(*) 
-            FROM contacts c
-            JOIN import_jobs j ON c.job_id = j.id 
-            {where_clause}
-        """
-        count_result = await session.execute(text(count_query), params)
-        total = count_result.scalar()
+        # Get total count (cached per user + filters while paging)
+        count_key = count_cache.key("crm:contacts", params)
+        total = count_cache.get(count_key)
+        if total is None:
+            count_query = f"""
+                SELECT COUNT(*) 
+                FROM contacts c
+                {where_clause}
+            """
+            count_result = await session.execute(text(count_query), params)
+            total = count_result.scalar() or 0
+            count_cache.set(count_key, total)
+        
+        # Keyset pagination when a cursor is given, OFFSET otherwise
+        offset = 0
+        if cursor and order_by != KEYSET_ORDER:
+            raise HTTPException(status_code=400, detail="Search results are ranked; page through them with page instead of cursor")
+        if cursor:
+            try:
+                params["cursor_created_at"], params["cursor_id"] = decode_cursor(cursor)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            where_clause += f" AND {KEYSET_CONDITION}"
+        else:
+            offset = (page - 1) * limit
         
         # Get contacts with job info
         contacts_query = f"""
@@ -338,15 +363,21 @@ async def get_contacts(
             FROM contacts c
             JOIN import_jobs j ON c.job_id = j.id 
             {where_clause}
-            ORDER BY c.created_at DESC
+            ORDER BY {order_by}
             LIMIT :limit OFFSET :offset
         """
-        params.update({"limit": limit, "offset": offset})
+        # One extra row tells us whether there is a next page
+        params.update({"limit": limit + 1, "offset": offset})
         
         contacts_result = await session.execute(text(contacts_query), params)
+        rows = contacts_result.fetchall()
+        cursor_next = next_cursor(rows, limit)
+        has_next = cursor_next is not None
+        if order_by != KEYSET_ORDER:
+            cursor_next = None
         contacts = []
         
-        for row in contacts_result.fetchall():
+        for row in rows:
             contact = dict(row._mapping)
             # Format dates
             if contact['created_at']:
@@ -362,11 +393,14 @@ async def get_contacts(
                 "page": page,
                 "limit": limit,
                 "pages": (total + limit - 1) // limit,
-                "has_next": offset + limit < total,
-                "has_prev": page > 1
+                "has_next": has_next,
+                "has_prev": bool(cursor) or page > 1,
+                "next_cursor": cursor_next
             }
         })
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching contacts: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -389,7 +423,7 @@ async def get_contact(
                 c.job_id, j.status as job_status
             FROM contacts c
             JOIN import_jobs j ON c.job_id = j.id 
-            WHERE c.id = :contact_id AND j.user_id = :user_id
+            WHERE c.id = :contact_id AND c.user_id = :user_id
         """
         result = await session.execute(text(query), {
             "contact_id": contact_id, 
@@ -432,8 +466,7 @@ async def get_enrichment_stats(
                 SUM(c.credits_consumed) as total_credits_used,
                 AVG(CASE WHEN c.enrichment_score IS NOT NULL THEN c.enrichment_score END) as avg_confidence
             FROM contacts c
-            JOIN import_jobs j ON c.job_id = j.id
-            WHERE j.user_id = :user_id
+            WHERE c.user_id = :user_id
         """
         
         result = await session.execute(text(stats_query), {"user_id": user_id})
@@ -448,8 +481,7 @@ async def get_enrichment_stats(
                 COUNT(CASE WHEN c.phone IS NOT NULL THEN 1 END) as phones_found,
                 AVG(c.enrichment_score) as avg_confidence
             FROM contacts c
-            JOIN import_jobs j ON c.job_id = j.id
-            WHERE c.enrichment_provider IS NOT NULL AND j.user_id = :user_id
+            WHERE c.enrichment_provider IS NOT NULL AND c.user_id = :user_id
             GROUP BY c.enrichment_provider
             ORDER BY contacts DESC
         """
@@ -505,8 +537,7 @@ async def get_recent_contacts(
                 c.email, c.phone, c.enrichment_provider, c.enrichment_score, 
                 c.credits_consumed, c.created_at
             FROM contacts c
-            JOIN import_jobs j ON c.job_id = j.id
-            WHERE c.enriched = true AND j.user_id = :user_id
+            WHERE c.enriched = true AND c.user_id = :user_id
             ORDER BY c.created_at DESC
             LIMIT :limit
         """
@@ -611,8 +642,7 @@ async def delete_contact(
         # Check if contact exists and belongs to user
         check_query = """
             SELECT c.id FROM contacts c
-            JOIN import_jobs j ON c.job_id = j.id
-            WHERE c.id = :contact_id AND j.user_id = :user_id
+            WHERE c.id = :contact_id AND c.user_id = :user_id
         """
         check_result = await session.execute(text(check_query), {
             "contact_id": contact_id, 
@@ -626,6 +656,7 @@ async def delete_contact(
         delete_query = "DELETE FROM contacts WHERE id = :contact_id"
         await session.execute(text(delete_query), {"contact_id": contact_id})
         await session.commit()
+        await publish_user_data_changed_async(settings.redis_url, user_id)
         
         return JSONResponse(content={"message": "Contact deleted successfully"})
         
@@ -0,0 +1,277 @@
+# services/enrichment-worker/app/bulk_verification.py
+"""
+Bulk verification pipeline for contacts that already exist in a job.
+
+Emails are grouped by domain and each domain's DNS is resolved once up front
+(through enrichment.dns_cache); addresses are then verified with bounded
+concurrency. Phones are verified through PhoneVerifier.verify_phones,
+which fans big batches out across a process pool. Results are written back
+with set-based UPDATEs and rescored with the SQL scoring functions.
+"""
+import json
+import asyncio
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from common.events import publish_user_data_changed_async
+from app.common import logger
+from app.config import get_settings
+from enrichment.email_verification import email_verifier, EmailVerificationResult
+from enrichment.phone_verification import phone_verifier, PhoneVerificationResult
+
+settings = get_settings()
+
+EMAIL_CONCURRENCY = 50     # Addresses verified at the same time
+WRITE_BATCH_SIZE = 1000    # Contacts per UPDATE statement
+
+SELECT_CONTACTS_TO_VERIFY = text("""
+    SELECT id, email, phone
+    FROM contacts
+    WHERE job_id = :job_id
+    AND (
+        (email IS NOT NULL AND (email_verified = false OR email_verification_score IS NULL)) OR
+        (phone IS NOT NULL AND (phone_verified = false OR phone_verification_score IS NULL))
+    )
+    ORDER BY id
+""")
+
+UPDATE_VERIFICATION = text("""
+    UPDATE contacts c
+    SET
+        email_verified = COALESCE(v.email_verified, c.email_verified),
+        email_verification_score = COALESCE(v.email_verification_score, c.email_verification_score),
+        is_disposable = COALESCE(v.is_disposable, c.is_disposable),
+        is_role_based = COALESCE(v.is_role_based, c.is_role_based),
+        is_catchall = COALESCE(v.is_catchall, c.is_catchall),
+        phone_verified = COALESCE(v.phone_verified, c.phone_verified),
+        phone_verification_score = COALESCE(v.phone_verification_score, c.phone_verification_score),
+        updated_at = CURRENT_TIMESTAMP
+    FROM unnest(
+        CAST(:ids AS INTEGER[]),
+        CAST(:email_verified AS BOOLEAN[]),
+        CAST(:email_verification_score AS REAL[]),
+        CAST(:is_disposable AS BOOLEAN[]),
+        CAST(:is_role_based AS BOOLEAN[]),
+        CAST(:is_catchall AS BOOLEAN[]),
+        CAST(:phone_verified AS BOOLEAN[]),
+        CAST(:phone_verification_score AS REAL[])
+    ) AS v(
+        id, email_verified, email_verification_score,
+        is_disposable, is_role_based, is_catchall,
+        phone_verified, phone_verification_score
+    )
+    WHERE c.id = v.id
+""")
+
+# Scores are computed in SQL (migrations/lead_scoring_functions.sql)
+UPDATE_SCORES = text("""
+    UPDATE contacts c
+    SET
+        lead_score = contact_lead_score(c),
+        email_reliability = contact_email_reliability(c)
+    WHERE c.id = ANY(CAST(:ids AS INTEGER[]))
+""")
+
+INSERT_VERIFICATION_RESULT = text("""
+    INSERT INTO enrichment_results (
+        contact_id, provider, email, phone, confidence_score,
+        email_verified, phone_verified, raw_data, created_at
+    ) VALUES (
+        :contact_id, :provider, :email, :phone, :confidence_score,
+        :email_verified, :phone_verified, :raw_data, CURRENT_TIMESTAMP
+    )
+""")
+
+
+def _normalize_email(email: Optional[str]) -> str:
+    return (email or "").strip().lower()
+
+
+def _normalize_phone(phone: Optional[str]) -> str:
+    return (phone or "").strip()
+
+
+# ----- Verification stages ----- #
+
+async def verify_emails(
+    emails: List[str],
+    concurrency: int = EMAIL_CONCURRENCY
+) -> Dict[str, EmailVerificationResult]:
+    """Verify unique addresses, resolving each domain once. Keyed by normalized email."""
+    by_domain: Dict[str, List[str]] = defaultdict(list)
+    for email in {_normalize_email(e) for e in emails if e and e.strip()}:
+        by_domain[email.split('@')[-1]].append(email)
+
+    if not by_domain:
+        return {}
+
+    # One DNS round per unique domain before any per-address work
+    await email_verifier.prefetch_domains([a for addrs in by_domain.values() for a in addrs])
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _verify(address: str):
+        async with semaphore:
+            try:
+                return address, await email_verifier.verify_email(address)
+            except Exception as e:
+                logger.warning(f"Email verification failed for {address}: {e}")
+                return address, None
+
+    # Addresses of one domain are queued together so SMTP sessions get reused
+    try:
+        results = await asyncio.gather(*(
+            _verify(address)
+            for addresses in by_domain.values()
+            for address in addresses
+        ))
+    finally:
+        await email_verifier.close()
+
+    logger.info(f"📧 Verified {len(results)} emails across {len(by_domain)} domains")
+    return {address: result for address, result in results if result is not None}
+
+
+async def verify_phones(phones: List[str]) -> Dict[str, PhoneVerificationResult]:
+    """Verify unique phones (process pool for big jobs). Keyed by stripped phone."""
+    unique = sorted({_normalize_phone(p) for p in phones if p and p.strip()})
+    if not unique:
+        return {}
+
+    results = dict(zip(unique, await phone_verifier.verify_phones(unique)))
+
+    logger.info(f"📱 Verified {len(results)} phones")
+    return results
+
+
+# ----- Write-back ----- #
+
+def _build_rows(contacts, email_results, phone_results) -> List[Dict[str, Any]]:
+    rows = []
+    for contact_id, email, phone in contacts:
+        email_result = email_results.get(_normalize_email(email)) if email else None
+        phone_result = phone_results.get(_normalize_phone(phone)) if phone else None
+        if email_result is None and phone_result is None:
+            continue
+        rows.append({
+            "id": contact_id,
+            "email": email,
+            "phone": phone,
+            "email_result": email_result,
+            "phone_result": phone_result,
+        })
+    return rows
+
+
+async def _write_batch(session: AsyncSession, batch: List[Dict[str, Any]], record_results: bool):
+    ids = [row["id"] for row in batch]
+
+    def _email(attr, transform=lambda v: v):
+        return [transform(getattr(r["email_result"], attr)) if r["email_result"] else None for r in batch]
+
+    def _phone(attr, transform=lambda v: v):
+        return [transform(getattr(r["phone_result"], attr)) if r["phone_result"] else None for r in batch]
+
+    await session.execute(UPDATE_VERIFICATION, {
+        "ids": ids,
+        "email_verified": _email("is_valid"),
+        "email_verification_score": _email("score", lambda s: s / 100),
+        "is_disposable": _email("is_disposable"),
+        "is_role_based": _email("is_role_based"),
+        "is_catchall": _email("is_catchall"),
+        "phone_verified": _phone("is_valid"),
+        "phone_verification_score": _phone("score", lambda s: s / 100),
+    })
+    await session.execute(UPDATE_SCORES, {"ids": ids})
+
+    if record_results:
+        params = []
+        for row in batch:
+            email_result, phone_result = row["email_result"], row["phone_result"]
+            if email_result:
+                params.append({
+                    "contact_id": row["id"],
+                    "provider": "email_verification",
+                    "email": row["email"],
+                    "phone": None,
+                    "confidence_score": email_result.score,
+                    "email_verified": email_result.is_valid,
+                    "phone_verified": False,
+                    "raw_data": json.dumps({
+                        "level": email_result.verification_level,
+                        "is_catchall": email_result.is_catchall,
+                        "is_disposable": email_result.is_disposable,
+                        "is_role_based": email_result.is_role_based,
+                        "deliverable": email_result.deliverable,
+                        "reason": email_result.reason,
+                    }),
+                })
+            if phone_result:
+                params.append({
+                    "contact_id": row["id"],
+                    "provider": "phone_verification",
+                    "email": None,
+                    "phone": row["phone"],
+                    "confidence_score": phone_result.score,
+                    "email_verified": False,
+                    "phone_verified": phone_result.is_valid,
+                    "raw_data": json.dumps({
+                        "is_mobile": phone_result.is_mobile,
+                        "is_landline": phone_result.is_landline,
+                        "is_voip": phone_result.is_voip,
+                        "country": phone_result.country,
+                        "carrier": phone_result.carrier_name,
+                        "region": phone_result.region,
+                        "reason": phone_result.reason,
+                    }),
+                })
+        if params:
+            await session.execute(INSERT_VERIFICATION_RESULT, params)
+
+    await session.commit()
+
+
+# ----- Pipeline ----- #
+
+async def bulk_verify_job(
+    session: AsyncSession,
+    job_id: str,
+    record_results: bool = False,
+    email_concurrency: int = EMAIL_CONCURRENCY,
+) -> Dict[str, Any]:
+    """
+    Verify every contact of a job that still needs email/phone verification.
+
+    Set ``record_results`` to also store one enrichment_results row per
+    verification, as the v2 tasks do.
+    """
+    result = await session.execute(SELECT_CONTACTS_TO_VERIFY, {"job_id": job_id})
+    contacts = result.fetchall()
+    logger.info(f"Found {len(contacts)} contacts needing verification")
+
+    if not contacts:
+        return {"contacts": 0, "verified_count": 0, "emails": 0, "phones": 0}
+
+    email_results, phone_results = await asyncio.gather(
+        verify_emails([c[1] for c in contacts if c[1]], email_concurrency),
+        verify_phones([c[2] for c in contacts if c[2]]),
+    )
+
+    user_id = (await session.execute(
+        text("SELECT user_id FROM import_jobs WHERE id = :job_id"), {"job_id": job_id}
+    )).scalar()
+    rows = _build_rows(contacts, email_results, phone_results)
+    for i in range(0, len(rows), WRITE_BATCH_SIZE):
+        await _write_batch(session, rows[i:i + WRITE_BATCH_SIZE], record_results)
+        await publish_user_data_changed_async(settings.redis_url, user_id)
+
+    logger.info(f"Verified {len(rows)} contacts for job {job_id}")
+    return {
+        "contacts": len(contacts),
+        "verified_count": len(rows),
+        "emails": len(email_results),
+        "phones": len(phone_results),
+    }
@@ -31,7 +31,14 @@ celery_app.conf.update(
         'app.tasks.get_enrichment_stats': {'queue': 'db_operations'},
         'app.tasks.enrich_single_contact_modern': {'queue': 'contact_enrichment'},
         'app.tasks.process_csv_file': {'queue': 'enrichment_batch'},
-    }
+        'app.tasks.compact_analytics_rollups': {'queue': 'db_operations'},
+    },
+    beat_schedule={
+        'compact-analytics-rollups': {
+            'task': 'app.tasks.compact_analytics_rollups',
+            'schedule': 3600.0,
+        },
+    },
 )
 
 # Define task queues with priorities
@@ -6,7 +6,8 @@ from typing import Dict, Any, Optional, List
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import sessionmaker as sync_sessionmaker
-from sqlalchemy import insert, update, text, Table, Column, Integer, String, MetaData, TIMESTAMP, Boolean, Float, JSON, create_engine
+from sqlalchemy import insert, update, text, Table, Column, Integer, String, MetaData, TIMESTAMP, Boolean, Float, JSON
+from common.db import create_db_engine
 
 from app.config import get_settings
 from app.common import logger
@@ -77,7 +78,7 @@ elif 'postgresql://' not in sync_db_url and 'postgres://' not in sync_db_url : #
     sync_db_url = f"postgresql://{sync_db_url}"
 
 
-sync_engine = create_engine(sync_db_url)
+sync_engine = create_db_engine(sync_db_url, is_async=False, role="worker")
 SyncSessionLocal = sync_sessionmaker(bind=sync_engine)
 
 
@@ -0,0 +1,105 @@
+# services/enrichment-worker/app/scoring.py
+# Lead scoring rules shared by the worker and the SQL implementation in
+# migrations/lead_scoring_functions.sql. Any change here must be mirrored
+# there; test_scoring_parity.py checks both sides agree.
+
+from typing import Optional
+
+def calculate_lead_score(
+    email: Optional[str] = None,
+    phone: Optional[str] = None,
+    email_verified: bool = False,
+    phone_verified: bool = False,
+    email_verification_score: Optional[float] = None,
+    phone_verification_score: Optional[float] = None,
+    company: Optional[str] = None,
+    position: Optional[str] = None,
+    profile_url: Optional[str] = None,
+    enrichment_score: Optional[float] = None
+) -> int:
+    """Calculate lead score (0-100) based on contact data quality."""
+    score = 20  # Base score
+    
+    # Email scoring (max 55 points)
+    if email and email.strip():
+        score += 20  # Has email
+        
+        if email_verified:
+            if email_verification_score and email_verification_score >= 0.9:
+                score += 35  # Excellent verification
+            elif email_verification_score and email_verification_score >= 0.7:
+                score += 30  # Good verification
+            elif email_verification_score and email_verification_score >= 0.5:
+                score += 25  # Fair verification
+            else:
+                score += 20  # Basic verification
+        else:
+            if email_verification_score and email_verification_score > 0:
+                score += int(email_verification_score * 15)
+    
+    # Phone scoring (max 35 points)
+    if phone and phone.strip():
+        score += 15  # Has phone
+        
+        if phone_verified:
+            if phone_verification_score and phone_verification_score >= 0.9:
+                score += 30  # Excellent phone verification
+            elif phone_verification_score and phone_verification_score >= 0.7:
+                score += 25  # Good verification
+            else:
+                score += 20  # Basic verification
+        else:
+            if phone_verification_score and phone_verification_score > 0:
+                score += int(phone_verification_score * 10)
+    
+    # Additional data quality factors (max 30 points)
+    if company and company.strip() and company.lower() != 'unknown':
+        score += 10
+        
+    if position and position.strip() and position.lower() != 'unknown':
+        score += 10
+        
+    if profile_url and profile_url.strip():
+        score += 10
+    
+    # Enrichment quality bonus (max 10 points)
+    if enrichment_score and enrichment_score >= 0.8:
+        score += 10
+    elif enrichment_score and enrichment_score >= 0.6:
+        score += 5
+    
+    return min(score, 100)
+
+def calculate_email_reliability(
+    email: Optional[str] = None,
+    email_verified: bool = False,
+    email_verification_score: Optional[float] = None,
+    is_disposable: bool = False,
+    is_role_based: bool = False,
+    is_catchall: bool = False
+) -> str:
+    """Calculate email reliability category."""
+    if not email or not email.strip():
+        return 'no_email'
+    
+    if is_disposable:
+        return 'poor'
+    
+    if not email_verified:
+        return 'unknown'
+    
+    if email_verification_score is None:
+        email_verification_score = 0.5
+    
+    if email_verification_score >= 0.9 and not is_role_based and not is_catchall:
+        return 'excellent'
+    
+    if email_verification_score >= 0.7:
+        if is_role_based:
+            return 'fair'
+        return 'good'
+    
+    if email_verification_score >= 0.5:
+        return 'fair'
+    
+    return 'poor'
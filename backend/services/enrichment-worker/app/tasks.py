@@ -17,12 +17,16 @@ import logging
 # Celery imports
 from celery import Task
 from celery.exceptions import SoftTimeLimitExceeded
+from celery.signals import worker_init
 
 # Database imports
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import insert, update, select, delete, text, Table, Column, Integer, String, MetaData, TIMESTAMP, Boolean, Float, JSON, create_engine
+from sqlalchemy import insert, update, select, delete, text, Table, Column, Integer, String, MetaData, TIMESTAMP, Boolean, Float, JSON
 from sqlalchemy.orm import sessionmaker as sync_sessionmaker
+from common.db import create_db_engine
+from common.progress import contact_progress_delta, publish_job_progress
+from common.events import publish_user_data_changed
 
 # Local imports
 from app.celery import celery_app
@@ -34,6 +38,7 @@ from app.common import (
     RateLimiter, 
     service_status
 )
+from app.scoring import calculate_lead_score, calculate_email_reliability
 
 # Provider functions
 from app.providers import (
@@ -70,6 +75,13 @@ except ImportError as e:
     phone_verifier = None
     VERIFICATION_AVAILABLE = False
 
+@worker_init.connect
+def warm_phone_metadata(**kwargs):
+    """Load phone metadata once per worker; threads-pool tasks share it."""
+    if phone_verifier is not None:
+        phone_verifier.warm_up()
+        logger.info("✅ Phone metadata warmed")
+
 # Modern enrichment engine (optional)
 try:
     from app.enrichment_engine import enrichment_engine, enrich_single_contact
@@ -82,11 +94,11 @@ except ImportError as e:
 # Get application settings
 settings = get_settings()
 
-# Database setup
-engine = create_async_engine(settings.database_url)
+# Database setup (shared, worker-tuned pools)
+engine = create_db_engine(settings.database_url, role="worker")
 AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
-sync_engine = create_engine(settings.database_url.replace('+asyncpg', ''))
+sync_engine = create_db_engine(settings.database_url, is_async=False, role="worker")
 SyncSessionLocal = sync_sessionmaker(bind=sync_engine)
 
 # Define metadata and tables
@@ -107,6 +119,7 @@ contacts = Table(
     'contacts', metadata,
     Column('id', Integer, primary_key=True),
     Column('job_id', String),
+    Column('user_id', String),  # Set from import_jobs by trigger
     Column('first_name', String),
     Column('last_name', String),
     Column('position', String),
@@ -284,107 +297,6 @@ async def verify_phone_if_available(phone: str) -> Dict[str, Any]:
             "details": {"reason": f"verification_error: {e}"}
         }
 
-# ===== SCORING FUNCTIONS =====
-
-def calculate_lead_score(
-    email: Optional[str] = None,
-    phone: Optional[str] = None,
-    email_verified: bool = False,
-    phone_verified: bool = False,
-    email_verification_score: Optional[float] = None,
-    phone_verification_score: Optional[float] = None,
-    company: Optional[str] = None,
-    position: Optional[str] = None,
-    profile_url: Optional[str] = None,
-    enrichment_score: Optional[float] = None
-) -> int:
-    """Calculate lead score (0-100) based on contact data quality."""
-    score = 20  # Base score
-    
-    # Email scoring (max 55 points)
-    if email and email.strip():
-        score += 20  # Has email
-        
-        if email_verified:
-            if email_verification_score and email_verification_score >= 0.9:
-                score += 35  # Excellent verification
-            elif email_verification_score and email_verification_score >= 0.7:
-                score += 30  # Good verification
-            elif email_verification_score and email_verification_score >= 0.5:
-                score += 25  # Fair verification
-            else:
-                score += 20  # Basic verification
-        else:
-            if email_verification_score and email_verification_score > 0:
-                score += int(email_verification_score * 15)
-    
-    # Phone scoring (max 35 points)
-    if phone and phone.strip():
-        score += 15  # Has phone
-        
-        if phone_verified:
-            if phone_verification_score and phone_verification_score >= 0.9:
-                score += 30  # Excellent phone verification
-            elif phone_verification_score and phone_verification_score >= 0.7:
-                score += 25  # Good verification
-            else:
-                score += 20  # Basic verification
-        else:
-            if phone_verification_score and phone_verification_score > 0:
-                score += int(phone_verification_score * 10)
-    
-    # Additional data quality factors (max 30 points)
-    if company and company.strip() and company.lower() != 'unknown':
-        score += 10
-        
-    if position and position.strip() and position.lower() != 'unknown':
-        score += 10
-        
-    if profile_url and profile_url.strip():
-        score += 10
-    
-    # Enrichment quality bonus (max 10 points)
-    if enrichment_score and enrichment_score >= 0.8:
-        score += 10
-    elif enrichment_score and enrichment_score >= 0.6:
-        score += 5
-    
-    return min(score, 100)
-
-def calculate_email_reliability(
-    email: Optional[str] = None,
-    email_verified: bool = False,
-    email_verification_score: Optional[float] = None,
-    is_disposable: bool = False,
-    is_role_based: bool = False,
-    is_catchall: bool = False
-) -> str:
-    """Calculate email reliability category."""
-    if not email or not email.strip():
-        return 'no_email'
-    
-    if is_disposable:
-        return 'poor'
-    
-    if not email_verified:
-        return 'unknown'
-    
-    if email_verification_score is None:
-        email_verification_score = 0.5
-    
-    if email_verification_score >= 0.9 and not is_role_based and not is_catchall:
-        return 'excellent'
-    
-    if email_verification_score >= 0.7:
-        if is_role_based:
-            return 'fair'
-        return 'good'
-    
-    if email_verification_score >= 0.5:
-        return 'fair'
-    
-    return 'poor'
-
 # ===== DATABASE OPERATIONS =====
 
 async def get_or_create_job(session: AsyncSession, job_id: str, user_id: str, total_contacts: int) -> str:
@@ -953,13 +865,18 @@ def cascade_enrich(self, lead: Dict[str, Any], job_id: str, user_id: str, enrich
                 
                 contact_id = result.scalar()
                 
-                # Update job progress
-                session.execute(
-                    text("UPDATE import_jobs SET completed = completed + 1, updated_at = CURRENT_TIMESTAMP WHERE id = :job_id"),
+                # Update job progress; the job_stats version our insert produced orders the progress delta
+                stats_version = session.execute(
+                    text("""
+                        UPDATE import_jobs SET completed = completed + 1, updated_at = CURRENT_TIMESTAMP WHERE id = :job_id
+                        RETURNING (SELECT version FROM job_stats WHERE job_id = :job_id)
+                    """),
                     {"job_id": job_id}
-                )
+                ).scalar()
                 
                 session.commit()
+                publish_job_progress(settings.redis_url, job_id, contact_progress_delta(contact_data, stats_version))
+                publish_user_data_changed(settings.redis_url, user_id)
                 
                 # Record cache usage for metrics
                 if cache_data.get("cache_id"):
@@ -1361,13 +1278,18 @@ def cascade_enrich(self, lead: Dict[str, Any], job_id: str, user_id: str, enrich
             
             contact_id = result.scalar()
             
-            # Update job progress
-            session.execute(
-                text("UPDATE import_jobs SET completed = completed + 1, updated_at = CURRENT_TIMESTAMP WHERE id = :job_id"),
+            # Update job progress; the job_stats version our insert produced orders the progress delta
+            stats_version = session.execute(
+                text("""
+                    UPDATE import_jobs SET completed = completed + 1, updated_at = CURRENT_TIMESTAMP WHERE id = :job_id
+                    RETURNING (SELECT version FROM job_stats WHERE job_id = :job_id)
+                """),
                 {"job_id": job_id}
-            )
+            ).scalar()
             
             session.commit()
+            publish_job_progress(settings.redis_url, job_id, contact_progress_delta(contact_data, stats_version))
+            publish_user_data_changed(settings.redis_url, user_id)
             print(f"📝 Saved contact {contact_id} and updated job progress")
             
     except Exception as e:
@@ -1740,59 +1662,30 @@ def verify_existing_contacts(self, job_id: str):
     try:
         logger.info(f"Starting verification task for job: {job_id}")
         
-        with SyncSessionLocal() as session:
-            # Get contacts that need verification
-            stmt = text("""
-                SELECT id, email, phone 
-                FROM contacts 
-                WHERE job_id = :job_id 
-                AND (
-                    (email IS NOT NULL AND (email_verified = false OR email_verification_score IS NULL)) OR
-                    (phone IS NOT NULL AND (phone_verified = false OR phone_verification_score IS NULL))
-                )
-            """)
-            
-            result = session.execute(stmt, {"job_id": job_id})
-            contacts = result.fetchall()
-            
-            logger.info(f"Found {len(contacts)} contacts needing verification")
-            
-            verified_count = 0
-            
-            for contact in contacts:
-                contact_id, email, phone = contact
-                
-                verification_data = {}
-                
-                # Verify email if present
-                if email and VERIFICATION_AVAILABLE:
-                    email_result = run_async(verify_email_if_available(email))
-                    verification_data["email_verified"] = email_result["verified"]
-                    verification_data["email_verification_score"] = email_result["score"] / 100
-                
-                # Verify phone if present
-                if phone and VERIFICATION_AVAILABLE:
-                    phone_result = run_async(verify_phone_if_available(phone))
-                    verification_data["phone_verified"] = phone_result["verified"]
-                    verification_data["phone_verification_score"] = phone_result["score"] / 100
-                
-                # Update contact with verification results
-                if verification_data:
-                    run_async(update_contact_with_scoring(
-                        AsyncSessionLocal(),
-                        contact_id,
-                        verification_data=verification_data
-                    ))
-                    verified_count += 1
-            
-            logger.info(f"Verified {verified_count} contacts")
+        if not VERIFICATION_AVAILABLE:
+            logger.warning("Verification modules not available, skipping")
             return {
                 "success": True,
                 "job_id": job_id,
-                "verified_count": verified_count,
-                "verification_available": VERIFICATION_AVAILABLE
+                "verified_count": 0,
+                "verification_available": False
             }
         
+        from app.bulk_verification import bulk_verify_job
+        
+        async def verify_contacts():
+            async with AsyncSessionLocal() as session:
+                return await bulk_verify_job(session, job_id)
+        
+        stats = run_async(verify_contacts())
+        
+        return {
+            "success": True,
+            "job_id": job_id,
+            "verified_count": stats["verified_count"],
+            "verification_available": VERIFICATION_AVAILABLE
+        }
+        
     except Exception as e:
         logger.error(f"Error in verify_existing_contacts: {str(e)}")
         return {
@@ -1804,106 +1697,43 @@ def verify_existing_contacts(self, job_id: str):
 
 @celery_app.task(base=EnrichmentTask, bind=True, name='app.tasks.recalculate_all_lead_scores')
 def recalculate_all_lead_scores(self, user_id: Optional[str] = None):
-    """Recalculate lead scores and email reliability for all existing contacts."""
+    """Recalculate lead scores and email reliability for all existing contacts.
+
+    Runs as a single set-based UPDATE using the SQL scoring functions from
+    migrations/lead_scoring_functions.sql, and only touches rows whose
+    score actually changes.
+    """
     try:
         logger.info(f"Starting lead score recalculation for user: {user_id or 'ALL'}")
         
         with SyncSessionLocal() as session:
             # Build query conditions
-            where_conditions = []
+            where_conditions = [
+                "(c.lead_score IS DISTINCT FROM contact_lead_score(c) "
+                "OR c.email_reliability IS DISTINCT FROM contact_email_reliability(c))"
+            ]
             params = {}
             
             if user_id:
-                where_conditions.append("ij.user_id = :user_id")
+                where_conditions.append("c.user_id = :user_id")
                 params["user_id"] = user_id
             
-            where_clause = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
-            
-            # Get all contacts that need score recalculation
-            stmt = text(f"""
-                SELECT 
-                    c.id, c.email, c.phone, c.company, c.position, c.profile_url,
-                    c.email_verified, c.phone_verified, 
-                    c.email_verification_score, c.phone_verification_score,
-                    c.enrichment_score, c.is_disposable, c.is_role_based, c.is_catchall
-                FROM contacts c
-                JOIN import_jobs ij ON c.job_id = ij.id
-                {where_clause}
-                ORDER BY c.id
+            update_query = text(f"""
+                UPDATE contacts c
+                SET 
+                    lead_score = contact_lead_score(c),
+                    email_reliability = contact_email_reliability(c),
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE {" AND ".join(where_conditions)}
             """)
             
-            result = session.execute(stmt, params)
-            contacts = result.fetchall()
-            
-            logger.info(f"Found {len(contacts)} contacts for score recalculation")
-            
-            updated_count = 0
-            batch_size = 100
-            
-            for i in range(0, len(contacts), batch_size):
-                batch = contacts[i:i + batch_size]
-                
-                for contact in batch:
-                    contact_id = contact[0]
-                    email = contact[1]
-                    phone = contact[2]
-                    company = contact[3]
-                    position = contact[4]
-                    profile_url = contact[5]
-                    email_verified = contact[6] or False
-                    phone_verified = contact[7] or False
-                    email_verification_score = contact[8]
-                    phone_verification_score = contact[9]
-                    enrichment_score = contact[10]
-                    is_disposable = contact[11] or False
-                    is_role_based = contact[12] or False
-                    is_catchall = contact[13] or False
-                    
-                    # Calculate new scores
-                    lead_score = calculate_lead_score(
-                        email=email,
-                        phone=phone,
-                        email_verified=email_verified,
-                        phone_verified=phone_verified,
-                        email_verification_score=email_verification_score,
-                        phone_verification_score=phone_verification_score,
-                        company=company,
-                        position=position,
-                        profile_url=profile_url,
-                        enrichment_score=enrichment_score
-                    )
-                    
-                    email_reliability = calculate_email_reliability(
-                        email=email,
-                        email_verified=email_verified,
-                        email_verification_score=email_verification_score,
-                        is_disposable=is_disposable,
-                        is_role_based=is_role_based,
-                        is_catchall=is_catchall
-                    )
-                    
-                    # Update the contact
-                    update_query = text("""
-                        UPDATE contacts 
-                        SET 
-                            lead_score = :lead_score,
-                            email_reliability = :email_reliability,
-                            updated_at = CURRENT_TIMESTAMP
-                        WHERE id = :contact_id
-                    """)
-                    
-                    session.execute(update_query, {
-                        "contact_id": contact_id,
-                        "lead_score": lead_score,
-                        "email_reliability": email_reliability
-                    })
-                    
-                    updated_count += 1
-                
-                # Commit after each batch
-                session.commit()
+            result = session.execute(update_query, params)
+            updated_count = result.rowcount
+            session.commit()
             
             logger.info(f"Lead score recalculation complete: {updated_count} contacts updated")
+            if user_id and updated_count:
+                publish_user_data_changed(settings.redis_url, user_id)
             
             return {
                 "success": True,
@@ -1919,6 +1749,28 @@ def recalculate_all_lead_scores(self, user_id: Optional[str] = None):
             "updated_count": 0
         }
 
+@celery_app.task(base=EnrichmentTask, bind=True, name='app.tasks.compact_analytics_rollups')
+def compact_analytics_rollups(self, keep_hours: int = 192):
+    """Fold hourly analytics rollups older than ``keep_hours`` into the daily table.
+
+    Scheduled by Celery beat (see app/celery.py); the SQL lives in
+    migrations/add_analytics_rollups.sql.
+    """
+    try:
+        with SyncSessionLocal() as session:
+            moved = session.execute(
+                text("SELECT compact_contact_rollups(:keep_hours)"),
+                {"keep_hours": keep_hours}
+            ).scalar()
+            session.commit()
+        
+        logger.info(f"Analytics rollup compaction complete: {moved} hourly rows folded")
+        return {"success": True, "compacted_rows": moved}
+        
+    except Exception as e:
+        logger.error(f"Error in compact_analytics_rollups: {str(e)}")
+        return {"success": False, "error": str(e), "compacted_rows": 0}
+
 # ===== MAIN ENTRY POINTS =====
 
 @celery_app.task(base=EnrichmentTask, bind=True, name='app.tasks.process_csv_smart')
@@ -22,7 +22,8 @@ from celery import Task, chain, group
 from celery.exceptions import SoftTimeLimitExceeded, Retry
 
 # Database imports
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession
+from common.db import create_db_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import insert, update, select, delete, text, Table, Column, Integer, String, MetaData, TIMESTAMP, Boolean, Float, JSON
 
@@ -41,14 +42,13 @@ from app.common import (
 settings = get_settings()
 
 # Initialize database connection
-engine = create_async_engine(settings.database_url)
+engine = create_db_engine(settings.database_url, role="worker")
 AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
-# Also create a synchronous engine for Celery tasks
-from sqlalchemy import create_engine
+# Also use a synchronous engine for Celery tasks
 from sqlalchemy.orm import sessionmaker as sync_sessionmaker
 
-sync_engine = create_engine(settings.database_url.replace('+asyncpg', ''))
+sync_engine = create_db_engine(settings.database_url, is_async=False, role="worker")
 SyncSessionLocal = sync_sessionmaker(bind=sync_engine)
 
 # OPTIMIZED: Connection pool for better performance
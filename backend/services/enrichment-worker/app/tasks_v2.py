@@ -18,7 +18,8 @@ from celery import Task
 from celery.exceptions import SoftTimeLimitExceeded, Retry
 
 # Database imports
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession
+from common.db import create_db_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import insert, update, select, text
 
@@ -40,7 +41,7 @@ from app.db_utils import (
 settings = get_settings()
 
 # Initialize database connection
-engine = create_async_engine(settings.database_url)
+engine = create_db_engine(settings.database_url, role="worker")
 AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 def run_async(coro):
@@ -383,104 +384,19 @@ def verify_existing_contacts(self, job_id: str):
     try:
         logger.info(f"Starting verification task for job: {job_id}")
         
+        from app.bulk_verification import bulk_verify_job
+        
         async def verify_contacts():
             async with AsyncSessionLocal() as session:
-                # Get contacts that need verification
-                stmt = text("""
-                    SELECT id, email, phone 
-                    FROM contacts 
-                    WHERE job_id = :job_id 
-                    AND (
-                        (email IS NOT NULL AND email_verified = false) OR
-                        (phone IS NOT NULL AND phone_verified = false)
-                    )
-                """)
-                
-                result = await session.execute(stmt, {"job_id": job_id})
-                contacts = result.fetchall()
-                
-                logger.info(f"Found {len(contacts)} contacts needing verification")
-                
-                verified_count = 0
-                
-                for contact in contacts:
-                    contact_id, email, phone = contact
-                    
-                    verification_data = {}
-                    
-                    # Verify email if present
-                    if email:
-                        from enrichment.email_verification import email_verifier
-                        email_result = await email_verifier.verify_email(email)
-                        verification_data["email_verified"] = email_result.is_valid
-                        verification_data["email_verification_score"] = email_result.score / 100
-                        
-                        # Save verification details
-                        await save_enrichment_result(
-                            session,
-                            contact_id,
-                            "email_verification",
-                            {
-                                "email": email,
-                                "email_verified": email_result.is_valid,
-                                "verification_score": email_result.score,
-                                "verification_details": {
-                                    "level": email_result.verification_level,
-                                    "is_catchall": email_result.is_catchall,
-                                    "is_disposable": email_result.is_disposable,
-                                    "is_role_based": email_result.is_role_based,
-                                    "deliverable": email_result.deliverable,
-                                    "reason": email_result.reason
-                                }
-                            }
-                        )
-                    
-                    # Verify phone if present
-                    if phone:
-                        from enrichment.phone_verification import phone_verifier
-                        phone_result = await phone_verifier.verify_phone(phone)
-                        verification_data["phone_verified"] = phone_result.is_valid
-                        verification_data["phone_verification_score"] = phone_result.score / 100
-                        
-                        # Save verification details
-                        await save_enrichment_result(
-                            session,
-                            contact_id,
-                            "phone_verification",
-                            {
-                                "phone": phone,
-                                "phone_verified": phone_result.is_valid,
-                                "verification_score": phone_result.score,
-                                "verification_details": {
-                                    "is_mobile": phone_result.is_mobile,
-                                    "is_landline": phone_result.is_landline,
-                                    "is_voip": phone_result.is_voip,
-                                    "country": phone_result.country,
-                                    "carrier": phone_result.carrier_name,
-                                    "region": phone_result.region,
-                                    "reason": phone_result.reason
-                                }
-                            }
-                        )
-                    
-                    # Update contact with verification results
-                    if verification_data:
-                        await update_contact(
-                            session,
-                            contact_id,
-                            enrichment_data=verification_data
-                        )
-                        verified_count += 1
-                
-                logger.info(f"Verified {verified_count} contacts")
-                return verified_count
+                # Keep one enrichment_results row per verification
+                return await bulk_verify_job(session, job_id, record_results=True)
         
-        verified_count = run_async(verify_contacts())
+        stats = run_async(verify_contacts())
         
         return {
             "success": True,
             "job_id": job_id,
-            "verified_count": verified_count
+            "verified_count": stats["verified_count"]
         }
         
     except Exception as e:
@@ -32,13 +32,13 @@ from app.common import logger
 from app.ultra_fast_enrichment import ultra_fast_engine, cleanup_ultra_fast_engine, EnrichmentResult
 
 # Database imports (sync for Celery tasks)
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from common.db import create_db_engine
 
 settings = get_settings()
 
 # Synchronous database setup for Celery
-sync_engine = create_engine(settings.database_url.replace('+asyncpg', ''))
+sync_engine = create_db_engine(settings.database_url, is_async=False, role="worker")
 SyncSessionLocal = sessionmaker(bind=sync_engine)
 
 class UltraFastEnrichmentTask(Task):
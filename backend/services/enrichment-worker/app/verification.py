@@ -1,7 +1,6 @@
 # backend/services/enrichment-worker/app/verification.py
 import re
-import asyncio
-import socket
+import functools
 from typing import Optional, Tuple
 from dataclasses import dataclass
 import phonenumbers
@@ -10,6 +9,7 @@ from phonenumbers import timezone as ph_timezone  # Renamed
 from phonenumbers.phonenumberutil import NumberParseException
 
 from app.common import logger  # Assuming common.utils is moved to app.common
+from enrichment.dns_cache import dns_cache
 
 
 @dataclass
@@ -138,61 +138,48 @@ class EmailVerifier:
         if not domain:
             return False
         try:
-            # Use asyncio's getaddrinfo for non-blocking DNS resolution
-            loop = asyncio.get_event_loop()
-            await loop.getaddrinfo(domain, None)
-            return True
-        except socket.gaierror:  # Not socket, but asyncio's equivalent
-            logger.debug(f"Domain DNS check failed for {domain}")
-            return False
+            # Cached, natively async A/AAAA lookup (one query per domain)
+            return await dns_cache.has_address(domain)
         except Exception as e:
             logger.warning(f"Error during domain DNS check for {domain}: {e}")
             return False
 
     async def _validate_mx_records(self, domain: str) -> tuple[bool, bool]:
-        """Level 3: MX record validation using dnspython if available."""
+        """Level 3: MX record validation through the shared DNS cache."""
         if not domain:
             return False, False
         try:
-            import dns.resolver  # type: ignore
-            # Run DNS resolution in a separate thread to avoid blocking
-            # asyncio loop
-            loop = asyncio.get_event_loop()
-            mx_records = await loop.run_in_executor(
-                None, dns.resolver.resolve, domain, 'MX'
-            )
-            has_mx = len(mx_records) > 0
-
-            # Basic catch-all detection (can be improved)
-            # If a domain has a very low preference MX record
-            # (e.g., priority > 50) or only one MX record, it might be
-            # a catch-all. This is a heuristic.
-            is_catchall = False
-            if has_mx and len(mx_records) == 1:
-                # Some providers use specific naming for catch-all,
-                # e.g. "catchall.example.com"
-                if any(
-                    str(mx_records[0].exchange).lower().startswith(p)
-                    for p in ["catchall.", "spam.", "junk."]
-                ):
-                    is_catchall = True
-
-            return has_mx, is_catchall
-        except ImportError:
-            logger.warning(
-                "dnspython library not found. MX record check will be skipped."
-            )
-            return False, False  # Cannot check MX without dnspython
-        except dns.resolver.NXDOMAIN:
-            logger.debug(f"MX check: Domain {domain} not found (NXDOMAIN).")
-            return False, False
-        except dns.resolver.NoAnswer:
-            logger.debug(f"MX check: No MX records found for {domain}.")
-            return False, False
+            mx_hosts = await dns_cache.resolve(domain, 'MX')
         except Exception as e:
             logger.warning(f"Error during MX record check for {domain}: {e}")
             return False, False  # Default to no MX on error
 
+        if not mx_hosts:
+            logger.debug(f"MX check: No MX records found for {domain}.")
+            return False, False
+
+        # Basic catch-all detection (can be improved)
+        # Some providers use specific naming for catch-all,
+        # e.g. "catchall.example.com". This is a heuristic.
+        is_catchall = False
+        if len(mx_hosts) == 1:
+            if any(
+                mx_hosts[0].lower().startswith(p)
+                for p in ["catchall.", "spam.", "junk."]
+            ):
+                is_catchall = True
+
+        return True, is_catchall
+
+    async def prefetch_domains(self, emails: list) -> int:
+        """Resolve A and MX records for every unique domain in one batch."""
+        domains = {
+            email.lower().strip().split('@')[-1]
+            for email in emails
+            if email and '@' in email
+        }
+        return await dns_cache.prefetch(domains)
+
     def _calculate_score(
         self, syntax: bool, domain_dns: bool, mx: bool,
         smtp_assumed: bool, disposable: bool, role_based: bool,
@@ -246,6 +233,19 @@ class PhoneVerificationResult:
     reason: str
 
 
+@functools.lru_cache(maxsize=50000)
+def _phone_metadata(e164: str) -> Tuple[str, str, str, str]:
+    """Carrier, country, region and first timezone for an E.164 number."""
+    parsed_phone = phonenumbers.parse(e164)
+    timezones_list = ph_timezone.time_zones_for_number(parsed_phone)
+    return (
+        carrier.name_for_number(parsed_phone, 'en') or "",
+        phonenumbers.region_code_for_number(parsed_phone) or "",
+        geocoder.description_for_number(parsed_phone, 'en') or "",
+        timezones_list[0] if timezones_list else "",
+    )
+
+
 class PhoneVerifier:
     def __init__(self):
         self.mobile_carriers_keywords = {  # More generic keywords
@@ -296,14 +296,10 @@ class PhoneVerifier:
         is_landline = phone_type == phonenumbers.PhoneNumberType.FIXED_LINE
         is_voip = phone_type == phonenumbers.PhoneNumberType.VOIP
 
-        # Get carrier and location info
-        carrier_name_raw = carrier.name_for_number(parsed_phone, 'en') or ""
-        country_code = phonenumbers.region_code_for_number(parsed_phone) or ""
-        region = geocoder.description_for_number(parsed_phone, 'en') or ""
-
-        # Get timezones
-        timezones_list = ph_timezone.time_zones_for_number(parsed_phone)
-        timezone_str = timezones_list[0] if timezones_list else ""
+        # Get carrier, location and timezone info (cached per E.164 number)
+        carrier_name_raw, country_code, region, timezone_str = _phone_metadata(
+            phonenumbers.format_number(parsed_phone, phonenumbers.PhoneNumberFormat.E164)
+        )
 
         # Format numbers
         formatted_national = phonenumbers.format_number(
@@ -0,0 +1,260 @@
+"""
+Domain-level DNS cache shared by the email verifiers.
+
+Lookups go through dnspython's native async resolver and are cached in two
+tiers: an in-process LRU and Redis, both honouring the record TTL. Negative
+answers (NXDOMAIN, no records) are cached too, and concurrent lookups of the
+same name share a single query, so a job costs roughly one resolution per
+unique domain.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import dns.asyncresolver
+import dns.exception
+import dns.resolver
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # Redis tier is optional
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+# TTL bounds (seconds)
+MIN_TTL = 60             # Don't hammer resolvers for very short TTLs
+MAX_TTL = 24 * 3600      # Re-check at least daily
+NEGATIVE_TTL = 15 * 60   # NXDOMAIN / no records
+ERROR_TTL = 30           # Timeouts / SERVFAIL, in-process only
+
+REDIS_KEY_PREFIX = "dns:v1:"
+REDIS_RETRY_AFTER = 60   # Seconds to skip Redis after a connection error
+
+
+@dataclass
+class DNSAnswer:
+    """Cached DNS answer. Empty records means a negative answer."""
+    records: List[str]
+    expires_at: float
+
+    @property
+    def negative(self) -> bool:
+        return not self.records
+
+
+class DNSCache:
+    """Two-tier (LRU + Redis) TTL-aware DNS cache with request coalescing."""
+
+    def __init__(
+        self,
+        redis_url: Optional[str] = None,
+        max_entries: int = 20000,
+        lifetime: float = 5.0,
+    ):
+        self.redis_url = redis_url
+        self.max_entries = max_entries
+        self.lifetime = lifetime
+
+        self._local: "OrderedDict[Tuple[str, str], DNSAnswer]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._resolver: Optional[dns.asyncresolver.Resolver] = None
+
+        # Futures and Redis clients are bound to an event loop, and Celery
+        # thread workers each run their own loop.
+        self._inflight: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict]" = weakref.WeakKeyDictionary()
+        self._redis_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, object]" = weakref.WeakKeyDictionary()
+        self._redis_down_until = 0.0
+
+        self.stats = {"hits": 0, "redis_hits": 0, "misses": 0, "coalesced": 0}
+
+    # ----- Public API ----- #
+
+    async def resolve(self, name: str, rdtype: str = "MX") -> List[str]:
+        """
+        Resolve ``name`` and return its records as strings.
+
+        MX records are returned as exchange hosts sorted by preference
+        (trailing dot removed); A/AAAA records as addresses. An empty list
+        means the name does not exist or has no records of that type.
+        """
+        key = (name.lower().rstrip("."), rdtype.upper())
+        if not key[0]:
+            return []
+
+        cached = self._get_local(key)
+        if cached is not None:
+            self.stats["hits"] += 1
+            return cached.records
+
+        loop = asyncio.get_running_loop()
+        inflight = self._inflight.setdefault(loop, {})
+        future = inflight.get(key)
+        if future is not None:
+            self.stats["coalesced"] += 1
+            return list(await asyncio.shield(future))
+
+        future = loop.create_future()
+        inflight[key] = future
+        try:
+            answer = await self._lookup(key)
+            future.set_result(answer.records)
+            return answer.records
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Avoid "exception never retrieved" when nobody else waited
+            future.exception()
+            raise
+        finally:
+            inflight.pop(key, None)
+
+    async def has_address(self, domain: str) -> bool:
+        """True if the domain has an A or AAAA record."""
+        if await self.resolve(domain, "A"):
+            return True
+        return bool(await self.resolve(domain, "AAAA"))
+
+    async def prefetch(
+        self,
+        domains: Iterable[str],
+        rdtypes: Tuple[str, ...] = ("A", "MX"),
+        concurrency: int = 50,
+    ) -> int:
+        """Warm the cache for many domains at once. Returns unique domain count."""
+        unique = {d.lower().rstrip(".") for d in domains if d}
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def _warm(domain: str, rdtype: str):
+            async with semaphore:
+                try:
+                    await self.resolve(domain, rdtype)
+                except Exception as e:
+                    logger.debug(f"DNS prefetch failed for {domain}/{rdtype}: {e}")
+
+        await asyncio.gather(*(_warm(d, t) for d in unique for t in rdtypes))
+        return len(unique)
+
+    def clear(self):
+        """Drop the in-process tier (Redis entries expire on their own)."""
+        with self._lock:
+            self._local.clear()
+
+    # ----- Lookup tiers ----- #
+
+    async def _lookup(self, key: Tuple[str, str]) -> DNSAnswer:
+        answer = await self._get_redis(key)
+        if answer is not None:
+            self.stats["redis_hits"] += 1
+            self._put_local(key, answer)
+            return answer
+
+        self.stats["misses"] += 1
+        answer, shareable = await self._query(*key)
+        self._put_local(key, answer)
+        if shareable:
+            await self._put_redis(key, answer)
+        return answer
+
+    async def _query(self, name: str, rdtype: str) -> Tuple[DNSAnswer, bool]:
+        """Query DNS. Returns the answer and whether it may be shared via Redis."""
+        if self._resolver is None:
+            self._resolver = dns.asyncresolver.Resolver()
+            self._resolver.lifetime = self.lifetime
+
+        now = time.time()
+        try:
+            result = await self._resolver.resolve(name, rdtype)
+        except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
+            return DNSAnswer(records=[], expires_at=now + NEGATIVE_TTL), True
+        except (dns.exception.Timeout, dns.resolver.NoNameservers) as e:
+            logger.debug(f"DNS lookup failed for {name}/{rdtype}: {e}")
+            return DNSAnswer(records=[], expires_at=now + ERROR_TTL), False
+
+        if rdtype == "MX":
+            # A "null MX" (RFC 7505) has "." as exchange: no mail accepted
+            records = [
+                str(r.exchange).rstrip(".")
+                for r in sorted(result, key=lambda r: r.preference)
+                if str(r.exchange) != "."
+            ]
+        else:
+            records = [r.to_text() for r in result]
+
+        ttl = max(MIN_TTL, min(MAX_TTL, result.rrset.ttl if result.rrset else MIN_TTL))
+        return DNSAnswer(records=records, expires_at=now + ttl), True
+
+    def _get_local(self, key: Tuple[str, str]) -> Optional[DNSAnswer]:
+        with self._lock:
+            answer = self._local.get(key)
+            if answer is None:
+                return None
+            if answer.expires_at <= time.time():
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            return answer
+
+    def _put_local(self, key: Tuple[str, str], answer: DNSAnswer):
+        with self._lock:
+            self._local[key] = answer
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+
+    def _get_redis_client(self):
+        if aioredis is None or not self.redis_url or time.time() < self._redis_down_until:
+            return None
+        loop = asyncio.get_running_loop()
+        client = self._redis_clients.get(loop)
+        if client is None:
+            client = aioredis.from_url(self.redis_url, socket_timeout=1.0)
+            self._redis_clients[loop] = client
+        return client
+
+    def _redis_failed(self, e: Exception):
+        logger.warning(f"DNS cache: Redis unavailable, using local cache only for {REDIS_RETRY_AFTER}s: {e}")
+        self._redis_down_until = time.time() + REDIS_RETRY_AFTER
+
+    async def _get_redis(self, key: Tuple[str, str]) -> Optional[DNSAnswer]:
+        client = self._get_redis_client()
+        if client is None:
+            return None
+        try:
+            raw = await client.get(REDIS_KEY_PREFIX + ":".join(key))
+        except Exception as e:
+            self._redis_failed(e)
+            return None
+        if not raw:
+            return None
+        data = json.loads(raw)
+        return DNSAnswer(records=data["r"], expires_at=data["e"])
+
+    async def _put_redis(self, key: Tuple[str, str], answer: DNSAnswer):
+        client = self._get_redis_client()
+        if client is None:
+            return
+        ttl = int(answer.expires_at - time.time())
+        if ttl <= 0:
+            return
+        try:
+            await client.set(
+                REDIS_KEY_PREFIX + ":".join(key),
+                json.dumps({"r": answer.records, "e": answer.expires_at}),
+                ex=ttl,
+            )
+        except Exception as e:
+            self._redis_failed(e)
+
+
+# Global instance
+dns_cache = DNSCache(redis_url=os.environ.get("REDIS_URL"))
@@ -2,13 +2,12 @@
 Email verification module with 4-level verification system
 """
 import re
-import socket
-import smtplib
-import asyncio
-import dns.resolver
 from typing import Dict, List, Optional
 from dataclasses import dataclass
 
+from .dns_cache import dns_cache
+from .smtp_probe import smtp_prober
+
 # Common disposable email domains
 DISPOSABLE_DOMAINS = {
     "10minutemail.com", "guerrillamail.com", "mailinator.com", "tempmail.org",
@@ -126,7 +125,7 @@ class EmailVerifier:
             )
         
         # Level 4: SMTP validation (often unreliable, so we'll be more permissive)
-        smtp_result = await self._verify_smtp(email, mx_servers[0])
+        smtp_result = await self._verify_smtp(email, mx_servers)
         
         # Calculate final score
         score = self._calculate_score(
@@ -163,36 +162,32 @@ class EmailVerifier:
         return re.match(pattern, email) is not None
     
     async def _is_valid_domain(self, domain: str) -> bool:
-        """Check if domain is valid and resolvable"""
+        """Check if domain is valid and resolvable (cached per domain)"""
         try:
-            # Try to resolve the domain
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(None, socket.gethostbyname, domain)
-            return True
-        except (socket.gaierror, Exception):
+            return await dns_cache.has_address(domain)
+        except Exception:
             return False
     
     async def _get_mx_records(self, domain: str) -> List[str]:
-        """Get MX records for domain"""
+        """Get MX hosts for domain, sorted by preference (cached per domain)"""
         try:
-            loop = asyncio.get_event_loop()
-            mx_records = await loop.run_in_executor(None, self._resolve_mx, domain)
-            return [str(mx.exchange) for mx in sorted(mx_records, key=lambda x: x.preference)]
+            return await dns_cache.resolve(domain, 'MX')
         except Exception:
             return []
     
-    def _resolve_mx(self, domain: str):
-        """Synchronous MX record resolution"""
-        try:
-            return dns.resolver.resolve(domain, 'MX')
-        except Exception:
-            return []
+    async def prefetch_domains(self, emails: List[str]) -> int:
+        """Resolve A and MX records for every unique domain in one batch"""
+        domains = {
+            email.strip().lower().split('@')[-1]
+            for email in emails
+            if email and '@' in email
+        }
+        return await dns_cache.prefetch(domains)
     
-    async def _verify_smtp(self, email: str, mx_server: str) -> Dict:
-        """Perform SMTP verification"""
+    async def _verify_smtp(self, email: str, mx_servers: List[str]) -> Dict:
+        """Perform SMTP verification through the pooled async prober"""
         try:
-            loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(None, self._smtp_check, email, mx_server)
+            return await smtp_prober.verify(email, mx_servers)
         except Exception as e:
             return {
                 "deliverable": False,
@@ -200,62 +195,9 @@ class EmailVerifier:
                 "reason": f"SMTP error: {str(e)}"
             }
     
-    def _smtp_check(self, email: str, mx_server: str) -> Dict:
-        """Synchronous SMTP check"""
-        try:
-            # Remove trailing dot from MX server if present
-            mx_server = mx_server.rstrip('.')
-            
-            # Connect to SMTP server
-            with smtplib.SMTP(mx_server, 25, timeout=self.timeout) as server:
-                server.helo("captely.com")
-                
-                # Try to send RCPT TO command
-                code, message = server.rcpt(email)
-                
-                if code == 250:
-                    return {
-                        "deliverable": True,
-                        "is_catchall": False,
-                        "reason": "Email address accepted"
-                    }
-                elif code == 550:
-                    return {
-                        "deliverable": False,
-                        "is_catchall": False,
-                        "reason": "Email address rejected"
-                    }
-                else:
-                    # Check for catch-all by testing invalid email
-                    test_email = f"nonexistent{int(asyncio.get_event_loop().time())}@{email.split('@')[1]}"
-                    test_code, _ = server.rcpt(test_email)
-                    
-                    is_catchall = (test_code == 250)
-                    
-                    return {
-                        "deliverable": code in [250, 251, 252],
-                        "is_catchall": is_catchall,
-                        "reason": f"SMTP code: {code}"
-                    }
-                    
-        except smtplib.SMTPConnectError:
-            return {
-                "deliverable": False,
-                "is_catchall": False,
-                "reason": "Could not connect to SMTP server"
-            }
-        except smtplib.SMTPServerDisconnected:
-            return {
-                "deliverable": False,
-                "is_catchall": False,
-                "reason": "SMTP server disconnected"
-            }
-        except Exception as e:
-            return {
-                "deliverable": False,
-                "is_catchall": False,
-                "reason": f"SMTP verification failed: {str(e)}"
-            }
+    async def close(self):
+        """Close pooled SMTP sessions (call at the end of a batch)"""
+        await smtp_prober.close()
     
     def _calculate_score(self, verification_level: int, is_disposable: bool, 
                         is_role_based: bool, is_catchall: bool, deliverable: bool, has_mx: bool) -> int:
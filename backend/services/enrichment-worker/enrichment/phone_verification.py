@@ -2,10 +2,21 @@
 Phone verification module with carrier and geographic information
 """
 import re
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import phonenumbers
 from phonenumbers import carrier, geocoder, timezone
-from typing import Optional
-from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+from dataclasses import dataclass, replace
+
+PHONE_CACHE_SIZE = 50000   # Entries per LRU cache
+POOL_MIN_BATCH = 200       # Below this a process pool costs more than it saves
+POOL_CHUNK_SIZE = 500      # Phones per pool task
+
+# Regions whose metadata is loaded at worker startup
+WARM_UP_REGIONS = ("US", "CA", "GB", "FR", "DE", "ES", "IT", "NL", "BE", "CH", "AU")
 
 @dataclass
 class PhoneVerificationResult:
@@ -27,7 +38,11 @@ class PhoneVerificationResult:
 class PhoneVerifier:
     """Advanced phone verification with carrier and location detection"""
     
-    def __init__(self):
+    def __init__(self, cache_size: int = PHONE_CACHE_SIZE):
+        # Per-instance LRU caches: raw input -> E.164, and E.164 -> result
+        self._normalize = functools.lru_cache(maxsize=cache_size)(self._normalize_uncached)
+        self._lookup = functools.lru_cache(maxsize=cache_size)(self._lookup_uncached)
+        
         # VoIP providers (common ones)
         self.voip_patterns = {
             "skype", "google", "vonage", "magicjack", "ooma", "ringcentral",
@@ -43,109 +58,157 @@ class PhoneVerifier:
         """
         Comprehensive phone verification with classification
         """
+        return self.verify_phone_sync(phone, country_hint)
+    
+    async def verify_phones(self, phones: List[str], country_hint: str = None) -> List[PhoneVerificationResult]:
+        """
+        Verify many phones, in input order. Large batches fan out across a
+        process pool; small ones, and calls from daemonic processes, run on a
+        single thread so the event loop stays free.
+        """
+        unique = sorted({phone.strip() for phone in phones if phone and phone.strip()})
+        loop = asyncio.get_running_loop()
+        
+        if len(unique) < POOL_MIN_BATCH or multiprocessing.current_process().daemon:
+            # Daemonic processes (Celery prefork children) may not start a pool;
+            # the worker runs --pool=threads, so its tasks take the pool path
+            results = await loop.run_in_executor(None, _verify_chunk, unique, country_hint)
+        else:
+            pool = _get_process_pool()
+            chunks = [unique[i:i + POOL_CHUNK_SIZE] for i in range(0, len(unique), POOL_CHUNK_SIZE)]
+            chunk_results = await asyncio.gather(*(
+                loop.run_in_executor(pool, _verify_chunk, chunk, country_hint)
+                for chunk in chunks
+            ))
+            results = [result for chunk_result in chunk_results for result in chunk_result]
+        
+        by_phone = dict(zip(unique, results))
+        return [
+            by_phone[phone.strip()] if phone and phone.strip() else self.verify_phone_sync(phone or "")
+            for phone in phones
+        ]
+    
+    def verify_phone_sync(self, phone: str, country_hint: str = None) -> PhoneVerificationResult:
+        """
+        Synchronous verification (pure CPU), usable from worker pools
+        """
         phone = phone.strip()
         
         # Clean the phone number
         cleaned_phone = self._clean_phone_number(phone)
         
+        e164, error = self._normalize(cleaned_phone, country_hint)
+        if error:
+            return self._invalid_result(phone, error)
+        
+        try:
+            result = self._lookup(e164)
+        except Exception as e:
+            return self._invalid_result(phone, f"Verification error: {str(e)}")
+        
+        return replace(result, phone=phone)
+    
+    def warm_up(self):
+        """
+        Load parsing, carrier, geocoder and timezone metadata for our main
+        regions, so the first real lookups don't pay for it
+        """
+        for region in WARM_UP_REGIONS:
+            for number_type in (phonenumbers.PhoneNumberType.MOBILE, phonenumbers.PhoneNumberType.FIXED_LINE):
+                example = phonenumbers.example_number_for_type(region, number_type)
+                if example is None:
+                    continue
+                carrier.name_for_number(example, "en")
+                geocoder.description_for_number(example, "en")
+                timezone.time_zones_for_number(example)
+    
+    def cache_info(self) -> Dict[str, Any]:
+        """LRU statistics for the normalization and metadata caches"""
+        return {
+            "normalize": self._normalize.cache_info()._asdict(),
+            "lookup": self._lookup.cache_info()._asdict(),
+        }
+    
+    def _normalize_uncached(self, cleaned_phone: str, country_hint: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+        """Parse to E.164. Returns (e164, None) or (None, reason)"""
         try:
             # Parse the phone number
             parsed_number = phonenumbers.parse(cleaned_phone, country_hint)
-            
-            # Check if the number is valid
-            is_valid = phonenumbers.is_valid_number(parsed_number)
-            
-            if not is_valid:
-                return PhoneVerificationResult(
-                    phone=phone,
-                    is_valid=False,
-                    is_mobile=False,
-                    is_landline=False,
-                    is_voip=False,
-                    country="",
-                    carrier_name="",
-                    region="",
-                    formatted_international="",
-                    formatted_national="",
-                    score=0,
-                    reason="Invalid phone number"
-                )
-            
-            # Get country information
-            country_code = phonenumbers.region_code_for_number(parsed_number)
-            
-            # Get carrier information
-            carrier_name = carrier.name_for_number(parsed_number, "en")
-            
-            # Get geographic information
-            location = geocoder.description_for_number(parsed_number, "en")
-            
-            # Get formatted numbers
-            international_format = phonenumbers.format_number(
-                parsed_number, phonenumbers.PhoneNumberFormat.INTERNATIONAL
-            )
-            national_format = phonenumbers.format_number(
-                parsed_number, phonenumbers.PhoneNumberFormat.NATIONAL
-            )
-            
-            # Determine phone type
-            phone_type = phonenumbers.number_type(parsed_number)
-            is_mobile, is_landline, is_voip = self._classify_phone_type(phone_type, carrier_name)
-            
-            # Calculate quality score
-            score = self._calculate_phone_score(
-                is_valid=is_valid,
-                is_mobile=is_mobile,
-                has_carrier=bool(carrier_name),
-                has_location=bool(location),
-                country_code=country_code
-            )
-            
-            return PhoneVerificationResult(
-                phone=phone,
-                is_valid=is_valid,
-                is_mobile=is_mobile,
-                is_landline=is_landline,
-                is_voip=is_voip,
-                country=country_code or "",
-                carrier_name=carrier_name or "",
-                region=location or "",
-                formatted_international=international_format,
-                formatted_national=national_format,
-                score=score,
-                reason="Phone verification completed"
-            )
-            
         except phonenumbers.phonenumberutil.NumberParseException as e:
-            return PhoneVerificationResult(
-                phone=phone,
-                is_valid=False,
-                is_mobile=False,
-                is_landline=False,
-                is_voip=False,
-                country="",
-                carrier_name="",
-                region="",
-                formatted_international="",
-                formatted_national="",
-                score=0,
-                reason=f"Parse error: {e.error_type.name}"
-            )
+            return None, f"Parse error: {e}"
         except Exception as e:
-            return PhoneVerificationResult(
-                phone=phone,
-                is_valid=False,
-                is_mobile=False,
-                is_landline=False,
-                is_voip=False,
-                country="",
-                carrier_name="",
-                region="",
-                formatted_international="",
-                formatted_national="",
-                score=0,
-                reason=f"Verification error: {str(e)}"
-            )
+            return None, f"Verification error: {str(e)}"
+        
+        # Check if the number is valid
+        if not phonenumbers.is_valid_number(parsed_number):
+            return None, "Invalid phone number"
+        
+        return phonenumbers.format_number(parsed_number, phonenumbers.PhoneNumberFormat.E164), None
+    
+    def _lookup_uncached(self, e164: str) -> PhoneVerificationResult:
+        """Carrier, location and classification for a valid E.164 number"""
+        parsed_number = phonenumbers.parse(e164)
+        
+        # Get country information
+        country_code = phonenumbers.region_code_for_number(parsed_number)
+        
+        # Get carrier information
+        carrier_name = carrier.name_for_number(parsed_number, "en")
+        
+        # Get geographic information
+        location = geocoder.description_for_number(parsed_number, "en")
+        
+        # Get formatted numbers
+        international_format = phonenumbers.format_number(
+            parsed_number, phonenumbers.PhoneNumberFormat.INTERNATIONAL
+        )
+        national_format = phonenumbers.format_number(
+            parsed_number, phonenumbers.PhoneNumberFormat.NATIONAL
+        )
+        
+        # Determine phone type
+        phone_type = phonenumbers.number_type(parsed_number)
+        is_mobile, is_landline, is_voip = self._classify_phone_type(phone_type, carrier_name)
+        
+        # Calculate quality score
+        score = self._calculate_phone_score(
+            is_valid=True,
+            is_mobile=is_mobile,
+            has_carrier=bool(carrier_name),
+            has_location=bool(location),
+            country_code=country_code
+        )
+        
+        return PhoneVerificationResult(
+            phone=e164,
+            is_valid=True,
+            is_mobile=is_mobile,
+            is_landline=is_landline,
+            is_voip=is_voip,
+            country=country_code or "",
+            carrier_name=carrier_name or "",
+            region=location or "",
+            formatted_international=international_format,
+            formatted_national=national_format,
+            score=score,
+            reason="Phone verification completed"
+        )
+    
+    def _invalid_result(self, phone: str, reason: str) -> PhoneVerificationResult:
+        return PhoneVerificationResult(
+            phone=phone,
+            is_valid=False,
+            is_mobile=False,
+            is_landline=False,
+            is_voip=False,
+            country="",
+            carrier_name="",
+            region="",
+            formatted_international="",
+            formatted_national="",
+            score=0,
+            reason=reason
+        )
     
     def _clean_phone_number(self, phone: str) -> str:
         """Clean and normalize phone number"""
@@ -241,4 +304,27 @@ class PhoneVerifier:
 
 
 # Global instance
-phone_verifier = PhoneVerifier() 
\ No newline at end of file
+phone_verifier = PhoneVerifier()
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _verify_chunk(phones: List[str], country_hint: Optional[str] = None) -> List[PhoneVerificationResult]:
+    """Pool entry point: verify a chunk of phones with this process's verifier"""
+    return [phone_verifier.verify_phone_sync(phone, country_hint) for phone in phones]
+
+
+def _warm_up_worker():
+    """Pool initializer: load phone metadata once per worker process"""
+    phone_verifier.warm_up()
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    """Lazily start a spawn-based pool whose workers warm their metadata once"""
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_warm_up_worker,
+        )
+    return _process_pool 
\ No newline at end of file
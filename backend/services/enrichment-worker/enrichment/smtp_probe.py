@@ -0,0 +1,300 @@
+"""
+Async SMTP probe engine for level-4 email verification.
+
+Keeps a small pool of SMTP sessions per MX host and issues many RCPT TO
+probes per connection instead of reconnecting for every address. Each host
+gets a concurrency cap, greylisting replies (4xx) are retried after a delay,
+unreachable hosts are skipped for a while, and catch-all detection is cached
+per domain.
+
+Pooled sessions belong to the event loop that opened them. They are closed
+when that loop shuts down (asyncio.run, or loop.shutdown_asyncgens() for
+hand-managed loops), by close(), or once idle for IDLE_TIMEOUT.
+"""
+import os
+import time
+import uuid
+import asyncio
+import logging
+import weakref
+from collections import defaultdict
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SMTP_PORT = 25
+HELO_HOSTNAME = os.environ.get("SMTP_PROBE_HELO", "captely.com")
+MAIL_FROM = os.environ.get("SMTP_PROBE_SENDER", "verify@captely.com")
+
+MAX_SESSIONS_PER_HOST = 2      # Concurrent connections to one MX host
+MAX_RCPT_PER_TRANSACTION = 20  # RSET + MAIL FROM again after this many probes
+IDLE_TIMEOUT = 30              # Seconds before an idle session is dropped
+GREYLIST_DELAYS = (5, 20)      # Seconds to wait before each retry on 4xx
+CATCHALL_TTL = 24 * 3600       # Catch-all verdict cache per domain
+HOST_DOWN_TTL = 10 * 60        # Skip hosts we could not talk to
+
+ACCEPTED_CODES = {250, 251, 252}
+REJECTED_CODES = {550, 551, 553, 554}
+TEMPORARY_CODES = {421, 450, 451, 452}
+
+
+class SMTPProbeError(Exception):
+    """Unexpected reply while setting up an SMTP session."""
+
+
+class SMTPSession:
+    """One SMTP connection used for many RCPT TO probes."""
+
+    def __init__(self, host: str, timeout: float):
+        self.host = host
+        self.timeout = timeout
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.rcpt_count = 0
+        self.last_used = time.monotonic()
+
+    @property
+    def idle_expired(self) -> bool:
+        return time.monotonic() - self.last_used > IDLE_TIMEOUT
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, SMTP_PORT), self.timeout
+        )
+        code, message = await self._read_reply()
+        if code != 220:
+            raise SMTPProbeError(f"Greeting {code}: {message}")
+
+        code, message = await self.command(f"EHLO {HELO_HOSTNAME}")
+        if code != 250:
+            code, message = await self.command(f"HELO {HELO_HOSTNAME}")
+            if code != 250:
+                raise SMTPProbeError(f"HELO {code}: {message}")
+
+        await self._start_transaction()
+
+    async def rcpt(self, address: str) -> Tuple[int, str]:
+        if self.rcpt_count >= MAX_RCPT_PER_TRANSACTION:
+            code, message = await self.command("RSET")
+            if code != 250:
+                raise SMTPProbeError(f"RSET {code}: {message}")
+            await self._start_transaction()
+        self.rcpt_count += 1
+        code, message = await self.command(f"RCPT TO:<{address}>")
+        self.last_used = time.monotonic()
+        return code, message
+
+    async def close(self):
+        if self.writer is None:
+            return
+        try:
+            self.writer.write(b"QUIT\r\n")
+            await asyncio.wait_for(self.writer.drain(), 2)
+        except Exception:
+            pass
+        finally:
+            self.writer.close()
+            self.writer = None
+
+    async def command(self, line: str) -> Tuple[int, str]:
+        self.writer.write(line.encode("ascii", "replace") + b"\r\n")
+        await asyncio.wait_for(self.writer.drain(), self.timeout)
+        return await self._read_reply()
+
+    async def _start_transaction(self):
+        code, message = await self.command(f"MAIL FROM:<{MAIL_FROM}>")
+        if code != 250:
+            raise SMTPProbeError(f"MAIL FROM {code}: {message}")
+        self.rcpt_count = 0
+
+    async def _read_reply(self) -> Tuple[int, str]:
+        """Read a (possibly multi-line) reply."""
+        lines = []
+        while True:
+            raw = await asyncio.wait_for(self.reader.readline(), self.timeout)
+            if not raw:
+                raise ConnectionError("SMTP server disconnected")
+            line = raw.decode("latin-1").rstrip("\r\n")
+            lines.append(line[4:])
+            if len(line) < 4 or line[3] != "-":
+                try:
+                    return int(line[:3]), "\n".join(lines)
+                except ValueError:
+                    raise SMTPProbeError(f"Malformed reply: {line!r}")
+
+
+class SMTPProber:
+    """Pooled, rate-capped RCPT TO prober shared by all verifications."""
+
+    def __init__(self, timeout: float = 10):
+        self.timeout = timeout
+
+        # Verdicts shared across event loops
+        self._catchall: Dict[str, Tuple[bool, float]] = {}
+        self._host_down: Dict[str, float] = {}
+
+        # Sessions, semaphores and locks are bound to an event loop, and
+        # Celery thread workers each run their own loop.
+        self._loop_state: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict]" = weakref.WeakKeyDictionary()
+
+    # ----- Public API ----- #
+
+    async def verify(self, email: str, mx_hosts: List[str]) -> Dict:
+        """Probe ``email`` against its MX hosts, in preference order."""
+        domain = email.split("@")[-1]
+        last_reason = "Could not connect to SMTP server"
+
+        for host in mx_hosts[:2]:
+            host = host.rstrip(".")
+            if self._host_down.get(host, 0) > time.time():
+                continue
+            try:
+                code, message = await self._probe(host, email)
+                is_catchall = False
+                if code in ACCEPTED_CODES:
+                    is_catchall = await self._is_catchall(host, domain)
+            except (OSError, asyncio.TimeoutError, ConnectionError, SMTPProbeError) as e:
+                logger.debug(f"SMTP probe via {host} failed: {e}")
+                self._host_down[host] = time.time() + HOST_DOWN_TTL
+                last_reason = f"SMTP verification failed: {e}"
+                continue
+
+            return self._interpret(code, is_catchall)
+
+        return {
+            "deliverable": False,
+            "is_catchall": False,
+            "reason": last_reason
+        }
+
+    async def close(self):
+        """Close every pooled session of the current event loop."""
+        state = self._loop_state.pop(asyncio.get_running_loop(), None)
+        if state:
+            await state["closer"].aclose()
+
+    # ----- Internals ----- #
+
+    def _interpret(self, code: int, is_catchall: bool) -> Dict:
+        if code in ACCEPTED_CODES:
+            return {
+                "deliverable": True,
+                "is_catchall": is_catchall,
+                "reason": "Email address accepted" + (" (catch-all domain)" if is_catchall else "")
+            }
+        if code in REJECTED_CODES:
+            return {
+                "deliverable": False,
+                "is_catchall": False,
+                "reason": "Email address rejected"
+            }
+        if code in TEMPORARY_CODES:
+            return {
+                "deliverable": False,
+                "is_catchall": False,
+                "reason": f"Greylisted / temporarily unavailable (SMTP code: {code})"
+            }
+        return {
+            "deliverable": False,
+            "is_catchall": False,
+            "reason": f"SMTP code: {code}"
+        }
+
+    async def _state(self) -> Dict:
+        loop = asyncio.get_running_loop()
+        state = self._loop_state.get(loop)
+        if state is None:
+            state = {
+                "semaphores": defaultdict(lambda: asyncio.Semaphore(MAX_SESSIONS_PER_HOST)),
+                "idle": defaultdict(list),
+                "catchall_locks": defaultdict(asyncio.Lock),
+            }
+            # A started async generator is finalized by the loop's
+            # shutdown_asyncgens(), which asyncio.run() calls before closing
+            # the loop: its finally block is our loop-teardown hook.
+            state["closer"] = self._close_on_shutdown(state)
+            await state["closer"].asend(None)
+            self._loop_state[loop] = state
+        return state
+
+    @staticmethod
+    async def _close_on_shutdown(state: Dict) -> AsyncIterator[None]:
+        try:
+            yield
+        finally:
+            for sessions in state["idle"].values():
+                while sessions:
+                    await sessions.pop().close()
+
+    @staticmethod
+    def _reap_idle(state: Dict):
+        """Close sessions idle for longer than IDLE_TIMEOUT, on every host."""
+        for sessions in state["idle"].values():
+            for session in [session for session in sessions if session.idle_expired]:
+                sessions.remove(session)
+                asyncio.ensure_future(session.close())
+
+    async def _probe(self, host: str, address: str) -> Tuple[int, str]:
+        """RCPT TO with greylisting-aware retry."""
+        code, message = await self._rcpt(host, address)
+        for delay in GREYLIST_DELAYS:
+            if code not in TEMPORARY_CODES:
+                break
+            logger.debug(f"SMTP {code} from {host} for {address}, retrying in {delay}s")
+            await asyncio.sleep(delay)
+            code, message = await self._rcpt(host, address)
+        return code, message
+
+    async def _rcpt(self, host: str, address: str) -> Tuple[int, str]:
+        state = await self._state()
+        self._reap_idle(state)
+        async with state["semaphores"][host]:
+            idle = state["idle"][host]
+            while idle:
+                session = idle.pop()
+                if not session.idle_expired:
+                    try:
+                        return self._release(state, session, await session.rcpt(address))
+                    except (OSError, asyncio.TimeoutError, ConnectionError, SMTPProbeError):
+                        pass  # Stale connection (or failed RSET), fall through to a new one
+                    except BaseException:
+                        await session.close()
+                        raise
+                await session.close()
+
+            session = SMTPSession(host, self.timeout)
+            try:
+                await session.open()
+                return self._release(state, session, await session.rcpt(address))
+            except BaseException:
+                await session.close()
+                raise
+
+    def _release(self, state: Dict, session: SMTPSession, reply: Tuple[int, str]) -> Tuple[int, str]:
+        """Return the session to the pool unless the server is closing it."""
+        if reply[0] == 421:
+            asyncio.ensure_future(session.close())
+        else:
+            state["idle"][session.host].append(session)
+        return reply
+
+    async def _is_catchall(self, host: str, domain: str) -> bool:
+        cached = self._catchall.get(domain)
+        if cached and cached[1] > time.time():
+            return cached[0]
+
+        async with (await self._state())["catchall_locks"][domain]:
+            cached = self._catchall.get(domain)
+            if cached and cached[1] > time.time():
+                return cached[0]
+
+            code, _ = await self._rcpt(host, f"captely-{uuid.uuid4().hex[:16]}@{domain}")
+            if code in TEMPORARY_CODES:
+                return False  # Undecided; don't cache
+            is_catchall = code in ACCEPTED_CODES
+            self._catchall[domain] = (is_catchall, time.time() + CATCHALL_TTL)
+            return is_catchall
+
+
+# Global instance
+smtp_prober = SMTPProber()
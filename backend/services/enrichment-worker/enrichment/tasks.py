@@ -32,7 +32,8 @@ from enrichment.email_verification import email_verifier, EmailVerificationResul
 from enrichment.phone_verification import phone_verifier, PhoneVerificationResult
 
 # Database imports
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession
+from common.db import create_db_engine
 from sqlalchemy.orm import sessionmaker
 import sqlalchemy as sa
 
@@ -40,7 +41,7 @@ import sqlalchemy as sa
 settings = get_settings()
 
 # Initialize database connection
-engine = create_async_engine(settings.database_url)
+engine = create_db_engine(settings.database_url, role="worker")
 AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 # Initialize rate limiters for each service
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Parity tests between the Python lead scoring (app/scoring.py) and the SQL
+functions in migrations/lead_scoring_functions.sql.
+
+The SQL side runs only when SCORING_TEST_DATABASE_URL points at a Captely
+database; everything happens inside a transaction that is rolled back.
+"""
+import os
+import random
+import itertools
+
+import pytest
+
+from app.scoring import calculate_lead_score, calculate_email_reliability
+
+MIGRATION_PATH = os.path.join(
+    os.path.dirname(__file__), '..', '..', 'migrations', 'lead_scoring_functions.sql'
+)
+
+TEXTS = [None, '', '   ', '\t\n', 'john@acme.com']
+NAMES = [None, '', ' ', 'unknown', 'Unknown', 'Acme', 'VP Sales']
+SCORES = [None, 0.0, -0.1, 0.1, 0.2, 0.3, 0.4, 0.49, 0.5, 0.59, 0.6, 0.69,
+          0.7, 0.75, 0.79, 0.8, 0.89, 0.9, 0.95, 1.0]
+FLAGS = [False, True]
+
+
+def lead_score_cases(count: int = 3000):
+    """Deterministic sample of the lead score input space."""
+    rng = random.Random(26)
+    for _ in range(count):
+        yield dict(
+            email=rng.choice(TEXTS),
+            phone=rng.choice(TEXTS[:-1] + ['+33612345678']),
+            email_verified=rng.choice(FLAGS),
+            phone_verified=rng.choice(FLAGS),
+            email_verification_score=rng.choice(SCORES),
+            phone_verification_score=rng.choice(SCORES),
+            company=rng.choice(NAMES),
+            position=rng.choice(NAMES),
+            profile_url=rng.choice(TEXTS[:-1] + ['https://linkedin.com/in/john']),
+            enrichment_score=rng.choice(SCORES),
+        )
+
+
+def email_reliability_cases():
+    """Exhaustive email reliability input space."""
+    for email, verified, score, disposable, role, catchall in itertools.product(
+        TEXTS, FLAGS, SCORES, FLAGS, FLAGS, FLAGS
+    ):
+        yield dict(
+            email=email,
+            email_verified=verified,
+            email_verification_score=score,
+            is_disposable=disposable,
+            is_role_based=role,
+            is_catchall=catchall,
+        )
+
+
+# ===== PYTHON REFERENCE CASES =====
+
+def test_lead_score_bounds():
+    for case in lead_score_cases():
+        assert 20 <= calculate_lead_score(**case) <= 100
+
+
+def test_lead_score_reference_values():
+    assert calculate_lead_score() == 20
+    assert calculate_lead_score(email='a@b.com') == 40
+    assert calculate_lead_score(email='a@b.com', email_verification_score=0.7) == 50
+    assert calculate_lead_score(email='a@b.com', email_verified=True, email_verification_score=0.7) == 70
+    assert calculate_lead_score(phone='+33612345678', phone_verification_score=0.3) == 38
+    assert calculate_lead_score(company='Unknown', position='CTO', profile_url=' ') == 30
+    assert calculate_lead_score(
+        email='a@b.com', phone='+33612345678', email_verified=True, phone_verified=True,
+        email_verification_score=0.95, phone_verification_score=0.95,
+        company='Acme', position='CTO', profile_url='https://linkedin.com/in/a',
+        enrichment_score=0.9,
+    ) == 100
+
+
+def test_email_reliability_reference_values():
+    assert calculate_email_reliability() == 'no_email'
+    assert calculate_email_reliability(email='a@b.com', is_disposable=True) == 'poor'
+    assert calculate_email_reliability(email='a@b.com') == 'unknown'
+    assert calculate_email_reliability(email='a@b.com', email_verified=True) == 'fair'
+    assert calculate_email_reliability(email='a@b.com', email_verified=True, email_verification_score=0.9) == 'excellent'
+    assert calculate_email_reliability(
+        email='a@b.com', email_verified=True, email_verification_score=0.9, is_role_based=True
+    ) == 'fair'
+    assert calculate_email_reliability(
+        email='a@b.com', email_verified=True, email_verification_score=0.9, is_catchall=True
+    ) == 'good'
+
+
+# ===== SQL PARITY =====
+
+@pytest.fixture(scope='module')
+def scoring_db():
+    url = os.environ.get('SCORING_TEST_DATABASE_URL')
+    if not url:
+        pytest.skip('SCORING_TEST_DATABASE_URL not set')
+    sqlalchemy = pytest.importorskip('sqlalchemy')
+
+    engine = sqlalchemy.create_engine(url.replace('+asyncpg', ''))
+    with engine.connect() as conn:
+        trans = conn.begin()
+        with open(MIGRATION_PATH) as f:
+            conn.exec_driver_sql(f.read())
+        try:
+            yield conn
+        finally:
+            trans.rollback()
+    engine.dispose()
+
+
+def test_lead_score_sql_parity(scoring_db):
+    from sqlalchemy import text
+
+    stmt = text("""
+        SELECT calculate_lead_score(
+            :email, :phone, :email_verified, :phone_verified,
+            CAST(:email_verification_score AS DOUBLE PRECISION),
+            CAST(:phone_verification_score AS DOUBLE PRECISION),
+            :company, :position, :profile_url,
+            CAST(:enrichment_score AS DOUBLE PRECISION)
+        )
+    """)
+    for case in lead_score_cases():
+        assert scoring_db.execute(stmt, case).scalar() == calculate_lead_score(**case), case
+
+
+def test_email_reliability_sql_parity(scoring_db):
+    from sqlalchemy import text
+
+    stmt = text("""
+        SELECT calculate_email_reliability(
+            :email, :email_verified,
+            CAST(:email_verification_score AS DOUBLE PRECISION),
+            :is_disposable, :is_role_based, :is_catchall
+        )
+    """)
+    for case in email_reliability_cases():
+        assert scoring_db.execute(stmt, case).scalar() == calculate_email_reliability(**case), case
+
+
+def test_contact_row_wrappers_parity(scoring_db):
+    """REAL columns must score like the values the worker reads back."""
+    from sqlalchemy import text
+
+    for score in [0.5, 0.6, 0.7, 0.8, 0.9]:
+        row = scoring_db.execute(text("""
+            INSERT INTO contacts (
+                email, phone, email_verified, phone_verified,
+                email_verification_score, phone_verification_score,
+                company, position, profile_url, enrichment_score
+            ) VALUES (
+                'a@b.com', '+33612345678', true, true,
+                :score, :score, 'Acme', 'CTO', 'https://linkedin.com/in/a', :score
+            )
+            RETURNING contact_lead_score(contacts), contact_email_reliability(contacts)
+        """), {"score": score}).first()
+
+        assert row[0] == calculate_lead_score(
+            email='a@b.com', phone='+33612345678', email_verified=True, phone_verified=True,
+            email_verification_score=score, phone_verification_score=score,
+            company='Acme', position='CTO', profile_url='https://linkedin.com/in/a',
+            enrichment_score=score,
+        )
+        assert row[1] == calculate_email_reliability(
+            email='a@b.com', email_verified=True, email_verification_score=score
+        )
@@ -0,0 +1,234 @@
+"""
+Asynchronous export jobs.
+
+POST /api/export/jobs records an export_jobs row and queues run_export on
+the ``exports`` queue, served by the export worker (same image as
+export-service, see docker-compose.yaml). The worker streams the rows from
+a server-side cursor into a file, reports rows_written as it goes and
+stores the file in S3 when S3_BUCKET_EXPORTS is configured, otherwise in
+EXPORT_ARTIFACT_DIR (a volume shared with the API).
+
+Exports are cached by job + format + columns + filters + the job's
+last-modified marker, so repeating a request for an unchanged job returns
+the existing artifact instead of recomputing it.
+"""
+import os
+import json
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from celery import Celery
+from sqlalchemy import text
+
+from common.config import get_settings
+from common.db import SessionLocal
+from common.exports import STREAM_ENCODERS, stream_query_sync, write_export_file, remove_file
+from common.storage import ArtifactStore, get_s3_client
+from app.export_query import JOB_EXPORT
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+EXPORT_QUEUE = "exports"
+EXPORT_ARTIFACT_DIR = os.environ.get("EXPORT_ARTIFACT_DIR", "/data/exports")
+EXPORT_ARTIFACT_TTL = timedelta(hours=int(os.environ.get("EXPORT_ARTIFACT_TTL_HOURS", "24")))
+EXPORT_TIME_LIMIT = 1860                # Hard task time limit, seconds
+# A queued / running export older than this was lost (worker killed or
+# crashed, or never enqueued): the cache ignores it and the task may reclaim it
+EXPORT_STALE_AFTER = timedelta(seconds=EXPORT_TIME_LIMIT + 60)
+
+# Formats an export job can produce: format -> file extension
+ARTIFACT_FORMATS = {
+    **{name: encoder.extension for name, encoder in STREAM_ENCODERS.items()},
+    "excel": "xlsx",
+}
+
+celery_app = Celery(
+    "exports", broker=settings.redis_url, backend=settings.redis_url, include=["app.salesforce_bulk"]
+)
+celery_app.conf.update(
+    task_serializer="json",
+    accept_content=["json"],
+    result_serializer="json",
+    enable_utc=True,
+    task_acks_late=True,
+    worker_prefetch_multiplier=1,
+    task_soft_time_limit=EXPORT_TIME_LIMIT - 60,
+    task_time_limit=EXPORT_TIME_LIMIT,
+    task_routes={
+        "app.export_jobs.*": {"queue": EXPORT_QUEUE},
+        "app.salesforce_bulk.*": {"queue": EXPORT_QUEUE},
+    },
+    beat_schedule={
+        "purge-expired-exports": {
+            "task": "app.export_jobs.purge_expired_exports",
+            "schedule": 3600.0,
+        },
+    },
+)
+
+artifact_store = ArtifactStore(EXPORT_ARTIFACT_DIR, settings.s3_bucket_exports, get_s3_client())
+
+
+# ----- Cache keys ----- #
+
+# Cheap change marker for a job's export: contacts.updated_at is maintained
+# by trigger and the count catches deletions
+JOB_VERSION_QUERY = text("""
+    SELECT COUNT(*), MAX(updated_at)
+    FROM contacts
+    WHERE job_id = :job_id AND user_id = :user_id
+""")
+
+
+def export_cache_key(
+    job_id: str,
+    format: str,
+    columns: Optional[list],
+    filters: Optional[Dict[str, Any]],
+    contact_count: int,
+    last_modified: Optional[datetime],
+) -> str:
+    payload = {
+        "job_id": job_id,
+        "format": format,
+        "columns": JOB_EXPORT.select(columns),
+        "filters": filters or {},
+        "version": [contact_count, last_modified.isoformat() if last_modified else None],
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def export_job_payload(row) -> Dict[str, Any]:
+    """API representation of an export_jobs row."""
+    job = row._mapping
+    total = job["total_rows"]
+    payload = {
+        "export_id": job["id"],
+        "job_id": job["job_id"],
+        "format": job["format"],
+        "status": job["status"],
+        "rows_written": job["rows_written"],
+        "total_rows": total,
+        "progress": round(min(job["rows_written"] / total, 1.0) * 100, 1) if total else (100.0 if job["status"] == "completed" else 0.0),
+        "size_bytes": job["size_bytes"],
+        "error": job["error"],
+        "created_at": job["created_at"].isoformat() if job["created_at"] else None,
+        "completed_at": job["completed_at"].isoformat() if job["completed_at"] else None,
+        "expires_at": job["expires_at"].isoformat() if job["expires_at"] else None,
+        "download_url": None,
+    }
+    if job["status"] == "completed":
+        payload["download_url"] = f"/api/export/jobs/{job['id']}/download"
+    return payload
+
+
+def artifact_filename(row) -> str:
+    job = row._mapping
+    return f"enriched_data_{job['job_id']}.{ARTIFACT_FORMATS.get(job['format'], job['format'])}"
+
+
+# ----- Worker tasks ----- #
+
+def _update(export_id: str, **fields):
+    assignments = ", ".join(f"{name} = :{name}" for name in fields)
+    with SessionLocal() as session:
+        session.execute(text(f"UPDATE export_jobs SET {assignments} WHERE id = :id"), {"id": export_id, **fields})
+        session.commit()
+
+
+@celery_app.task(bind=True, name="app.export_jobs.run_export")
+def run_export(self, export_id: str):
+    """Produce the artifact for one export_jobs row."""
+    # A 'running' row is claimed again when this is a redelivery (acks are
+    # late, so the worker that ran it died) or it outlived the time limit
+    redelivered = bool((self.request.delivery_info or {}).get("redelivered"))
+    with SessionLocal() as session:
+        job = session.execute(text("""
+            UPDATE export_jobs SET status = 'running', started_at = NOW(), rows_written = 0, error = NULL
+            WHERE id = :id AND (
+                status IN ('queued', 'failed')
+                OR (status = 'running' AND (:redelivered OR started_at < NOW() - make_interval(secs => :stale)))
+            )
+            RETURNING *
+        """), {
+            "id": export_id, "redelivered": redelivered, "stale": EXPORT_STALE_AFTER.total_seconds(),
+        }).mappings().first()
+        if not job:
+            return {"export_id": export_id, "skipped": True}
+
+        where = ["c.job_id = :job_id", "c.enriched = true", "c.user_id = :user_id"]
+        base_params = {"job_id": job["job_id"], "user_id": job["user_id"]}
+        # Upper bound for progress; filters can only remove rows
+        total = session.execute(
+            text(f"SELECT COUNT(*) FROM contacts c WHERE {' AND '.join(where)}"), base_params
+        ).scalar()
+        session.execute(
+            text("UPDATE export_jobs SET total_rows = :total WHERE id = :id"),
+            {"id": export_id, "total": total},
+        )
+        session.commit()
+
+    written = 0
+
+    def counted(batches):
+        nonlocal written
+        try:
+            for batch in batches:
+                yield batch
+                written += len(batch)
+                _update(export_id, rows_written=written)
+        finally:
+            batches.close()
+
+    path = None
+    try:
+        columns, query, params = JOB_EXPORT.build(job["columns"], job["filters"], where, base_params)
+        path = write_export_file(
+            job["format"], columns, counted(stream_query_sync(query, params)), JOB_EXPORT.kinds(columns)
+        )
+        key = f"{job['user_id']}/{export_id}.{ARTIFACT_FORMATS[job['format']]}"
+        storage, size = artifact_store.save(path, key)
+        path = None
+        _update(
+            export_id,
+            status="completed",
+            storage=storage,
+            artifact_key=key,
+            size_bytes=size,
+            rows_written=written,
+            total_rows=written,
+            completed_at=datetime.utcnow(),
+            expires_at=datetime.utcnow() + EXPORT_ARTIFACT_TTL,
+        )
+        logger.info(f"Export {export_id} completed: {written} rows, {size} bytes ({storage})")
+        return {"export_id": export_id, "rows": written, "size_bytes": size}
+    except Exception as e:
+        logger.error(f"Export {export_id} failed: {e}")
+        _update(export_id, status="failed", error=str(e)[:1000], completed_at=datetime.utcnow())
+        raise
+    finally:
+        if path:
+            remove_file(path)
+
+
+@celery_app.task(name="app.export_jobs.purge_expired_exports")
+def purge_expired_exports():
+    """Delete artifacts past their expiry (scheduled hourly by the worker's beat)."""
+    with SessionLocal() as session:
+        expired = session.execute(text("""
+            SELECT id, storage, artifact_key FROM export_jobs
+            WHERE artifact_key IS NOT NULL AND expires_at < NOW()
+        """)).fetchall()
+        for export_id, storage, key in expired:
+            artifact_store.delete(storage, key)
+        if expired:
+            session.execute(
+                text("UPDATE export_jobs SET status = 'expired', artifact_key = NULL WHERE id = ANY(:ids)"),
+                {"ids": [row[0] for row in expired]},
+            )
+            session.commit()
+    return {"purged": len(expired)}
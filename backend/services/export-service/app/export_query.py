@@ -0,0 +1,171 @@
+"""
+Export query builder.
+
+Each export source whitelists the columns it can export, with their SQL
+expression and type. Requested columns become the SELECT list and filters
+become bound WHERE conditions, so names from the request never reach the
+SQL text and only the columns asked for leave Postgres.
+
+enrichment_results is joined through a LATERAL subquery that picks each
+contact's latest result (one row per contact, instead of one per result),
+and only when a selected or filtered column needs it.
+"""
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+
+
+class ExportQueryError(ValueError):
+    """A filter value that doesn't fit its column; reported as a 400."""
+
+
+def _bool(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in ("true", "false", "1", "0", "yes", "no"):
+        return value.strip().lower() in ("true", "1", "yes")
+    raise ValueError(f"not a boolean: {value!r}")
+
+
+def _datetime(value: Any) -> datetime:
+    """Naive UTC datetime; aware values are converted to UTC first."""
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+# Column type -> value kind used for typed export formats (Parquet / Arrow)
+_KINDS = {str: "string", int: "int", float: "float", _bool: "bool", _datetime: "timestamp"}
+
+
+@dataclass(frozen=True)
+class ExportColumn:
+    sql: str
+    type: Callable[[Any], Any] = str
+    join: Optional[str] = None      # Optional join the expression reads from
+
+
+@dataclass(frozen=True)
+class ExportSource:
+    from_sql: str
+    columns: Dict[str, ExportColumn]
+    order_by: str
+    joins: Dict[str, str] = field(default_factory=dict)
+
+    def select(self, columns: Optional[Sequence[str]]) -> List[str]:
+        """Requested columns that exist, in request order; all columns if none do."""
+        return [name for name in (columns or []) if name in self.columns] or list(self.columns)
+
+    def kinds(self, names: Sequence[str]) -> List[str]:
+        return [_KINDS[self.columns[name].type] for name in names]
+
+    def _condition(self, name: str, value: Any, param: str, params: Dict[str, Any]) -> str:
+        column = self.columns[name]
+        try:
+            if value is None:
+                return f"{column.sql} IS NULL"
+            if isinstance(value, (list, tuple)):
+                params[param] = [column.type(v) for v in value]
+                return f"{column.sql} = ANY(:{param})"
+            params[param] = column.type(value)
+            return f"{column.sql} = :{param}"
+        except (TypeError, ValueError) as e:
+            raise ExportQueryError(f"Invalid filter value for {name}: {e}")
+
+    def build(
+        self,
+        columns: Optional[Sequence[str]],
+        filters: Optional[Dict[str, Any]],
+        where: Sequence[str],
+        params: Dict[str, Any],
+    ) -> Tuple[List[str], Any, Dict[str, Any]]:
+        """
+        (output column names, query, params) for an export.
+
+        ``where`` holds the fixed, trusted conditions (ownership, job);
+        ``params`` their values. Unknown column and filter names are ignored.
+        """
+        names = self.select(columns)
+        params = dict(params)
+        conditions = list(where)
+        filtered = []
+        for i, (name, value) in enumerate((filters or {}).items()):
+            if name in self.columns:
+                conditions.append(self._condition(name, value, f"filter_{i}", params))
+                filtered.append(name)
+
+        needed = {self.columns[name].join for name in (*names, *filtered)} - {None}
+        joins = "".join(sql for join, sql in self.joins.items() if join in needed)
+        select_list = ", ".join(f"{self.columns[name].sql} AS {name}" for name in names)
+
+        query = text(f"""
+            SELECT {select_list}
+            FROM {self.from_sql}{joins}
+            WHERE {" AND ".join(conditions)}
+            ORDER BY {self.order_by}
+        """)
+        return names, query, params
+
+
+# ----- Sources ----- #
+
+_CONTACT_COLUMNS = {
+    "id": ExportColumn("c.id", int),
+    "first_name": ExportColumn("c.first_name"),
+    "last_name": ExportColumn("c.last_name"),
+    "email": ExportColumn("c.email"),
+    "phone": ExportColumn("c.phone"),
+    "company": ExportColumn("c.company"),
+    "position": ExportColumn("c.position"),
+    "location": ExportColumn("c.location"),
+    "industry": ExportColumn("c.industry"),
+    "enriched": ExportColumn("c.enriched", _bool),
+    "enrichment_status": ExportColumn("c.enrichment_status"),
+    "enrichment_provider": ExportColumn("c.enrichment_provider"),
+    "enrichment_score": ExportColumn("c.enrichment_score", float),
+    "credits_consumed": ExportColumn("c.credits_consumed", int),
+    "email_verified": ExportColumn("c.email_verified", _bool),
+    "phone_verified": ExportColumn("c.phone_verified", _bool),
+    "created_at": ExportColumn("c.created_at", _datetime),
+    "updated_at": ExportColumn("c.updated_at", _datetime),
+}
+
+# Latest enrichment result per contact (idx_enrichment_results_contact_latest)
+LATEST_ENRICHMENT_JOIN = """
+            LEFT JOIN LATERAL (
+                SELECT provider, confidence_score, email_verified, phone_verified
+                FROM enrichment_results
+                WHERE contact_id = c.id
+                ORDER BY created_at DESC, id DESC
+                LIMIT 1
+            ) er ON true"""
+
+JOB_EXPORT = ExportSource(
+    from_sql="contacts c",
+    columns={
+        **_CONTACT_COLUMNS,
+        "provider": ExportColumn("COALESCE(er.provider, c.enrichment_provider)", join="er"),
+        "confidence_score": ExportColumn("COALESCE(er.confidence_score, c.enrichment_score)", float, join="er"),
+        "email_verified_status": ExportColumn("COALESCE(er.email_verified, c.email_verified)", _bool, join="er"),
+        "phone_verified_status": ExportColumn("COALESCE(er.phone_verified, c.phone_verified)", _bool, join="er"),
+    },
+    joins={"er": LATEST_ENRICHMENT_JOIN},
+    order_by="c.created_at DESC, c.id DESC",
+)
+
+CRM_EXPORT = ExportSource(
+    from_sql="contacts c\n            JOIN import_jobs j ON c.job_id = j.id",
+    columns={
+        **_CONTACT_COLUMNS,
+        "job_id": ExportColumn("c.job_id"),
+        "batch_name": ExportColumn("j.file_name"),
+        "batch_created_at": ExportColumn("j.created_at", _datetime),
+    },
+    order_by="c.created_at DESC, c.id DESC",
+)
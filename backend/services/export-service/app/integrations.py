@@ -8,8 +8,17 @@ from typing import Dict, List, Optional
 from datetime import datetime, timedelta
 import json
 import asyncio
+import logging
 from urllib.parse import urlencode, parse_qs
 
+from common.hubspot import HubSpotBulkSync
+from common.webhooks import enqueue_webhooks
+from app.salesforce_bulk import (
+    contact_to_salesforce, email_chunks, lookup_soql, match_contact_ids, upsert_field_problem,
+)
+
+logger = logging.getLogger(__name__)
+
 class HubSpotIntegration:
     def __init__(self, access_token: str = None, client_id: str = None, client_secret: str = None):
         # Use your actual HubSpot app credentials
@@ -161,126 +170,44 @@ class HubSpotIntegration:
                 raise Exception(f"Failed to import contacts: {response.text}")
     
     async def create_or_update_contacts(self, contacts: List[Dict]) -> Dict:
-        """Batch create or update contacts in HubSpot using OAuth"""
+        """Upsert contacts in HubSpot, matched on email, with the batch API"""
         if not self.access_token:
             raise Exception("Access token required for HubSpot operations")
         
-        async with httpx.AsyncClient() as client:
-            results = {"created": 0, "updated": 0, "errors": []}
-            
-            # Process contacts in batches of 100 (HubSpot limit)
-            for i in range(0, len(contacts), 100):
-                batch_contacts = contacts[i:i+100]
-                batch_data = {"inputs": []}
-                
-                for contact in batch_contacts:
-                    properties = {}
-                    
-                    # Map fields to HubSpot properties
-                    if contact.get('first_name'):
-                        properties['firstname'] = contact['first_name']
-                    if contact.get('last_name'):
-                        properties['lastname'] = contact['last_name']
-                    if contact.get('email'):
-                        properties['email'] = contact['email']
-                    if contact.get('phone'):
-                        properties['phone'] = contact['phone']
-                    if contact.get('company'):
-                        properties['company'] = contact['company']
-                    if contact.get('position'):
-                        properties['jobtitle'] = contact['position']
-                    
-                    # Add enrichment metadata
-                    if contact.get('enrichment_provider'):
-                        properties['captely_source'] = contact['enrichment_provider']
-                    if contact.get('enrichment_score'):
-                        properties['captely_confidence'] = str(contact['enrichment_score'])
-                    if contact.get('lead_score'):
-                        properties['hs_lead_score'] = str(contact['lead_score'])
-                    
-                    # Add custom properties from contact
-                    if contact.get('custom_fields'):
-                        properties.update(contact['custom_fields'])
-                    
-                    batch_data["inputs"].append({"properties": properties})
-                
-                try:
-                    # Try to create new contacts first
-                    response = await client.post(
-                        f"{self.base_url}/crm/v3/objects/contacts/batch/create",
-                        headers=self.headers,
-                        json=batch_data,
-                        timeout=30.0
-                    )
-                    
-                    if response.status_code == 201:
-                        result = response.json()
-                        results["created"] += len(result.get("results", []))
-                    elif response.status_code == 409:  # Conflict - contacts exist
-                        # Try to update existing contacts
-                        await self._update_existing_contacts(client, batch_contacts, results)
-                    else:
-                        error_msg = f"Batch {i//100 + 1}: {response.status_code} - {response.text}"
-                        results["errors"].append(error_msg)
-                
-                except Exception as e:
-                    results["errors"].append(f"Batch {i//100 + 1}: {str(e)}")
-            
-            return results
-    
-    async def _update_existing_contacts(self, client: httpx.AsyncClient, contacts: List[Dict], results: Dict):
-        """Update existing contacts by email lookup"""
+        inputs = []
         for contact in contacts:
-            if not contact.get('email'):
-                continue
-                
-            try:
-                # Search for contact by email
-                search_response = await client.post(
-                    f"{self.base_url}/crm/v3/objects/contacts/search",
-                    headers=self.headers,
-                    json={
-                        "filterGroups": [{
-                            "filters": [{
-                                "propertyName": "email",
-                                "operator": "EQ",
-                                "value": contact['email']
-                            }]
-                        }]
-                    }
-                )
-                
-                if search_response.status_code == 200:
-                    search_data = search_response.json()
-                    if search_data.get("results"):
-                        # Update the found contact
-                        contact_id = search_data["results"][0]["id"]
-                        
-                        properties = {}
-                        if contact.get('first_name'):
-                            properties['firstname'] = contact['first_name']
-                        if contact.get('last_name'):
-                            properties['lastname'] = contact['last_name']
-                        if contact.get('phone'):
-                            properties['phone'] = contact['phone']
-                        if contact.get('company'):
-                            properties['company'] = contact['company']
-                        if contact.get('position'):
-                            properties['jobtitle'] = contact['position']
-                        
-                        update_response = await client.patch(
-                            f"{self.base_url}/crm/v3/objects/contacts/{contact_id}",
-                            headers=self.headers,
-                            json={"properties": properties}
-                        )
-                        
-                        if update_response.status_code == 200:
-                            results["updated"] += 1
-                        else:
-                            results["errors"].append(f"Update failed for {contact['email']}: {update_response.text}")
-                
-            except Exception as e:
-                results["errors"].append(f"Update error for {contact.get('email', 'unknown')}: {str(e)}")
+            properties = {}
+            
+            # Map fields to HubSpot properties
+            if contact.get('first_name'):
+                properties['firstname'] = contact['first_name']
+            if contact.get('last_name'):
+                properties['lastname'] = contact['last_name']
+            if contact.get('email'):
+                properties['email'] = contact['email']
+            if contact.get('phone'):
+                properties['phone'] = contact['phone']
+            if contact.get('company'):
+                properties['company'] = contact['company']
+            if contact.get('position'):
+                properties['jobtitle'] = contact['position']
+            
+            # Add enrichment metadata
+            if contact.get('enrichment_provider'):
+                properties['captely_source'] = contact['enrichment_provider']
+            if contact.get('enrichment_score'):
+                properties['captely_confidence'] = str(contact['enrichment_score'])
+            if contact.get('lead_score'):
+                properties['hs_lead_score'] = str(contact['lead_score'])
+            
+            # Add custom properties from contact
+            if contact.get('custom_fields'):
+                properties.update(contact['custom_fields'])
+            
+            inputs.append(properties)
+        
+        result = await HubSpotBulkSync(self.access_token, base_url=self.base_url).upsert(inputs)
+        return result.as_dict()
     
     async def export_to_list(self, list_id: str, contact_emails: List[str]) -> Dict:
         """Add contacts to a HubSpot list"""
@@ -453,6 +380,20 @@ class SalesforceIntegration:
             else:
                 raise Exception(f"Failed to get user info: {response.text}")
     
+    async def count_contacts(self) -> int:
+        """Number of contacts with an email, to choose between the REST and Bulk APIs"""
+        async with httpx.AsyncClient() as client:
+            response = await client.get(
+                f"{self.instance_url}/services/data/{self.api_version}/query",
+                headers=self.headers,
+                params={"q": "SELECT COUNT() FROM Contact WHERE Email != null"}
+            )
+            
+            if response.status_code == 200:
+                return response.json().get("totalSize", 0)
+            else:
+                raise Exception(f"Failed to count contacts: {response.text}")
+    
     async def import_contacts(self, limit: int = 200, offset: int = 0) -> Dict:
         """Import contacts from Salesforce"""
         async with httpx.AsyncClient() as client:
@@ -501,43 +442,62 @@ class SalesforceIntegration:
             else:
                 raise Exception(f"Failed to import contacts: {response.text}")
     
+    async def has_upsert_field(self, client: httpx.AsyncClient) -> bool:
+        """Whether Contact has the email mirror External ID field (else match on Email only)"""
+        response = await client.get(
+            f"{self.instance_url}/services/data/{self.api_version}/sobjects/Contact/describe",
+            headers=self.headers
+        )
+        if response.status_code != 200:
+            raise Exception(f"Failed to describe Contact: {response.text}")
+        problem = upsert_field_problem(response.json().get("fields", []))
+        if problem:
+            logger.warning(f"{problem}; matching Salesforce contacts on Email only")
+        return problem is None
+    
+    async def lookup_contact_ids(self, client: httpx.AsyncClient, emails: List[str], mirror_email: bool) -> Dict[str, str]:
+        """Lower-cased email -> Id of the existing Contact for each email that has one"""
+        records = []
+        for chunk in email_chunks(emails):
+            url = f"{self.instance_url}/services/data/{self.api_version}/query"
+            params = {"q": lookup_soql(chunk, mirror_email)}
+            while url:
+                response = await client.get(url, headers=self.headers, params=params)
+                if response.status_code != 200:
+                    raise Exception(f"Failed to look up contacts: {response.text}")
+                data = response.json()
+                records.extend(data.get("records", []))
+                url = f"{self.instance_url}{data['nextRecordsUrl']}" if data.get("nextRecordsUrl") else None
+                params = None
+        return match_contact_ids(records, mirror_email)
+    
     async def create_or_update_contacts(self, contacts: List[Dict]) -> Dict:
-        """Batch create or update contacts in Salesforce"""
+        """
+        Create or update contacts in Salesforce (composite API, 200 per call).
+        
+        Existing Contacts are found by Email (and by the email mirror External ID
+        field when the org has it, which is then backfilled) and updated by Id;
+        the rest are created.
+        """
         if not self.access_token:
             raise Exception("Access token required for Salesforce operations")
         
-        async with httpx.AsyncClient() as client:
-            results = {"created": 0, "updated": 0, "errors": []}
+        async with httpx.AsyncClient(timeout=60.0) as client:
+            results = {"created": 0, "updated": 0, "failed": 0, "errors": []}
+            mirror_email = await self.has_upsert_field(client)
+            existing = await self.lookup_contact_ids(client, [c.get("email") for c in contacts], mirror_email)
             
             # Process contacts in batches of 200 (Salesforce limit)
             for i in range(0, len(contacts), 200):
                 batch_contacts = contacts[i:i+200]
-                
-                # Prepare batch request for contacts
-                composite_data = {
-                    "allOrNone": False,
-                    "records": []
-                }
+                updates, creates = [], []
                 
                 for contact in batch_contacts:
                     contact_data = {
-                        "attributes": {"type": "Contact"}
+                        "attributes": {"type": "Contact"},
+                        **contact_to_salesforce(contact, mirror_email)
                     }
                     
-                    # Map fields to Salesforce Contact fields
-                    if contact.get('first_name'):
-                        contact_data['FirstName'] = contact['first_name']
-                    if contact.get('last_name'):
-                        contact_data['LastName'] = contact['last_name']
-                    if contact.get('email'):
-                        contact_data['Email'] = contact['email']
-                    if contact.get('phone'):
-                        contact_data['Phone'] = contact['phone']
-                    if contact.get('position'):
-                        contact_data['Title'] = contact['position']
-                    if contact.get('location'):
-                        contact_data['MailingCity'] = contact['location']
-                    
                     # Add enrichment metadata
                     if contact.get('enrichment_provider'):
                         contact_data['Captely_Source__c'] = contact['enrichment_provider']
@@ -546,80 +506,43 @@ class SalesforceIntegration:
                     if contact.get('lead_score'):
                         contact_data['Lead_Score__c'] = contact['lead_score']
                     
-                    contact_data['LeadSource'] = 'Captely'
-                    composite_data["records"].append(contact_data)
-                
-                try:
-                    # Try to create new contacts first
-                    response = await client.post(
-                        f"{self.instance_url}/services/data/{self.api_version}/composite/sobjects",
-                        headers=self.headers,
-                        json=composite_data,
-                        timeout=30.0
-                    )
-                    
-                    if response.status_code == 200:
-                        result = response.json()
-                        for record in result:
-                            if record.get("success"):
-                                results["created"] += 1
-                            else:
-                                # Try to update if creation failed due to duplicate
-                                await self._update_existing_contacts(client, [contacts[result.index(record)]], results)
+                    salesforce_id = existing.get((contact.get("email") or "").lower())
+                    if salesforce_id:
+                        updates.append((contact, {**contact_data, "Id": salesforce_id}))
                     else:
-                        error_msg = f"Batch {i//200 + 1}: {response.status_code} - {response.text}"
-                        results["errors"].append(error_msg)
-                
-                except Exception as e:
-                    results["errors"].append(f"Batch {i//200 + 1}: {str(e)}")
-            
-            return results
-    
-    async def _update_existing_contacts(self, client: httpx.AsyncClient, contacts: List[Dict], results: Dict):
-        """Update existing contacts by email lookup"""
-        for contact in contacts:
-            if not contact.get('email'):
-                continue
-                
-            try:
-                # Search for contact by email using SOQL
-                soql_query = f"SELECT Id FROM Contact WHERE Email = '{contact['email']}' LIMIT 1"
-                
-                search_response = await client.get(
-                    f"{self.instance_url}/services/data/{self.api_version}/query",
-                    headers=self.headers,
-                    params={"q": soql_query}
-                )
+                        creates.append((contact, contact_data))
                 
-                if search_response.status_code == 200:
-                    search_data = search_response.json()
-                    if search_data.get("records"):
-                        # Update the found contact
-                        contact_id = search_data["records"][0]["Id"]
-                        
-                        update_data = {}
-                        if contact.get('first_name'):
-                            update_data['FirstName'] = contact['first_name']
-                        if contact.get('last_name'):
-                            update_data['LastName'] = contact['last_name']
-                        if contact.get('phone'):
-                            update_data['Phone'] = contact['phone']
-                        if contact.get('position'):
-                            update_data['Title'] = contact['position']
-                        
-                        update_response = await client.patch(
-                            f"{self.instance_url}/services/data/{self.api_version}/sobjects/Contact/{contact_id}",
+                for method, outcome, pairs in (("PATCH", "updated", updates), ("POST", "created", creates)):
+                    if not pairs:
+                        continue
+                    try:
+                        response = await client.request(
+                            method,
+                            f"{self.instance_url}/services/data/{self.api_version}/composite/sobjects",
                             headers=self.headers,
-                            json=update_data
+                            json={"allOrNone": False, "records": [record for _, record in pairs]}
                         )
                         
-                        if update_response.status_code == 204:
-                            results["updated"] += 1
+                        if response.status_code == 200:
+                            for (contact, _), record in zip(pairs, response.json()):
+                                if record.get("success"):
+                                    results[outcome] += 1
+                                    # Later copies of a created contact update it instead of creating another
+                                    if outcome == "created" and contact.get("email"):
+                                        existing.setdefault(contact["email"].lower(), record.get("id"))
+                                else:
+                                    results["failed"] += 1
+                                    messages = "; ".join(error.get("message", "") for error in record.get("errors", []))
+                                    results["errors"].append(f"{contact.get('email', 'unknown')}: {messages}")
                         else:
-                            results["errors"].append(f"Update failed for {contact['email']}: {update_response.text}")
-                
-            except Exception as e:
-                results["errors"].append(f"Update error for {contact.get('email', 'unknown')}: {str(e)}")
+                            results["failed"] += len(pairs)
+                            results["errors"].append(f"Batch {i//200 + 1} ({outcome}): {response.status_code} - {response.text}")
+                    
+                    except Exception as e:
+                        results["failed"] += len(pairs)
+                        results["errors"].append(f"Batch {i//200 + 1} ({outcome}): {str(e)}")
+            
+            return results
     
     async def export_to_campaign(self, campaign_id: str, contact_emails: List[str]) -> Dict:
         """Add contacts to a Salesforce campaign"""
@@ -887,100 +810,49 @@ class ZapierIntegration:
                 "response": response.text[:500] if response.text else None
             }
     
-    async def send_contacts(self, contacts: List[Dict], event_type: str = "contacts.enriched") -> Dict:
-        """Send contacts to Zapier webhook"""
-        async with httpx.AsyncClient() as client:
-            results = {"sent": 0, "errors": []}
-            
-            # Prepare webhook data
-            webhook_data = {
-                "event": event_type,
-                "timestamp": datetime.utcnow().isoformat(),
-                "total_contacts": len(contacts),
-                "contacts": []
-            }
-            
-            # Transform contacts for Zapier
-            for contact in contacts:
-                zapier_contact = {
-                    "contact_id": contact.get("id"),
-                    "first_name": contact.get("first_name", ""),
-                    "last_name": contact.get("last_name", ""),
-                    "full_name": f"{contact.get('first_name', '')} {contact.get('last_name', '')}".strip(),
-                    "email": contact.get("email", ""),
-                    "phone": contact.get("phone", ""),
-                    "company": contact.get("company", ""),
-                    "position": contact.get("position", ""),
-                    "location": contact.get("location", ""),
-                    "industry": contact.get("industry", ""),
-                    "enriched": contact.get("enriched", False),
-                    "enrichment_score": contact.get("enrichment_score"),
-                    "email_verified": contact.get("email_verified", False),
-                    "phone_verified": contact.get("phone_verified", False),
-                    "created_at": contact.get("created_at"),
-                    "updated_at": contact.get("updated_at"),
-                    "exported_at": datetime.utcnow().isoformat()
-                }
-                webhook_data["contacts"].append(zapier_contact)
-            
-            try:
-                response = await client.post(
-                    self.webhook_url,
-                    json=webhook_data,
-                    timeout=30.0
-                )
-                
-                if response.status_code in [200, 201, 202]:
-                    results["sent"] = len(contacts)
-                else:
-                    results["errors"].append(f"Webhook returned {response.status_code}: {response.text}")
-            
-            except Exception as e:
-                results["errors"].append(str(e))
-            
-            return results
-    
-    async def send_single_contact(self, contact: Dict, event_type: str = "contact.enriched") -> Dict:
-        """Send a single contact to Zapier webhook"""
-        return await self.send_contacts([contact], event_type)
-    
-    async def send_batch_export(self, contacts: List[Dict], job_id: str) -> Dict:
-        """Send batch export data to Zapier webhook"""
-        webhook_data = {
-            "event": "batch.exported",
-            "job_id": job_id,
-            "timestamp": datetime.utcnow().isoformat(),
-            "total_contacts": len(contacts),
-            "batch_data": {
-                "contacts": contacts,
-                "export_summary": {
-                    "total_exported": len(contacts),
-                    "enriched_contacts": len([c for c in contacts if c.get("enriched")]),
-                    "verified_emails": len([c for c in contacts if c.get("email_verified")]),
-                    "verified_phones": len([c for c in contacts if c.get("phone_verified")])
-                }
-            }
+    @staticmethod
+    def zapier_contact(contact: Dict) -> Dict:
+        """Transform a contact for Zapier"""
+        return {
+            "contact_id": contact.get("id"),
+            "first_name": contact.get("first_name", ""),
+            "last_name": contact.get("last_name", ""),
+            "full_name": f"{contact.get('first_name', '')} {contact.get('last_name', '')}".strip(),
+            "email": contact.get("email", ""),
+            "phone": contact.get("phone", ""),
+            "company": contact.get("company", ""),
+            "position": contact.get("position", ""),
+            "location": contact.get("location", ""),
+            "industry": contact.get("industry", ""),
+            "enriched": contact.get("enriched", False),
+            "enrichment_score": contact.get("enrichment_score"),
+            "email_verified": contact.get("email_verified", False),
+            "phone_verified": contact.get("phone_verified", False),
+            "created_at": contact.get("created_at"),
+            "updated_at": contact.get("updated_at"),
+            "exported_at": datetime.utcnow().isoformat()
         }
-        
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(
-                    self.webhook_url,
-                    json=webhook_data,
-                    timeout=30.0
-                )
-                
-                return {
-                    "success": response.status_code in [200, 201, 202],
-                    "status_code": response.status_code,
-                    "response": response.text[:500] if response.text else None
-                }
-            
-            except Exception as e:
-                return {
-                    "success": False,
-                    "error": str(e)
-                }
+    
+    async def queue_contacts(
+        self,
+        session,
+        user_id: str,
+        contacts: List[Dict],
+        event_type: str = "contacts.enriched",
+        batch_mode: bool = True,
+        **envelope,
+    ) -> List[int]:
+        """
+        Queue contacts for delivery by the webhook dispatcher; returns the
+        outbox ids. Extra keyword arguments are sent as top-level fields.
+        Nothing is committed.
+        """
+        return await enqueue_webhooks(
+            session, user_id, self.webhook_url, event_type,
+            [self.zapier_contact(contact) for contact in contacts],
+            envelope={"event": event_type, **envelope},
+            batch_mode=batch_mode,
+        )
 
 # Factory function to get integration instance
 def get_integration(provider: str, config: Dict):
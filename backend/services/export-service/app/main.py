@@ -2,15 +2,17 @@
 Export Service for Captely
 Handles data exports to CRM, outreach tools, and integration platforms
 """
-from fastapi import FastAPI, Depends, HTTPException, Query
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi import FastAPI, Depends, HTTPException, Query, Header
+from fastapi.responses import StreamingResponse, JSONResponse, FileResponse, RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
+import os
 import csv
-import io
+import asyncio
 import json
+import uuid
 import pandas as pd
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, text
@@ -19,9 +21,23 @@ from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 
 from common.config import get_settings
-from common.db import get_async_session
+from common.db import get_async_session, pool_metrics
+from common.exports import (
+    STREAM_ENCODERS, XLSX_MEDIA_TYPE, open_stream, encode_stream, spool_xlsx, iter_file, prefers_ndjson
+)
 from common.auth import verify_api_token
+from common.hubspot import HubSpotBulkSync
+from common.crm_sync import get_sync_state
+from common.events import publish_user_data_changed_async
 from app.integrations import get_integration
+from app.salesforce_bulk import (
+    SALESFORCE_BULK_THRESHOLD, import_soql, use_bulk_api, create_bulk_job, queue_bulk_job, bulk_job_payload,
+)
+from app.export_query import JOB_EXPORT, CRM_EXPORT, ExportQueryError
+from app.export_jobs import (
+    ARTIFACT_FORMATS, EXPORT_STALE_AFTER, JOB_VERSION_QUERY, artifact_store, artifact_filename,
+    export_cache_key, export_job_payload, run_export,
+)
 
 # Temporary models for export service - these should match your actual models
 class Contact:
@@ -61,7 +77,7 @@ security = HTTPBearer()
 # Pydantic models
 class ExportRequest(BaseModel):
     job_id: str
-    format: str = "csv"  # csv, json, excel
+    format: str = "csv"  # csv, json, ndjson, excel, parquet, arrow
     columns: Optional[List[str]] = None
     filters: Optional[Dict[str, Any]] = None
 
@@ -77,103 +93,105 @@ class ZapierWebhook(BaseModel):
 
 class CrmExportRequest(BaseModel):
     contact_ids: List[str]
-    format: str = "csv"  # csv, json, excel
+    format: str = "csv"  # csv, json, ndjson, excel, parquet, arrow
     columns: Optional[List[str]] = None
     filters: Optional[Dict[str, Any]] = None
 
 # Export endpoints
+
+def export_format(format: str, accept: Optional[str]) -> str:
+    """format=json is streamed as NDJSON when the client accepts it"""
+    return "ndjson" if format == "json" and prefers_ndjson(accept) else format
+
+
+async def export_response(
+    session: AsyncSession,
+    query,
+    params: Dict[str, Any],
+    columns: List[str],
+    format: str,
+    filename: str,
+    not_found: str,
+    kinds: Optional[List[str]] = None,
+):
+    """Render an export query in the requested format.
+
+    CSV, NDJSON, Parquet and Arrow IPC are streamed from a server-side
+    cursor, one encoded chunk per fetched batch. Excel is written row by
+    row to a temp file (xlsxwriter constant_memory) and streamed from
+    there; JSON still builds the whole document.
+    """
+    if format in STREAM_ENCODERS:
+        batches = await open_stream(query, params)
+        if batches is None:
+            raise HTTPException(status_code=404, detail=not_found)
+        encoder = STREAM_ENCODERS[format](columns, kinds)
+        return StreamingResponse(
+            encode_stream(encoder, batches),
+            media_type=encoder.media_type,
+            headers={"Content-Disposition": f"attachment; filename={filename}.{encoder.extension}"}
+        )
+
+    if format == "excel":
+        batches = await open_stream(query, params)
+        if batches is None:
+            raise HTTPException(status_code=404, detail=not_found)
+        path = await spool_xlsx(columns, batches)
+        return StreamingResponse(
+            iter_file(path),
+            media_type=XLSX_MEDIA_TYPE,
+            headers={"Content-Disposition": f"attachment; filename={filename}.xlsx"}
+        )
+
+    if format != "json":
+        raise HTTPException(status_code=400, detail="Unsupported format")
+
+    result = await session.execute(query, params)
+    rows = result.fetchall()
+    if not rows:
+        raise HTTPException(status_code=404, detail=not_found)
+
+    df = pd.DataFrame(rows, columns=columns)
+
+    # Convert datetime columns to strings for JSON serialization
+    df_json = df.copy()
+    datetime_cols = df_json.select_dtypes(include=['datetime64', 'datetime']).columns
+    for col in datetime_cols:
+        df_json[col] = df_json[col].astype(str)
+
+    # Also handle any remaining non-serializable objects
+    object_cols = df_json.select_dtypes(include=['object']).columns
+    for col in object_cols:
+        df_json[col] = df_json[col].astype(str)
+
+    return JSONResponse(df_json.to_dict(orient="records"))
+
+
 @app.post("/api/export/download")
 async def export_data(
     request: ExportRequest,
     user_id: str = Depends(verify_api_token),
-    session: AsyncSession = Depends(get_async_session)
+    session: AsyncSession = Depends(get_async_session),
+    accept: Optional[str] = Header(None)
 ):
     """Export enriched data in various formats"""
     
     # Get enriched contacts for the job with user verification
-    query = text("""
-        SELECT 
-            c.id, c.first_name, c.last_name, c.email, c.phone, 
-            c.company, c.position, c.location, c.industry,
-            c.enriched, c.enrichment_status, c.enrichment_provider, 
-            c.enrichment_score, c.credits_consumed,
-            c.email_verified, c.phone_verified, c.created_at, c.updated_at,
-            COALESCE(er.provider, c.enrichment_provider) as provider,
-            COALESCE(er.confidence_score, c.enrichment_score) as confidence_score,
-            COALESCE(er.email_verified, c.email_verified) as email_verified_status,
-            COALESCE(er.phone_verified, c.phone_verified) as phone_verified_status
-        FROM contacts c
-        LEFT JOIN enrichment_results er ON c.id = er.contact_id
-        JOIN import_jobs j ON c.job_id = j.id
-        WHERE c.job_id = :job_id AND c.enriched = true AND j.user_id = :user_id
-        ORDER BY c.created_at DESC
-    """)
-    
-    result = await session.execute(query, {"job_id": request.job_id, "user_id": user_id})
-    contacts = result.fetchall()
-    
-    if not contacts:
-        raise HTTPException(status_code=404, detail="No enriched contacts found")
-    
-    # Convert to DataFrame for easy manipulation
-    contacts_data = []
-    for contact in contacts:
-        contact_dict = dict(contact._mapping)
-        contacts_data.append(contact_dict)
-    
-    df = pd.DataFrame(contacts_data)
-    
-    # Apply column selection if specified
-    if request.columns:
-        available_columns = [col for col in request.columns if col in df.columns]
-        df = df[available_columns]
-    
-    # Apply filters if specified
-    if request.filters:
-        for field, value in request.filters.items():
-            if field in df.columns:
-                df = df[df[field] == value]
-    
-    # Generate export based on format
-    if request.format == "csv":
-        output = io.StringIO()
-        df.to_csv(output, index=False)
-        output.seek(0)
-        
-        return StreamingResponse(
-            io.BytesIO(output.getvalue().encode()),
-            media_type="text/csv",
-            headers={"Content-Disposition": f"attachment; filename=enriched_data_{request.job_id}.csv"}
-        )
-    
-    elif request.format == "excel":
-        output = io.BytesIO()
-        df.to_excel(output, index=False, engine='openpyxl')
-        output.seek(0)
-        
-        return StreamingResponse(
-            output,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": f"attachment; filename=enriched_data_{request.job_id}.xlsx"}
+    try:
+        columns, query, params = JOB_EXPORT.build(
+            request.columns, request.filters,
+            where=["c.job_id = :job_id", "c.enriched = true", "c.user_id = :user_id"],
+            params={"job_id": request.job_id, "user_id": user_id},
         )
-    
-    elif request.format == "json":
-        # Convert datetime columns to strings for JSON serialization
-        df_json = df.copy()
-        # Convert all datetime columns to strings
-        datetime_cols = df_json.select_dtypes(include=['datetime64', 'datetime']).columns
-        for col in datetime_cols:
-            df_json[col] = df_json[col].astype(str)
-        
-        # Also handle any remaining non-serializable objects
-        object_cols = df_json.select_dtypes(include=['object']).columns
-        for col in object_cols:
-            df_json[col] = df_json[col].astype(str)
-        
-        return JSONResponse(df_json.to_dict(orient="records"))
-    
-    else:
-        raise HTTPException(status_code=400, detail="Unsupported format")
+    except ExportQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return await export_response(
+        session, query, params, columns, export_format(request.format, accept),
+        filename=f"enriched_data_{request.job_id}",
+        not_found="No enriched contacts found",
+        kinds=JOB_EXPORT.kinds(columns),
+    )
 
 # CRM Integration endpoints
 @app.post("/api/integrations/hubspot")
@@ -188,8 +206,7 @@ async def export_to_hubspot(
         contacts_query = text("""
             SELECT c.first_name, c.last_name, c.email, c.phone, c.company, c.position
             FROM contacts c
-            JOIN import_jobs j ON c.job_id = j.id
-            WHERE c.job_id = :job_id AND c.enriched = true AND c.email IS NOT NULL AND j.user_id = :user_id
+            WHERE c.job_id = :job_id AND c.enriched = true AND c.email IS NOT NULL AND c.user_id = :user_id
         """)
         
         contacts_result = await session.execute(contacts_query, {"job_id": request.job_id, "user_id": user_id})
@@ -281,11 +298,11 @@ async def export_to_hubspot(
         """)
         
         exported_count = result.get("created", 0) + result.get("updated", 0)
-        failed_count = len(result.get("errors", []))
+        failed_count = result.get("failed", 0)
         
         await session.execute(log_sync_query, {
             "user_id": user_id,
-            "status": "completed" if not result.get("errors") else "partial",
+            "status": "completed" if not failed_count else ("partial" if exported_count else "failed"),
             "total_records": len(contact_data),
             "processed_records": exported_count,
             "failed_records": failed_count
@@ -294,7 +311,10 @@ async def export_to_hubspot(
         
         return {
             "status": "success",
-            "exported_count": result.get("created", 0) + result.get("updated", 0),
+            "exported_count": exported_count,
+            "created": result.get("created", 0),
+            "updated": result.get("updated", 0),
+            "failed": failed_count,
             "errors": result.get("errors", [])
         }
         
@@ -657,6 +677,7 @@ async def import_contacts_from_hubspot(
         
         await session.commit()
         print(f"Successfully imported {imported_count} contacts")
+        await publish_user_data_changed_async(settings.redis_url, user_id)
         
         # Try to log the import (optional)
         try:
@@ -753,8 +774,7 @@ async def export_single_contact_to_hubspot(
                 c.first_name, c.last_name, c.email, c.phone, c.company, c.position,
                 c.location, c.industry, c.notes, c.enriched, c.enrichment_score
             FROM contacts c
-            JOIN import_jobs ij ON c.job_id = ij.id
-            WHERE c.id = :contact_id AND ij.user_id = :user_id
+            WHERE c.id = :contact_id AND c.user_id = :user_id
         """)
         
         contact_result = await session.execute(contact_query, {"contact_id": int(contact_id), "user_id": user_id})
@@ -949,8 +969,7 @@ async def export_batch_to_hubspot(
                 c.enriched, c.enrichment_status, c.enrichment_score,
                 c.notes, c.created_at, c.job_id
             FROM contacts c
-            JOIN import_jobs j ON c.job_id = j.id
-            WHERE c.job_id = :job_id AND j.user_id = :user_id AND c.email IS NOT NULL
+            WHERE c.job_id = :job_id AND c.user_id = :user_id AND c.email IS NOT NULL
             ORDER BY c.created_at DESC
         """)
         
@@ -1011,62 +1030,33 @@ async def export_batch_to_hubspot(
         # Convert contacts to HubSpot format
         hubspot_contacts = []
         for contact in contacts:
-            contact_data = {
-                "properties": {
-                    "firstname": contact[1] or "",
-                    "lastname": contact[2] or "",
-                    "email": contact[3] or "",
-                    "phone": contact[4] or "",
-                    "company": contact[5] or "",
-                    "jobtitle": contact[6] or "",
-                    "city": contact[7] or "",
-                    "industry": contact[8] or "",
-                    "captely_contact_id": str(contact[0]),
-                    "captely_enriched": str(contact[9]).lower() if contact[9] is not None else "false",
-                    "captely_enrichment_score": str(contact[11]) if contact[11] else "0",
-                    "hs_lead_status": "NEW",
-                    "lifecyclestage": "lead"
-                }
+            properties = {
+                "firstname": contact[1] or "",
+                "lastname": contact[2] or "",
+                "email": contact[3] or "",
+                "phone": contact[4] or "",
+                "company": contact[5] or "",
+                "jobtitle": contact[6] or "",
+                "city": contact[7] or "",
+                "industry": contact[8] or "",
+                "captely_contact_id": str(contact[0]),
+                "captely_enriched": str(contact[9]).lower() if contact[9] is not None else "false",
+                "captely_enrichment_score": str(contact[11]) if contact[11] else "0",
+                "hs_lead_status": "NEW",
+                "lifecyclestage": "lead"
             }
             
             if contact[12]:  # notes
-                contact_data["properties"]["notes_last_contacted"] = contact[12]
+                properties["notes_last_contacted"] = contact[12]
             
-            hubspot_contacts.append(contact_data)
-        
-        # Export to HubSpot in batches of 100
-        exported_count = 0
-        failed_count = 0
+            # Blank values would wipe fields on contacts that already exist
+            hubspot_contacts.append({name: value for name, value in properties.items() if value})
         
-        import httpx
-        async with httpx.AsyncClient() as client:
-            headers = {
-                "Authorization": f"Bearer {access_token}",
-                "Content-Type": "application/json"
-            }
-            
-            for i in range(0, len(hubspot_contacts), 100):
-                batch = hubspot_contacts[i:i+100]
-                
-                try:
-                    response = await client.post(
-                        "https://api.hubapi.com/crm/v3/objects/contacts/batch/create",
-                        headers=headers,
-                        json={"inputs": batch},
-                        timeout=60.0
-                    )
-                    
-                    if response.status_code == 201:
-                        batch_result = response.json()
-                        exported_count += len(batch_result.get("results", []))
-                        print(f"Successfully exported batch {i//100 + 1}: {len(batch_result.get('results', []))} contacts")
-                    else:
-                        failed_count += len(batch)
-                        print(f"HubSpot batch export failed: {response.status_code} - {response.text}")
-                        
-                except Exception as batch_error:
-                    failed_count += len(batch)
-                    print(f"Batch export error: {batch_error}")
+        # Upsert by email: existing HubSpot contacts are updated, the rest created
+        sync = await HubSpotBulkSync(access_token).upsert(hubspot_contacts)
+        exported_count = sync.created + sync.updated
+        failed_count = sync.failed
+        print(f"HubSpot batch upsert: {sync.created} created, {sync.updated} updated, {sync.failed} failed ({sync.api_calls} API calls)")
         
         # Log the export
         try:
@@ -1109,6 +1099,113 @@ async def export_batch_to_hubspot(
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Failed to export batch to HubSpot: {str(e)}")
 
+# Asynchronous export jobs (see app/export_jobs.py)
+EXPORT_JOB_COLUMNS = "id, job_id, format, status, rows_written, total_rows, size_bytes, error, storage, artifact_key, created_at, completed_at, expires_at"
+
+@app.post("/api/export/jobs")
+async def create_export_job(
+    request: ExportRequest,
+    user_id: str = Depends(verify_api_token),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """Queue an export, or return the cached one for an identical request on an unchanged job"""
+    if request.format not in ARTIFACT_FORMATS:
+        raise HTTPException(status_code=400, detail="Unsupported format")
+    try:
+        JOB_EXPORT.build(request.columns, request.filters, where=["true"], params={})
+    except ExportQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    version = (await session.execute(JOB_VERSION_QUERY, {"job_id": request.job_id, "user_id": user_id})).first()
+    contact_count, last_modified = version
+    if not contact_count:
+        raise HTTPException(status_code=404, detail="No contacts found for this job")
+
+    cache_key = export_cache_key(
+        request.job_id, request.format, request.columns, request.filters, contact_count, last_modified
+    )
+    existing = (await session.execute(text(f"""
+        SELECT {EXPORT_JOB_COLUMNS} FROM export_jobs
+        WHERE user_id = :user_id AND cache_key = :cache_key
+          AND (
+              (status = 'queued' AND created_at > NOW() - make_interval(secs => :stale))
+              OR (status = 'running' AND started_at > NOW() - make_interval(secs => :stale))
+              OR (status = 'completed' AND expires_at > NOW())
+          )
+        ORDER BY created_at DESC
+        LIMIT 1
+    """), {"user_id": user_id, "cache_key": cache_key, "stale": EXPORT_STALE_AFTER.total_seconds()})).first()
+    if existing and (
+        existing.status != "completed"
+        or await asyncio.to_thread(artifact_store.exists, existing.storage, existing.artifact_key)
+    ):
+        return {**export_job_payload(existing), "cached": True}
+
+    export_id = str(uuid.uuid4())
+    created = (await session.execute(text(f"""
+        INSERT INTO export_jobs (id, user_id, job_id, format, columns, filters, cache_key)
+        VALUES (:id, :user_id, :job_id, :format, CAST(:columns AS JSONB), CAST(:filters AS JSONB), :cache_key)
+        RETURNING {EXPORT_JOB_COLUMNS}
+    """), {
+        "id": export_id,
+        "user_id": user_id,
+        "job_id": request.job_id,
+        "format": request.format,
+        "columns": json.dumps(request.columns) if request.columns else None,
+        "filters": json.dumps(request.filters) if request.filters else None,
+        "cache_key": cache_key,
+    })).first()
+    await session.commit()
+
+    try:
+        run_export.delay(export_id)
+    except Exception as e:
+        await session.execute(
+            text("UPDATE export_jobs SET status = 'failed', error = :error, completed_at = NOW() WHERE id = :id"),
+            {"id": export_id, "error": f"Could not queue export: {e}"[:1000]},
+        )
+        await session.commit()
+        raise HTTPException(status_code=503, detail="Export queue unavailable, please retry")
+    return {**export_job_payload(created), "cached": False}
+
+async def _get_export_job(session: AsyncSession, export_id: str, user_id: str):
+    row = (await session.execute(
+        text(f"SELECT {EXPORT_JOB_COLUMNS} FROM export_jobs WHERE id = :id AND user_id = :user_id"),
+        {"id": export_id, "user_id": user_id}
+    )).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Export not found")
+    return row
+
+@app.get("/api/export/jobs/{export_id}")
+async def get_export_job(
+    export_id: str,
+    user_id: str = Depends(verify_api_token),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """Status and progress of an export job"""
+    return export_job_payload(await _get_export_job(session, export_id, user_id))
+
+@app.get("/api/export/jobs/{export_id}/download")
+async def download_export_job(
+    export_id: str,
+    user_id: str = Depends(verify_api_token),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """Download a finished export (redirects to a presigned URL when stored in S3)"""
+    row = await _get_export_job(session, export_id, user_id)
+    if row.status != "completed" or not row.artifact_key:
+        raise HTTPException(status_code=409 if row.status in ("queued", "running") else 410, detail=f"Export is {row.status}")
+
+    filename = artifact_filename(row)
+    if row.storage == "s3":
+        return RedirectResponse(artifact_store.presigned_url(row.artifact_key, filename, expires_in=900))
+
+    path = artifact_store.local_path(row.artifact_key)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=410, detail="Export file is no longer available")
+    return FileResponse(path, filename=filename)
+
 # Column customization endpoint
 @app.get("/api/export/columns/{job_id}")
 async def get_available_columns(
@@ -1118,18 +1215,8 @@ async def get_available_columns(
 ):
     """Get available columns for export customization"""
     
-    query = text("""
-        SELECT column_name 
-        FROM information_schema.columns 
-        WHERE table_name = 'contacts'
-        UNION
-        SELECT column_name 
-        FROM information_schema.columns 
-        WHERE table_name = 'enrichment_results'
-    """)
-    
-    result = await session.execute(query)
-    columns = [row[0] for row in result.fetchall()]
+    # Only whitelisted columns can be exported
+    columns = list(JOB_EXPORT.columns)
     
     # Define user-friendly column names
     column_mapping = {
@@ -1161,7 +1248,8 @@ async def get_available_columns(
 async def export_crm_contacts(
     request: CrmExportRequest,
     user_id: str = Depends(verify_api_token),
-    session: AsyncSession = Depends(get_async_session)
+    session: AsyncSession = Depends(get_async_session),
+    accept: Optional[str] = Header(None)
 ):
     """Export CRM contacts in various formats"""
     
@@ -1172,84 +1260,24 @@ async def export_crm_contacts(
         raise HTTPException(status_code=400, detail=f"Invalid contact ID format: {str(e)}")
     
     # Get contacts for the specified IDs (with user verification)
-    query = text("""
-        SELECT 
-            c.id, c.first_name, c.last_name, c.email, c.phone, 
-            c.company, c.position, c.location, c.industry,
-            c.enriched, c.enrichment_status, c.enrichment_provider, 
-            c.enrichment_score, c.credits_consumed,
-            c.email_verified, c.phone_verified, c.created_at, c.updated_at,
-            c.job_id,
-            j.file_name as batch_name, j.created_at as batch_created_at
-        FROM contacts c
-        JOIN import_jobs j ON c.job_id = j.id
-        WHERE c.id = ANY(:contact_ids) AND j.user_id = :user_id
-        ORDER BY c.created_at DESC
-    """)
-    
-    result = await session.execute(query, {
-        "contact_ids": contact_ids_int,  # 🔥 FIX: Use converted integer IDs
-        "user_id": user_id
-    })
-    contacts = result.fetchall()
-    
-    if not contacts:
-        raise HTTPException(status_code=404, detail="No contacts found or access denied")
-    
-    # Convert to DataFrame for easy manipulation
-    df = pd.DataFrame([dict(contact) for contact in contacts])
-    
-    # Apply column selection if specified
-    if request.columns:
-        available_columns = [col for col in request.columns if col in df.columns]
-        df = df[available_columns]
-    
-    # Apply filters if specified
-    if request.filters:
-        for field, value in request.filters.items():
-            if field in df.columns:
-                df = df[df[field] == value]
-    
-    # Generate export based on format
-    if request.format == "csv":
-        output = io.StringIO()
-        df.to_csv(output, index=False)
-        output.seek(0)
-        
-        return StreamingResponse(
-            io.BytesIO(output.getvalue().encode()),
-            media_type="text/csv",
-            headers={"Content-Disposition": f"attachment; filename=crm_contacts_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"}
-        )
-    
-    elif request.format == "excel":
-        output = io.BytesIO()
-        df.to_excel(output, index=False, engine='openpyxl')
-        output.seek(0)
-        
-        return StreamingResponse(
-            output,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": f"attachment; filename=crm_contacts_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"}
+    try:
+        columns, query, params = CRM_EXPORT.build(
+            request.columns, request.filters,
+            where=["c.id = ANY(:contact_ids)", "c.user_id = :user_id"],
+            params={
+                "contact_ids": contact_ids_int,  # 🔥 FIX: Use converted integer IDs
+                "user_id": user_id
+            },
         )
-    
-    elif request.format == "json":
-        # Convert datetime columns to strings for JSON serialization
-        df_json = df.copy()
-        # Convert all datetime columns to strings
-        datetime_cols = df_json.select_dtypes(include=['datetime64', 'datetime']).columns
-        for col in datetime_cols:
-            df_json[col] = df_json[col].astype(str)
-        
-        # Also handle any remaining non-serializable objects
-        object_cols = df_json.select_dtypes(include=['object']).columns
-        for col in object_cols:
-            df_json[col] = df_json[col].astype(str)
-        
-        return JSONResponse(df_json.to_dict(orient="records"))
-    
-    else:
-        raise HTTPException(status_code=400, detail="Unsupported format")
+    except ExportQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return await export_response(
+        session, query, params, columns, export_format(request.format, accept),
+        filename=f"crm_contacts_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+        not_found="No contacts found or access denied",
+        kinds=CRM_EXPORT.kinds(columns),
+    )
 
 # =============================================
 # SALESFORCE INTEGRATION ENDPOINTS  
@@ -1403,7 +1431,7 @@ async def disconnect_salesforce(
 
 @app.post("/api/export/salesforce/import")
 async def import_contacts_from_salesforce(
-    limit: int = Query(200, le=500, description="Number of contacts to import"),
+    limit: int = Query(200, ge=1, le=100000, description="Number of contacts to import; large imports run as a Bulk API job"),
     offset: int = Query(0, description="Offset for pagination"),
     user_id: str = Depends(verify_api_token),
     session: AsyncSession = Depends(get_async_session)
@@ -1457,22 +1485,44 @@ async def import_contacts_from_salesforce(
             except Exception as e:
                 raise HTTPException(status_code=401, detail=f"Token refresh failed: {str(e)}")
         
-        # Create import job
-        job_query = text("""
-            INSERT INTO import_jobs (user_id, file_name, source_type, status, total_records, processed_records)
-            VALUES (:user_id, 'Salesforce Import', 'salesforce', 'in_progress', 0, 0)
-            RETURNING id
-        """)
-        
-        job_result = await session.execute(job_query, {"user_id": user_id})
-        job_id = job_result.scalar()
-        
-        # Import contacts using integration
         salesforce = get_integration("salesforce", {
             "access_token": access_token,
             "instance_url": integration.salesforce_instance_url
         })
         
+        # Create import job
+        job_id = f"salesforce_import_{user_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        job_query = text("""
+            INSERT INTO import_jobs (id, user_id, status, total, completed, file_name)
+            VALUES (:job_id, :user_id, 'processing', 0, 0, 'Salesforce Import')
+        """)
+        await session.execute(job_query, {"job_id": job_id, "user_id": user_id})
+        
+        # Large imports run as a Bulk API query job on the export worker
+        if offset == 0 and limit > SALESFORCE_BULK_THRESHOLD:
+            requested = min(limit, await salesforce.count_contacts())
+            if use_bulk_api(requested):
+                _, watermark = await get_sync_state(session, user_id, "salesforce")
+                bulk_id = await create_bulk_job(
+                    session, user_id, "query", job_id=job_id,
+                    soql=import_soql(requested, watermark), total_records=requested
+                )
+                await session.commit()
+                queue_bulk_job(bulk_id)
+                
+                return {
+                    "success": True,
+                    "mode": "bulk",
+                    "job_id": job_id,
+                    "bulk_job_id": bulk_id,
+                    "total_contacts": requested,
+                    "status_url": f"/api/export/salesforce/bulk/{bulk_id}",
+                    "message": f"Importing {requested} contacts from Salesforce in the background",
+                    "redirect": "enrichment",
+                    "redirect_url": f"/batches/{job_id}"
+                }
+        
+        # Import contacts using integration
         import_result = await salesforce.import_contacts(limit=limit, offset=offset)
         
         imported_count = 0
@@ -1508,21 +1558,22 @@ async def import_contacts_from_salesforce(
         # Update job status
         update_job_query = text("""
             UPDATE import_jobs 
-            SET status = 'completed', total_records = :total, processed_records = :imported, updated_at = NOW()
+            SET status = 'completed', total = :imported, updated_at = NOW()
             WHERE id = :job_id
         """)
         
         await session.execute(update_job_query, {
             "job_id": job_id,
-            "total": len(import_result["contacts"]),
             "imported": imported_count
         })
         
         await session.commit()
         print(f"Successfully imported {imported_count} contacts from Salesforce")
+        await publish_user_data_changed_async(settings.redis_url, user_id)
         
         return {
             "success": True,
+            "mode": "rest",
             "job_id": job_id,
             "imported_count": imported_count,
             "total_contacts": len(import_result["contacts"]),
@@ -1555,8 +1606,7 @@ async def export_single_contact_to_salesforce(
                 c.first_name, c.last_name, c.email, c.phone, c.company, c.position,
                 c.location, c.industry, c.notes, c.enriched, c.enrichment_score
             FROM contacts c
-            JOIN import_jobs ij ON c.job_id = ij.id
-            WHERE c.id = :contact_id AND ij.user_id = :user_id
+            WHERE c.id = :contact_id AND c.user_id = :user_id
         """)
         
         contact_result = await session.execute(contact_query, {"contact_id": int(contact_id), "user_id": user_id})
@@ -1702,8 +1752,7 @@ async def export_batch_to_salesforce(
                 c.enriched, c.enrichment_status, c.enrichment_score,
                 c.notes, c.created_at, c.job_id
             FROM contacts c
-            JOIN import_jobs j ON c.job_id = j.id
-            WHERE c.job_id = :job_id AND j.user_id = :user_id AND c.email IS NOT NULL
+            WHERE c.job_id = :job_id AND c.user_id = :user_id AND c.email IS NOT NULL
             ORDER BY c.created_at DESC
         """)
         
@@ -1731,75 +1780,73 @@ async def export_batch_to_salesforce(
         if not integration:
             raise HTTPException(status_code=400, detail="Salesforce integration not found. Please connect Salesforce first.")
         
-        # Check if token needs refresh (similar to above patterns)
+        # Large batches run as a Bulk API upsert job on the export worker
+        if use_bulk_api(len(contacts)):
+            bulk_id = await create_bulk_job(session, user_id, "upsert", job_id=job_id, total_records=len(contacts))
+            await session.commit()
+            queue_bulk_job(bulk_id)
+            
+            return {
+                "success": True,
+                "mode": "bulk",
+                "job_id": job_id,
+                "bulk_job_id": bulk_id,
+                "total_contacts": len(contacts),
+                "status_url": f"/api/export/salesforce/bulk/{bulk_id}",
+                "message": f"Exporting {len(contacts)} contacts to Salesforce in the background"
+            }
+        
+        # Check if token needs refresh
         access_token = integration.access_token
         if integration.expires_at and integration.expires_at.replace(tzinfo=None) < datetime.utcnow():
-            # Token refresh logic here (same as above)
-            pass
-        
-        # Convert contacts to Salesforce format and batch export
-        exported_count = 0
-        failed_count = 0
-        
-        # Use Salesforce composite API for batch operations
-        import httpx
-        async with httpx.AsyncClient() as client:
-            headers = {
-                "Authorization": f"Bearer {access_token}",
-                "Content-Type": "application/json"
-            }
-            
-            # Process in batches of 200 (Salesforce limit)
-            for i in range(0, len(contacts), 200):
-                batch = contacts[i:i+200]
+            salesforce = get_integration("salesforce", {
+                "instance_url": integration.salesforce_instance_url
+            })
+            try:
+                token_data = await salesforce.refresh_access_token(integration.refresh_token)
                 
-                composite_data = {
-                    "allOrNone": False,
-                    "records": []
-                }
+                # Update stored tokens
+                update_query = text("""
+                    UPDATE salesforce_integrations 
+                    SET access_token = :access_token, 
+                        expires_at = :expires_at,
+                        updated_at = NOW()
+                    WHERE user_id = :user_id AND is_active = true
+                """)
                 
-                for contact in batch:
-                    contact_data = {
-                        "attributes": {"type": "Contact"},
-                        "FirstName": contact[1] or "",
-                        "LastName": contact[2] or "",
-                        "Email": contact[3] or "",
-                        "Phone": contact[4] or "",
-                        "Company": contact[5] or "",
-                        "Title": contact[6] or "",
-                        "City": contact[7] or "",
-                        "Industry": contact[8] or "",
-                        "Description": contact[9] or "",
-                        "Captely_Contact_ID__c": str(contact[0]),
-                        "Captely_Enriched__c": contact[10] if contact[10] is not None else False,
-                        "Captely_Enrichment_Score__c": contact[12] if contact[12] else 0,
-                        "LeadSource": "Captely"
-                    }
-                    composite_data["records"].append(contact_data)
+                new_expires_at = datetime.utcnow() + timedelta(seconds=token_data.get("expires_in", 21600))
+                await session.execute(update_query, {
+                    "user_id": user_id,
+                    "access_token": token_data["access_token"],
+                    "expires_at": new_expires_at
+                })
+                await session.commit()
                 
-                try:
-                    response = await client.post(
-                        f"{integration.salesforce_instance_url}/services/data/v58.0/composite/sobjects",
-                        headers=headers,
-                        json=composite_data,
-                        timeout=60.0
-                    )
-                    
-                    if response.status_code == 200:
-                        batch_result = response.json()
-                        for record in batch_result:
-                            if record.get("success"):
-                                exported_count += 1
-                            else:
-                                failed_count += 1
-                        print(f"Successfully exported batch {i//200 + 1}: {exported_count} contacts")
-                    else:
-                        failed_count += len(batch)
-                        print(f"Salesforce batch export failed: {response.status_code} - {response.text}")
-                        
-                except Exception as batch_error:
-                    failed_count += len(batch)
-                    print(f"Batch export error: {batch_error}")
+                access_token = token_data["access_token"]
+            except Exception as e:
+                raise HTTPException(status_code=401, detail=f"Token refresh failed: {str(e)}")
+        
+        # Upsert through the composite API, matched on email
+        salesforce = get_integration("salesforce", {
+            "access_token": access_token,
+            "instance_url": integration.salesforce_instance_url
+        })
+        result = await salesforce.create_or_update_contacts([
+            {
+                "first_name": contact[1],
+                "last_name": contact[2],
+                "email": contact[3],
+                "phone": contact[4],
+                "position": contact[6],
+                "location": contact[7],
+                "enrichment_score": contact[11]
+            }
+            for contact in contacts
+        ])
+        exported_count = result["created"] + result["updated"]
+        failed_count = result["failed"]
+        for error in result["errors"][:10]:
+            print(f"Salesforce batch export error: {error}")
         
         # Log the export
         try:
@@ -1827,6 +1874,7 @@ async def export_batch_to_salesforce(
         
         return {
             "success": True,
+            "mode": "rest",
             "job_id": job_id,
             "exported": exported_count,
             "failed": failed_count,
@@ -1842,6 +1890,21 @@ async def export_batch_to_salesforce(
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Failed to export batch to Salesforce: {str(e)}")
 
+@app.get("/api/export/salesforce/bulk/{bulk_id}")
+async def get_salesforce_bulk_job(
+    bulk_id: str,
+    user_id: str = Depends(verify_api_token),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """Status of a Salesforce Bulk API export or import"""
+    row = (await session.execute(
+        text("SELECT * FROM salesforce_bulk_jobs WHERE id = :id AND user_id = :user_id"),
+        {"id": bulk_id, "user_id": user_id}
+    )).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Bulk job not found")
+    return bulk_job_payload(row)
+
 # LEMLIST INTEGRATION ENDPOINTS
 class LemlistSetupRequest(BaseModel):
     api_key: str
@@ -2043,8 +2106,7 @@ async def export_single_contact_to_lemlist(
                 c.first_name, c.last_name, c.email, c.phone, c.company, c.position,
                 c.location, c.industry, c.notes, c.enriched, c.enrichment_score
             FROM contacts c
-            JOIN import_jobs ij ON c.job_id = ij.id
-            WHERE c.id = :contact_id AND ij.user_id = :user_id
+            WHERE c.id = :contact_id AND c.user_id = :user_id
         """)
         
         contact_result = await session.execute(contact_query, {"contact_id": int(contact_id), "user_id": user_id})
@@ -2147,8 +2209,7 @@ async def export_batch_to_lemlist(
                 c.enriched, c.enrichment_status, c.enrichment_score,
                 c.notes, c.created_at, c.job_id
             FROM contacts c
-            JOIN import_jobs j ON c.job_id = j.id
-            WHERE c.job_id = :job_id AND j.user_id = :user_id AND c.email IS NOT NULL
+            WHERE c.job_id = :job_id AND c.user_id = :user_id AND c.email IS NOT NULL
             ORDER BY c.created_at DESC
         """)
         
@@ -2400,8 +2461,7 @@ async def export_single_contact_to_zapier(
                 c.first_name, c.last_name, c.email, c.phone, c.company, c.position,
                 c.location, c.industry, c.notes, c.enriched, c.enrichment_score
             FROM contacts c
-            JOIN import_jobs ij ON c.job_id = ij.id
-            WHERE c.id = :contact_id AND ij.user_id = :user_id
+            WHERE c.id = :contact_id AND c.user_id = :user_id
         """)
         
         contact_result = await session.execute(contact_query, {"contact_id": int(contact_id), "user_id": user_id})
@@ -2412,7 +2472,7 @@ async def export_single_contact_to_zapier(
         
         # Get Zapier integration
         integration_query = text("""
-            SELECT webhook_url FROM zapier_integrations 
+            SELECT zapier_webhook_url AS webhook_url FROM zapier_integrations 
             WHERE user_id = :user_id AND is_active = true
             ORDER BY created_at DESC
             LIMIT 1
@@ -2426,6 +2486,7 @@ async def export_single_contact_to_zapier(
         
         # Prepare contact data for Zapier
         contact_data = {
+            "id": int(contact_id),
             "first_name": contact_row[0] or "",
             "last_name": contact_row[1] or "",
             "email": contact_row[2] or "",
@@ -2438,37 +2499,34 @@ async def export_single_contact_to_zapier(
             "enrichment_score": contact_row[10] if contact_row[10] else 0
         }
         
-        # Export to Zapier
+        # Queue for the webhook dispatcher, which batches and retries deliveries
         zapier = get_integration("zapier", {"webhook_url": integration.webhook_url})
-        result = await zapier.send_single_contact(contact_data)
+        await zapier.queue_contacts(session, user_id, [contact_data], "contact.enriched", batch_mode=False)
+        await session.commit()
         
-        if result["sent"] > 0:
-            # Log the export
-            try:
-                log_sync_query = text("""
-                    INSERT INTO zapier_sync_logs 
-                    (user_id, integration_id, sync_type, operation, status, total_records, processed_records, started_at)
-                    SELECT :user_id, zi.id, 'export', 'contact', 'completed', 1, 1, NOW()
-                    FROM zapier_integrations zi 
-                    WHERE zi.user_id = :user_id AND zi.is_active = true
-                    LIMIT 1
-                """)
-                
-                await session.execute(log_sync_query, {"user_id": user_id})
-                await session.commit()
-            except Exception as log_error:
-                print(f"Failed to log export: {log_error}")
+        # Log the export
+        try:
+            log_sync_query = text("""
+                INSERT INTO zapier_sync_logs 
+                (user_id, integration_id, sync_type, operation, status, total_records, processed_records, started_at)
+                SELECT :user_id, zi.id, 'export', 'contact', 'pending', 1, 0, NOW()
+                FROM zapier_integrations zi 
+                WHERE zi.user_id = :user_id AND zi.is_active = true
+                LIMIT 1
+            """)
             
-            return {
-                "success": True,
-                "platform": "zapier",
-                "webhook_url": integration.webhook_url,
-                "message": "Contact sent to Zapier webhook successfully!"
-            }
-        else:
-            errors = result.get("errors", [])
-            error_msg = errors[0] if errors else "Unknown error"
-            raise HTTPException(status_code=500, detail=f"Zapier export failed: {error_msg}")
+            await session.execute(log_sync_query, {"user_id": user_id})
+            await session.commit()
+        except Exception as log_error:
+            print(f"Failed to log export: {log_error}")
+        
+        return {
+            "success": True,
+            "platform": "zapier",
+            "webhook_url": integration.webhook_url,
+            "queued": True,
+            "message": "Contact queued for delivery to your Zapier webhook"
+        }
         
     except HTTPException:
         raise
@@ -2502,8 +2560,7 @@ async def export_batch_to_zapier(
                 c.enriched, c.enrichment_status, c.enrichment_score,
                 c.notes, c.created_at, c.job_id
             FROM contacts c
-            JOIN import_jobs j ON c.job_id = j.id
-            WHERE c.job_id = :job_id AND j.user_id = :user_id AND c.email IS NOT NULL
+            WHERE c.job_id = :job_id AND c.user_id = :user_id AND c.email IS NOT NULL
             ORDER BY c.created_at DESC
         """)
         
@@ -2518,7 +2575,7 @@ async def export_batch_to_zapier(
         
         # Get Zapier integration
         integration_query = text("""
-            SELECT webhook_url FROM zapier_integrations 
+            SELECT zapier_webhook_url AS webhook_url FROM zapier_integrations 
             WHERE user_id = :user_id AND is_active = true
             ORDER BY created_at DESC
             LIMIT 1
@@ -2548,47 +2605,30 @@ async def export_batch_to_zapier(
             }
             zapier_contacts.append(contact_data)
         
-        # Export to Zapier
+        # Queue for the webhook dispatcher: batch mode is delivered as one
+        # payload, otherwise as an array Zapier splits into one run per contact
         zapier = get_integration("zapier", {"webhook_url": integration.webhook_url})
-        
-        if batch_mode:
-            # Send as batch
-            webhook_payload = {
-                "event": "batch.exported",
-                "job_id": job_id,
-                "timestamp": datetime.utcnow().isoformat(),
-                "total_contacts": len(zapier_contacts),
-                "contacts": zapier_contacts
-            }
-            
-            export_result = await zapier.send_webhook(session, user_id, webhook_payload, "batch_export")
-            exported_count = len(zapier_contacts) if export_result.get("success") else 0
-            failed_count = 0 if export_result.get("success") else len(zapier_contacts)
-        else:
-            # Send individually
-            export_result = await zapier.send_contacts(zapier_contacts)
-            exported_count = export_result.get("sent", 0)
-            failed_count = len(export_result.get("errors", []))
+        await zapier.queue_contacts(
+            session, user_id, zapier_contacts,
+            "batch.exported" if batch_mode else "contact.enriched",
+            batch_mode=batch_mode, job_id=job_id,
+        )
+        await session.commit()
         
         # Log the export
         try:
             log_sync_query = text("""
                 INSERT INTO zapier_sync_logs 
                 (user_id, integration_id, sync_type, operation, status, total_records, processed_records, failed_records, started_at)
-                SELECT :user_id, zi.id, 'export', 'batch', :status, :total_records, :processed_records, :failed_records, NOW()
+                SELECT :user_id, zi.id, 'export', 'batch', 'pending', :total_records, 0, 0, NOW()
                 FROM zapier_integrations zi 
                 WHERE zi.user_id = :user_id AND zi.is_active = true
                 LIMIT 1
             """)
             
-            status = "completed" if failed_count == 0 else ("partial" if exported_count > 0 else "failed")
-            
             await session.execute(log_sync_query, {
                 "user_id": user_id,
-                "status": status,
-                "total_records": len(contacts),
-                "processed_records": exported_count,
-                "failed_records": failed_count
+                "total_records": len(contacts)
             })
             await session.commit()
         except Exception as log_error:
@@ -2597,11 +2637,10 @@ async def export_batch_to_zapier(
         return {
             "success": True,
             "job_id": job_id,
-            "exported": exported_count,
-            "failed": failed_count,
+            "queued": len(zapier_contacts),
             "total_contacts": len(contacts),
             "batch_mode": batch_mode,
-            "message": f"Successfully sent {exported_count} out of {len(contacts)} contacts to Zapier webhook"
+            "message": f"{len(zapier_contacts)} contacts queued for delivery to your Zapier webhook"
         }
         
     except HTTPException:
@@ -2743,6 +2782,11 @@ async def get_integration_statuses(
         }
 
 # Health check endpoints
+@app.get("/health/db-pool")
+async def db_pool_health():
+    """Connection pool checkout wait times and usage"""
+    return pool_metrics()
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
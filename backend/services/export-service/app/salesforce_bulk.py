@@ -0,0 +1,558 @@
+"""
+Salesforce Bulk API 2.0 exports and imports.
+
+Up to SALESFORCE_BULK_THRESHOLD records go through the REST API inline
+(composite create/update, SOQL query). Larger transfers are recorded in
+salesforce_bulk_jobs and handed to the export worker:
+
+* upsert: existing Contacts are looked up by email, then the contacts are
+  written to a CSV file with the matched Ids and uploaded as one ingest
+  job that upserts Contact on Id (rows without one are inserted), then
+  polled until Salesforce has processed it.
+* query: a query job runs the SOQL; once complete its CSV results are
+  paged through with the Sforce-Locator and written like the incremental
+  REST import (common.crm_sync): contacts imported before are updated
+  through salesforce_contact_mappings, and the SystemModstamp watermark
+  advances so the next import only reads contacts modified since.
+
+Polling re-schedules a short task instead of holding a worker slot while
+Salesforce works through the job.
+
+Salesforce doesn't allow the standard Contact.Email field to be declared
+an External ID, so exports match existing Contacts by looking their Ids up
+on Email. Orgs that have the custom External ID field SALESFORCE_UPSERT_FIELD
+(Captely_Email__c by default) are also matched on it, and exports backfill
+it with the email; orgs without it are matched on Email alone.
+"""
+import io
+import os
+import csv
+import uuid
+import json
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import httpx
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from common.db import SessionLocal, create_db_engine
+from common.crm_sync import get_sync_state, save_sync_state, write_contacts, commit_page, prefetch_pages
+from common.exports import stream_query_sync, write_export_file, iter_file, remove_file
+from app.export_jobs import celery_app
+
+logger = logging.getLogger(__name__)
+
+SALESFORCE_API_VERSION = "v58.0"
+SALESFORCE_BULK_THRESHOLD = int(os.environ.get("SALESFORCE_BULK_THRESHOLD", "2000"))
+SALESFORCE_UPSERT_FIELD = os.environ.get("SALESFORCE_UPSERT_FIELD", "Captely_Email__c")
+SALESFORCE_BULK_POLL_SECONDS = 15
+SALESFORCE_BULK_MAX_AGE = timedelta(hours=6)           # Give up polling after this
+SALESFORCE_BULK_UPLOAD_LIMIT = 100 * 1024 * 1024       # Bulk API 2.0 per-job CSV limit
+SALESFORCE_QUERY_PAGE_SIZE = 50000                     # maxRecords per results page
+SALESFORCE_LOOKUP_CHUNK = 200                          # Emails per SOQL Id lookup
+SALESFORCE_MAX_ERRORS = 50
+
+_TERMINAL_STATES = {"JobComplete", "Failed", "Aborted"}
+
+# Contacts to import, oldest modification first so the watermark can advance
+# (same selection as the import service's incremental import)
+SALESFORCE_IMPORT_SOQL = """
+    SELECT Id, FirstName, LastName, Email, Phone, Title,
+           MailingCity, MailingState, MailingCountry, Account.Name, SystemModstamp
+    FROM Contact
+    WHERE Email != null{since}
+    ORDER BY SystemModstamp ASC, Id ASC
+    LIMIT {limit}
+"""
+
+# Contact field -> Salesforce Contact field, shared by REST and Bulk upserts
+SALESFORCE_CONTACT_FIELDS = {
+    "email": "Email",
+    "first_name": "FirstName",
+    "last_name": "LastName",
+    "phone": "Phone",
+    "position": "Title",
+    "location": "MailingCity",
+}
+
+
+def contact_to_salesforce(contact: Dict[str, Any], mirror_email: bool = False) -> Dict[str, Any]:
+    """
+    Salesforce Contact record for a contact dict; empty values are left out.
+    ``mirror_email`` also fills SALESFORCE_UPSERT_FIELD (only when the org has it).
+    """
+    record = {
+        field: contact[name] for name, field in SALESFORCE_CONTACT_FIELDS.items() if contact.get(name)
+    }
+    if mirror_email and contact.get("email"):
+        record[SALESFORCE_UPSERT_FIELD] = contact["email"]
+    record["LeadSource"] = "Captely"
+    return record
+
+
+def upsert_field_problem(fields: List[Dict[str, Any]]) -> Optional[str]:
+    """Why SALESFORCE_UPSERT_FIELD can't be used, from a Contact describe's fields; None if it can."""
+    field = next((f for f in fields if f.get("name", "").lower() == SALESFORCE_UPSERT_FIELD.lower()), None)
+    if field is None:
+        return f"Contact.{SALESFORCE_UPSERT_FIELD} does not exist"
+    if not field.get("externalId"):
+        return f"Contact.{SALESFORCE_UPSERT_FIELD} is not an External ID field"
+    return None
+
+
+def lookup_soql(emails: List[str], mirror_email: bool) -> str:
+    """SOQL for the Contacts matching ``emails`` on Email (and the mirror field), oldest first."""
+    values = ", ".join("'" + email.replace("\\", "\\\\").replace("'", "\\'") + "'" for email in emails)
+    fields, where = "Id, Email", f"Email IN ({values})"
+    if mirror_email:
+        fields += f", {SALESFORCE_UPSERT_FIELD}"
+        where += f" OR {SALESFORCE_UPSERT_FIELD} IN ({values})"
+    return f"SELECT {fields} FROM Contact WHERE {where} ORDER BY CreatedDate ASC"
+
+
+def match_contact_ids(records: Iterable[Dict[str, Any]], mirror_email: bool) -> Dict[str, str]:
+    """Lower-cased email -> Id of the oldest matching Contact; a mirror field match wins over Email."""
+    by_email: Dict[str, str] = {}
+    by_mirror: Dict[str, str] = {}
+    for record in records:
+        if record.get("Email"):
+            by_email.setdefault(record["Email"].lower(), record["Id"])
+        if mirror_email and record.get(SALESFORCE_UPSERT_FIELD):
+            by_mirror.setdefault(record[SALESFORCE_UPSERT_FIELD].lower(), record["Id"])
+    return {**by_email, **by_mirror}
+
+
+def email_chunks(emails: Iterable[str]) -> Iterator[List[str]]:
+    """Distinct non-empty emails in SALESFORCE_LOOKUP_CHUNK sized lists."""
+    unique = sorted({email.lower() for email in emails if email})
+    for i in range(0, len(unique), SALESFORCE_LOOKUP_CHUNK):
+        yield unique[i:i + SALESFORCE_LOOKUP_CHUNK]
+
+
+def use_bulk_api(record_count: int) -> bool:
+    return record_count > SALESFORCE_BULK_THRESHOLD
+
+
+def import_soql(limit: int, since: Optional[datetime]) -> str:
+    """Query job SOQL for up to ``limit`` contacts modified since the watermark."""
+    return SALESFORCE_IMPORT_SOQL.format(
+        limit=limit,
+        since=f" AND SystemModstamp >= {since.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')}" if since else "",
+    )
+
+
+# ----- Jobs ----- #
+
+async def create_bulk_job(
+    session: AsyncSession,
+    user_id: str,
+    operation: str,
+    job_id: Optional[str] = None,
+    soql: Optional[str] = None,
+    total_records: Optional[int] = None,
+) -> str:
+    """Record a bulk job (the caller commits) and return its id; queue it with ``queue_bulk_job``."""
+    bulk_id = str(uuid.uuid4())
+    await session.execute(text("""
+        INSERT INTO salesforce_bulk_jobs (id, user_id, operation, job_id, soql, total_records)
+        VALUES (:id, :user_id, :operation, :job_id, :soql, :total_records)
+    """), {
+        "id": bulk_id,
+        "user_id": user_id,
+        "operation": operation,
+        "job_id": job_id,
+        "soql": soql,
+        "total_records": total_records,
+    })
+    return bulk_id
+
+
+def queue_bulk_job(bulk_id: str):
+    run_salesforce_bulk_job.delay(bulk_id)
+
+
+def bulk_job_payload(row) -> Dict[str, Any]:
+    """API representation of a salesforce_bulk_jobs row."""
+    job = row._mapping
+    return {
+        "bulk_job_id": job["id"],
+        "operation": job["operation"],
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "salesforce_job_id": job["salesforce_job_id"],
+        "salesforce_state": job["salesforce_state"],
+        "total_records": job["total_records"],
+        "processed_records": job["processed_records"],
+        "failed_records": job["failed_records"],
+        "errors": job["errors"] or [],
+        "created_at": job["created_at"].isoformat() if job["created_at"] else None,
+        "completed_at": job["completed_at"].isoformat() if job["completed_at"] else None,
+    }
+
+
+def _update(bulk_id: str, **fields):
+    assignments = ", ".join(f"{name} = :{name}" for name in fields)
+    with SessionLocal() as session:
+        session.execute(
+            text(f"UPDATE salesforce_bulk_jobs SET {assignments}, updated_at = NOW() WHERE id = :id"),
+            {"id": bulk_id, **fields},
+        )
+        session.commit()
+
+
+# ----- Salesforce client ----- #
+
+def _credentials(session, user_id: str) -> Tuple[str, str]:
+    """(access token, instance URL), refreshing an expired token."""
+    from app.integrations import SalesforceIntegration      # integrations imports this module
+
+    integration = session.execute(text("""
+        SELECT access_token, refresh_token, expires_at, salesforce_instance_url
+        FROM salesforce_integrations
+        WHERE user_id = :user_id AND is_active = true
+        ORDER BY created_at DESC
+        LIMIT 1
+    """), {"user_id": user_id}).fetchone()
+    if not integration:
+        raise RuntimeError("Salesforce integration not found")
+
+    access_token = integration.access_token
+    if integration.expires_at and integration.expires_at.replace(tzinfo=None) < datetime.utcnow():
+        salesforce = SalesforceIntegration(instance_url=integration.salesforce_instance_url)
+        token_data = asyncio.run(salesforce.refresh_access_token(integration.refresh_token))
+        access_token = token_data["access_token"]
+        session.execute(text("""
+            UPDATE salesforce_integrations
+            SET access_token = :access_token, expires_at = :expires_at, updated_at = NOW()
+            WHERE user_id = :user_id AND is_active = true
+        """), {
+            "user_id": user_id,
+            "access_token": access_token,
+            "expires_at": datetime.utcnow() + timedelta(seconds=token_data.get("expires_in", 7200)),
+        })
+        session.commit()
+    return access_token, integration.salesforce_instance_url
+
+
+class BulkClient:
+    """Minimal synchronous Bulk API 2.0 client for the worker."""
+
+    def __init__(self, access_token: str, instance_url: str):
+        self.instance_url = instance_url
+        self.api = f"{instance_url}/services/data/{SALESFORCE_API_VERSION}"
+        self.base = f"{self.api}/jobs"
+        self.client = httpx.Client(timeout=120.0, headers={"Authorization": f"Bearer {access_token}"})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.client.close()
+
+    def _check(self, response: httpx.Response) -> httpx.Response:
+        if response.status_code >= 400:
+            raise RuntimeError(f"Salesforce Bulk API {response.status_code}: {response.text[:500]}")
+        return response
+
+    def has_upsert_field(self) -> bool:
+        """Whether Contact has SALESFORCE_UPSERT_FIELD as an External ID (else match on Email only)."""
+        fields = self._check(self.client.get(f"{self.api}/sobjects/Contact/describe")).json().get("fields", [])
+        problem = upsert_field_problem(fields)
+        if problem:
+            logger.warning(f"{problem}; matching Salesforce contacts on Email only")
+        return problem is None
+
+    def lookup_contact_ids(self, emails: Iterable[str], mirror_email: bool) -> Dict[str, str]:
+        """Lower-cased email -> Id of the existing Contact for each email that has one."""
+        records: List[Dict[str, Any]] = []
+        for chunk in email_chunks(emails):
+            response = self._check(self.client.get(f"{self.api}/query", params={"q": lookup_soql(chunk, mirror_email)}))
+            while True:
+                data = response.json()
+                records.extend(data.get("records", []))
+                if not data.get("nextRecordsUrl"):
+                    break
+                response = self._check(self.client.get(f"{self.instance_url}{data['nextRecordsUrl']}"))
+        return match_contact_ids(records, mirror_email)
+
+    def create_ingest_job(self) -> str:
+        return self._check(self.client.post(f"{self.base}/ingest", json={
+            "object": "Contact",
+            "operation": "upsert",
+            "externalIdFieldName": "Id",     # Rows with an empty Id are inserted
+            "contentType": "CSV",
+            "lineEnding": "CRLF",        # csv.writer default
+        })).json()["id"]
+
+    def upload(self, sf_job_id: str, chunks: Iterator[bytes]):
+        self._check(self.client.put(
+            f"{self.base}/ingest/{sf_job_id}/batches", content=chunks, headers={"Content-Type": "text/csv"}
+        ))
+
+    def set_state(self, kind: str, sf_job_id: str, state: str):
+        self._check(self.client.patch(f"{self.base}/{kind}/{sf_job_id}", json={"state": state}))
+
+    def create_query_job(self, soql: str) -> str:
+        return self._check(self.client.post(f"{self.base}/query", json={
+            "operation": "query",
+            "query": soql,
+        })).json()["id"]
+
+    def status(self, kind: str, sf_job_id: str) -> Dict[str, Any]:
+        return self._check(self.client.get(f"{self.base}/{kind}/{sf_job_id}")).json()
+
+    def failed_results(self, sf_job_id: str) -> List[Dict[str, str]]:
+        response = self._check(self.client.get(f"{self.base}/ingest/{sf_job_id}/failedResults"))
+        return list(csv.DictReader(io.StringIO(response.text)))
+
+    def query_page(self, sf_job_id: str, locator: Optional[str]) -> Tuple[List[Dict[str, str]], Optional[str]]:
+        """One result page of a completed query job and the locator of the next (None on the last)."""
+        params = {"maxRecords": SALESFORCE_QUERY_PAGE_SIZE}
+        if locator:
+            params["locator"] = locator
+        response = self._check(self.client.get(f"{self.base}/query/{sf_job_id}/results", params=params))
+        locator = response.headers.get("Sforce-Locator")
+        return list(csv.DictReader(io.StringIO(response.text))), (None if locator in (None, "", "null") else locator)
+
+
+# ----- Upsert (export) ----- #
+
+def _export_query(job, mirror_email: bool) -> Tuple[List[str], Any, Dict[str, Any]]:
+    """
+    CSV columns (Salesforce fields, without Id) and query for the contacts of
+    an upsert job, one row per email (the newest contact) so no Contact is
+    written twice; contacts without an email are all inserted. The email
+    comes first.
+    """
+    columns = [*SALESFORCE_CONTACT_FIELDS.values(), "LeadSource"]
+    select = [*(f"NULLIF(c.{name}, '')" for name in SALESFORCE_CONTACT_FIELDS), "'Captely'"]
+    if mirror_email:
+        columns.append(SALESFORCE_UPSERT_FIELD)
+        select.append("NULLIF(c.email, '')")
+    query = text(f"""
+        SELECT DISTINCT ON (COALESCE(lower(NULLIF(c.email, '')), c.id::text)) {", ".join(select)}
+        FROM contacts c
+        WHERE c.job_id = :job_id AND c.user_id = :user_id
+        ORDER BY COALESCE(lower(NULLIF(c.email, '')), c.id::text), c.id DESC
+    """)
+    return columns, query, {"job_id": job["job_id"], "user_id": job["user_id"]}
+
+
+def _with_ids(batches: Iterator[List], ids: Dict[str, str]) -> Iterator[List]:
+    """Prefix each row with the Id of the Contact its email matched ('' inserts a new one)."""
+    for batch in batches:
+        yield [(ids.get((row[0] or "").lower(), ""), *row) for row in batch]
+
+
+def _submit_upsert(bulk: BulkClient, job) -> str:
+    mirror_email = bulk.has_upsert_field()
+    emails = (
+        row[0]
+        for batch in stream_query_sync(
+            text("""
+                SELECT DISTINCT c.email FROM contacts c
+                WHERE c.job_id = :job_id AND c.user_id = :user_id AND c.email <> ''
+            """),
+            {"job_id": job["job_id"], "user_id": job["user_id"]},
+        )
+        for row in batch
+    )
+    ids = bulk.lookup_contact_ids(emails, mirror_email)
+
+    columns, query, params = _export_query(job, mirror_email)
+    path = write_export_file("csv", ["Id", *columns], _with_ids(stream_query_sync(query, params), ids))
+    try:
+        if os.path.getsize(path) > SALESFORCE_BULK_UPLOAD_LIMIT:
+            raise RuntimeError("Export exceeds the 100 MB Bulk API job limit; export fewer contacts at once")
+        sf_job_id = bulk.create_ingest_job()
+        try:
+            bulk.upload(sf_job_id, iter_file(path, delete=False))
+            bulk.set_state("ingest", sf_job_id, "UploadComplete")
+        except Exception:
+            bulk.set_state("ingest", sf_job_id, "Aborted")
+            raise
+        return sf_job_id
+    finally:
+        remove_file(path)
+
+
+def _finish_upsert(bulk: BulkClient, job, status: Dict[str, Any]):
+    failed = status.get("numberRecordsFailed", 0)
+    errors = []
+    if failed:
+        for record in bulk.failed_results(job["salesforce_job_id"])[:SALESFORCE_MAX_ERRORS]:
+            errors.append(f"{record.get('Email') or record.get('LastName') or 'unknown'}: {record.get('sf__Error')}")
+    processed = status.get("numberRecordsProcessed", 0)
+
+    with SessionLocal() as session:
+        session.execute(text("""
+            INSERT INTO salesforce_sync_logs
+            (user_id, integration_id, sync_type, operation, status, total_records, processed_records, failed_records, started_at, completed_at)
+            SELECT si.user_id, si.id, 'export', 'bulk', :status, :total, :processed, :failed, :started_at, NOW()
+            FROM salesforce_integrations si
+            WHERE si.user_id = CAST(:user_id AS uuid) AND si.is_active = true
+            LIMIT 1
+        """), {
+            "user_id": job["user_id"],
+            "status": "completed" if not failed else ("partial" if processed > failed else "failed"),
+            "total": processed,
+            "processed": processed - failed,
+            "failed": failed,
+            "started_at": job["created_at"],
+        })
+        session.commit()
+    return processed - failed, failed, errors
+
+
+# ----- Query (import) ----- #
+
+def _salesforce_contact(record: Dict[str, str]) -> Dict[str, Any]:
+    """Contact fields of one query result row (the CSV has empty strings for missing values)."""
+    return {
+        "first_name": record.get("FirstName", "")[:255],
+        "last_name": record.get("LastName", "")[:255],
+        "email": record.get("Email", "")[:255],
+        "phone": record.get("Phone", "")[:50],
+        "company": record.get("Account.Name", "")[:255],
+        "position": record.get("Title", "")[:255],
+        "location": record.get("MailingCity", "")[:255],
+    }
+
+
+async def _write_results(job, bulk: BulkClient) -> int:
+    user_id, job_id = job["user_id"], job["job_id"]
+    imported = updated = 0
+    # Unpooled: every task runs its own event loop and connections can't outlive it
+    engine = create_db_engine(is_async=True, role="script")
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        _, watermark = await get_sync_state(session, user_id, "salesforce")
+
+        async def fetch(locator):
+            return await asyncio.to_thread(bulk.query_page, job["salesforce_job_id"], locator)
+
+        async for records, _ in prefetch_pages(fetch, None):
+            rows = []
+            for record in records:
+                if not record.get("Email"):
+                    continue
+                rows.append((record["Id"], _salesforce_contact(record)))
+                modified = record.get("SystemModstamp")
+                if modified:
+                    modified = datetime.strptime(modified, "%Y-%m-%dT%H:%M:%S.%f%z")
+                    watermark = modified if watermark is None else max(watermark, modified)
+
+            inserted, changed = await write_contacts(session, user_id, job_id, "salesforce", rows)
+            imported += inserted
+            updated += changed
+            await session.execute(
+                text("UPDATE import_jobs SET total = :count, updated_at = NOW() WHERE id = :job_id"),
+                {"job_id": job_id, "count": imported},
+            )
+            # Results come in SystemModstamp order, so the watermark is safe to save page by page
+            await save_sync_state(session, user_id, "salesforce", None, watermark)
+            await commit_page(session, user_id)
+            _update(job["id"], processed_records=imported + updated)
+
+        await session.execute(
+            text("UPDATE import_jobs SET status = 'completed', total = :count, updated_at = NOW() WHERE id = :job_id"),
+            {"job_id": job_id, "count": imported},
+        )
+        await session.commit()
+    return imported + updated
+
+
+def _import_rows(job, bulk: BulkClient) -> int:
+    """Write the query results into the job's import batch, updating contacts imported before."""
+    return asyncio.run(_write_results(job, bulk))
+
+
+# ----- Worker tasks ----- #
+
+def _load(bulk_id: str):
+    with SessionLocal() as session:
+        return session.execute(
+            text("SELECT * FROM salesforce_bulk_jobs WHERE id = :id"), {"id": bulk_id}
+        ).mappings().first()
+
+
+def _fail(bulk_id: str, job, error: str):
+    logger.error(f"Salesforce bulk job {bulk_id} failed: {error}")
+    _update(bulk_id, status="failed", errors=json.dumps([error[:1000]]), completed_at=datetime.utcnow())
+    if job["operation"] == "query" and job["job_id"]:
+        with SessionLocal() as session:
+            session.execute(
+                text("UPDATE import_jobs SET status = 'failed', updated_at = NOW() WHERE id = :job_id"),
+                {"job_id": job["job_id"]},
+            )
+            session.commit()
+
+
+@celery_app.task(name="app.salesforce_bulk.run_salesforce_bulk_job")
+def run_salesforce_bulk_job(bulk_id: str):
+    """Submit a queued bulk job to Salesforce, then hand it to the poller."""
+    job = _load(bulk_id)
+    if not job or job["status"] != "queued":
+        return {"bulk_job_id": bulk_id, "skipped": True}
+    try:
+        with SessionLocal() as session:
+            access_token, instance_url = _credentials(session, job["user_id"])
+        with BulkClient(access_token, instance_url) as bulk:
+            if job["operation"] == "upsert":
+                sf_job_id = _submit_upsert(bulk, job)
+            else:
+                sf_job_id = bulk.create_query_job(job["soql"])
+        _update(bulk_id, status="submitted", salesforce_job_id=sf_job_id)
+    except Exception as e:
+        _fail(bulk_id, job, str(e))
+        raise
+    poll_salesforce_bulk_job.apply_async((bulk_id,), countdown=SALESFORCE_BULK_POLL_SECONDS)
+    return {"bulk_job_id": bulk_id, "salesforce_job_id": sf_job_id}
+
+
+@celery_app.task(name="app.salesforce_bulk.poll_salesforce_bulk_job")
+def poll_salesforce_bulk_job(bulk_id: str):
+    """Check a submitted job; finish it when Salesforce is done, otherwise poll again later."""
+    job = _load(bulk_id)
+    if not job or job["status"] != "submitted":
+        return {"bulk_job_id": bulk_id, "skipped": True}
+    kind = "ingest" if job["operation"] == "upsert" else "query"
+    try:
+        with SessionLocal() as session:
+            access_token, instance_url = _credentials(session, job["user_id"])
+        with BulkClient(access_token, instance_url) as bulk:
+            status = bulk.status(kind, job["salesforce_job_id"])
+            state = status.get("state")
+
+            if state not in _TERMINAL_STATES:
+                if datetime.utcnow() - job["created_at"] > SALESFORCE_BULK_MAX_AGE:
+                    bulk.set_state(kind, job["salesforce_job_id"], "Aborted")
+                    raise RuntimeError(f"Salesforce job still {state} after {SALESFORCE_BULK_MAX_AGE}")
+                _update(bulk_id, salesforce_state=state, processed_records=status.get("numberRecordsProcessed", 0))
+                poll_salesforce_bulk_job.apply_async((bulk_id,), countdown=SALESFORCE_BULK_POLL_SECONDS)
+                return {"bulk_job_id": bulk_id, "state": state}
+
+            if state != "JobComplete":
+                raise RuntimeError(f"Salesforce job {state}: {status.get('errorMessage') or 'no details'}")
+
+            if kind == "ingest":
+                processed, failed, errors = _finish_upsert(bulk, job, status)
+            else:
+                processed, failed, errors = _import_rows(job, bulk), 0, []
+        _update(
+            bulk_id,
+            status="completed",
+            salesforce_state=state,
+            processed_records=processed,
+            failed_records=failed,
+            total_records=processed + failed,
+            errors=json.dumps(errors) if errors else None,
+            completed_at=datetime.utcnow(),
+        )
+        logger.info(f"Salesforce bulk {job['operation']} {bulk_id} completed: {processed} ok, {failed} failed")
+        return {"bulk_job_id": bulk_id, "processed": processed, "failed": failed}
+    except Exception as e:
+        _fail(bulk_id, job, str(e))
+        raise
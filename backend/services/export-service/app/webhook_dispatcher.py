@@ -0,0 +1,258 @@
+"""
+Webhook outbox dispatcher.
+
+Runs as its own process (``python -m app.webhook_dispatcher``, the
+webhook-dispatcher service in docker-compose.yaml) and delivers the rows
+queued with common.webhooks.enqueue_webhooks:
+
+* due groups are claimed with FOR UPDATE SKIP LOCKED, so several
+  dispatchers can run side by side;
+* each group is POSTed as one request (gzip-encoded only if the rows were
+  queued with gzip=True) through a single
+  pooled HTTP client, at most WEBHOOK_DESTINATION_CONCURRENCY requests at a
+  time per destination URL;
+* 408 / 429 / 5xx and network errors are retried with exponential backoff
+  and jitter (honouring Retry-After), other 4xx answers are not; rows that
+  run out of attempts or are rejected stay in the table as 'dead' with
+  their last error.
+
+Rows left 'sending' by a dispatcher that died are put back in the queue
+after WEBHOOK_STALE_AFTER, and delivered rows are purged after
+WEBHOOK_RETENTION.
+"""
+import os
+import random
+import signal
+import asyncio
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from sqlalchemy import text
+
+from common.db import SessionLocal
+from common.webhooks import WEBHOOK_BATCH_SIZE, WEBHOOK_BATCH_WAIT, encode_body, webhook_body
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_DESTINATION_CONCURRENCY = int(os.environ.get("WEBHOOK_DESTINATION_CONCURRENCY", "2"))
+WEBHOOK_MAX_IN_FLIGHT = int(os.environ.get("WEBHOOK_MAX_IN_FLIGHT", "50"))
+WEBHOOK_MAX_ATTEMPTS = int(os.environ.get("WEBHOOK_MAX_ATTEMPTS", "8"))
+WEBHOOK_BACKOFF_BASE = 30.0             # Seconds before the first retry, doubled per attempt
+WEBHOOK_BACKOFF_MAX = 3600.0
+WEBHOOK_TIMEOUT = 30.0
+WEBHOOK_POLL_SECONDS = 1.0
+WEBHOOK_STALE_AFTER = timedelta(minutes=10)
+WEBHOOK_RETENTION = timedelta(days=7)
+WEBHOOK_MAINTENANCE_SECONDS = 300
+
+_RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+DUE_GROUPS = text("""
+    SELECT user_id, destination, event, batch_mode, envelope_hash
+    FROM webhook_outbox
+    WHERE status = 'pending' AND next_attempt_at <= NOW()
+    GROUP BY user_id, destination, event, batch_mode, envelope_hash
+    HAVING COUNT(*) >= :batch_size OR MIN(created_at) <= NOW() - make_interval(secs => :batch_wait)
+    ORDER BY MIN(created_at)
+    LIMIT :limit
+""")
+
+CLAIM_GROUP = text("""
+    UPDATE webhook_outbox SET status = 'sending', locked_at = NOW(), attempts = attempts + 1
+    WHERE id IN (
+        SELECT id FROM webhook_outbox
+        WHERE status = 'pending' AND next_attempt_at <= NOW()
+          AND user_id = :user_id AND destination = :destination
+          AND event = :event AND batch_mode = :batch_mode AND envelope_hash = :envelope_hash
+        ORDER BY id
+        LIMIT :batch_size
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, attempts, envelope, payload, gzip
+""")
+
+MARK_DELIVERED = text("""
+    UPDATE webhook_outbox
+    SET status = 'delivered', delivered_at = NOW(), locked_at = NULL, last_error = NULL
+    WHERE id = ANY(:ids)
+""")
+
+MARK_RETRY = text("""
+    UPDATE webhook_outbox SET
+        status = CASE WHEN attempts >= :max_attempts THEN 'dead' ELSE 'pending' END,
+        next_attempt_at = NOW() + make_interval(secs => :delay),
+        locked_at = NULL,
+        last_error = :error
+    WHERE id = ANY(:ids)
+""")
+
+MARK_DEAD = text("""
+    UPDATE webhook_outbox SET status = 'dead', locked_at = NULL, last_error = :error
+    WHERE id = ANY(:ids)
+""")
+
+
+@dataclass
+class Batch:
+    user_id: str
+    destination: str
+    event: str
+    batch_mode: bool
+    ids: List[int]
+    attempts: int
+    envelope: Dict[str, Any]
+    items: List[Dict[str, Any]]
+    gzip: bool = False
+
+
+# ----- Database (blocking, run in threads) ----- #
+
+def claim_batches(limit: int) -> List[Batch]:
+    """Claim up to ``limit`` due groups, one batch each."""
+    batches = []
+    with SessionLocal() as session:
+        groups = session.execute(DUE_GROUPS, {
+            "batch_size": WEBHOOK_BATCH_SIZE, "batch_wait": WEBHOOK_BATCH_WAIT, "limit": limit,
+        }).fetchall()
+        for user_id, destination, event, batch_mode, envelope_hash in groups:
+            rows = sorted(session.execute(CLAIM_GROUP, {
+                "user_id": user_id, "destination": destination, "event": event,
+                "batch_mode": batch_mode, "envelope_hash": envelope_hash, "batch_size": WEBHOOK_BATCH_SIZE,
+            }).fetchall())
+            if rows:
+                batches.append(Batch(
+                    user_id, destination, event, batch_mode,
+                    ids=[row[0] for row in rows],
+                    attempts=max(row[1] for row in rows),
+                    envelope=rows[0][2] or {},
+                    items=[row[3] for row in rows],
+                    gzip=all(row[4] for row in rows),
+                ))
+        session.commit()
+    return batches
+
+
+def retry_delay(attempts: int, retry_after: float = 0.0) -> float:
+    """Seconds before the next attempt: jittered exponential backoff, at least ``retry_after``."""
+    backoff = min(WEBHOOK_BACKOFF_MAX, WEBHOOK_BACKOFF_BASE * 2 ** (attempts - 1))
+    return max(retry_after, backoff * (0.5 + random.random()))
+
+
+def record_outcome(batch: Batch, outcome: str, error: Optional[str] = None, retry_after: float = 0.0):
+    with SessionLocal() as session:
+        if outcome == "delivered":
+            session.execute(MARK_DELIVERED, {"ids": batch.ids})
+        elif outcome == "retry":
+            # One delay for the whole batch so its rows come due, and are claimed, together
+            session.execute(MARK_RETRY, {
+                "ids": batch.ids, "error": error, "max_attempts": WEBHOOK_MAX_ATTEMPTS,
+                "delay": retry_delay(batch.attempts, retry_after),
+            })
+        else:
+            session.execute(MARK_DEAD, {"ids": batch.ids, "error": error})
+        session.commit()
+
+
+def maintain_outbox():
+    """Requeue rows orphaned mid-send and purge old delivered rows."""
+    with SessionLocal() as session:
+        requeued = session.execute(text("""
+            UPDATE webhook_outbox SET status = 'pending', locked_at = NULL
+            WHERE status = 'sending' AND locked_at < NOW() - make_interval(secs => :stale)
+        """), {"stale": WEBHOOK_STALE_AFTER.total_seconds()}).rowcount
+        purged = session.execute(text("""
+            DELETE FROM webhook_outbox
+            WHERE status = 'delivered' AND delivered_at < NOW() - make_interval(secs => :retention)
+        """), {"retention": WEBHOOK_RETENTION.total_seconds()}).rowcount
+        session.commit()
+    if requeued or purged:
+        logger.info(f"Webhook outbox: requeued {requeued} stale rows, purged {purged} delivered rows")
+
+
+# ----- Delivery ----- #
+
+def _retry_after(response: httpx.Response) -> float:
+    value = response.headers.get("Retry-After", "")
+    return float(value) if value.isdigit() else 0.0
+
+
+class WebhookDispatcher:
+    def __init__(self):
+        self.client = httpx.AsyncClient(
+            timeout=WEBHOOK_TIMEOUT,
+            limits=httpx.Limits(max_connections=WEBHOOK_MAX_IN_FLIGHT, max_keepalive_connections=20),
+        )
+        self.semaphores = defaultdict(lambda: asyncio.Semaphore(WEBHOOK_DESTINATION_CONCURRENCY))
+        self.in_flight: set = set()
+        self.stopping = asyncio.Event()
+
+    async def post(self, batch: Batch) -> Tuple[str, Optional[str], float]:
+        """(outcome, error, retry_after) for one delivery attempt."""
+        content, headers = encode_body(
+            webhook_body(batch.envelope, batch.items, batch.batch_mode), compress=batch.gzip
+        )
+        async with self.semaphores[batch.destination]:
+            try:
+                response = await self.client.post(batch.destination, content=content, headers=headers)
+            except httpx.HTTPError as e:
+                return "retry", f"{type(e).__name__}: {e}", 0.0
+        if response.is_success:
+            return "delivered", None, 0.0
+        error = f"{response.status_code}: {response.text[:500]}"
+        if response.status_code in _RETRY_STATUSES:
+            return "retry", error, _retry_after(response)
+        return "dead", error, 0.0
+
+    async def deliver(self, batch: Batch):
+        try:
+            outcome, error, retry_after = await self.post(batch)
+        except Exception as e:
+            outcome, error, retry_after = "retry", f"{type(e).__name__}: {e}", 0.0
+        if outcome != "delivered":
+            logger.warning(f"Webhook {batch.event} to {batch.destination} ({len(batch.ids)} items): {outcome}, {error}")
+        await asyncio.to_thread(record_outcome, batch, outcome, error, retry_after)
+
+    async def run(self):
+        logger.info("Webhook dispatcher started")
+        last_maintenance = 0.0
+        loop = asyncio.get_running_loop()
+        try:
+            while not self.stopping.is_set():
+                if loop.time() - last_maintenance >= WEBHOOK_MAINTENANCE_SECONDS:
+                    await asyncio.to_thread(maintain_outbox)
+                    last_maintenance = loop.time()
+
+                free = WEBHOOK_MAX_IN_FLIGHT - len(self.in_flight)
+                batches = await asyncio.to_thread(claim_batches, free) if free > 0 else []
+                for batch in batches:
+                    task = asyncio.create_task(self.deliver(batch))
+                    self.in_flight.add(task)
+                    task.add_done_callback(self.in_flight.discard)
+
+                if not batches:
+                    try:
+                        await asyncio.wait_for(self.stopping.wait(), WEBHOOK_POLL_SECONDS)
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            if self.in_flight:
+                await asyncio.gather(*self.in_flight, return_exceptions=True)
+            await self.client.aclose()
+            logger.info("Webhook dispatcher stopped")
+
+
+async def main():
+    dispatcher = WebhookDispatcher()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, dispatcher.stopping.set)
+    await dispatcher.run()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
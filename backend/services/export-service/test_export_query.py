@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Export query builder (app/export_query.py): only whitelisted columns and
+filters reach the SQL, filter values are bound and coerced to the column's
+type, and the latest-enrichment join is added only when a column needs it.
+
+The built queries are also run against Postgres when EXPORT_TEST_DATABASE_URL
+points at a Captely database; everything happens inside a transaction that
+is rolled back.
+"""
+import os
+import uuid
+from datetime import datetime
+
+import pytest
+
+from app.export_query import CRM_EXPORT, JOB_EXPORT, ExportQueryError
+
+WHERE = ["c.job_id = :job_id", "c.user_id = :user_id"]
+PARAMS = {"job_id": "job", "user_id": "user"}
+
+
+def build(columns=None, filters=None, source=JOB_EXPORT):
+    return source.build(columns, filters, where=WHERE, params=PARAMS)
+
+
+def test_columns_keep_request_order_and_drop_unknown_names():
+    names, query, _ = build(["email", "id", "password_hash", "email; DROP TABLE contacts"])
+    assert names == ["email", "id"]
+    sql = str(query)
+    assert "c.email AS email, c.id AS id" in sql
+    assert "password_hash" not in sql and "DROP" not in sql
+
+
+def test_no_known_columns_selects_everything():
+    assert build()[0] == list(JOB_EXPORT.columns)
+    assert build(["nope"])[0] == list(JOB_EXPORT.columns)
+
+
+def test_filters_are_bound_and_typed():
+    _, query, params = build(["id"], {
+        "enriched": "yes",
+        "credits_consumed": ["1", 2],
+        "created_at": "2025-01-02T03:04:05+02:00",
+        "company": None,
+        "evil') OR 1=1 --": "x",
+    })
+    sql = str(query)
+    assert "c.enriched = :filter_0" in sql
+    assert "c.credits_consumed = ANY(:filter_1)" in sql
+    assert "c.created_at = :filter_2" in sql
+    assert "c.company IS NULL" in sql
+    assert "OR 1=1" not in sql
+    assert params["filter_0"] is True
+    assert params["filter_1"] == [1, 2]
+    # Aware datetimes become naive UTC, matching the timestamp columns
+    assert params["filter_2"] == datetime(2025, 1, 2, 1, 4, 5)
+    assert {k: params[k] for k in PARAMS} == PARAMS
+    assert "filter_4" not in params
+
+
+@pytest.mark.parametrize("filters", [
+    {"id": "abc"},
+    {"enriched": "maybe"},
+    {"credits_consumed": ["1", "two"]},
+    {"created_at": "yesterday"},
+])
+def test_bad_filter_values_raise(filters):
+    with pytest.raises(ExportQueryError):
+        build(["id"], filters)
+
+
+def test_enrichment_join_only_when_needed():
+    assert "LATERAL" not in str(build(["id", "email"])[1])
+    assert "LATERAL" in str(build(["id", "provider"])[1])
+    # A filter on a joined column needs the join even when it isn't selected
+    assert "LATERAL" in str(build(["id"], {"confidence_score": 0.5})[1])
+
+
+def test_kinds_follow_column_types():
+    names = ["id", "email", "enrichment_score", "enriched", "created_at", "email_verified_status"]
+    assert JOB_EXPORT.kinds(names) == ["int", "string", "float", "bool", "timestamp", "bool"]
+
+
+def test_caller_params_are_not_mutated():
+    params = dict(PARAMS)
+    JOB_EXPORT.build(["id"], {"enriched": True}, where=WHERE, params=params)
+    assert params == PARAMS
+
+
+def test_built_queries_run_postgres():
+    url = os.environ.get("EXPORT_TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("EXPORT_TEST_DATABASE_URL not set")
+    pytest.importorskip("psycopg2")
+    from sqlalchemy import create_engine, text
+
+    engine = create_engine(url.replace("+asyncpg", ""))
+    try:
+        with engine.connect() as conn:
+            trans = conn.begin()
+            try:
+                user_id = str(conn.execute(
+                    text("INSERT INTO users (email) VALUES (:email) RETURNING id"),
+                    {"email": f"export-test-{uuid.uuid4().hex}@example.com"},
+                ).scalar())
+                job_id = f"export_test_{uuid.uuid4().hex}"
+                conn.execute(
+                    text("INSERT INTO import_jobs (id, user_id, status, file_name) VALUES (:id, :user_id, 'completed', 'leads.csv')"),
+                    {"id": job_id, "user_id": user_id},
+                )
+                first, second = conn.execute(text("""
+                    INSERT INTO contacts (job_id, user_id, email, enriched, enrichment_provider, created_at)
+                    VALUES (:job_id, :user_id, 'a@example.com', true, 'icypeas', TIMESTAMP '2025-01-01'),
+                           (:job_id, :user_id, 'b@example.com', false, NULL, TIMESTAMP '2025-01-02')
+                    RETURNING id
+                """), {"job_id": job_id, "user_id": user_id}).scalars().all()
+                conn.execute(text("""
+                    INSERT INTO enrichment_results (contact_id, provider, confidence_score, created_at)
+                    VALUES (:id, 'apollo', 0.4, TIMESTAMP '2025-01-01'), (:id, 'dropcontact', 0.9, TIMESTAMP '2025-01-03')
+                """), {"id": first})
+
+                params = {"job_id": job_id, "user_id": user_id}
+                names, query, bound = JOB_EXPORT.build(
+                    ["id", "email", "provider", "confidence_score"], None, where=WHERE, params=params
+                )
+                rows = conn.execute(query, bound).fetchall()
+                # One row per contact, newest first, carrying the latest enrichment result
+                assert [tuple(row) for row in rows] == [
+                    (second, "b@example.com", None, None),
+                    (first, "a@example.com", "dropcontact", 0.9),
+                ]
+
+                _, query, bound = JOB_EXPORT.build(["id"], {"enriched": "true"}, where=WHERE, params=params)
+                assert conn.execute(query, bound).scalars().all() == [first]
+
+                names, query, bound = CRM_EXPORT.build(
+                    ["email", "batch_name"], {"id": [first, second]}, where=WHERE, params=params
+                )
+                assert names == ["email", "batch_name"]
+                assert [tuple(row) for row in conn.execute(query, bound)] == [
+                    ("b@example.com", "leads.csv"), ("a@example.com", "leads.csv"),
+                ]
+            finally:
+                trans.rollback()
+    finally:
+        engine.dispose()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Streaming export encoders (common/exports.py): every format decodes back to
+the rows it was given, Parquet flushes row groups as it goes, empty exports
+are still valid files, and the async and sync stream helpers agree.
+
+Parquet / Arrow cases need pyarrow and the XLSX cases need xlsxwriter; they
+are skipped when those aren't installed.
+"""
+import io
+import csv
+import json
+import asyncio
+import zipfile
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from common import exports
+from common.exports import (
+    ArrowStreamEncoder, CsvEncoder, NdjsonEncoder, ParquetEncoder, XlsxSpooler,
+    encode_stream, encode_stream_sync, iter_file, prefers_ndjson, write_export_file,
+)
+
+COLUMNS = ["id", "email", "score", "enriched", "created_at"]
+KINDS = ["int", "string", "float", "bool", "timestamp"]
+ROWS = [
+    (1, "a@example.com", 0.5, True, datetime(2025, 1, 1, 12, 0)),
+    (2, 'quote "b", comma', None, False, datetime(2025, 1, 2, 8, 30)),
+    (3, None, 1.0, None, None),
+]
+
+
+def batches_of(rows, size):
+    return [rows[i:i + size] for i in range(0, len(rows), size)]
+
+
+def generate(batches):
+    """Batches as a closable generator, like stream_query_sync() returns."""
+    yield from batches
+
+
+def encode(encoder, batches):
+    return b"".join(encode_stream_sync(encoder, generate(batches)))
+
+
+async def aiter_batches(batches, closed=None):
+    try:
+        for batch in batches:
+            await asyncio.sleep(0)
+            yield batch
+    finally:
+        if closed is not None:
+            closed.append(True)
+
+
+async def encode_async(encoder, batches):
+    return b"".join([chunk async for chunk in encode_stream(encoder, aiter_batches(batches))])
+
+
+# ----- CSV / NDJSON ----- #
+
+def test_csv_round_trip():
+    data = encode(CsvEncoder(COLUMNS), batches_of(ROWS, 2)).decode()
+    parsed = list(csv.reader(io.StringIO(data)))
+    assert parsed[0] == COLUMNS
+    assert parsed[2][1] == 'quote "b", comma'
+    assert parsed[3] == ["3", "", "1.0", "", ""]
+    assert len(parsed) == 4
+
+
+def test_ndjson_rows_are_json_objects():
+    rows = [(1, Decimal("0.25"), datetime(2025, 1, 1, 12, 0), None)]
+    data = encode(NdjsonEncoder(["id", "score", "created_at", "phone"]), [rows])
+    assert data.endswith(b"\n")
+    assert [json.loads(line) for line in data.splitlines()] == [
+        {"id": 1, "score": 0.25, "created_at": "2025-01-01T12:00:00", "phone": None}
+    ]
+
+
+def test_empty_exports():
+    assert encode(CsvEncoder(COLUMNS), []) == b"id,email,score,enriched,created_at\r\n"
+    assert encode(NdjsonEncoder(COLUMNS), []) == b""
+
+
+def test_prefers_ndjson():
+    assert prefers_ndjson("application/x-ndjson")
+    assert prefers_ndjson("Application/X-NDJSON, application/json;q=0.5")
+    assert not prefers_ndjson("application/json")
+    assert not prefers_ndjson(None)
+
+
+@pytest.mark.parametrize("encoder_class", [CsvEncoder, NdjsonEncoder])
+def test_async_stream_matches_sync(encoder_class):
+    batches = batches_of(ROWS, 1)
+    assert asyncio.run(encode_async(encoder_class(COLUMNS), batches)) == encode(encoder_class(COLUMNS), batches)
+
+
+def test_async_stream_closes_source_when_abandoned():
+    closed = []
+
+    async def run():
+        stream = encode_stream(CsvEncoder(COLUMNS), aiter_batches(batches_of(ROWS, 1), closed))
+        await stream.__anext__()      # header
+        await stream.__anext__()      # first batch
+        await stream.aclose()
+
+    asyncio.run(run())
+    assert closed == [True]
+
+
+# ----- Parquet / Arrow ----- #
+
+def read_arrow(data):
+    pa = pytest.importorskip("pyarrow")
+    return pa.ipc.open_stream(io.BytesIO(data)).read_all()
+
+
+def read_parquet(data):
+    pq = pytest.importorskip("pyarrow.parquet")
+    return pq.read_table(io.BytesIO(data))
+
+
+def test_arrow_typed_round_trip():
+    pytest.importorskip("pyarrow")
+    table = read_arrow(encode(ArrowStreamEncoder(COLUMNS, KINDS), batches_of(ROWS, 2)))
+    assert [str(field.type) for field in table.schema] == ["int64", "string", "double", "bool", "timestamp[us]"]
+    assert [tuple(row.values()) for row in table.to_pylist()] == ROWS
+
+
+def test_arrow_inferred_types_and_null_columns():
+    pytest.importorskip("pyarrow")
+    rows = [(1, None), (2, None)]
+    table = read_arrow(encode(ArrowStreamEncoder(["id", "phone"]), [rows]))
+    assert [str(field.type) for field in table.schema] == ["int64", "string"]
+    assert table.to_pylist() == [{"id": 1, "phone": None}, {"id": 2, "phone": None}]
+
+
+def test_parquet_flushes_row_groups(monkeypatch):
+    pytest.importorskip("pyarrow")
+    monkeypatch.setattr(exports, "PARQUET_ROW_GROUP_SIZE", 2)
+    rows = [(i, f"c{i}@example.com", i / 10, i % 2 == 0, datetime(2025, 1, 1, 0, i)) for i in range(7)]
+    encoder = ParquetEncoder(COLUMNS, KINDS)
+
+    chunks = [encoder.header()] + [encoder.encode(batch) for batch in batches_of(rows, 1)]
+    # Each row group leaves as soon as it fills, before the footer is written
+    assert [len(chunk) > 0 for chunk in chunks] == [False, False, True, False, True, False, True, False]
+    data = b"".join(chunks) + encoder.footer()
+
+    pq = pytest.importorskip("pyarrow.parquet")
+    assert pq.ParquetFile(io.BytesIO(data)).metadata.num_row_groups == 4
+    assert [tuple(row.values()) for row in read_parquet(data).to_pylist()] == rows
+
+
+@pytest.mark.parametrize("encoder_class,reader", [(ArrowStreamEncoder, read_arrow), (ParquetEncoder, read_parquet)])
+def test_arrow_formats_empty_export(encoder_class, reader):
+    pytest.importorskip("pyarrow")
+    typed = reader(encode(encoder_class(COLUMNS, KINDS), []))
+    untyped = reader(encode(encoder_class(COLUMNS), []))
+    for table in (typed, untyped):
+        assert table.num_rows == 0
+        assert table.schema.names == COLUMNS
+
+
+@pytest.mark.parametrize("encoder_class,reader", [(ArrowStreamEncoder, read_arrow), (ParquetEncoder, read_parquet)])
+def test_arrow_formats_async_stream(encoder_class, reader):
+    pytest.importorskip("pyarrow")
+    assert encoder_class.cpu_bound
+    table = reader(asyncio.run(encode_async(encoder_class(COLUMNS, KINDS), batches_of(ROWS, 1))))
+    assert [tuple(row.values()) for row in table.to_pylist()] == ROWS
+
+
+# ----- XLSX ----- #
+
+def sheets(path):
+    with zipfile.ZipFile(path) as workbook:
+        return {
+            name: workbook.read(name).decode()
+            for name in sorted(workbook.namelist()) if name.startswith("xl/worksheets/sheet")
+        }
+
+
+def test_xlsx_rolls_over_to_new_sheets(monkeypatch, tmp_path):
+    pytest.importorskip("xlsxwriter")
+    monkeypatch.setattr(exports, "EXPORT_SPOOL_DIR", str(tmp_path))
+    monkeypatch.setattr(exports, "XLSX_MAX_ROWS", 3)   # Header + 2 rows per sheet
+    spooler = XlsxSpooler(["id", "formula"])
+    spooler.write([(i, "=1+1") for i in range(5)])
+    path = spooler.close()
+
+    written = sheets(path)
+    assert len(written) == 3
+    # Cell text is never turned into a formula
+    assert all("<f>" not in sheet for sheet in written.values())
+    with zipfile.ZipFile(path) as workbook:
+        assert "Contacts (3)" in workbook.read("xl/workbook.xml").decode()
+
+
+def test_write_export_file_and_iter_file(monkeypatch, tmp_path):
+    monkeypatch.setattr(exports, "EXPORT_SPOOL_DIR", str(tmp_path))
+    path = write_export_file("csv", COLUMNS, generate(batches_of(ROWS, 2)))
+    assert path.endswith(".csv")
+
+    data = b"".join(iter_file(path))
+    assert data == encode(CsvEncoder(COLUMNS), batches_of(ROWS, 2))
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_write_export_file_removes_partial_file(monkeypatch, tmp_path):
+    monkeypatch.setattr(exports, "EXPORT_SPOOL_DIR", str(tmp_path))
+
+    def failing_batches():
+        yield ROWS[:1]
+        raise RuntimeError("cursor lost")
+
+    with pytest.raises(RuntimeError):
+        write_export_file("ndjson", COLUMNS, failing_batches())
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Webhook outbox dispatcher (app/webhook_dispatcher.py): how delivery attempts
+are classified, the retry backoff, and the outbox row transitions
+(pending -> sending -> delivered / pending again / dead).
+
+The outbox part runs only when EXPORT_TEST_DATABASE_URL points at a Captely
+database. The dispatcher's sessions are joined to an outer transaction
+(their commits become savepoints), which is rolled back at the end.
+"""
+import os
+import gzip
+import json
+import uuid
+import asyncio
+
+import httpx
+import pytest
+from sqlalchemy import text
+
+from app import webhook_dispatcher
+from app.webhook_dispatcher import (
+    WEBHOOK_BACKOFF_BASE, WEBHOOK_BACKOFF_MAX, Batch, WebhookDispatcher,
+    claim_batches, maintain_outbox, record_outcome, retry_delay,
+)
+
+DESTINATION = "https://hooks.example.com/catch/1"
+
+
+def make_batch(**overrides):
+    fields = dict(
+        user_id="user", destination=DESTINATION, event="contacts.exported", batch_mode=True,
+        ids=[1, 2], attempts=1, envelope={"source": "captely"},
+        items=[{"email": "a@example.com"}, {"email": "b@example.com"}],
+    )
+    fields.update(overrides)
+    return Batch(**fields)
+
+
+def post(batch, handler):
+    async def run():
+        dispatcher = WebhookDispatcher()
+        await dispatcher.client.aclose()
+        dispatcher.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            return await dispatcher.post(batch)
+        finally:
+            await dispatcher.client.aclose()
+
+    return asyncio.run(run())
+
+
+# ----- Delivery attempts ----- #
+
+def test_success_is_delivered_with_batch_body():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200)
+
+    assert post(make_batch(), handler) == ("delivered", None, 0.0)
+    body = json.loads(requests[0].content)
+    assert body["source"] == "captely"
+    assert body["total_contacts"] == 2
+    assert body["contacts"] == [{"email": "a@example.com"}, {"email": "b@example.com"}]
+    assert "timestamp" in body
+    assert "content-encoding" not in requests[0].headers
+
+
+def test_per_item_mode_posts_an_array():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(204)
+
+    assert post(make_batch(batch_mode=False), handler)[0] == "delivered"
+    body = json.loads(requests[0].content)
+    assert [item["email"] for item in body] == ["a@example.com", "b@example.com"]
+    assert all(item["source"] == "captely" for item in body)
+
+
+def test_gzip_only_when_queued_with_gzip():
+    requests = []
+    items = [{"email": f"user{i}@example.com"} for i in range(100)]
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200)
+
+    post(make_batch(items=items, gzip=True), handler)
+    assert requests[0].headers["content-encoding"] == "gzip"
+    assert len(json.loads(gzip.decompress(requests[0].content))["contacts"]) == 100
+
+
+@pytest.mark.parametrize("status,headers,expected", [
+    (503, {"Retry-After": "120"}, ("retry", 120.0)),
+    (429, {}, ("retry", 0.0)),
+    (408, {"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}, ("retry", 0.0)),
+    (500, {}, ("retry", 0.0)),
+    (400, {}, ("dead", 0.0)),
+    (410, {"Retry-After": "60"}, ("dead", 0.0)),
+])
+def test_http_errors(status, headers, expected):
+    outcome, error, retry_after = post(make_batch(), lambda request: httpx.Response(status, headers=headers, text="nope"))
+    assert (outcome, retry_after) == expected
+    assert error == f"{status}: nope"
+
+
+def test_network_errors_are_retried():
+    def handler(request):
+        raise httpx.ConnectError("connection refused", request=request)
+
+    outcome, error, _ = post(make_batch(), handler)
+    assert outcome == "retry"
+    assert error.startswith("ConnectError")
+
+
+def test_retry_delay(monkeypatch):
+    monkeypatch.setattr(webhook_dispatcher.random, "random", lambda: 0.5)
+    assert retry_delay(1) == WEBHOOK_BACKOFF_BASE
+    assert retry_delay(3) == WEBHOOK_BACKOFF_BASE * 4
+    assert retry_delay(50) == WEBHOOK_BACKOFF_MAX
+    assert retry_delay(1, retry_after=600) == 600
+
+    monkeypatch.setattr(webhook_dispatcher.random, "random", lambda: 0.0)
+    assert retry_delay(1) == WEBHOOK_BACKOFF_BASE / 2
+
+
+# ----- Outbox transitions ----- #
+
+def _outbox_test(url, monkeypatch):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    engine = create_engine(url.replace("+asyncpg", ""))
+    conn = engine.connect()
+    trans = conn.begin()
+    monkeypatch.setattr(webhook_dispatcher, "SessionLocal", sessionmaker(
+        bind=conn, join_transaction_mode="create_savepoint"
+    ))
+    monkeypatch.setattr(webhook_dispatcher, "WEBHOOK_MAX_ATTEMPTS", 2)
+    user_id = f"webhook-test-{uuid.uuid4().hex}"
+
+    def enqueue(destination, envelope, payloads, gzip=False, age=60):
+        return conn.execute(text("""
+            INSERT INTO webhook_outbox (user_id, destination, event, batch_mode, envelope, envelope_hash, payload, gzip, created_at)
+            SELECT :user_id, :destination, 'contacts.exported', true, e.envelope, md5(e.envelope::text), p.payload, :gzip,
+                   NOW() - make_interval(secs => :age)
+            FROM CAST(:envelope AS jsonb) AS e(envelope),
+                 jsonb_array_elements(CAST(:payloads AS jsonb)) WITH ORDINALITY AS p(payload, n)
+            ORDER BY p.n
+            RETURNING id
+        """), {
+            "user_id": user_id, "destination": destination, "gzip": gzip, "age": age,
+            "envelope": json.dumps(envelope), "payloads": json.dumps(payloads),
+        }).scalars().all()
+
+    def rows(ids):
+        return conn.execute(text("""
+            SELECT status, attempts, locked_at IS NOT NULL, last_error, next_attempt_at > NOW(), delivered_at IS NOT NULL
+            FROM webhook_outbox WHERE id = ANY(:ids) ORDER BY id
+        """), {"ids": list(ids)}).fetchall()
+
+    def claim():
+        return {
+            (batch.destination, batch.envelope.get("list")): batch
+            for batch in claim_batches(1000) if batch.user_id == user_id
+        }
+
+    return engine, conn, trans, enqueue, rows, claim
+
+
+def test_outbox_transitions_postgres(monkeypatch):
+    url = os.environ.get("EXPORT_TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("EXPORT_TEST_DATABASE_URL not set")
+    pytest.importorskip("psycopg2")
+
+    engine, conn, trans, enqueue, rows, claim = _outbox_test(url, monkeypatch)
+    try:
+        a_ids = enqueue(DESTINATION, {"list": "a"}, [{"n": 1}, {"n": 2}, {"n": 3}], gzip=True)
+        # Same destination, different envelope: a separate batch
+        b_ids = enqueue(DESTINATION, {"list": "b"}, [{"n": 4}], gzip=True)
+        # Mixed gzip flags in one group: sent uncompressed
+        c_ids = enqueue("https://hooks.example.com/catch/2", {"list": "c"}, [{"n": 5}], gzip=True)
+        c_ids += enqueue("https://hooks.example.com/catch/2", {"list": "c"}, [{"n": 6}], gzip=False)
+        # Too new and too small to be due yet
+        fresh_ids = enqueue(DESTINATION, {"list": "fresh"}, [{"n": 7}], age=0)
+
+        claimed = claim()
+        assert set(claimed) == {(DESTINATION, "a"), (DESTINATION, "b"), ("https://hooks.example.com/catch/2", "c")}
+        a, b, c = claimed[(DESTINATION, "a")], claimed[(DESTINATION, "b")], claimed[("https://hooks.example.com/catch/2", "c")]
+        assert (a.ids, a.items, a.attempts, a.gzip) == (a_ids, [{"n": 1}, {"n": 2}, {"n": 3}], 1, True)
+        assert (c.ids, c.gzip) == (c_ids, False)
+        assert rows(a_ids) == [("sending", 1, True, None, False, False)] * 3
+        assert rows(fresh_ids) == [("pending", 0, False, None, False, False)]
+
+        # Claimed rows aren't handed to another dispatcher
+        assert claim() == {}
+
+        record_outcome(b, "delivered")
+        assert rows(b_ids) == [("delivered", 1, False, None, False, True)]
+
+        record_outcome(c, "dead", "400: bad request")
+        assert rows(c_ids) == [("dead", 1, False, "400: bad request", False, False)] * 2
+
+        # A retry puts the whole batch back with one backoff, so it isn't due yet
+        record_outcome(a, "retry", "503: busy")
+        assert rows(a_ids) == [("pending", 1, False, "503: busy", True, False)] * 3
+        assert claim() == {}
+
+        conn.execute(text("UPDATE webhook_outbox SET next_attempt_at = NOW() WHERE id = ANY(:ids)"), {"ids": a_ids})
+        a = claim()[(DESTINATION, "a")]
+        assert (a.ids, a.attempts) == (a_ids, 2)
+
+        # Out of attempts (WEBHOOK_MAX_ATTEMPTS is 2 here): dead with the last error
+        record_outcome(a, "retry", "ConnectError: refused")
+        assert rows(a_ids) == [("dead", 2, False, "ConnectError: refused", True, False)] * 3
+        assert claim() == {}
+
+        # A dispatcher that died mid-send: its rows are requeued; old delivered rows are purged
+        conn.execute(text("""
+            UPDATE webhook_outbox SET status = 'sending', locked_at = NOW() - INTERVAL '1 hour' WHERE id = ANY(:ids)
+        """), {"ids": fresh_ids})
+        conn.execute(text("""
+            UPDATE webhook_outbox SET delivered_at = NOW() - INTERVAL '30 days' WHERE id = ANY(:ids)
+        """), {"ids": b_ids})
+        maintain_outbox()
+        assert rows(fresh_ids) == [("pending", 0, False, None, False, False)]
+        assert rows(b_ids) == []
+    finally:
+        trans.rollback()
+        conn.close()
+        engine.dispose()
+
+
+def test_deliver_records_outcome_postgres(monkeypatch):
+    url = os.environ.get("EXPORT_TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("EXPORT_TEST_DATABASE_URL not set")
+    pytest.importorskip("psycopg2")
+
+    engine, conn, trans, enqueue, rows, claim = _outbox_test(url, monkeypatch)
+    try:
+        ok_ids = enqueue(DESTINATION, {"list": "ok"}, [{"n": 1}, {"n": 2}])
+        busy_ids = enqueue("https://hooks.example.com/busy", {"list": "busy"}, [{"n": 3}])
+        received = []
+
+        def handler(request):
+            if request.url.path == "/busy":
+                return httpx.Response(503, headers={"Retry-After": "3600"}, text="busy")
+            received.append(json.loads(request.content))
+            return httpx.Response(200)
+
+        async def run(batches):
+            dispatcher = WebhookDispatcher()
+            await dispatcher.client.aclose()
+            dispatcher.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            try:
+                for batch in batches:
+                    await dispatcher.deliver(batch)
+            finally:
+                await dispatcher.client.aclose()
+
+        asyncio.run(run(claim().values()))
+
+        assert [body["contacts"] for body in received] == [[{"n": 1}, {"n": 2}]]
+        assert rows(ok_ids) == [("delivered", 1, False, None, False, True)] * 2
+        assert rows(busy_ids) == [("pending", 1, False, "503: busy", True, False)]
+        # Retry-After is honoured
+        assert conn.execute(text("""
+            SELECT next_attempt_at >= NOW() + INTERVAL '3599 seconds' FROM webhook_outbox WHERE id = ANY(:ids)
+        """), {"ids": busy_ids}).scalar()
+    finally:
+        trans.rollback()
+        conn.close()
+        engine.dispose()
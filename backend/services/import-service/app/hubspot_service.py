@@ -6,7 +6,7 @@ Handles OAuth authentication, token management, and contact synchronization
 import asyncio
 import json
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Optional, Any
 from urllib.parse import urlencode
 
@@ -15,9 +15,18 @@ from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from common.config import get_settings
+from common.hubspot import HubSpotBulkSync
+from common.crm_sync import get_sync_state, save_sync_state, write_contacts, commit_page, prefetch_pages
 
 settings = get_settings()
 
+HUBSPOT_PAGE_SIZE = 100            # Max for both the list and search APIs
+HUBSPOT_SEARCH_LIMIT = 10000       # Search API stops paging after this many results
+HUBSPOT_IMPORT_PROPERTIES = [
+    "firstname", "lastname", "email", "phone", "company", "jobtitle",
+    "city", "state", "country", "website", "industry", "lastmodifieddate"
+]
+
 class HubSpotService:
     def __init__(self):
         self.client_id = "0f881091-86be-4d35-bb38-f98365bd62ec"
@@ -83,9 +92,8 @@ class HubSpotService:
             response.raise_for_status()
             return response.json()
     
-    async def make_api_request(self, session: AsyncSession, user_id: str, method: str, endpoint: str, **kwargs) -> Dict[str, Any]:
-        """Make authenticated API request to HubSpot"""
-        # Get valid access token from database
+    async def get_access_token(self, session: AsyncSession, user_id: str) -> str:
+        """Valid access token for the user's integration, refreshed if about to expire"""
         query = text("""
             SELECT access_token, refresh_token, expires_at 
             FROM hubspot_integrations 
@@ -128,6 +136,11 @@ class HubSpotService:
                 logging.error(f"Failed to refresh HubSpot token for user {user_id}: {e}")
                 raise Exception("Failed to refresh HubSpot access token")
         
+        return access_token
+    
+    async def make_api_request(self, session: AsyncSession, user_id: str, method: str, endpoint: str, **kwargs) -> Dict[str, Any]:
+        """Make authenticated API request to HubSpot"""
+        access_token = await self.get_access_token(session, user_id)
         headers = {
             "Authorization": f"Bearer {access_token}",
             "Content-Type": "application/json"
@@ -199,11 +212,48 @@ class HubSpotService:
         
         return captely_contact
     
+    async def _fetch_contacts_page(self, client: httpx.AsyncClient, access_token: str, since: Optional[datetime], after: Optional[str]):
+        """One page of contacts: all of them (list API) or those modified since ``since`` (search API, oldest first)"""
+        headers = {"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"}
+        for attempt in range(4):
+            if since is None:
+                params = {"limit": HUBSPOT_PAGE_SIZE, "properties": ",".join(HUBSPOT_IMPORT_PROPERTIES)}
+                if after:
+                    params["after"] = after
+                response = await client.get(f"{self.base_url}/crm/v3/objects/contacts", headers=headers, params=params)
+            else:
+                body = {
+                    "filterGroups": [{"filters": [{
+                        "propertyName": "lastmodifieddate",
+                        "operator": "GTE",
+                        "value": str(int(since.timestamp() * 1000))
+                    }]}],
+                    "sorts": [{"propertyName": "lastmodifieddate", "direction": "ASCENDING"}],
+                    "properties": HUBSPOT_IMPORT_PROPERTIES,
+                    "limit": HUBSPOT_PAGE_SIZE
+                }
+                if after:
+                    body["after"] = after
+                response = await client.post(f"{self.base_url}/crm/v3/objects/contacts/search", headers=headers, json=body)
+            if response.status_code == 429 and attempt < 3:
+                retry_after = response.headers.get("Retry-After", "")
+                await asyncio.sleep(float(retry_after) if retry_after.isdigit() else 2 ** attempt)
+                continue
+            response.raise_for_status()
+            data = response.json()
+            return data.get("results", []), data.get("paging", {}).get("next", {}).get("after")
+    
     async def import_contacts_from_hubspot(self, session: AsyncSession, user_id: str, job_id: str) -> Dict[str, Any]:
-        """Import contacts from HubSpot to Captely"""
+        """
+        Import contacts from HubSpot to Captely.
+        
+        The first import pages through every contact, saving the ``after``
+        cursor per page so an interrupted import resumes where it stopped.
+        Later imports only fetch contacts modified since the last one; contacts
+        imported before are updated in place instead of being added again.
+        """
         total_imported = 0
-        total_failed = 0
-        after = None
+        total_updated = 0
         
         # Create sync log
         log_query = text("""
@@ -218,89 +268,75 @@ class HubSpotService:
         await session.commit()
         
         try:
-            while True:
-                # Get batch of contacts from HubSpot
-                response = await self.make_api_request(
-                    session, user_id, "GET", "/crm/v3/objects/contacts",
-                    params={"limit": 100, "properties": ["firstname", "lastname", "email", "phone", "company", "jobtitle", "city", "state", "country", "website"]}
-                )
-                contacts = response.get("results", [])
-                
-                if not contacts:
-                    break
-                
-                # Import each contact
-                for hubspot_contact in contacts:
-                    try:
-                        captely_contact = self.map_hubspot_to_captely(hubspot_contact)
-                        
-                        # Insert into contacts table
-                        insert_query = text("""
-                            INSERT INTO contacts (
-                                job_id, first_name, last_name, email, phone, company, 
-                                position, location, industry, profile_url, enriched, 
-                                enrichment_status, created_at
-                            ) VALUES (
-                                :job_id, :first_name, :last_name, :email, :phone, :company,
-                                :position, :location, :industry, :profile_url, :enriched,
-                                :enrichment_status, NOW()
-                            ) RETURNING id
-                        """)
-                        
-                        contact_result = await session.execute(insert_query, {
-                            "job_id": job_id,
-                            **captely_contact
-                        })
-                        captely_contact_id = contact_result.scalar()
-                        
-                        # Create mapping
-                        mapping_query = text("""
-                            INSERT INTO hubspot_contact_mappings (
-                                user_id, captely_contact_id, hubspot_contact_id, 
-                                sync_status, created_at
-                            ) VALUES (:user_id, :captely_contact_id, :hubspot_contact_id, 'synced', NOW())
-                        """)
-                        
-                        await session.execute(mapping_query, {
-                            "user_id": user_id,
-                            "captely_contact_id": captely_contact_id,
-                            "hubspot_contact_id": hubspot_contact["id"]
-                        })
+            access_token = await self.get_access_token(session, user_id)
+            cursor, watermark = await get_sync_state(session, user_id, "hubspot")
+            # Full import (new or resumed) until a watermark exists with no pending cursor
+            incremental = watermark is not None and cursor is None
+            if watermark is None:
+                watermark = datetime.now(timezone.utc)
+            
+            async with httpx.AsyncClient(timeout=60.0) as client:
+                since = watermark if incremental else None
+                while True:
+                    truncated = False
+                    
+                    async def fetch(after):
+                        nonlocal truncated
+                        records, next_after = await self._fetch_contacts_page(client, access_token, since, after)
+                        # Search results stop at 10k; continue from the watermark reached instead
+                        if since is not None and next_after and int(next_after) >= HUBSPOT_SEARCH_LIMIT:
+                            truncated = True
+                            next_after = None
+                        return records, next_after
+                    
+                    async for contacts, next_after in prefetch_pages(fetch, None if incremental else cursor):
+                        page_watermark = watermark
+                        records = []
+                        for hubspot_contact in contacts:
+                            records.append((hubspot_contact["id"], self.map_hubspot_to_captely(hubspot_contact)))
+                            modified = hubspot_contact.get("properties", {}).get("lastmodifieddate")
+                            if incremental and modified:
+                                page_watermark = max(page_watermark, datetime.fromisoformat(modified.replace("Z", "+00:00")))
                         
-                        total_imported += 1
+                        inserted, updated = await write_contacts(session, user_id, job_id, "hubspot", records)
+                        total_imported += inserted
+                        total_updated += updated
                         
-                    except Exception as e:
-                        logging.error(f"Failed to import contact {hubspot_contact.get('id')}: {e}")
-                        total_failed += 1
-                
-                # Check for next page
-                paging = response.get("paging", {})
-                after = paging.get("next", {}).get("after")
-                if not after:
-                    break
+                        if incremental:
+                            watermark = page_watermark
+                            await save_sync_state(session, user_id, "hubspot", None, watermark)
+                        else:
+                            await save_sync_state(session, user_id, "hubspot", next_after, watermark)
+                        await commit_page(session, user_id)
+                    
+                    if not (truncated and watermark > since):
+                        break
+                    since = watermark
             
             # Update sync log
             update_log_query = text("""
                 UPDATE hubspot_sync_logs 
                 SET status = 'completed', processed_records = :imported, 
-                    failed_records = :failed, completed_at = NOW()
+                    failed_records = 0, completed_at = NOW()
                 WHERE id = :sync_log_id
             """)
             await session.execute(update_log_query, {
                 "sync_log_id": sync_log_id,
-                "imported": total_imported,
-                "failed": total_failed
+                "imported": total_imported + total_updated
             })
             await session.commit()
             
             return {
                 "success": True,
+                "incremental": incremental,
                 "imported": total_imported,
-                "failed": total_failed,
+                "updated": total_updated,
+                "failed": 0,
                 "sync_log_id": sync_log_id
             }
             
         except Exception as e:
+            await session.rollback()
             # Update sync log with error
             error_log_query = text("""
                 UPDATE hubspot_sync_logs 
@@ -314,6 +350,33 @@ class HubSpotService:
             await session.commit()
             raise
     
+    async def save_contact_mappings(self, session: AsyncSession, user_id: str, mappings: Dict[str, int]):
+        """Upsert HubSpot contact id -> Captely contact id mappings (not committed)"""
+        params = {
+            "user_id": user_id,
+            "captely_ids": list(mappings.values()),
+            "hubspot_ids": list(mappings.keys())
+        }
+        # Drop mappings that now point the HubSpot contact at another Captely contact
+        await session.execute(text("""
+            DELETE FROM hubspot_contact_mappings hm
+            USING unnest(CAST(:captely_ids AS integer[]), CAST(:hubspot_ids AS varchar[])) AS m(captely_contact_id, hubspot_contact_id)
+            WHERE hm.user_id = CAST(:user_id AS uuid)
+              AND hm.hubspot_contact_id = m.hubspot_contact_id
+              AND hm.captely_contact_id IS DISTINCT FROM m.captely_contact_id
+        """), params)
+        await session.execute(text("""
+            INSERT INTO hubspot_contact_mappings (
+                user_id, captely_contact_id, hubspot_contact_id, sync_status, created_at
+            )
+            SELECT CAST(:user_id AS uuid), m.captely_contact_id, m.hubspot_contact_id, 'synced', NOW()
+            FROM unnest(CAST(:captely_ids AS integer[]), CAST(:hubspot_ids AS varchar[])) AS m(captely_contact_id, hubspot_contact_id)
+            ON CONFLICT (user_id, captely_contact_id) DO UPDATE SET
+                hubspot_contact_id = EXCLUDED.hubspot_contact_id,
+                sync_status = 'synced',
+                last_synced_at = NOW()
+        """), params)
+    
     async def export_contacts_to_hubspot(self, session: AsyncSession, user_id: str, contact_ids: List[int]) -> Dict[str, Any]:
         """Export Captely contacts to HubSpot"""
         total_exported = 0
@@ -346,68 +409,43 @@ class HubSpotService:
             contacts_result = await session.execute(contacts_query, {"contact_ids": contact_ids})
             contacts = contacts_result.fetchall()
             
-            # Process in batches of 100 (HubSpot limit)
-            batch_size = 100
-            for i in range(0, len(contacts), batch_size):
-                batch = contacts[i:i + batch_size]
-                hubspot_contacts = []
-                
-                for contact in batch:
-                    contact_dict = {
-                        "id": contact[0],
-                        "first_name": contact[1],
-                        "last_name": contact[2],
-                        "email": contact[3],
-                        "phone": contact[4],
-                        "company": contact[5],
-                        "position": contact[6],
-                        "location": contact[7],
-                        "industry": contact[8],
-                        "enriched": contact[9],
-                        "enrichment_score": contact[10],
-                        "email_verified": contact[11],
-                        "phone_verified": contact[12]
-                    }
-                    
-                    hubspot_contact = self.map_captely_to_hubspot(contact_dict)
-                    hubspot_contacts.append(hubspot_contact)
-                
-                try:
-                    # Batch create in HubSpot
-                    result = await self.make_api_request(
-                        session, user_id, "POST", "/crm/v3/objects/contacts/batch/create",
-                        json={"inputs": hubspot_contacts}
-                    )
-                    
-                    # Process results and create mappings
-                    for j, hubspot_result in enumerate(result.get("results", [])):
-                        contact = batch[j]
-                        captely_contact_id = contact[0]
-                        hubspot_contact_id = hubspot_result["id"]
-                        
-                        # Create mapping
-                        mapping_query = text("""
-                            INSERT INTO hubspot_contact_mappings (
-                                user_id, captely_contact_id, hubspot_contact_id, 
-                                sync_status, created_at
-                            ) VALUES (:user_id, :captely_contact_id, :hubspot_contact_id, 'synced', NOW())
-                            ON CONFLICT (user_id, captely_contact_id) DO UPDATE SET
-                                hubspot_contact_id = :hubspot_contact_id,
-                                sync_status = 'synced',
-                                last_synced_at = NOW()
-                        """)
-                        
-                        await session.execute(mapping_query, {
-                            "user_id": user_id,
-                            "captely_contact_id": captely_contact_id,
-                            "hubspot_contact_id": hubspot_contact_id
-                        })
-                        
-                        total_exported += 1
-                        
-                except Exception as e:
-                    logging.error(f"Failed to export batch: {e}")
-                    total_failed += len(batch)
+            hubspot_contacts = []
+            for contact in contacts:
+                contact_dict = {
+                    "id": contact[0],
+                    "first_name": contact[1],
+                    "last_name": contact[2],
+                    "email": contact[3],
+                    "phone": contact[4],
+                    "company": contact[5],
+                    "position": contact[6],
+                    "location": contact[7],
+                    "industry": contact[8],
+                    "enriched": contact[9],
+                    "enrichment_score": contact[10],
+                    "email_verified": contact[11],
+                    "phone_verified": contact[12]
+                }
+                hubspot_contacts.append(self.map_captely_to_hubspot(contact_dict))
+            
+            # Upsert by email through the batch API (read, then create / update)
+            access_token = await self.get_access_token(session, user_id)
+            sync = await HubSpotBulkSync(access_token, base_url=self.base_url).upsert(hubspot_contacts)
+            total_exported = sync.created + sync.updated
+            total_failed = sync.failed
+            
+            # Every exported contact gets its HubSpot id; the mapping table holds one
+            # row per HubSpot contact, so contacts sharing an email map to the first
+            hubspot_ids = {}
+            mappings = {}
+            for contact in contacts:
+                hubspot_contact_id = sync.ids.get((contact[3] or "").strip().lower())
+                if hubspot_contact_id:
+                    hubspot_ids[str(contact[0])] = hubspot_contact_id
+                    mappings.setdefault(hubspot_contact_id, contact[0])
+            
+            if mappings:
+                await self.save_contact_mappings(session, user_id, mappings)
             
             # Update sync log
             update_log_query = text("""
@@ -426,7 +464,11 @@ class HubSpotService:
             return {
                 "success": True,
                 "exported": total_exported,
+                "created": sync.created,
+                "updated": sync.updated,
                 "failed": total_failed,
+                "errors": sync.errors[:50],
+                "hubspot_ids": hubspot_ids,
                 "sync_log_id": sync_log_id
             }
             
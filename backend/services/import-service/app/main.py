@@ -6,7 +6,8 @@ from fastapi import (
     Depends, HTTPException, status,
     Form, Query, Response, Header
 )
-from fastapi.responses import JSONResponse, HTMLResponse, RedirectResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, HTMLResponse, RedirectResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
@@ -15,7 +16,9 @@ from jose import jwt, JWTError
 from pydantic import BaseModel
 from sqlalchemy import insert, select, text
 import pandas as pd
-import uuid, io, boto3, httpx, csv
+import uuid, io, httpx, csv, json
+import anyio
+import asyncio
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 import os
@@ -24,9 +27,21 @@ import time
 from datetime import datetime, timedelta
 
 from common.config import get_settings
-from common.db import get_session, async_engine
+from common.db import get_session, get_async_session, get_async_session_context, SessionLocal, async_engine, pool_metrics
 from common.celery_app import celery_app
-from common.auth import verify_api_token
+from common.auth import verify_api_token, resolve_token
+from common.pagination import (
+    KEYSET_CONDITION, KEYSET_ORDER, count_cache, decode_cursor, next_cursor
+)
+from common.search import contact_search
+from common.progress import JobProgressHub
+from common.storage import get_s3_client
+from common.events import publish_user_data_changed
+from common.response_cache import ResponseCache, cached_response
+from common.exports import (
+    STREAM_ENCODERS, XLSX_MEDIA_TYPE, open_stream_sync, encode_stream_sync,
+    spool_xlsx_sync, iter_file, prefers_ndjson
+)
 from .models import ImportJob, Contact, Base
 from .hubspot_service import HubSpotService
 from .lemlist_service import LemlistService
@@ -92,21 +107,24 @@ templates = Jinja2Templates(directory="templates")
 # HTTP-Bearer for JWT
 security = HTTPBearer()
 
+# Per-user response cache, invalidated when the user's contacts or credits change
+response_cache = ResponseCache(settings.redis_url)
+
+# Endpoints that use the sync Session are plain ``def`` so FastAPI runs them in
+# AnyIO's worker threads instead of blocking the event loop. Keep that pool no
+# larger than the sync DB pool (common.db: pool_size + max_overflow) so threads
+# never sit waiting for a connection.
+THREADPOOL_SIZE = int(os.environ.get("IMPORT_THREADPOOL_SIZE", "20"))
+
+@app.on_event("startup")
+async def configure_threadpool():
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+
 # Startup event removed to fix async engine issues
 # Tables will be created by the enrichment worker or manually
 
 # prepare S3 client if AWS credentials are available
-s3 = None
-try:
-    if hasattr(settings, 'aws_access_key_id') and settings.aws_access_key_id:
-        s3 = boto3.client(
-            "s3",
-            aws_access_key_id=settings.aws_access_key_id,
-            aws_secret_access_key=settings.aws_secret_access_key,
-            region_name=settings.aws_default_region,
-        )
-except Exception as e:
-    print(f"Warning: AWS S3 client initialization failed: {e}")
+s3 = get_s3_client()
 
 # ─── Web UI ─────────────────────────────────────────────────────────────────────
 
@@ -157,7 +175,7 @@ async def dashboard(
     "/api/imports/file",
     status_code=status.HTTP_201_CREATED,
 )
-async def import_file(
+def import_file(
     file: UploadFile = File(...),
     enrich_email: str = Form("true"),
     enrich_phone: str = Form("true"), 
@@ -185,7 +203,7 @@ async def import_file(
         
         print(f"🎯 Enrichment type requested: {enrichment_type_str}")
         
-        data = await file.read()
+        data = file.file.read()
         if file.filename.lower().endswith(".csv"):
             df = pd.read_csv(io.BytesIO(data))
         else:
@@ -244,7 +262,7 @@ async def import_file(
             )
 
         # Upload to S3 if available - use custom filename in the S3 key
-        if s3 and hasattr(settings, 's3_bucket_raw'):
+        if s3 and settings.s3_bucket_raw:
             try:
                 # Use custom filename in S3 key but preserve original file extension
                 file_extension = os.path.splitext(file.filename)[1]  # Get .csv or .xlsx
@@ -299,7 +317,7 @@ class ManualContactsBatch(BaseModel):
     "/api/imports/manual",
     status_code=status.HTTP_201_CREATED,
 )
-async def import_manual_contacts(
+def import_manual_contacts(
     batch: ManualContactsBatch,
     user_id: str = Depends(verify_api_token),
     session: Session = Depends(get_session),
@@ -410,7 +428,7 @@ class LeadsBatch(BaseModel):
     "/api/imports/leads",
     status_code=status.HTTP_201_CREATED,
 )
-async def import_leads(
+def import_leads(
     batch: LeadsBatch,
     user_id: str = Depends(verify_api_token),
     session: Session = Depends(get_session),
@@ -470,7 +488,7 @@ class LeadIn(BaseModel):
     "/api/scraper/leads",
     status_code=status.HTTP_201_CREATED,
 )
-async def scraper_leads(
+def scraper_leads(
     leads: list[LeadIn],
     user_id: str = Depends(verify_api_token),
     session: Session = Depends(get_session),
@@ -520,7 +538,7 @@ async def scraper_leads(
 @app.get(
     "/api/jobs",
 )
-async def get_user_jobs(
+def get_user_jobs(
     user_id: str = Depends(verify_api_token),
     session: Session = Depends(get_session)
 ):
@@ -530,15 +548,14 @@ async def get_user_jobs(
         
         jobs_query = text("""
             SELECT ij.*, 
-                   COUNT(c.id) as total_processed,
-                   COUNT(CASE WHEN c.enriched = true THEN 1 END) as enriched_count,
-                   COUNT(CASE WHEN c.email IS NOT NULL AND c.email != '' THEN 1 END) as emails_found,
-                   COUNT(CASE WHEN c.phone IS NOT NULL AND c.phone != '' THEN 1 END) as phones_found,
-                   SUM(c.credits_consumed) as total_credits_used
+                   js.total_processed,
+                   js.enriched_count,
+                   js.emails_found,
+                   js.phones_found,
+                   js.credits_used as total_credits_used
             FROM import_jobs ij
-            LEFT JOIN contacts c ON ij.id = c.job_id
+            LEFT JOIN job_stats js ON js.job_id = ij.id
             WHERE ij.user_id = :user_id
-            GROUP BY ij.id, ij.user_id, ij.total, ij.completed, ij.status, ij.file_name, ij.created_at, ij.updated_at
             ORDER BY ij.created_at DESC
         """)
         
@@ -590,84 +607,189 @@ async def get_user_jobs(
         print(f"❌ Error fetching user jobs: {e}")
         return {"jobs": []}
 
+JOB_STATUS_QUERY = text("""
+    SELECT ij.id, ij.user_id, ij.status, ij.file_name, ij.total, ij.created_at, ij.updated_at,
+           js.total_processed,
+           js.enriched_count,
+           js.emails_found,
+           js.phones_found,
+           js.credits_used,
+           js.score_sum,
+           js.score_count,
+           js.version
+    FROM import_jobs ij
+    LEFT JOIN job_stats js ON js.job_id = ij.id
+    WHERE ij.id = :job_id
+""")
+
+def load_job_status(session: Session, job_id: str):
+    """Job row and its job_stats counters, or (None, None) if the job doesn't exist"""
+    job_data = session.execute(JOB_STATUS_QUERY, {"job_id": job_id}).first()
+    if not job_data:
+        return None, None
+    job = dict(job_data._mapping)
+    stats = {key: job.pop(key) or 0 for key in (
+        "total_processed", "enriched_count", "emails_found", "phones_found",
+        "credits_used", "score_sum", "score_count", "version"
+    )}
+    return job, stats
+
+def complete_job_if_done(session: Session, job: dict, stats: dict) -> dict:
+    """🔥 AUTO-FIX: Update job status to "completed" if progress is 100% and status is still "processing" """
+    if job["status"] == 'processing' and job["total"] > 0 and stats["total_processed"] >= job["total"]:
+        print(f"🔄 Auto-updating job {job['id']} status from 'processing' to 'completed'")
+        update_status_query = text("""
+            UPDATE import_jobs 
+            SET status = 'completed', updated_at = CURRENT_TIMESTAMP 
+            WHERE id = :job_id
+        """)
+        session.execute(update_status_query, {"job_id": job["id"]})
+        session.commit()
+        job["status"] = 'completed'
+    return job
+
+def job_status_payload(job: dict, stats: dict) -> dict:
+    """Response body of /api/jobs/{job_id} (also sent by the progress stream)"""
+    total_processed = stats["total_processed"]
+    enriched_count = stats["enriched_count"]
+    emails_found = stats["emails_found"]
+    phones_found = stats["phones_found"]
+    
+    progress = (total_processed / job["total"] * 100) if job["total"] > 0 else 0
+    success_rate = (enriched_count / total_processed * 100) if total_processed > 0 else 0
+    email_hit_rate = (emails_found / total_processed * 100) if total_processed > 0 else 0
+    phone_hit_rate = (phones_found / total_processed * 100) if total_processed > 0 else 0
+    avg_confidence = (stats["score_sum"] / stats["score_count"]) if stats["score_count"] > 0 else 0
+    
+    return {
+        "id": job["id"],
+        "user_id": job["user_id"],
+        "status": job["status"],
+        "file_name": job["file_name"],
+        "total": job["total"],
+        "completed": total_processed,
+        "progress": round(progress, 1),
+        "success_rate": round(success_rate, 1),
+        "email_hit_rate": round(email_hit_rate, 1),
+        "phone_hit_rate": round(phone_hit_rate, 1),
+        "emails_found": emails_found,
+        "phones_found": phones_found,
+        "credits_used": stats["credits_used"],
+        "avg_confidence": round(float(avg_confidence), 2),
+        "created_at": job["created_at"].isoformat() if job["created_at"] else None,
+        "updated_at": job["updated_at"].isoformat() if job["updated_at"] else None
+    }
+
 @app.get("/api/jobs/{job_id}")
-async def get_job_status(
+def get_job_status(
     job_id: str,
     session: Session = Depends(get_session)
 ):
     """Get detailed status of an import job"""
     try:
-        # Get job details
-        job_query = text("""
-            SELECT ij.*, 
-                   COUNT(c.id) as total_processed,
-                   COUNT(CASE WHEN c.enriched = true THEN 1 END) as enriched_count,
-                   COUNT(CASE WHEN c.email IS NOT NULL AND c.email != '' THEN 1 END) as emails_found,
-                   COUNT(CASE WHEN c.phone IS NOT NULL AND c.phone != '' THEN 1 END) as phones_found,
-                   SUM(c.credits_consumed) as total_credits_used,
-                   AVG(c.enrichment_score) as avg_confidence
-            FROM import_jobs ij
-            LEFT JOIN contacts c ON ij.id = c.job_id
-            WHERE ij.id = :job_id
-            GROUP BY ij.id
-        """)
-        
-        result = session.execute(job_query, {"job_id": job_id})
-        job_data = result.first()
+        job, stats = load_job_status(session, job_id)
         
-        if not job_data:
+        if not job:
             raise HTTPException(status_code=404, detail="Job not found")
         
-        # Calculate progress and success rate
-        total_processed = job_data.total_processed or 0
-        enriched_count = job_data.enriched_count or 0
-        emails_found = job_data.emails_found or 0
-        phones_found = job_data.phones_found or 0
-        total_credits_used = job_data.total_credits_used or 0
-        
-        progress = (total_processed / job_data.total * 100) if job_data.total > 0 else 0
-        success_rate = (enriched_count / total_processed * 100) if total_processed > 0 else 0
-        email_hit_rate = (emails_found / total_processed * 100) if total_processed > 0 else 0
-        phone_hit_rate = (phones_found / total_processed * 100) if total_processed > 0 else 0
-        
-        # 🔥 AUTO-FIX: Update job status to "completed" if progress is 100% and status is still "processing"
-        current_status = job_data.status
-        if progress >= 100 and current_status == 'processing':
-            print(f"🔄 Auto-updating job {job_id} status from 'processing' to 'completed' (progress: {progress}%)")
-            update_status_query = text("""
-                UPDATE import_jobs 
-                SET status = 'completed', updated_at = CURRENT_TIMESTAMP 
-                WHERE id = :job_id
-            """)
-            session.execute(update_status_query, {"job_id": job_id})
-            session.commit()
-            current_status = 'completed'
-        
-        return {
-            "id": job_data.id,
-            "user_id": job_data.user_id,
-            "status": current_status,  # Use corrected status instead of job_data.status
-            "file_name": job_data.file_name,
-            "total": job_data.total,
-            "completed": total_processed,
-            "progress": round(progress, 1),
-            "success_rate": round(success_rate, 1),
-            "email_hit_rate": round(email_hit_rate, 1),
-            "phone_hit_rate": round(phone_hit_rate, 1),
-            "emails_found": emails_found,
-            "phones_found": phones_found,
-            "credits_used": total_credits_used,
-            "avg_confidence": round(float(job_data.avg_confidence or 0), 2),
-            "created_at": job_data.created_at.isoformat() if job_data.created_at else None,
-            "updated_at": job_data.updated_at.isoformat() if job_data.updated_at else None
-        }
+        complete_job_if_done(session, job, stats)
+        return job_status_payload(job, stats)
         
     except Exception as e:
         print(f"Error fetching job status: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Progress stream: one Redis subscription per process, shared by all clients
+progress_hub = JobProgressHub(settings.redis_url)
+PROGRESS_HEARTBEAT = 15  # Seconds between keep-alive comments
+
+def read_job_snapshot(job_id: str):
+    session = SessionLocal()
+    try:
+        job, stats = load_job_status(session, job_id)
+        if job:
+            complete_job_if_done(session, job, stats)
+        return job, stats
+    finally:
+        session.close()
+
+def apply_progress_delta(stats: dict, delta: dict):
+    """Add a worker delta (common.progress.contact_progress_delta) to job_stats counters"""
+    stats["total_processed"] += delta.get("processed", 0)
+    stats["enriched_count"] += delta.get("enriched", 0)
+    stats["emails_found"] += delta.get("emails", 0)
+    stats["phones_found"] += delta.get("phones", 0)
+    stats["credits_used"] += delta.get("credits", 0)
+    if delta.get("score") is not None:
+        stats["score_sum"] += delta["score"]
+        stats["score_count"] += 1
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@app.get("/api/jobs/{job_id}/events")
+async def stream_job_progress(
+    job_id: str,
+    request: Request,
+    token: Optional[str] = Query(None, description="JWT or API key, for clients that can't send headers (EventSource)")
+):
+    """
+    Server-sent events for a running job: a "progress" event with the
+    /api/jobs/{job_id} payload on connect and after every saved contact,
+    then "done" once the job leaves the processing state.
+    """
+    authorization = request.headers.get("Authorization", "")
+    if not token and authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+    user_id = await resolve_token(token) if token else None
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Invalid API token")
+    if not progress_hub.available:
+        raise HTTPException(status_code=503, detail="Progress stream unavailable")
+    
+    job, _ = await anyio.to_thread.run_sync(read_job_snapshot, job_id)
+    if not job or str(job["user_id"]) != str(user_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def events():
+        async with progress_hub.subscribe(job_id) as queue:
+            # Snapshot after subscribing so no delta falls in between; deltas for
+            # writes the snapshot already counts (version <= its version) are skipped
+            job, stats = await anyio.to_thread.run_sync(read_job_snapshot, job_id)
+            yield sse_event("progress", job_status_payload(job, stats))
+            
+            while job["status"] in ('pending', 'processing'):
+                if await request.is_disconnected():
+                    return
+                try:
+                    delta = await asyncio.wait_for(queue.get(), PROGRESS_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                
+                if delta.get("resync"):
+                    job, stats = await anyio.to_thread.run_sync(read_job_snapshot, job_id)
+                elif delta.get("version") is not None and delta["version"] <= stats["version"]:
+                    continue
+                else:
+                    apply_progress_delta(stats, delta)
+                    if job["total"] > 0 and stats["total_processed"] >= job["total"]:
+                        # Authoritative final numbers (and the completion update)
+                        job, stats = await anyio.to_thread.run_sync(read_job_snapshot, job_id)
+                if not job:  # Deleted while streaming
+                    return
+                yield sse_event("progress", job_status_payload(job, stats))
+            
+            yield sse_event("done", job_status_payload(job, stats))
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/api/jobs/{job_id}/contacts")
-async def get_job_contacts(
+def get_job_contacts(
     job_id: str,
     page: int = Query(1, ge=1),
     limit: int = Query(50, ge=1, le=100),
@@ -753,7 +875,7 @@ async def get_job_contacts(
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/user/credits")
-async def get_user_credits(
+def get_user_credits(
     user_id: str = Depends(verify_api_token),
     session: Session = Depends(get_session)
 ):
@@ -783,8 +905,7 @@ async def get_user_credits(
                 COUNT(CASE WHEN email IS NOT NULL AND email != '' THEN 1 END) as emails_found,
                 COUNT(CASE WHEN phone IS NOT NULL AND phone != '' THEN 1 END) as phones_found
             FROM contacts c
-            JOIN import_jobs ij ON c.job_id = ij.id
-            WHERE ij.user_id = :user_id
+            WHERE c.user_id = :user_id
         """)
         
         stats_result = session.execute(stats_query, {"user_id": user_id})
@@ -806,8 +927,7 @@ async def get_user_credits(
         today_query = text("""
             SELECT SUM(credits_consumed) as used_today
             FROM contacts c
-            JOIN import_jobs ij ON c.job_id = ij.id
-            WHERE ij.user_id = :user_id 
+            WHERE c.user_id = :user_id 
             AND DATE(c.created_at) = CURRENT_DATE
         """)
         
@@ -864,7 +984,7 @@ async def get_user_credits(
         }
 
 @app.post("/api/credits/deduct")
-async def deduct_credits(
+def deduct_credits(
     request: dict,
     user_id: str = Depends(verify_api_token),
     session: Session = Depends(get_session)
@@ -878,34 +998,27 @@ async def deduct_credits(
         if credits_to_deduct <= 0:
             raise HTTPException(status_code=400, detail="Credits to deduct must be positive")
         
-        # Check current balance
-        balance_query = text("SELECT credits FROM users WHERE id = :user_id")
-        balance_result = session.execute(balance_query, {"user_id": user_id})
-        balance_data = balance_result.first()
-        
-        if not balance_data:
-            # User doesn't exist - this shouldn't happen as they should be created during auth
-            print(f"❌ User {user_id} not found in database")
-            raise HTTPException(status_code=404, detail="User not found. Please ensure you are properly authenticated.")
-        else:
-            current_balance = balance_data.credits or 0
-        
-        if current_balance < credits_to_deduct:
-            raise HTTPException(status_code=400, detail="Insufficient credits")
-        
-        # Deduct credits
-        new_balance = current_balance - credits_to_deduct
+        # Check and deduct in one statement so concurrent requests can't overdraw the balance
         deduct_query = text("""
             UPDATE users 
-            SET credits = :new_balance, updated_at = CURRENT_TIMESTAMP 
-            WHERE id = :user_id
+            SET credits = COALESCE(credits, 0) - :credits, updated_at = CURRENT_TIMESTAMP 
+            WHERE id = :user_id AND COALESCE(credits, 0) >= :credits
+            RETURNING credits
         """)
-        session.execute(deduct_query, {
-            "new_balance": new_balance,
+        new_balance = session.execute(deduct_query, {
+            "credits": credits_to_deduct,
             "user_id": user_id
-        })
+        }).scalar()
         session.commit()
         
+        if new_balance is None:
+            user_exists = session.execute(text("SELECT 1 FROM users WHERE id = :user_id"), {"user_id": user_id}).first()
+            if not user_exists:
+                # User doesn't exist - this shouldn't happen as they should be created during auth
+                print(f"❌ User {user_id} not found in database")
+                raise HTTPException(status_code=404, detail="User not found. Please ensure you are properly authenticated.")
+            raise HTTPException(status_code=400, detail="Insufficient credits")
+        
         print(f"💳 Deducted {credits_to_deduct} credits from user {user_id}. New balance: {new_balance}")
         
         return {
@@ -922,7 +1035,7 @@ async def deduct_credits(
         raise HTTPException(status_code=500, detail=f"Error deducting credits: {str(e)}")
 
 @app.post("/api/credits/refund")
-async def refund_credits(
+def refund_credits(
     request: dict,
     user_id: str = Depends(verify_api_token),
     session: Session = Depends(get_session)
@@ -935,31 +1048,24 @@ async def refund_credits(
         if credits_to_refund <= 0:
             raise HTTPException(status_code=400, detail="Credits to refund must be positive")
         
-        # Get current balance
-        balance_query = text("SELECT credits FROM users WHERE id = :user_id")
-        balance_result = session.execute(balance_query, {"user_id": user_id})
-        balance_data = balance_result.first()
-        
-        if not balance_data:
-            # User doesn't exist - this shouldn't happen as they should be created during auth
-            print(f"❌ User {user_id} not found in database")
-            raise HTTPException(status_code=404, detail="User not found. Please ensure you are properly authenticated.")
-        else:
-            current_balance = balance_data.credits or 0
-        
-        # Refund credits
-        new_balance = current_balance + credits_to_refund
+        # Refund credits (relative update, so concurrent refunds and deductions all count)
         refund_query = text("""
             UPDATE users 
-            SET credits = :new_balance, updated_at = CURRENT_TIMESTAMP 
+            SET credits = COALESCE(credits, 0) + :credits, updated_at = CURRENT_TIMESTAMP 
             WHERE id = :user_id
+            RETURNING credits
         """)
-        session.execute(refund_query, {
-            "new_balance": new_balance,
+        new_balance = session.execute(refund_query, {
+            "credits": credits_to_refund,
             "user_id": user_id
-        })
+        }).scalar()
         session.commit()
         
+        if new_balance is None:
+            # User doesn't exist - this shouldn't happen as they should be created during auth
+            print(f"❌ User {user_id} not found in database")
+            raise HTTPException(status_code=404, detail="User not found. Please ensure you are properly authenticated.")
+        
         print(f"💳 Refunded {credits_to_refund} credits to user {user_id}. New balance: {new_balance}")
         
         return {
@@ -975,12 +1081,36 @@ async def refund_credits(
         print(f"Error refunding credits: {e}")
         raise HTTPException(status_code=500, detail=f"Error refunding credits: {str(e)}")
 
+# Columns of the job export; blanks instead of NULLs, dates as ISO 8601
+JOB_EXPORT_COLUMNS = [
+    "first_name", "last_name", "email", "phone", "company", "position",
+    "location", "industry", "profile_url", "enriched", "enrichment_status",
+    "enrichment_provider", "enrichment_score", "email_verified", "phone_verified",
+    "credits_consumed", "created_at",
+]
+
+JOB_EXPORT_QUERY = text("""
+    SELECT 
+        first_name, COALESCE(last_name, '') AS last_name, COALESCE(email, '') AS email,
+        COALESCE(phone, '') AS phone, COALESCE(company, '') AS company,
+        COALESCE(position, '') AS position, COALESCE(location, '') AS location,
+        COALESCE(industry, '') AS industry, COALESCE(profile_url, '') AS profile_url,
+        enriched, enrichment_status, COALESCE(enrichment_provider, '') AS enrichment_provider,
+        COALESCE(enrichment_score, 0) AS enrichment_score, email_verified, phone_verified,
+        COALESCE(credits_consumed, 0) AS credits_consumed,
+        COALESCE(to_char(created_at, 'YYYY-MM-DD"T"HH24:MI:SS.US'), '') AS created_at
+    FROM contacts 
+    WHERE job_id = :job_id
+    ORDER BY created_at DESC
+""")
+
 @app.get("/api/jobs/{job_id}/export")
-async def export_job_data(
+def export_job_data(
     job_id: str,
-    format: str = Query("csv", regex="^(csv|excel|json)$"),
+    format: str = Query("csv", regex="^(csv|excel|json|ndjson)$"),
     user_id: str = Depends(verify_api_token),
-    session: Session = Depends(get_session)
+    session: Session = Depends(get_session),
+    accept: Optional[str] = Header(None)
 ):
     """Export job contacts in various formats"""
     try:
@@ -990,75 +1120,41 @@ async def export_job_data(
         if not job_result.first():
             raise HTTPException(status_code=404, detail="Job not found")
         
-        # Get all contacts for the job
-        contacts_query = text("""
-            SELECT 
-                first_name, last_name, email, phone, company, position,
-                location, industry, profile_url, enriched, enrichment_status,
-                enrichment_provider, enrichment_score, email_verified, phone_verified,
-                credits_consumed, created_at
-            FROM contacts 
-            WHERE job_id = :job_id
-            ORDER BY created_at DESC
-        """)
-        
-        contacts_result = session.execute(contacts_query, {"job_id": job_id})
-        contacts = []
-        
-        for row in contacts_result:
-            contacts.append({
-                "first_name": row[0],
-                "last_name": row[1],
-                "email": row[2] or "",
-                "phone": row[3] or "",
-                "company": row[4] or "",
-                "position": row[5] or "",
-                "location": row[6] or "",
-                "industry": row[7] or "",
-                "profile_url": row[8] or "",
-                "enriched": row[9],
-                "enrichment_status": row[10],
-                "enrichment_provider": row[11] or "",
-                "enrichment_score": row[12] or 0,
-                "email_verified": row[13],
-                "phone_verified": row[14],
-                "credits_consumed": row[15] or 0,
-                "created_at": row[16].isoformat() if row[16] else ""
-            })
-        
-        if format == "csv":
-            # Create CSV response
-            output = io.StringIO()
-            if contacts:
-                writer = csv.DictWriter(output, fieldnames=contacts[0].keys())
-                writer.writeheader()
-                writer.writerows(contacts)
-            
-            return Response(
-                content=output.getvalue(),
-                media_type="text/csv",
+        if format == "json" and prefers_ndjson(accept):
+            format = "ndjson"
+
+        if format in ("csv", "ndjson"):
+            # Stream from a server-side cursor; nothing is held beyond one batch
+            batches = open_stream_sync(JOB_EXPORT_QUERY, {"job_id": job_id})
+            if batches is None:
+                raise HTTPException(status_code=404, detail="No contacts found for this job")
+            encoder = STREAM_ENCODERS[format](JOB_EXPORT_COLUMNS)
+            return StreamingResponse(
+                encode_stream_sync(encoder, batches),
+                media_type=encoder.media_type,
                 headers={
-                    "Content-Disposition": f"attachment; filename=export_{job_id}.csv"
+                    "Content-Disposition": f"attachment; filename=export_{job_id}.{encoder.extension}"
                 }
             )
-            
-        elif format == "excel":
-            # Create Excel response
-            df = pd.DataFrame(contacts)
-            output = io.BytesIO()
-            with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-                df.to_excel(writer, sheet_name='Contacts', index=False)
-            
-            return Response(
-                content=output.getvalue(),
-                media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+
+        if format == "excel":
+            # Rows go straight from the cursor into a constant_memory workbook on disk
+            batches = open_stream_sync(JOB_EXPORT_QUERY, {"job_id": job_id})
+            if batches is None:
+                raise HTTPException(status_code=404, detail="No contacts found for this job")
+            path = spool_xlsx_sync(JOB_EXPORT_COLUMNS, batches)
+            return StreamingResponse(
+                iter_file(path),
+                media_type=XLSX_MEDIA_TYPE,
                 headers={
                     "Content-Disposition": f"attachment; filename=export_{job_id}.xlsx"
                 }
             )
-            
-        else:  # json
-            return JSONResponse(content={"contacts": contacts})
+
+        contacts_result = session.execute(JOB_EXPORT_QUERY, {"job_id": job_id})
+        contacts = [dict(zip(JOB_EXPORT_COLUMNS, row)) for row in contacts_result]
+
+        return JSONResponse(content={"contacts": contacts})
             
     except HTTPException:
         raise
@@ -1066,6 +1162,11 @@ async def export_job_data(
         print(f"Error exporting job data: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/health/db-pool")
+async def db_pool_health():
+    """Connection pool checkout wait times and usage"""
+    return pool_metrics()
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -1081,7 +1182,8 @@ async def api_health_check():
 # ==========================================
 
 @app.get("/api/verification/stats")
-async def get_verification_stats(
+@cached_response(response_cache, "verification:stats")
+def get_verification_stats(
     user_id: str = Depends(verify_api_token),
     session: Session = Depends(get_session)
 ):
@@ -1109,8 +1211,7 @@ async def get_verification_stats(
                 COUNT(CASE WHEN c.phone_verification_score >= 0.5 AND c.phone_verification_score < 0.7 THEN 1 END) as phone_voip,
                 COUNT(CASE WHEN c.phone_verification_score < 0.5 AND c.phone_verification_score IS NOT NULL THEN 1 END) as phone_invalid
             FROM contacts c
-            JOIN import_jobs ij ON c.job_id = ij.id
-            WHERE ij.user_id = :user_id
+            WHERE c.user_id = :user_id
         """)
         
         result = session.execute(stats_query, {"user_id": user_id})
@@ -1147,7 +1248,7 @@ async def get_verification_stats(
         raise HTTPException(status_code=500, detail=f"Error getting verification stats: {str(e)}")
 
 @app.get("/api/verification/stats/{job_id}")
-async def get_job_verification_stats(
+def get_job_verification_stats(
     job_id: str,
     user_id: str = Depends(verify_api_token),
     session: Session = Depends(get_session)
@@ -1221,7 +1322,7 @@ async def get_job_verification_stats(
         raise HTTPException(status_code=500, detail=f"Error getting verification stats: {str(e)}")
 
 @app.post("/api/verification/job/{job_id}/verify")
-async def verify_job_contacts(
+def verify_job_contacts(
     job_id: str,
     user_id: str = Depends(verify_api_token),
     session: Session = Depends(get_session)
@@ -1361,7 +1462,7 @@ class ContactUpdate(BaseModel):
     industry: Optional[str] = None
 
 @app.put("/api/contacts/{contact_id}")
-async def update_contact(
+def update_contact(
     contact_id: str,
     update_data: ContactUpdate,
     user_id: str = Depends(verify_api_token),
@@ -1372,8 +1473,7 @@ async def update_contact(
         # Verify contact exists and belongs to user
         verify_query = text("""
             SELECT c.id FROM contacts c
-            JOIN import_jobs ij ON c.job_id = ij.id
-            WHERE c.id = :contact_id AND ij.user_id = :user_id
+            WHERE c.id = :contact_id AND c.user_id = :user_id
         """)
         verify_result = session.execute(verify_query, {"contact_id": contact_id, "user_id": user_id})
         if not verify_result.first():
@@ -1431,6 +1531,7 @@ async def update_contact(
             raise HTTPException(status_code=404, detail="Contact not found")
         
         session.commit()
+        publish_user_data_changed(settings.redis_url, user_id)
         
         # Return updated contact
         updated_contact_query = text("""
@@ -1483,7 +1584,7 @@ async def update_contact(
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/contacts/{contact_id}")
-async def get_contact(
+def get_contact(
     contact_id: str,
     user_id: str = Depends(verify_api_token),
     session: Session = Depends(get_session)
@@ -1499,8 +1600,7 @@ async def get_contact(
                 c.email_verification_score, c.phone_verification_score, c.notes,
                 c.credits_consumed, c.created_at, c.updated_at
             FROM contacts c
-            JOIN import_jobs ij ON c.job_id = ij.id
-            WHERE c.id = :contact_id AND ij.user_id = :user_id
+            WHERE c.id = :contact_id AND c.user_id = :user_id
         """)
         
         contact_result = session.execute(contact_query, {"contact_id": contact_id, "user_id": user_id})
@@ -1546,7 +1646,7 @@ async def get_contact(
 # ==========================================
 
 @app.post("/api/contacts/{contact_id}/export/hubspot")
-async def export_contact_to_hubspot(
+def export_contact_to_hubspot(
     contact_id: str,
     user_id: str = Depends(verify_api_token),
     session: Session = Depends(get_session)
@@ -1559,8 +1659,7 @@ async def export_contact_to_hubspot(
                 c.first_name, c.last_name, c.email, c.phone, c.company, c.position,
                 c.location, c.industry, c.profile_url, c.notes
             FROM contacts c
-            JOIN import_jobs ij ON c.job_id = ij.id
-            WHERE c.id = :contact_id AND ij.user_id = :user_id
+            WHERE c.id = :contact_id AND c.user_id = :user_id
         """)
         
         contact_result = session.execute(contact_query, {"contact_id": contact_id, "user_id": user_id})
@@ -1634,7 +1733,7 @@ async def export_contact_to_hubspot(
         raise HTTPException(status_code=500, detail=f"HubSpot export failed: {str(e)}")
 
 @app.post("/api/jobs/{job_id}/export/hubspot")
-async def export_job_to_hubspot(
+def export_job_to_hubspot(
     job_id: str,
     user_id: str = Depends(verify_api_token),
     session: Session = Depends(get_session)
@@ -1744,7 +1843,7 @@ async def export_job_to_hubspot(
         raise HTTPException(status_code=500, detail=f"Bulk HubSpot export failed: {str(e)}")
 
 @app.get("/api/export/logs")
-async def get_export_logs(
+def get_export_logs(
     user_id: str = Depends(verify_api_token),
     session: Session = Depends(get_session),
     page: int = Query(1, ge=1),
@@ -1814,7 +1913,7 @@ async def get_export_logs(
 # ==========================================
 
 @app.get("/api/crm/contacts")
-async def get_crm_contacts(
+def get_crm_contacts(
     page: int = Query(1, ge=1),
     limit: int = Query(50, ge=1, le=100),
     search: str = Query("", description="Search term"),
@@ -1823,25 +1922,28 @@ async def get_crm_contacts(
     email_reliability: str = Query("all", description="Filter by email reliability"),
     lead_score_min: int = Query(0, ge=0, le=100),
     lead_score_max: int = Query(100, ge=0, le=100),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page (overrides page)"),
     user_id: str = Depends(verify_api_token),
     session: Session = Depends(get_session)
 ):
-    """Get unified view of all contacts from all batches with advanced filtering"""
+    """
+    Get unified view of all contacts from all batches with advanced filtering.
+
+    Pass the returned ``next_cursor`` as ``cursor`` to page through results in
+    constant time; ``page`` is kept for compatibility and uses OFFSET.
+    """
     try:
         # Build base query
-        where_conditions = ["ij.user_id = :user_id"]
+        where_conditions = ["c.user_id = :user_id"]
         params = {"user_id": user_id}
         
-        # Add search filter
-        if search:
-            where_conditions.append("""(
-                c.first_name ILIKE :search OR 
-                c.last_name ILIKE :search OR 
-                c.email ILIKE :search OR 
-                c.company ILIKE :search OR
-                c.position ILIKE :search
-            )""")
-            params["search"] = f"%{search}%"
+        # Add search filter (trigram index, ranked by relevance)
+        order_by = KEYSET_ORDER
+        if search.strip():
+            search_condition, search_rank, search_params = contact_search(search)
+            where_conditions.append(search_condition)
+            params.update(search_params)
+            order_by = f"{search_rank} DESC, {KEYSET_ORDER}"
         
         # Add batch filter
         if batch_filter != "all":
@@ -1869,18 +1971,30 @@ async def get_crm_contacts(
         
         where_clause = "WHERE " + " AND ".join(where_conditions)
         
-        # Get total count
-        count_query = text(f"""
-            SELECT COUNT(*)
-            FROM contacts c
-            JOIN import_jobs ij ON c.job_id = ij.id
-            {where_clause}
-        """)
-        count_result = session.execute(count_query, params)
-        total = count_result.scalar() or 0
-        
-        # Calculate pagination
-        offset = (page - 1) * limit
+        # Get total count (cached per user + filters while paging)
+        count_key = count_cache.key("import:crm_contacts", params)
+        total = count_cache.get(count_key)
+        if total is None:
+            count_query = text(f"""
+                SELECT COUNT(*)
+                FROM contacts c
+                {where_clause}
+            """)
+            total = session.execute(count_query, params).scalar() or 0
+            count_cache.set(count_key, total)
+        
+        # Keyset pagination when a cursor is given, OFFSET otherwise
+        offset = 0
+        if cursor and order_by != KEYSET_ORDER:
+            raise HTTPException(status_code=400, detail="Search results are ranked; page through them with page instead of cursor")
+        if cursor:
+            try:
+                params["cursor_created_at"], params["cursor_id"] = decode_cursor(cursor)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            where_clause += f" AND {KEYSET_CONDITION}"
+        else:
+            offset = (page - 1) * limit
         total_pages = (total + limit - 1) // limit
         
         # Get contacts with enhanced fields (with fallbacks for missing columns)
@@ -1901,15 +2015,19 @@ async def get_crm_contacts(
             FROM contacts c
             JOIN import_jobs ij ON c.job_id = ij.id
             {where_clause}
-            ORDER BY c.created_at DESC
+            ORDER BY {order_by}
             LIMIT :limit OFFSET :offset
         """)
         
-        params.update({"limit": limit, "offset": offset})
-        contacts_result = session.execute(contacts_query, params)
+        # One extra row tells us whether there is a next page
+        params.update({"limit": limit + 1, "offset": offset})
+        rows = session.execute(contacts_query, params).fetchall()
+        cursor_next = next_cursor(rows, limit)
+        if order_by != KEYSET_ORDER:
+            cursor_next = None
         
         contacts = []
-        for row in contacts_result.fetchall():
+        for row in rows:
             contacts.append({
                 "id": str(row[0]),
                 "job_id": str(row[1]),
@@ -1946,6 +2064,7 @@ async def get_crm_contacts(
             "page": page,
             "limit": limit,
             "total_pages": total_pages,
+            "next_cursor": cursor_next,
             "filters_applied": {
                 "search": search,
                 "batch_filter": batch_filter,
@@ -1955,12 +2074,15 @@ async def get_crm_contacts(
             }
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching CRM contacts: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/crm/contacts/stats")
-async def get_crm_contacts_stats(
+@cached_response(response_cache, "crm:contacts-stats")
+def get_crm_contacts_stats(
     user_id: str = Depends(verify_api_token),
     session: Session = Depends(get_session)
 ):
@@ -1989,8 +2111,7 @@ async def get_crm_contacts_stats(
                 AVG(COALESCE(c.lead_score, 0)) as avg_lead_score,
                 SUM(COALESCE(c.credits_consumed, 0)) as total_credits_consumed
             FROM contacts c
-            JOIN import_jobs ij ON c.job_id = ij.id
-            WHERE ij.user_id = :user_id
+            WHERE c.user_id = :user_id
         """)
         
         result = session.execute(stats_query, {"user_id": user_id})
@@ -2025,7 +2146,7 @@ async def get_crm_contacts_stats(
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/crm/batches")
-async def get_crm_batches(
+def get_crm_batches(
     user_id: str = Depends(verify_api_token),
     session: Session = Depends(get_session)
 ):
@@ -2036,12 +2157,11 @@ async def get_crm_batches(
                 ij.id,
                 ij.file_name,
                 ij.created_at,
-                COUNT(c.id) as contact_count,
-                COUNT(CASE WHEN c.enriched = true THEN 1 END) as enriched_count
+                js.total_processed as contact_count,
+                js.enriched_count
             FROM import_jobs ij
-            LEFT JOIN contacts c ON ij.id = c.job_id
+            LEFT JOIN job_stats js ON js.job_id = ij.id
             WHERE ij.user_id = :user_id
-            GROUP BY ij.id, ij.file_name, ij.created_at
             ORDER BY ij.created_at DESC
         """)
         
@@ -2064,7 +2184,7 @@ async def get_crm_batches(
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/crm/contacts/bulk-export")
-async def bulk_export_crm_contacts(
+def bulk_export_crm_contacts(
     request: dict,
     user_id: str = Depends(verify_api_token),
     session: Session = Depends(get_session)
@@ -2080,8 +2200,7 @@ async def bulk_export_crm_contacts(
         # Verify contacts belong to user
         verify_query = text("""
             SELECT c.id FROM contacts c
-            JOIN import_jobs ij ON c.job_id = ij.id
-            WHERE c.id = ANY(:contact_ids) AND ij.user_id = :user_id
+            WHERE c.id = ANY(:contact_ids) AND c.user_id = :user_id
         """)
         verify_result = session.execute(verify_query, {
             "contact_ids": contact_ids,
@@ -2093,38 +2212,33 @@ async def bulk_export_crm_contacts(
             raise HTTPException(status_code=403, detail="Some contacts do not belong to user")
         
         if export_type == "hubspot":
-            # Process HubSpot export for each contact
-            exported_count = 0
-            failed_count = 0
-            
-            for contact_id in verified_ids:
-                try:
-                    # Mock HubSpot export - in real implementation, call HubSpot API
-                    hubspot_contact_id = f"hubspot_{contact_id}_{int(time.time())}"
-                    
-                    # Log the export
-                    export_log_query = text("""
-                        INSERT INTO export_logs (user_id, contact_id, platform, platform_contact_id, export_type, status, created_at)
-                        VALUES (:user_id, :contact_id, 'hubspot', :platform_contact_id, 'hubspot', 'success', CURRENT_TIMESTAMP)
-                    """)
-                    session.execute(export_log_query, {
-                        "user_id": user_id,
-                        "contact_id": contact_id,
-                        "platform_contact_id": hubspot_contact_id
-                    })
-                    exported_count += 1
-                except Exception as e:
-                    print(f"Failed to export contact {contact_id}: {e}")
-                    failed_count += 1
+            # Batch upsert through HubSpot's batch API (runs on the event loop)
+            result = anyio.from_thread.run(
+                export_contacts_to_hubspot_async, user_id, [int(contact_id) for contact_id in verified_ids]
+            )
             
-            session.commit()
+            hubspot_ids = result["hubspot_ids"]
+            if hubspot_ids:
+                session.execute(text("""
+                    INSERT INTO export_logs (user_id, contact_id, platform, platform_contact_id, export_type, status, created_at)
+                    SELECT :user_id, m.contact_id, 'hubspot', m.platform_contact_id, 'hubspot', 'success', CURRENT_TIMESTAMP
+                    FROM unnest(CAST(:contact_ids AS integer[]), CAST(:platform_contact_ids AS varchar[])) AS m(contact_id, platform_contact_id)
+                """), {
+                    "user_id": user_id,
+                    "contact_ids": [int(contact_id) for contact_id in hubspot_ids],
+                    "platform_contact_ids": list(hubspot_ids.values())
+                })
+                session.commit()
             
             return {
                 "success": True,
                 "export_type": "hubspot",
-                "exported_count": exported_count,
-                "failed_count": failed_count,
-                "message": f"Exported {exported_count} contacts to HubSpot"
+                "exported_count": result["exported"],
+                "created_count": result["created"],
+                "updated_count": result["updated"],
+                "failed_count": result["failed"],
+                "errors": result["errors"],
+                "message": f"Exported {result['exported']} contacts to HubSpot"
             }
         
         else:  # CSV export
@@ -2137,8 +2251,7 @@ async def bulk_export_crm_contacts(
                     COALESCE(c.email_reliability, 'unknown') as email_reliability,
                     c.enrichment_provider, c.created_at
                 FROM contacts c
-                JOIN import_jobs ij ON c.job_id = ij.id
-                WHERE c.id = ANY(:contact_ids) AND ij.user_id = :user_id
+                WHERE c.id = ANY(:contact_ids) AND c.user_id = :user_id
                 ORDER BY c.created_at DESC
             """)
             
@@ -2193,6 +2306,11 @@ hubspot_service = HubSpotService()
 print(f"✅ HubSpotService initialized: {hubspot_service}")
 print(f"📋 HubSpot Service methods: {dir(hubspot_service)}")
 
+async def export_contacts_to_hubspot_async(user_id: str, contact_ids: list[int]) -> dict:
+    """HubSpot export with its own async session, for sync endpoints"""
+    async with get_async_session_context() as async_session:
+        return await hubspot_service.export_contacts_to_hubspot(async_session, user_id, contact_ids)
+
 @app.get("/api/integrations/hubspot/oauth-url")
 async def get_hubspot_oauth_url(
     user_id: str = Depends(verify_api_token)
@@ -2251,7 +2369,7 @@ async def hubspot_oauth_callback(
                 updated_at = NOW()
         """)
         
-        session.execute(insert_query, {
+        await run_in_threadpool(session.execute, insert_query, {
             "user_id": user_id,
             "portal_id": portal_id,
             "access_token": token_data['access_token'],
@@ -2259,20 +2377,20 @@ async def hubspot_oauth_callback(
             "expires_at": expires_at,
             "scopes": token_data.get('scope', '').split(' ')
         })
-        session.commit()
+        await run_in_threadpool(session.commit)
         
         return {"success": True, "message": "HubSpot integration connected successfully"}
         
     except Exception as e:
         if session is not None:
-            session.rollback()
+            await run_in_threadpool(session.rollback)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"OAuth callback failed: {str(e)}"
         )
 
 @app.get("/api/integrations/hubspot/status")
-async def get_hubspot_integration_status(
+def get_hubspot_integration_status(
     user_id: str = Depends(verify_api_token),
     session: Session = Depends(get_session)
 ):
@@ -2351,7 +2469,7 @@ async def import_from_hubspot(
         raise HTTPException(status_code=503, detail="Export service unavailable")
     except Exception as e:
         if session is not None:
-            session.rollback()
+            await run_in_threadpool(session.rollback)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"HubSpot import failed: {str(e)}"
@@ -2361,7 +2479,7 @@ async def import_from_hubspot(
 async def export_to_hubspot(
     contact_ids: list[int],
     user_id: str = Depends(verify_api_token),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     """Export selected contacts to HubSpot"""
     try:
@@ -2376,13 +2494,15 @@ async def export_to_hubspot(
         return {
             "success": True,
             "exported": result["exported"],
+            "created": result["created"],
+            "updated": result["updated"],
             "failed": result["failed"],
             "sync_log_id": result["sync_log_id"]
         }
         
     except Exception as e:
         if session is not None:
-            session.rollback()
+            await session.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"HubSpot export failed: {str(e)}"
@@ -2391,7 +2511,7 @@ async def export_to_hubspot(
 # Removed duplicate endpoint - using proxy below
 
 @app.get("/api/integrations/hubspot/sync-logs")
-async def get_hubspot_sync_logs(
+def get_hubspot_sync_logs(
     user_id: str = Depends(verify_api_token),
     session: Session = Depends(get_session),
     page: int = Query(1, ge=1),
@@ -2453,7 +2573,7 @@ async def get_hubspot_sync_logs(
         )
 
 @app.delete("/api/integrations/hubspot/disconnect")
-async def disconnect_hubspot(
+def disconnect_hubspot(
     user_id: str = Depends(verify_api_token),
     session: Session = Depends(get_session)
 ):
@@ -2545,7 +2665,7 @@ async def setup_lemlist_integration(
             SELECT id FROM lemlist_integrations 
             WHERE user_id = :user_id AND is_active = true
         """)
-        existing = session.execute(existing_query, {"user_id": user_id}).fetchone()
+        existing = (await run_in_threadpool(session.execute, existing_query, {"user_id": user_id})).fetchone()
         
         if existing:
             # Update existing integration
@@ -2555,7 +2675,7 @@ async def setup_lemlist_integration(
                     account_name = :account_name, updated_at = NOW()
                 WHERE user_id = :user_id AND is_active = true
             """)
-            session.execute(update_query, {
+            await run_in_threadpool(session.execute, update_query, {
                 "user_id": user_id,
                 "api_key": api_key,
                 "account_email": account_info.get("email", ""),
@@ -2568,14 +2688,14 @@ async def setup_lemlist_integration(
                 (user_id, api_key, account_email, account_name, is_active, created_at, updated_at)
                 VALUES (:user_id, :api_key, :account_email, :account_name, true, NOW(), NOW())
             """)
-            session.execute(insert_query, {
+            await run_in_threadpool(session.execute, insert_query, {
                 "user_id": user_id,
                 "api_key": api_key,
                 "account_email": account_info.get("email", ""),
                 "account_name": account_info.get("name", "")
             })
         
-        session.commit()
+        await run_in_threadpool(session.commit)
         
         return {
             "success": True,
@@ -2587,7 +2707,7 @@ async def setup_lemlist_integration(
         }
         
     except Exception as e:
-        session.rollback()
+        await run_in_threadpool(session.rollback)
         print(f"Lemlist setup error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to setup Lemlist integration: {str(e)}")
 
@@ -2606,7 +2726,7 @@ async def get_lemlist_integration_status(
             LIMIT 1
         """)
         
-        integration = session.execute(query, {"user_id": user_id}).fetchone()
+        integration = (await run_in_threadpool(session.execute, query, {"user_id": user_id})).fetchone()
         
         if not integration:
             return {"connected": False}
@@ -2635,7 +2755,7 @@ async def get_lemlist_integration_status(
 @app.get("/api/integrations/lemlist/campaigns")
 async def get_lemlist_campaigns(
     user_id: str = Depends(verify_api_token),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     """Get available Lemlist campaigns"""
     try:
@@ -2655,7 +2775,7 @@ async def get_lemlist_campaigns(
 async def import_from_lemlist(
     request: dict,
     user_id: str = Depends(verify_api_token),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     """Import contacts from Lemlist campaigns"""
     try:
@@ -2669,12 +2789,12 @@ async def import_from_lemlist(
         """)
         
         filename = f"Lemlist Import - Campaign {campaign_id}" if campaign_id else "Lemlist Import - All Campaigns"
-        session.execute(job_insert_sql, {
+        await session.execute(job_insert_sql, {
             "job_id": job_id,
             "user_id": user_id,
             "file_name": filename
         })
-        session.commit()
+        await session.commit()
         
         # Import contacts from Lemlist
         lemlist_service = LemlistService()
@@ -2686,12 +2806,12 @@ async def import_from_lemlist(
             SET status = 'completed', total = :total, processed_records = :imported, updated_at = NOW()
             WHERE id = :job_id
         """)
-        session.execute(update_job_sql, {
+        await session.execute(update_job_sql, {
             "job_id": job_id,
             "total": result["total_contacts"],
             "imported": result["imported_count"]
         })
-        session.commit()
+        await session.commit()
         
         return {
             "success": True,
@@ -2704,7 +2824,7 @@ async def import_from_lemlist(
         }
         
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         print(f"Lemlist import error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Lemlist import failed: {str(e)}")
 
@@ -2712,7 +2832,7 @@ async def import_from_lemlist(
 async def export_to_lemlist(
     request: dict,
     user_id: str = Depends(verify_api_token),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     """Export contacts to Lemlist campaign"""
     try:
@@ -2735,12 +2855,12 @@ async def export_to_lemlist(
         }
         
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         print(f"Lemlist export error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Lemlist export failed: {str(e)}")
 
 @app.delete("/api/integrations/lemlist/disconnect")
-async def disconnect_lemlist(
+def disconnect_lemlist(
     user_id: str = Depends(verify_api_token),
     session: Session = Depends(get_session)
 ):
@@ -2793,7 +2913,7 @@ async def setup_zapier_integration(
             SELECT id FROM zapier_integrations 
             WHERE user_id = :user_id AND is_active = true
         """)
-        existing = session.execute(existing_query, {"user_id": user_id}).fetchone()
+        existing = (await run_in_threadpool(session.execute, existing_query, {"user_id": user_id})).fetchone()
         
         if existing:
             # Update existing integration
@@ -2802,7 +2922,7 @@ async def setup_zapier_integration(
                 SET webhook_url = :webhook_url, zap_name = :zap_name, updated_at = NOW()
                 WHERE user_id = :user_id AND is_active = true
             """)
-            session.execute(update_query, {
+            await run_in_threadpool(session.execute, update_query, {
                 "user_id": user_id,
                 "webhook_url": webhook_url,
                 "zap_name": "Captely to Zapier Integration"
@@ -2814,13 +2934,13 @@ async def setup_zapier_integration(
                 (user_id, webhook_url, zap_name, is_active, created_at, updated_at)
                 VALUES (:user_id, :webhook_url, :zap_name, true, NOW(), NOW())
             """)
-            session.execute(insert_query, {
+            await run_in_threadpool(session.execute, insert_query, {
                 "user_id": user_id,
                 "webhook_url": webhook_url,
                 "zap_name": "Captely to Zapier Integration"
             })
         
-        session.commit()
+        await run_in_threadpool(session.commit)
         
         return {
             "success": True,
@@ -2830,7 +2950,7 @@ async def setup_zapier_integration(
         }
         
     except Exception as e:
-        session.rollback()
+        await run_in_threadpool(session.rollback)
         print(f"Zapier setup error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to setup Zapier integration: {str(e)}")
 
@@ -2849,7 +2969,7 @@ async def get_zapier_integration_status(
             LIMIT 1
         """)
         
-        integration = session.execute(query, {"user_id": user_id}).fetchone()
+        integration = (await run_in_threadpool(session.execute, query, {"user_id": user_id})).fetchone()
         
         if not integration:
             return {"connected": False}
@@ -2879,9 +2999,9 @@ async def get_zapier_integration_status(
 async def export_to_zapier(
     request: dict,
     user_id: str = Depends(verify_api_token),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
-    """Export contacts to Zapier webhook"""
+    """Queue contacts for delivery to the Zapier webhook"""
     try:
         contact_ids = request.get("contact_ids", [])
         batch_mode = request.get("batch_mode", True)
@@ -2897,11 +3017,13 @@ async def export_to_zapier(
             "exported_count": result["exported_count"],
             "failed_count": result["failed_count"],
             "errors": result["errors"],
-            "batch_mode": result["batch_mode"]
+            "batch_mode": result["batch_mode"],
+            "queued": result["queued"]
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
-        session.rollback()
         print(f"Zapier export error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Zapier export failed: {str(e)}")
 
@@ -2909,7 +3031,7 @@ async def export_to_zapier(
 async def receive_zapier_webhook(
     request: dict,
     user_id: str = Depends(verify_api_token),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     """Receive webhook data from Zapier (for importing contacts)"""
     try:
@@ -2919,12 +3041,12 @@ async def receive_zapier_webhook(
         return result
         
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         print(f"Zapier webhook error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Webhook processing failed: {str(e)}")
 
 @app.delete("/api/integrations/zapier/disconnect")
-async def disconnect_zapier(
+def disconnect_zapier(
     user_id: str = Depends(verify_api_token),
     session: Session = Depends(get_session)
 ):
@@ -20,6 +20,8 @@ class Contact(Base):
     __tablename__ = "contacts"
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     job_id: Mapped[str] = mapped_column(ForeignKey("import_jobs.id", ondelete="CASCADE"))
+    # Denormalized from import_jobs.user_id (set by trigger when omitted)
+    user_id: Mapped[str | None] = mapped_column(String, nullable=True)
     first_name: Mapped[str] = mapped_column(String)
     last_name: Mapped[str | None]
     company: Mapped[str]
@@ -6,8 +6,8 @@ Handles OAuth authentication, token management, and contact synchronization
 import asyncio
 import json
 import logging
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Any, Tuple
 from urllib.parse import urlencode
 
 import httpx
@@ -15,9 +15,19 @@ from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from common.config import get_settings
+from common.crm_sync import get_sync_state, save_sync_state, write_contacts, commit_page, prefetch_pages
 
 settings = get_settings()
 
+# Oldest modification first so the watermark can advance page by page
+SALESFORCE_IMPORT_SOQL = """
+    SELECT Id, FirstName, LastName, Email, Phone, Title,
+           MailingCity, MailingState, MailingCountry, Account.Name, SystemModstamp
+    FROM Contact
+    WHERE Email != null{since}
+    ORDER BY SystemModstamp ASC, Id ASC
+"""
+
 class SalesforceService:
     def __init__(self):
         # Replace with your actual Salesforce Connected App credentials
@@ -80,9 +90,8 @@ class SalesforceService:
             response.raise_for_status()
             return response.json()
     
-    async def make_api_request(self, session: AsyncSession, user_id: str, method: str, endpoint: str, **kwargs) -> Dict[str, Any]:
-        """Make authenticated API request to Salesforce"""
-        # Get valid access token from database
+    async def get_credentials(self, session: AsyncSession, user_id: str) -> Tuple[str, str]:
+        """(access token, instance URL) for the user's integration, refreshing the token if about to expire"""
         query = text("""
             SELECT access_token, refresh_token, expires_at, salesforce_instance_url 
             FROM salesforce_integrations 
@@ -125,6 +134,11 @@ class SalesforceService:
                 logging.error(f"Failed to refresh Salesforce token for user {user_id}: {e}")
                 raise Exception("Failed to refresh Salesforce access token")
         
+        return access_token, instance_url
+    
+    async def make_api_request(self, session: AsyncSession, user_id: str, method: str, endpoint: str, **kwargs) -> Dict[str, Any]:
+        """Make authenticated API request to Salesforce"""
+        access_token, instance_url = await self.get_credentials(session, user_id)
         headers = {
             "Authorization": f"Bearer {access_token}",
             "Content-Type": "application/json"
@@ -199,77 +213,84 @@ class SalesforceService:
         
         return captely_contact
     
+    async def _fetch_contacts_page(
+        self,
+        client: httpx.AsyncClient,
+        access_token: str,
+        instance_url: str,
+        since: Optional[datetime],
+        next_url: Optional[str],
+    ):
+        """One page of contacts, oldest modification first; returns (records, nextRecordsUrl)"""
+        headers = {"Authorization": f"Bearer {access_token}"}
+        if next_url:
+            response = await client.get(f"{instance_url}{next_url}", headers=headers)
+        else:
+            soql = SALESFORCE_IMPORT_SOQL.format(
+                since=f" AND SystemModstamp >= {since.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')}" if since else ""
+            )
+            response = await client.get(
+                f"{instance_url}/services/data/{self.api_version}/query", headers=headers, params={"q": soql}
+            )
+        response.raise_for_status()
+        data = response.json()
+        return data.get("records", []), data.get("nextRecordsUrl")
+    
     async def import_contacts_from_salesforce(self, session: AsyncSession, user_id: str, job_id: str) -> Dict[str, Any]:
-        """Import contacts from Salesforce to Captely"""
+        """
+        Import contacts from Salesforce to Captely.
+        
+        Contacts are read oldest modification first and the watermark advances
+        with every page written, so an interrupted import resumes from the
+        saved query cursor (or the watermark once the cursor has expired) and
+        later imports only read contacts modified since. Contacts imported
+        before are updated in place.
+        """
         imported_count = 0
+        updated_count = 0
+        total_contacts = 0
         
         try:
-            # Build SOQL query to get contacts
-            soql_query = """
-                SELECT Id, FirstName, LastName, Email, Phone, Title, 
-                       MailingCity, MailingState, MailingCountry, Account.Name
-                FROM Contact 
-                WHERE Email != null 
-                ORDER BY CreatedDate DESC 
-                LIMIT 200
-            """
-            
-            response = await self.make_api_request(
-                session, user_id, "GET", "/query",
-                params={"q": soql_query}
-            )
-            
-            contacts = response.get("records", [])
+            access_token, instance_url = await self.get_credentials(session, user_id)
+            cursor, watermark = await get_sync_state(session, user_id, "salesforce")
             
-            # Import each contact
-            for salesforce_contact in contacts:
-                try:
-                    captely_contact = self.map_salesforce_to_captely(salesforce_contact)
-                    
-                    # Insert into contacts table
-                    insert_query = text("""
-                        INSERT INTO contacts (
-                            job_id, first_name, last_name, email, phone, company, 
-                            position, location, industry, profile_url, enriched, 
-                            enrichment_status, created_at
-                        ) VALUES (
-                            :job_id, :first_name, :last_name, :email, :phone, :company,
-                            :position, :location, :industry, :profile_url, :enriched,
-                            :enrichment_status, NOW()
-                        ) RETURNING id
-                    """)
-                    
-                    contact_result = await session.execute(insert_query, {
-                        "job_id": job_id,
-                        **captely_contact
-                    })
-                    captely_contact_id = contact_result.scalar()
-                    
-                    # Create mapping record
-                    mapping_query = text("""
-                        INSERT INTO salesforce_contact_mappings 
-                        (user_id, captely_contact_id, salesforce_contact_id)
-                        VALUES (:user_id, :captely_id, :salesforce_id)
-                    """)
-                    
-                    await session.execute(mapping_query, {
-                        "user_id": user_id,
-                        "captely_id": captely_contact_id,
-                        "salesforce_id": salesforce_contact["Id"]
-                    })
+            async with httpx.AsyncClient(timeout=60.0) as client:
+                since = watermark
+                
+                async def fetch(next_url):
+                    nonlocal cursor
+                    try:
+                        return await self._fetch_contacts_page(client, access_token, instance_url, since, next_url)
+                    except httpx.HTTPStatusError:
+                        if next_url != cursor:
+                            raise
+                        # Query locators expire; restart from the watermark
+                        cursor = None
+                        return await self._fetch_contacts_page(client, access_token, instance_url, since, None)
+                
+                async for contacts, next_url in prefetch_pages(fetch, cursor):
+                    records = []
+                    for salesforce_contact in contacts:
+                        records.append((salesforce_contact["Id"], self.map_salesforce_to_captely(salesforce_contact)))
+                        modified = salesforce_contact.get("SystemModstamp")
+                        if modified:
+                            modified = datetime.strptime(modified, "%Y-%m-%dT%H:%M:%S.%f%z")
+                            watermark = modified if watermark is None else max(watermark, modified)
                     
-                    imported_count += 1
+                    inserted, updated = await write_contacts(session, user_id, job_id, "salesforce", records)
+                    imported_count += inserted
+                    updated_count += updated
+                    total_contacts += len(contacts)
                     
-                except Exception as e:
-                    logging.error(f"Failed to import Salesforce contact {salesforce_contact.get('Id')}: {e}")
-                    continue
-            
-            await session.commit()
+                    await save_sync_state(session, user_id, "salesforce", next_url, watermark)
+                    await commit_page(session, user_id)
             
             return {
                 "imported_count": imported_count,
-                "total_contacts": len(contacts),
-                "message": f"Successfully imported {imported_count} contacts from Salesforce"
+                "updated_count": updated_count,
+                "total_contacts": total_contacts,
+                "incremental": since is not None,
+                "message": f"Successfully imported {imported_count} contacts from Salesforce ({updated_count} updated)"
             }
             
         except Exception as e:
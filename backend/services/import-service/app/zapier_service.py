@@ -15,6 +15,7 @@ from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from common.config import get_settings
+from common.webhooks import enqueue_webhooks
 
 settings = get_settings()
 
@@ -49,9 +50,8 @@ class ZapierService:
                 "response": response.text[:500] if response.text else None
             }
     
-    async def send_webhook(self, session: AsyncSession, user_id: str, data: Dict[str, Any], webhook_type: str = "contact") -> Dict[str, Any]:
-        """Send data to configured Zapier webhook"""
-        # Get webhook URL from database
+    async def get_integration(self, session: AsyncSession, user_id: str):
+        """(webhook URL, zap id) of the user's active Zapier integration"""
         query = text("""
             SELECT zapier_webhook_url, zapier_zap_id 
             FROM zapier_integrations 
@@ -64,8 +64,11 @@ class ZapierService:
         
         if not integration:
             raise Exception("No Zapier integration found")
-            
-        webhook_url, zap_id = integration
+        return integration
+    
+    async def send_webhook(self, session: AsyncSession, user_id: str, data: Dict[str, Any], webhook_type: str = "contact") -> Dict[str, Any]:
+        """Send data to configured Zapier webhook"""
+        webhook_url, zap_id = await self.get_integration(session, user_id)
         
         # Add metadata to the payload
         payload = {
@@ -234,12 +237,17 @@ class ZapierService:
             raise Exception(f"Failed to export contact to Zapier: {str(e)}")
     
     async def export_contacts_to_zapier(self, session: AsyncSession, user_id: str, contact_ids: List[int], batch_mode: bool = True) -> Dict[str, Any]:
-        """Export multiple contacts to Zapier webhook"""
-        exported_count = 0
-        failed_count = 0
-        errors = []
-        
+        """
+        Queue contacts for the Zapier webhook.
+
+        The webhook dispatcher delivers them: in batch mode as one payload
+        with a ``contacts`` list, otherwise as an array Zapier splits into
+        one run per contact. Retries and failures are tracked in
+        webhook_outbox, so this returns as soon as the rows are written.
+        """
         try:
+            webhook_url, zap_id = await self.get_integration(session, user_id)
+            
             # Get contacts from database
             contacts_query = text("""
                 SELECT id, first_name, last_name, email, phone, company, position, 
@@ -247,86 +255,72 @@ class ZapierService:
                        email_verified, phone_verified, created_at, updated_at
                 FROM contacts 
                 WHERE id = ANY(:contact_ids)
+                ORDER BY id
             """)
             
             contacts_result = await session.execute(contacts_query, {"contact_ids": contact_ids})
             contacts = contacts_result.fetchall()
             
-            if batch_mode:
-                # Send all contacts in a single webhook
-                batch_data = []
-                for contact in contacts:
-                    contact_dict = {
-                        "id": contact[0],
-                        "first_name": contact[1],
-                        "last_name": contact[2],
-                        "email": contact[3],
-                        "phone": contact[4],
-                        "company": contact[5],
-                        "position": contact[6],
-                        "location": contact[7],
-                        "industry": contact[8],
-                        "profile_url": contact[9],
-                        "enriched": contact[10],
-                        "enrichment_score": contact[11],
-                        "email_verified": contact[12],
-                        "phone_verified": contact[13],
-                        "created_at": contact[14].isoformat() if contact[14] else None,
-                        "updated_at": contact[15].isoformat() if contact[15] else None
-                    }
-                    batch_data.append(self.map_captely_to_zapier(contact_dict))
-                
-                # Send batch webhook
-                webhook_payload = {
-                    "batch_export": True,
-                    "total_contacts": len(batch_data),
-                    "contacts": batch_data
+            zapier_contacts = []
+            for contact in contacts:
+                contact_dict = {
+                    "id": contact[0],
+                    "first_name": contact[1],
+                    "last_name": contact[2],
+                    "email": contact[3],
+                    "phone": contact[4],
+                    "company": contact[5],
+                    "position": contact[6],
+                    "location": contact[7],
+                    "industry": contact[8],
+                    "profile_url": contact[9],
+                    "enriched": contact[10],
+                    "enrichment_score": contact[11],
+                    "email_verified": contact[12],
+                    "phone_verified": contact[13],
+                    "created_at": contact[14].isoformat() if contact[14] else None,
+                    "updated_at": contact[15].isoformat() if contact[15] else None
                 }
-                
-                webhook_result = await self.send_webhook(session, user_id, webhook_payload, "batch_contacts")
-                
-                if webhook_result["success"]:
-                    exported_count = len(contacts)
-                    # Create mapping records for all contacts
-                    for contact in contacts:
-                        mapping_query = text("""
-                            INSERT INTO zapier_contact_mappings 
-                            (user_id, captely_contact_id, zapier_record_id)
-                            VALUES (:user_id, :captely_id, :zapier_id)
-                            ON CONFLICT (captely_contact_id, zapier_record_id) DO NOTHING
-                        """)
-                        
-                        zapier_record_id = f"batch_{contact[0]}_{int(datetime.now().timestamp())}"
-                        await session.execute(mapping_query, {
-                            "user_id": user_id,
-                            "captely_id": contact[0],
-                            "zapier_id": zapier_record_id
-                        })
-                else:
-                    failed_count = len(contacts)
-                    errors.append(f"Batch webhook failed: {webhook_result.get('response', 'Unknown error')}")
-                    
-            else:
-                # Send individual webhooks for each contact
-                for contact in contacts:
-                    try:
-                        result = await self.export_contact_to_zapier(session, user_id, contact[0])
-                        if result["exported"]:
-                            exported_count += 1
-                        else:
-                            failed_count += 1
-                            errors.append(f"Failed to export contact {contact[3]}")
-                    except Exception as e:
-                        failed_count += 1
-                        errors.append(f"Error processing contact {contact[3]}: {str(e)}")
+                zapier_contacts.append(self.map_captely_to_zapier(contact_dict))
+            
+            webhook_type = "batch_contacts" if batch_mode else "single_contact"
+            envelope = {
+                "captely_webhook_type": webhook_type,
+                "captely_timestamp": datetime.now().isoformat(),
+                "captely_user_id": user_id,
+                "captely_zap_id": zap_id,
+            }
+            if batch_mode:
+                envelope["batch_export"] = True
+            
+            outbox_ids = await enqueue_webhooks(
+                session, user_id, webhook_url, webhook_type, zapier_contacts,
+                envelope=envelope, batch_mode=batch_mode,
+            )
+            
+            # Map each contact to its outbox row
+            if outbox_ids:
+                await session.execute(text("""
+                    INSERT INTO zapier_contact_mappings 
+                    (user_id, captely_contact_id, zapier_record_id, zap_id)
+                    SELECT CAST(:user_id AS uuid), m.captely_contact_id, m.zapier_record_id, :zap_id
+                    FROM unnest(CAST(:contact_ids AS integer[]), CAST(:record_ids AS varchar[])) AS m(captely_contact_id, zapier_record_id)
+                    ON CONFLICT (captely_contact_id, zapier_record_id) DO NOTHING
+                """), {
+                    "user_id": user_id,
+                    "zap_id": zap_id,
+                    "contact_ids": [contact[0] for contact in contacts],
+                    "record_ids": [f"outbox_{outbox_id}" for outbox_id in outbox_ids],
+                })
             
             await session.commit()
             
             return {
-                "exported_count": exported_count,
-                "failed_count": failed_count,
-                "errors": errors,
-                "batch_mode": batch_mode
+                "exported_count": len(outbox_ids),
+                "failed_count": 0,
+                "errors": [],
+                "batch_mode": batch_mode,
+                "queued": True
             }
             
         except Exception as e:
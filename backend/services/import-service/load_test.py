@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Load test for the import-service read endpoints.
+
+Fires requests at increasing concurrency levels and prints throughput and
+latency for each, to check that requests/second keeps scaling with
+concurrency (a blocked event loop shows up as flat throughput and latency
+growing linearly with concurrency).
+
+Usage:
+    python load_test.py --token <JWT> [--url http://localhost:8002]
+                        [--path /api/crm/contacts --path /api/jobs]
+                        [--levels 1,5,10,20,40] [--requests 200]
+"""
+import time
+import asyncio
+import argparse
+import statistics
+from typing import Dict, List
+
+import httpx
+
+DEFAULT_PATHS = [
+    "/api/crm/contacts?limit=50",
+    "/api/crm/contacts/stats",
+    "/api/jobs",
+    "/api/verification/stats",
+    "/api/health",
+]
+
+
+async def run_level(client: httpx.AsyncClient, paths: List[str], concurrency: int, total: int) -> Dict:
+    """Send ``total`` requests with at most ``concurrency`` in flight."""
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            path = paths[i % len(paths)]
+            started = time.perf_counter()
+            try:
+                response = await client.get(path)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "rps": total / elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p95": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "errors": errors,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8002")
+    parser.add_argument("--token", required=True, help="JWT or API key")
+    parser.add_argument("--path", action="append", dest="paths", help="Endpoint to hit (repeatable)")
+    parser.add_argument("--levels", default="1,5,10,20,40", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per level")
+    args = parser.parse_args()
+
+    paths = args.paths or DEFAULT_PATHS
+    levels = [int(level) for level in args.levels.split(",")]
+
+    async with httpx.AsyncClient(
+        base_url=args.url,
+        headers={"Authorization": f"Bearer {args.token}"},
+        timeout=60.0,
+        limits=httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels)),
+    ) as client:
+        # Warm up connections, caches and the DB pool
+        await run_level(client, paths, min(5, max(levels)), 20)
+
+        print(f"{'conc':>5} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'errors':>7} {'scaling':>8}")
+        baseline = None
+        for level in levels:
+            result = await run_level(client, paths, level, args.requests)
+            baseline = baseline or result["rps"]
+            print(
+                f"{result['concurrency']:>5} {result['rps']:>9.1f} {result['p50']:>9.1f} "
+                f"{result['p95']:>9.1f} {result['errors']:>7} {result['rps'] / baseline:>7.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Incremental CRM imports (common/crm_sync.py): write_contacts splits a page
+into inserts and in-place updates by the user's existing mappings, keeps
+the last copy of a record repeated within a page, and never overwrites a
+field with an empty value; prefetch_pages fetches one page ahead.
+
+The database part runs only when CRM_TEST_DATABASE_URL points at a Captely
+database; everything happens inside a transaction that is rolled back.
+"""
+import os
+import uuid
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from common.crm_sync import prefetch_pages
+
+
+def _asyncpg_url(url: str) -> str:
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    return url.replace("+psycopg2", "+asyncpg")
+
+
+def test_prefetch_pages_fetches_ahead():
+    calls = []
+
+    async def fetch(cursor):
+        calls.append(cursor)
+        page = int(cursor or 0)
+        return [f"record-{page}"], (str(page + 1) if page < 2 else None)
+
+    async def run():
+        pages = []
+        async for records, cursor in prefetch_pages(fetch, None):
+            await asyncio.sleep(0)
+            # The following page was requested before this one is processed
+            pages.append((records, cursor, list(calls)))
+        return pages
+
+    pages = asyncio.run(run())
+    assert [(records, cursor) for records, cursor, _ in pages] == [
+        (["record-0"], "1"), (["record-1"], "2"), (["record-2"], None),
+    ]
+    assert pages[0][2] == [None, "1"]
+    assert calls == [None, "1", "2"]
+
+
+def test_prefetch_pages_cancels_pending_fetch():
+    cancelled = []
+
+    async def fetch(cursor):
+        if cursor:
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(cursor)
+                raise
+        return ["first"], "next"
+
+    async def run():
+        pages = prefetch_pages(fetch, None)
+        assert await pages.__anext__() == (["first"], "next")
+        await asyncio.sleep(0)
+        await pages.aclose()
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    assert cancelled == ["next"]
+
+
+async def _run_write_contacts(url: str):
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+    from common.crm_sync import get_sync_state, save_sync_state, write_contacts
+
+    engine = create_async_engine(_asyncpg_url(url))
+    try:
+        async with engine.connect() as conn:
+            trans = await conn.begin()
+            try:
+                session = AsyncSession(bind=conn)
+
+                async def new_user_and_job():
+                    user_id = str((await session.execute(
+                        text("INSERT INTO users (email) VALUES (:email) RETURNING id"),
+                        {"email": f"crm-sync-test-{uuid.uuid4().hex}@example.com"},
+                    )).scalar())
+                    job_id = f"crm_sync_test_{uuid.uuid4().hex}"
+                    await session.execute(
+                        text("INSERT INTO import_jobs (id, user_id, status) VALUES (:id, :user_id, 'processing')"),
+                        {"id": job_id, "user_id": user_id},
+                    )
+                    return user_id, job_id
+
+                async def contacts(job_id):
+                    rows = (await session.execute(text("""
+                        SELECT m.hubspot_contact_id, c.id, c.first_name, c.email, c.company
+                        FROM contacts c
+                        JOIN hubspot_contact_mappings m ON m.captely_contact_id = c.id
+                        WHERE c.job_id = :job_id
+                        ORDER BY m.hubspot_contact_id
+                    """), {"job_id": job_id})).fetchall()
+                    return {row[0]: tuple(row[1:]) for row in rows}
+
+                user_id, job_id = await new_user_and_job()
+
+                assert await write_contacts(session, user_id, job_id, "hubspot", []) == (0, 0)
+
+                # hs-1 appears twice in the page: one contact, with the later copy's fields
+                inserted, updated = await write_contacts(session, user_id, job_id, "hubspot", [
+                    ("hs-1", {"first_name": "Ann", "email": "ann@old.example.com", "company": "Acme"}),
+                    ("hs-2", {"first_name": "Bob", "email": "bob@example.com", "company": "Beta"}),
+                    ("hs-1", {"first_name": "Ann", "email": "ann@example.com", "company": "Acme"}),
+                ])
+                assert (inserted, updated) == (2, 0)
+                first = await contacts(job_id)
+                assert {crm_id: row[1:] for crm_id, row in first.items()} == {
+                    "hs-1": ("Ann", "ann@example.com", "Acme"),
+                    "hs-2": ("Bob", "bob@example.com", "Beta"),
+                }
+
+                # hs-2 is already mapped: updated in place, empty and missing fields keep their value
+                inserted, updated = await write_contacts(session, user_id, job_id, "hubspot", [
+                    ("hs-2", {"first_name": "", "company": "Beta Corp"}),
+                    ("hs-3", {"first_name": "Cy", "email": "cy@example.com"}),
+                    ("hs-2", {"first_name": "", "company": "Beta Corp"}),
+                ])
+                assert (inserted, updated) == (1, 1)
+                second = await contacts(job_id)
+                assert second["hs-2"] == (first["hs-2"][0], "Bob", "bob@example.com", "Beta Corp")
+                assert second["hs-1"] == first["hs-1"]
+                assert second["hs-3"][1:] == ("Cy", "cy@example.com", None)
+
+                # Another user's mapping for the same CRM id is not theirs to update
+                other_user, other_job = await new_user_and_job()
+                assert await write_contacts(session, other_user, other_job, "hubspot", [
+                    ("hs-1", {"first_name": "Other"}),
+                ]) == (1, 0)
+                assert (await contacts(job_id))["hs-1"] == first["hs-1"]
+
+                # Salesforce pages use their own mapping table
+                assert await write_contacts(session, user_id, job_id, "salesforce", [
+                    ("003A", {"first_name": "Dee"}),
+                ]) == (1, 0)
+                assert await write_contacts(session, user_id, job_id, "salesforce", [
+                    ("003A", {"company": "Delta"}),
+                ]) == (0, 1)
+
+                assert await get_sync_state(session, user_id, "hubspot") == (None, None)
+                watermark = datetime(2025, 1, 1, 12, 0, tzinfo=timezone.utc)
+                await save_sync_state(session, user_id, "hubspot", "after-2", None)
+                await save_sync_state(session, user_id, "hubspot", None, watermark)
+                assert await get_sync_state(session, user_id, "hubspot") == (None, watermark)
+            finally:
+                await trans.rollback()
+    finally:
+        await engine.dispose()
+
+
+def test_write_contacts_asyncpg():
+    url = os.environ.get("CRM_TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("CRM_TEST_DATABASE_URL not set")
+    pytest.importorskip("sqlalchemy")
+    pytest.importorskip("asyncpg")
+
+    asyncio.run(_run_write_contacts(url))
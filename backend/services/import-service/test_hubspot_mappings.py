@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Runs HubSpotService.save_contact_mappings against Postgres through asyncpg,
+the driver the service uses: the mappings land in the uuid user_id column
+and a re-export repoints them instead of adding rows.
+
+Runs only when CRM_TEST_DATABASE_URL points at a Captely database;
+everything happens inside a transaction that is rolled back.
+"""
+import os
+import uuid
+import asyncio
+
+import pytest
+
+
+def _asyncpg_url(url: str) -> str:
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    return url.replace("+psycopg2", "+asyncpg")
+
+
+async def _run_mapping_upserts(url: str):
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+    from app.hubspot_service import HubSpotService
+
+    engine = create_async_engine(_asyncpg_url(url))
+    try:
+        async with engine.connect() as conn:
+            trans = await conn.begin()
+            try:
+                session = AsyncSession(bind=conn)
+                user_id = str((await session.execute(
+                    text("INSERT INTO users (email) VALUES (:email) RETURNING id"),
+                    {"email": f"hubspot-test-{uuid.uuid4().hex}@example.com"},
+                )).scalar())
+                job_id = f"hubspot_test_{uuid.uuid4().hex}"
+                await session.execute(
+                    text("INSERT INTO import_jobs (id, user_id, status) VALUES (:id, :user_id, 'completed')"),
+                    {"id": job_id, "user_id": user_id},
+                )
+                first, second = (await session.execute(text("""
+                    INSERT INTO contacts (job_id, user_id, email)
+                    VALUES (:job_id, :user_id, 'a@example.com'), (:job_id, :user_id, 'b@example.com')
+                    RETURNING id
+                """), {"job_id": job_id, "user_id": user_id})).scalars().all()
+
+                service = HubSpotService()
+                mappings_query = text("""
+                    SELECT hubspot_contact_id, captely_contact_id
+                    FROM hubspot_contact_mappings
+                    WHERE user_id = CAST(:user_id AS uuid)
+                """)
+
+                await service.save_contact_mappings(session, user_id, {"hs-1": first, "hs-2": second})
+                rows = set((await session.execute(mappings_query, {"user_id": user_id})).fetchall())
+                assert rows == {("hs-1", first), ("hs-2", second)}
+
+                # hs-1 now matches the second contact: its old mapping goes, the second contact's is repointed
+                await service.save_contact_mappings(session, user_id, {"hs-1": second})
+                rows = set((await session.execute(mappings_query, {"user_id": user_id})).fetchall())
+                assert rows == {("hs-1", second)}
+            finally:
+                await trans.rollback()
+    finally:
+        await engine.dispose()
+
+
+def test_save_contact_mappings_asyncpg():
+    url = os.environ.get("CRM_TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("CRM_TEST_DATABASE_URL not set")
+    pytest.importorskip("sqlalchemy")
+    pytest.importorskip("asyncpg")
+
+    asyncio.run(_run_mapping_upserts(url))
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Keyset pagination (common.pagination): cursors round-trip, malformed ones
+are rejected, and paging a listing with KEYSET_CONDITION visits every row
+exactly once in KEYSET_ORDER, including rows that share a created_at.
+
+The database part runs only when CRM_TEST_DATABASE_URL points at a Captely
+database; everything happens inside a transaction that is rolled back.
+"""
+import os
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from common.pagination import (
+    KEYSET_CONDITION, KEYSET_ORDER, CountCache, decode_cursor, encode_cursor, next_cursor
+)
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2025, 6, 15, 12, 30, 45, 123456)
+    cursor = encode_cursor(created_at, 42)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (created_at, 42)
+
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", encode_cursor(datetime(2025, 1, 1), 1)[:-3]])
+def test_malformed_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+class Row:
+    """Stand-in for a SQLAlchemy Row: next_cursor only reads ``_mapping``."""
+
+    def __init__(self, row_id: int, created_at: datetime):
+        self._mapping = {"id": row_id, "created_at": created_at}
+
+
+def test_next_cursor_trims_extra_row():
+    start = datetime(2025, 1, 1)
+    rows = [Row(i, start - timedelta(seconds=i)) for i in range(4)]
+
+    assert next_cursor(rows[:3], 3) is None
+    page = list(rows)
+    cursor = next_cursor(page, 3)
+    assert len(page) == 3
+    assert decode_cursor(cursor) == (start - timedelta(seconds=2), 2)
+
+
+def test_count_cache_key_ignores_param_order():
+    cache = CountCache(ttl=60)
+    cache.set(CountCache.key("scope", {"a": 1, "b": "x"}), 10)
+    assert cache.get(CountCache.key("scope", {"b": "x", "a": 1})) == 10
+    assert cache.get(CountCache.key("other", {"a": 1, "b": "x"})) is None
+
+
+def _page_through(conn, user_id: str, limit: int):
+    from sqlalchemy import text
+
+    pages, cursor = [], None
+    while True:
+        where = "c.user_id = :user_id"
+        params = {"user_id": user_id, "limit": limit + 1}
+        if cursor:
+            params["cursor_created_at"], params["cursor_id"] = decode_cursor(cursor)
+            where += f" AND {KEYSET_CONDITION}"
+        rows = conn.execute(text(f"""
+            SELECT c.id, c.created_at FROM contacts c
+            WHERE {where}
+            ORDER BY {KEYSET_ORDER}
+            LIMIT :limit
+        """), params).fetchall()
+        cursor = next_cursor(rows, limit)
+        pages.append([row.id for row in rows])
+        if cursor is None:
+            return pages
+
+
+def test_keyset_paging_postgres():
+    url = os.environ.get("CRM_TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("CRM_TEST_DATABASE_URL not set")
+    pytest.importorskip("psycopg2")
+    from sqlalchemy import create_engine, text
+
+    engine = create_engine(url.replace("+asyncpg", ""))
+    try:
+        with engine.connect() as conn:
+            trans = conn.begin()
+            try:
+                user_id = str(conn.execute(
+                    text("INSERT INTO users (email) VALUES (:email) RETURNING id"),
+                    {"email": f"paging-test-{uuid.uuid4().hex}@example.com"},
+                ).scalar())
+                job_id = f"paging_test_{uuid.uuid4().hex}"
+                conn.execute(
+                    text("INSERT INTO import_jobs (id, user_id, status) VALUES (:id, :user_id, 'completed')"),
+                    {"id": job_id, "user_id": user_id},
+                )
+                # 23 contacts over 6 distinct timestamps, so pages split ties
+                conn.execute(text("""
+                    INSERT INTO contacts (job_id, user_id, email, created_at)
+                    SELECT :job_id, :user_id, 'p' || g || '@example.com',
+                           TIMESTAMP '2025-01-01 00:00:00' + (g / 4) * INTERVAL '1 minute'
+                    FROM generate_series(1, 23) g
+                """), {"job_id": job_id, "user_id": user_id})
+
+                expected = conn.execute(text(f"""
+                    SELECT c.id FROM contacts c WHERE c.user_id = :user_id ORDER BY {KEYSET_ORDER}
+                """), {"user_id": user_id}).scalars().all()
+
+                for limit in (1, 4, 5, 23, 50):
+                    pages = _page_through(conn, user_id, limit)
+                    assert [contact_id for page in pages for contact_id in page] == expected
+                    assert all(len(page) == limit for page in pages[:-1])
+                    assert 0 < len(pages[-1]) <= limit
+            finally:
+                trans.rollback()
+    finally:
+        engine.dispose()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Behaviour of common.response_cache.cached_response on sync and async
+endpoints: hits skip the endpoint, a bumped user generation invalidates,
+If-None-Match gets a 304, and a Redis outage falls back to uncached.
+
+Redis is replaced by an in-memory stand-in, so nothing external is needed.
+"""
+import pytest
+
+pytest.importorskip("redis")
+pytest.importorskip("httpx")
+
+from fastapi import FastAPI, Response
+from fastapi.testclient import TestClient
+
+from common.events import user_generation_key
+from common.response_cache import ResponseCache, cached_response
+
+
+class FakeRedis:
+    """The two commands ResponseCache uses, over a dict."""
+
+    def __init__(self):
+        self.data = {}
+        self.down = False
+
+    def mget(self, *keys):
+        if self.down:
+            raise ConnectionError("redis is down")
+        return [self.data.get(key) for key in keys]
+
+    def set(self, key, value, ex=None):
+        if self.down:
+            raise ConnectionError("redis is down")
+        self.data[key] = value
+
+    def bump(self, user_id: str):
+        key = user_generation_key(user_id)
+        self.data[key] = str(int(self.data.get(key) or 0) + 1)
+
+
+class FakeAsyncRedis:
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+
+    async def mget(self, *keys):
+        return self.redis.mget(*keys)
+
+    async def set(self, key, value, ex=None):
+        self.redis.set(key, value, ex=ex)
+
+
+def make_app():
+    redis = FakeRedis()
+    cache = ResponseCache("redis://response-cache-test")
+    cache._sync = redis
+    cache._async = FakeAsyncRedis(redis)
+    calls = []
+    app = FastAPI()
+
+    @app.get("/sync/{user_id}/stats")
+    @cached_response(cache, "test:sync")
+    def sync_stats(user_id: str, days: int = 7):
+        calls.append(("sync", user_id, days))
+        return {"user_id": user_id, "days": days, "calls": len(calls)}
+
+    @app.get("/async/{user_id}/stats")
+    @cached_response(cache, "test:async")
+    async def async_stats(user_id: str, days: int = 7):
+        calls.append(("async", user_id, days))
+        return {"user_id": user_id, "days": days, "calls": len(calls)}
+
+    @app.get("/async/{user_id}/raw")
+    @cached_response(cache, "test:raw")
+    async def raw(user_id: str):
+        calls.append(("raw", user_id))
+        return Response(content="plain", media_type="text/plain")
+
+    return TestClient(app), redis, cache, calls
+
+
+@pytest.mark.parametrize("kind", ["sync", "async"])
+def test_hit_skips_endpoint(kind):
+    client, _, _, calls = make_app()
+
+    first = client.get(f"/{kind}/u1/stats", params={"days": 30})
+    second = client.get(f"/{kind}/u1/stats", params={"days": 30})
+
+    assert first.status_code == second.status_code == 200
+    assert first.json() == second.json() == {"user_id": "u1", "days": 30, "calls": 1}
+    assert first.headers["ETag"] == second.headers["ETag"]
+    assert second.headers["Cache-Control"] == "private, no-cache"
+    assert calls == [(kind, "u1", 30)]
+
+
+@pytest.mark.parametrize("kind", ["sync", "async"])
+def test_key_covers_params_and_user(kind):
+    client, _, _, calls = make_app()
+
+    client.get(f"/{kind}/u1/stats", params={"days": 30})
+    client.get(f"/{kind}/u1/stats", params={"days": 7})
+    client.get(f"/{kind}/u2/stats", params={"days": 30})
+
+    assert calls == [(kind, "u1", 30), (kind, "u1", 7), (kind, "u2", 30)]
+
+
+@pytest.mark.parametrize("kind", ["sync", "async"])
+def test_generation_bump_invalidates_only_that_user(kind):
+    client, redis, _, calls = make_app()
+    client.get(f"/{kind}/u1/stats")
+    client.get(f"/{kind}/u2/stats")
+
+    redis.bump("u1")
+    refreshed = client.get(f"/{kind}/u1/stats")
+    client.get(f"/{kind}/u2/stats")
+
+    assert refreshed.json()["calls"] == 3
+    assert calls == [(kind, "u1", 7), (kind, "u2", 7), (kind, "u1", 7)]
+
+
+@pytest.mark.parametrize("kind", ["sync", "async"])
+def test_if_none_match_gets_304(kind):
+    client, redis, _, _ = make_app()
+    etag = client.get(f"/{kind}/u1/stats").headers["ETag"]
+
+    not_modified = client.get(f"/{kind}/u1/stats", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert not_modified.headers["ETag"] == etag
+
+    # The body changes after an invalidation, so the old ETag no longer matches
+    redis.bump("u1")
+    changed = client.get(f"/{kind}/u1/stats", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+
+@pytest.mark.parametrize("kind", ["sync", "async"])
+def test_redis_outage_serves_uncached(kind):
+    client, redis, cache, calls = make_app()
+    redis.down = True
+
+    first = client.get(f"/{kind}/u1/stats")
+    second = client.get(f"/{kind}/u1/stats")
+
+    assert first.status_code == second.status_code == 200
+    assert "ETag" in second.headers
+    assert len(calls) == 2
+    # Redis is skipped for a while instead of being retried on every request
+    assert cache._down_until > 0
+    redis.down = False
+    client.get(f"/{kind}/u1/stats")
+    assert len(calls) == 3
+
+
+def test_response_objects_pass_through_uncached():
+    client, redis, _, calls = make_app()
+
+    first = client.get("/async/u1/raw")
+    second = client.get("/async/u1/raw")
+
+    assert first.text == second.text == "plain"
+    assert "ETag" not in first.headers
+    assert calls == [("raw", "u1"), ("raw", "u1")]
+    assert not [key for key in redis.data if ":test:raw:" in key]
@@ -19,7 +19,7 @@ from jose import jwt, JWTError
 import os
 
 from common.config import get_settings
-from common.db import get_async_session
+from common.db import get_async_session, pool_metrics
 from common.utils import logger
 
 app = FastAPI(
@@ -458,9 +458,7 @@ async def send_weekly_summaries(
                 COUNT(CASE WHEN email IS NOT NULL AND email != '' THEN 1 END) as emails,
                 SUM(credits_consumed) as credits
             FROM contacts 
-            WHERE job_id IN (
-                SELECT id FROM import_jobs WHERE user_id = :user_id
-            )
+            WHERE user_id = :user_id
             AND created_at >= :one_week_ago
         """
         
@@ -796,6 +794,11 @@ async def check_credit_alerts():
         await session.commit()
 
 # Health check endpoints
+@app.get("/health/db-pool")
+async def db_pool_health():
+    """Connection pool checkout wait times and usage"""
+    return pool_metrics()
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""